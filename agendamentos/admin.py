@@ -1,12 +1,27 @@
 from django.contrib import admin
-from .models import Agendamento
+from . import busca
+from .models import Agendamento, ChaveIdempotencia, Cliente, ListaEspera, NotificacaoPendente, ReservaTemporaria
 
 @admin.register(Agendamento)
 class AgendamentoAdmin(admin.ModelAdmin):
     list_display = ['nome_cliente', 'telefone_cliente', 'servico', 'profissional', 'barbearia', 'data_hora', 'status']
     list_filter = ['barbearia', 'status', 'data_hora', 'servico']
-    search_fields = ['nome_cliente', 'telefone_cliente']
+    search_fields = ['nome_cliente', 'telefone_cliente', 'email_cliente', 'observacoes']
     date_hierarchy = 'data_hora'
+    raw_id_fields = ['cliente']
+    
+    def get_search_results(self, request, queryset, search_term):
+        # No SQLite usa o índice FTS5 em vez de LIKE '%termo%' em cada campo
+        if not search_term or not busca.fts_disponivel(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        # Os filtros laterais já estão no queryset e valem antes do limite de resultados; a
+        # barbearia (a do dono ou a do filtro) também restringe os documentos do índice
+        if request.user.is_superuser:
+            filtro = request.GET.get('barbearia__id__exact', '')
+            barbearia_id = int(filtro) if filtro.isdigit() else None
+        else:
+            barbearia_id = getattr(getattr(request.user, 'barbearia', None), 'id', None)
+        return busca.filtrar(queryset, search_term, barbearia_id), False
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
@@ -17,3 +32,56 @@ class AgendamentoAdmin(admin.ModelAdmin):
             return qs.filter(barbearia=barbearia)
         except:
             return qs.none()
+
+
+@admin.register(Cliente)
+class ClienteAdmin(admin.ModelAdmin):
+    list_display = ['nome', 'telefone', 'email', 'barbearia', 'criado_em']
+    list_filter = ['barbearia']
+    search_fields = ['nome', 'telefone', 'email']
+    list_select_related = ['barbearia']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Telefone digitado com máscara casa com o normalizado
+        numero = Cliente.normalizar_telefone(search_term)
+        if numero and len(numero) >= 8:
+            return queryset.filter(telefone__startswith=numero), False
+        return super().get_search_results(request, queryset, search_term)
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if request.user.is_superuser:
+            return qs
+        try:
+            return qs.filter(barbearia=request.user.barbearia)
+        except:
+            return qs.none()
+
+
+@admin.register(NotificacaoPendente)
+class NotificacaoPendenteAdmin(admin.ModelAdmin):
+    list_display = ['barbearia', 'agendamento', 'tipo', 'criado_em', 'enviada_em']
+    list_filter = ['barbearia', 'tipo', 'enviada_em']
+    list_select_related = ['barbearia', 'agendamento']
+
+
+@admin.register(ReservaTemporaria)
+class ReservaTemporariaAdmin(admin.ModelAdmin):
+    list_display = ['profissional', 'inicio', 'fim', 'expira_em']
+    list_filter = ['barbearia']
+    list_select_related = ['profissional__barbearia']
+
+
+@admin.register(ChaveIdempotencia)
+class ChaveIdempotenciaAdmin(admin.ModelAdmin):
+    list_display = ['chave', 'barbearia', 'agendamento', 'criada_em', 'expira_em']
+    list_filter = ['barbearia']
+    list_select_related = ['barbearia', 'agendamento']
+
+
+@admin.register(ListaEspera)
+class ListaEsperaAdmin(admin.ModelAdmin):
+    list_display = ['nome_cliente', 'telefone_cliente', 'servico', 'profissional', 'data_inicio', 'data_fim', 'hora_inicio', 'hora_fim', 'ativa', 'avisos']
+    list_filter = ['barbearia', 'ativa']
+    search_fields = ['nome_cliente', 'telefone_cliente', 'email_cliente']
+    list_select_related = ['servico', 'profissional']
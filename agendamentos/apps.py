@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AgendamentosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'agendamentos'
+
+    def ready(self):
+        # Registra os signals que publicam os eventos da agenda em tempo real
+        from . import eventos  # noqa: F401
@@ -0,0 +1,89 @@
+"""
+Busca textual de agendamentos.
+
+No SQLite, uma tabela virtual FTS5 (agendamentos_busca, criada na migração 0007 e
+mantida por triggers) indexa nome, telefone, email e observações de cada agendamento.
+A consulta usa prefixos ("jo" encontra "João") e ordena pela relevância (bm25). A
+barbearia também é indexada como um termo, então a busca de um estabelecimento só
+percorre os documentos dele; os demais filtros da tela entram na mesma consulta (pelo
+rowid), antes do limite de resultados. Em outros bancos, cai para um icontains nos
+mesmos campos.
+"""
+import re
+
+from django.core.exceptions import EmptyResultSet
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Case, IntegerField, Q, When
+
+TABELA = 'agendamentos_busca'
+LIMITE_RESULTADOS = 200
+
+# Pesos do bm25 por coluna: barbearia, nome, telefone, email, observações
+PESOS = (0.0, 10.0, 5.0, 3.0, 1.0)
+
+_TERMOS = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_disponivel(banco=DEFAULT_DB_ALIAS):
+    return connections[banco].vendor == 'sqlite'
+
+
+def montar_consulta(termo):
+    """Converte o texto digitado em uma consulta FTS5 com prefixo em cada palavra"""
+    palavras = _TERMOS.findall(termo or '')
+    if not palavras:
+        return ''
+    # Entre aspas, a palavra nunca é interpretada como operador (AND, OR, NEAR...)
+    return ' AND '.join(f'"{palavra}"*' for palavra in palavras)
+
+
+def buscar_ids(termo, barbearia_id=None, limite=LIMITE_RESULTADOS, banco=DEFAULT_DB_ALIAS, queryset=None):
+    """
+    Ids dos agendamentos que casam com o termo, do mais relevante para o menos. Com
+    `queryset`, só os ids dele: os filtros entram na consulta do índice, antes do limite.
+    """
+    consulta = montar_consulta(termo)
+    if not consulta:
+        return []
+    consulta = '{nome_cliente telefone_cliente email_cliente observacoes} : (' + consulta + ')'
+    if barbearia_id is not None:
+        consulta = f'barbearia : "b{int(barbearia_id)}" AND {consulta}'
+
+    filtro, parametros = '', []
+    if queryset is not None:
+        try:
+            sql, parametros = queryset.order_by().values('id').query.get_compiler(using=banco).as_sql()
+        except EmptyResultSet:
+            return []
+        filtro = f' AND rowid IN ({sql})'
+
+    pesos = ', '.join(str(peso) for peso in PESOS)
+    with connections[banco].cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {TABELA} WHERE {TABELA} MATCH %s{filtro} ORDER BY bm25({TABELA}, {pesos}) LIMIT %s',
+            [consulta, *parametros, limite],
+        )
+        return [linha[0] for linha in cursor.fetchall()]
+
+
+def filtrar(queryset, termo, barbearia_id=None):
+    """
+    Aplica a busca ao queryset de agendamentos, ordenando pela relevância. Os filtros
+    que ele já tem (data, status, profissional) valem antes do limite de resultados.
+    """
+    # O índice fica no mesmo banco (shard) dos agendamentos consultados
+    banco = queryset.db
+    if not fts_disponivel(banco):
+        filtro = Q()
+        for palavra in _TERMOS.findall(termo or ''):
+            filtro &= (
+                Q(nome_cliente__icontains=palavra) | Q(telefone_cliente__icontains=palavra)
+                | Q(email_cliente__icontains=palavra) | Q(observacoes__icontains=palavra)
+            )
+        return queryset.filter(filtro)
+
+    ids = buscar_ids(termo, barbearia_id, banco=banco, queryset=queryset)
+    if not ids:
+        return queryset.none()
+    relevancia = Case(*[When(id=id_, then=posicao) for posicao, id_ in enumerate(ids)], output_field=IntegerField())
+    return queryset.filter(id__in=ids).annotate(relevancia=relevancia).order_by('relevancia')
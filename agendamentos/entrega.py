@@ -0,0 +1,189 @@
+"""
+Entrega concorrente de emails.
+
+Um conjunto limitado de threads envia as mensagens em paralelo; cada thread mantém
+a própria conexão SMTP aberta durante toda a execução. Quando o servidor começa a
+recusar por excesso de envios (421/450/451/452), a concorrência é reduzida pela
+metade e os envios pausam por um tempo crescente, voltando a subir aos poucos
+conforme os envios seguintes dão certo.
+"""
+import logging
+import queue
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+from barbearias import metricas
+
+logger = logging.getLogger(__name__)
+
+# Códigos SMTP que indicam limitação temporária do servidor
+CODIGOS_LIMITACAO = {421, 450, 451, 452}
+
+_FIM = object()
+
+
+def _eh_limitacao(erro):
+    if isinstance(erro, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(erro, smtplib.SMTPResponseException):
+        return erro.smtp_code in CODIGOS_LIMITACAO
+    if isinstance(erro, smtplib.SMTPRecipientsRefused):
+        return any(codigo in CODIGOS_LIMITACAO for codigo, _ in erro.recipients.values())
+    return False
+
+
+class Regulador:
+    """Controle de vazão compartilhado entre as threads de envio (aumento aditivo, redução pela metade)"""
+
+    def __init__(self, maximo, espera_inicial=1.0, espera_maxima=60.0, sucessos_para_subir=20):
+        self.maximo = maximo
+        self.limite = maximo
+        self.espera_inicial = espera_inicial
+        self.espera_maxima = espera_maxima
+        self.sucessos_para_subir = sucessos_para_subir
+        self.espera = espera_inicial
+        self.pausa_ate = 0.0
+        self.ativos = 0
+        self.sucessos = 0
+        self.limitacoes = 0
+        self._condicao = threading.Condition()
+
+    def entrar(self):
+        with self._condicao:
+            while True:
+                restante = self.pausa_ate - time.monotonic()
+                if restante <= 0 and self.ativos < self.limite:
+                    self.ativos += 1
+                    return
+                self._condicao.wait(restante if restante > 0 else None)
+
+    def sair(self, limitado=False):
+        with self._condicao:
+            self.ativos -= 1
+            if limitado:
+                self.limitacoes += 1
+                self.sucessos = 0
+                self.limite = max(1, self.limite // 2)
+                self.pausa_ate = max(self.pausa_ate, time.monotonic() + self.espera)
+                self.espera = min(self.espera * 2, self.espera_maxima)
+            else:
+                self.sucessos += 1
+                if self.sucessos >= self.sucessos_para_subir:
+                    self.sucessos = 0
+                    self.limite = min(self.maximo, self.limite + 1)
+                    self.espera = self.espera_inicial
+            self._condicao.notify_all()
+
+
+class _Trabalhador(threading.Thread):
+    def __init__(self, fila, regulador, resultados, tentativas, tipo):
+        super().__init__(daemon=True)
+        self.tipo = tipo
+        self.fila = fila
+        self.regulador = regulador
+        self.resultados = resultados
+        self.tentativas = tentativas
+        self.conexao = None
+
+    def _conectar(self):
+        if self.conexao is None:
+            self.conexao = get_connection(fail_silently=False)
+            self.conexao.open()
+        return self.conexao
+
+    def _descartar_conexao(self):
+        if self.conexao is not None:
+            try:
+                self.conexao.close()
+            except Exception:
+                pass
+            self.conexao = None
+
+    def _enviar(self, mensagem):
+        with metricas.EMAIL_ENVIO_SEGUNDOS.medir(tipo=self.tipo):
+            erro = self._enviar_com_tentativas(mensagem)
+        metricas.EMAILS.inc(tipo=self.tipo, resultado='enviado' if erro is None else 'erro')
+        return erro
+
+    def _enviar_com_tentativas(self, mensagem):
+        for tentativa in range(1, self.tentativas + 1):
+            self.regulador.entrar()
+            limitado = False
+            try:
+                mensagem.connection = self._conectar()
+                mensagem.send()
+                return None
+            except Exception as e:
+                limitado = _eh_limitacao(e)
+                if limitado:
+                    metricas.SMTP_LIMITACOES.inc()
+                if not limitado or tentativa == self.tentativas:
+                    return e
+                # A conexão pode ter sido derrubada pelo servidor; reabre na próxima tentativa
+                self._descartar_conexao()
+            finally:
+                self.regulador.sair(limitado=limitado)
+
+    def run(self):
+        try:
+            while True:
+                item = self.fila.get()
+                if item is _FIM:
+                    return
+                chave, mensagem = item
+                erro = self._enviar(mensagem)
+                self.resultados.append((chave, erro))
+        finally:
+            self._descartar_conexao()
+
+
+def entregar_em_lote(mensagens, workers=None, tentativas=3, regulador=None, tipo='lote'):
+    """
+    Envia as mensagens em paralelo e retorna [(chave, erro), ...], com erro None nos
+    envios bem-sucedidos. `tipo` identifica os emails nas métricas.
+
+    `mensagens` é um iterável de (chave, EmailMessage). Ele é consumido aos poucos: a
+    fila entre quem monta as mensagens e as threads é limitada, então a montagem
+    (consultas e templates) acompanha o ritmo de envio em vez de acumular tudo em memória.
+    """
+    workers = max(1, workers or getattr(settings, 'NOTIFICACOES_SMTP_WORKERS', 4))
+    regulador = regulador or Regulador(workers)
+    fila = queue.Queue(maxsize=workers * 2)
+    resultados = []
+
+    trabalhadores = [_Trabalhador(fila, regulador, resultados, tentativas, tipo) for _ in range(workers)]
+    for trabalhador in trabalhadores:
+        trabalhador.start()
+    try:
+        for item in mensagens:
+            fila.put(item)
+    finally:
+        for _ in trabalhadores:
+            fila.put(_FIM)
+        for trabalhador in trabalhadores:
+            trabalhador.join()
+
+    if regulador.limitacoes:
+        logger.warning(f"Servidor SMTP limitou os envios {regulador.limitacoes} vez(es); concorrência final: {regulador.limite}")
+    return resultados
+
+
+def entregar_em_segundo_plano(mensagens, workers=None, tipo='lote'):
+    """
+    Dispara entregar_em_lote em uma thread separada, sem segurar a requisição.
+    As mensagens já devem estar montadas (nada de consultas ao banco na thread).
+    """
+    mensagens = list(mensagens)
+
+    def executar():
+        for chave, erro in entregar_em_lote(mensagens, workers=workers, tipo=tipo):
+            if erro is not None:
+                logger.error(f"Erro ao enviar email {chave}: {str(erro)}")
+
+    thread = threading.Thread(target=executar, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,212 @@
+"""
+Eventos em tempo real da agenda (novo agendamento, cancelamento e mudança de status).
+
+Os eventos são publicados a partir dos signals de Agendamento e entregues às abas
+do painel administrativo abertas via Server-Sent Events. Quando
+EVENTOS_AGENDA_DIR está configurado, os eventos passam por um arquivo compartilhado
+que cada processo acompanha, permitindo a entrega entre workers diferentes.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+try:
+    import fcntl
+except ImportError:  # Windows: rotação sem trava entre processos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ARQUIVO_EVENTOS = 'agenda.jsonl'
+TAMANHO_MAXIMO_ARQUIVO = 1024 * 1024  # Rotaciona o arquivo a cada 1MB
+TAMANHO_FILA = 100
+
+
+class BrokerLocal:
+    """Pub/sub em processo, com arquivo compartilhado opcional entre workers"""
+
+    def __init__(self, diretorio=None, intervalo=0.5):
+        self.diretorio = str(diretorio) if diretorio else None
+        self.intervalo = intervalo
+        self._assinantes = {}
+        self._lock = threading.Lock()
+        self._observador = None
+
+    @property
+    def caminho(self):
+        return os.path.join(self.diretorio, ARQUIVO_EVENTOS)
+
+    def assinar(self, barbearia_id):
+        """Registra uma fila para receber os eventos da barbearia (chamar dentro do event loop)"""
+        fila = asyncio.Queue(maxsize=TAMANHO_FILA)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._assinantes.setdefault(barbearia_id, set()).add((loop, fila))
+        if self.diretorio:
+            self._iniciar_observador()
+        return fila
+
+    def cancelar(self, barbearia_id, fila):
+        with self._lock:
+            assinantes = self._assinantes.get(barbearia_id, set())
+            for item in [a for a in assinantes if a[1] is fila]:
+                assinantes.discard(item)
+            if not assinantes:
+                self._assinantes.pop(barbearia_id, None)
+
+    def publicar(self, barbearia_id, tipo, dados):
+        evento = {
+            'id': uuid.uuid4().hex,
+            'tipo': tipo,
+            'barbearia_id': barbearia_id,
+            'dados': dados,
+        }
+        if not self.diretorio:
+            self._entregar(evento)
+            return
+
+        linha = (json.dumps(evento, ensure_ascii=False) + '\n').encode('utf-8')
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            # Rotação e escrita sob a mesma trava: sem ela, dois workers podiam rotacionar
+            # juntos (um .1 sobrescrevendo o outro) ou escrever no arquivo já rotacionado
+            with self._travado():
+                self._rotacionar_se_necessario()
+                fd = os.open(self.caminho, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, linha)
+                finally:
+                    os.close(fd)
+        except OSError as e:
+            logger.error(f"Erro ao publicar evento da agenda: {str(e)}")
+            self._entregar(evento)
+
+    @contextmanager
+    def _travado(self):
+        """Exclusão entre processos para escrever e rotacionar o arquivo"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.diretorio, '.lock'), 'w') as trava:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+            yield
+
+    def _rotacionar_se_necessario(self):
+        """Chamar com _travado"""
+        try:
+            if os.path.getsize(self.caminho) > TAMANHO_MAXIMO_ARQUIVO:
+                # os.replace é atômico: os observadores terminam de ler o arquivo antigo
+                # pelo descritor aberto e depois reabrem o novo
+                os.replace(self.caminho, self.caminho + '.1')
+        except FileNotFoundError:
+            pass
+
+    def _entregar(self, evento):
+        with self._lock:
+            destinos = list(self._assinantes.get(evento['barbearia_id'], ()))
+        for loop, fila in destinos:
+            try:
+                loop.call_soon_threadsafe(_enfileirar, fila, evento)
+            except RuntimeError:
+                # Event loop já encerrado; a assinatura será removida pelo próprio stream
+                pass
+
+    def _iniciar_observador(self):
+        with self._lock:
+            if self._observador and self._observador.is_alive():
+                return
+            self._observador = threading.Thread(target=self._observar, name='eventos-agenda', daemon=True)
+            self._observador.start()
+
+    def _abrir(self, do_fim):
+        os.makedirs(self.diretorio, exist_ok=True)
+        arquivo = open(self.caminho, 'a+b')
+        arquivo.seek(0, os.SEEK_END if do_fim else os.SEEK_SET)
+        return arquivo
+
+    def _observar(self):
+        """Acompanha o arquivo compartilhado (como tail -F) e repassa as linhas novas"""
+        arquivo = self._abrir(do_fim=True)
+        pendente = b''
+        while True:
+            with self._lock:
+                if not self._assinantes:
+                    self._observador = None
+                    arquivo.close()
+                    return
+            pendente += arquivo.read()
+            *linhas, pendente = pendente.split(b'\n')
+            for linha in linhas:
+                try:
+                    self._entregar(json.loads(linha))
+                except ValueError:
+                    continue
+            try:
+                rotacionado = os.stat(self.caminho).st_ino != os.fstat(arquivo.fileno()).st_ino
+            except FileNotFoundError:
+                rotacionado = True
+            if rotacionado:
+                # O restante do arquivo antigo já foi lido acima
+                arquivo.close()
+                arquivo = self._abrir(do_fim=False)
+                pendente = b''
+            time.sleep(self.intervalo)
+
+
+def _enfileirar(fila, evento):
+    try:
+        fila.put_nowait(evento)
+    except asyncio.QueueFull:
+        # Aba lenta: descarta o evento mais antigo para manter a fila limitada
+        fila.get_nowait()
+        fila.put_nowait(evento)
+
+
+broker = BrokerLocal(getattr(settings, 'EVENTOS_AGENDA_DIR', None))
+
+
+def serializar_agendamento(agendamento):
+    """Dados enviados às abas abertas (sem consultas adicionais ao banco)"""
+    return {
+        'agendamento_id': agendamento.id,
+        'profissional_id': agendamento.profissional_id,
+        'servico_id': agendamento.servico_id,
+        'nome_cliente': agendamento.nome_cliente,
+        'data_hora': agendamento.data_hora.isoformat(),
+        'status': agendamento.status,
+        # Permite ao painel ajustar os contadores sem recarregar a página
+        'status_anterior': getattr(agendamento, '_status_original', None),
+    }
+
+
+def publicar_evento(agendamento, tipo, using):
+    """Publica o evento somente depois que a transação do banco `using` for confirmada"""
+    barbearia_id = agendamento.barbearia_id
+    dados = serializar_agendamento(agendamento)
+    transaction.on_commit(lambda: broker.publicar(barbearia_id, tipo, dados), using=using)
+
+
+@receiver(post_init, sender='agendamentos.Agendamento')
+def guardar_status_original(sender, instance, **kwargs):
+    instance._status_original = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender='agendamentos.Agendamento')
+def agendamento_salvo(sender, instance, created, using, **kwargs):
+    # `using` é o shard da barbearia: a transação que importa é a desse banco
+    if created:
+        publicar_evento(instance, 'agendamento_criado', using)
+    elif instance.status != instance._status_original:
+        tipo = 'agendamento_cancelado' if instance.status == 'cancelado' else 'status_alterado'
+        publicar_evento(instance, tipo, using)
+    instance._status_original = instance.status
@@ -1,10 +1,21 @@
 from django import forms
-from .models import Agendamento
+from .models import Agendamento, ListaEspera, ReservaTemporaria
 from barbearias.models import Servico, Profissional
+from barbearias import agenda, datas
+from barbearias.catalogo import obter_catalogo
 from django.utils import timezone
 from datetime import datetime, timedelta
+import secrets
 
 class AgendamentoForm(forms.ModelForm):
+    # Token da reserva temporária do horário escolhido (preenchido pelo JavaScript)
+    reserva = forms.CharField(required=False, widget=forms.HiddenInput)
+    # Gerada a cada formulário novo e mantida ao reexibir com erros: um reenvio
+    # (duplo clique, F5) devolve o agendamento já criado (veja ChaveIdempotencia)
+    chave_idempotencia = forms.CharField(
+        required=False, max_length=64, widget=forms.HiddenInput, initial=lambda: secrets.token_urlsafe(16)
+    )
+
     class Meta:
         model = Agendamento
         fields = ['nome_cliente', 'telefone_cliente', 'email_cliente', 'servico', 'profissional', 'data_hora', 'observacoes']
@@ -20,15 +31,27 @@ class AgendamentoForm(forms.ModelForm):
         self.barbearia = kwargs.pop('barbearia', None)
         super().__init__(*args, **kwargs)
         
+        self.catalogo = None
         if self.barbearia:
+            # O queryset só é consultado na validação; as opções vêm do catálogo em cache
+            self.catalogo = obter_catalogo(self.barbearia.id)
             self.fields['servico'].queryset = Servico.objects.filter(barbearia=self.barbearia, ativo=True)
             self.fields['profissional'].queryset = Profissional.objects.filter(barbearia=self.barbearia, ativo=True)
+            self.fields['servico'].choices = [('', '---------')] + [
+                (servico.id, f"{servico.nome} - R$ {servico.preco} ({servico.duracao_minutos}min)")
+                for servico in self.catalogo.servicos
+            ]
+            self.fields['profissional'].choices = [('', '---------')] + [
+                (profissional.id, profissional.nome) for profissional in self.catalogo.profissionais
+            ]
         
         self.fields['servico'].widget.attrs.update({'class': 'form-control'})
         self.fields['profissional'].widget.attrs.update({'class': 'form-control'})
         
-        # Define horário mínimo como agora + 1 hora
-        min_datetime = (timezone.now() + timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M')
+        # Define horário mínimo como agora + 1 hora (no fuso da barbearia)
+        min_datetime = timezone.localtime(
+            timezone.now() + timedelta(hours=1), datas.fuso(self.barbearia)
+        ).strftime('%Y-%m-%dT%H:%M')
         self.fields['data_hora'].widget.attrs.update({'min': min_datetime})
     
     def clean_data_hora(self):
@@ -40,14 +63,38 @@ class AgendamentoForm(forms.ModelForm):
             if data_hora < timezone.now():
                 raise forms.ValidationError("Não é possível agendar para datas passadas.")
 
-            dia_semana = data_hora.weekday()
-            horario_funcionamento = self.barbearia.horarios_funcionamento.filter(dia_semana=dia_semana).first()
-
-            if horario_funcionamento and horario_funcionamento.fechado:
-                raise forms.ValidationError(f"A barbearia está fechada na {horario_funcionamento.get_dia_semana_display()}.")
+            # Considera o horário semanal e as exceções por data (feriados, fechamentos)
+            data = datas.local(data_hora, datas.fuso(self.barbearia)).date()
+            if data in agenda.datas_fechadas(self.barbearia.id, data, data):
+                raise forms.ValidationError(f"O estabelecimento está fechado em {data.strftime('%d/%m/%Y')}.")
 
         return data_hora
     
+    def clean(self):
+        cleaned_data = super().clean()
+        data_hora = cleaned_data.get('data_hora')
+        servico = cleaned_data.get('servico')
+        profissional = cleaned_data.get('profissional')
+
+        if self.barbearia and data_hora and servico and profissional:
+            # O horário precisa caber em um intervalo aberto da agenda compilada do profissional
+            data = datas.local(data_hora, datas.fuso(self.barbearia)).date()
+            abertos = agenda.intervalos_abertos(self.barbearia.id, [profissional.id], data)[(profissional.id, data)]
+            fim = data_hora + timedelta(minutes=servico.duracao_minutos)
+            if not any(inicio <= data_hora and fim <= fim_aberto for inicio, fim_aberto in abertos):
+                raise forms.ValidationError("O horário escolhido está fora do expediente do profissional.")
+
+            # Horário segurado por outro cliente que ainda está finalizando o agendamento
+            if ReservaTemporaria.ativas(ignorar=cleaned_data.get('reserva')).filter(
+                profissional=profissional, inicio__lt=fim, fim__gt=data_hora
+            ).exists():
+                raise forms.ValidationError(
+                    "Este horário está reservado por outro cliente no momento. Escolha outro horário.",
+                    code='conflito'
+                )
+
+        return cleaned_data
+    
     def clean_telefone_cliente(self):
         telefone = self.cleaned_data.get('telefone_cliente')
         # Remove caracteres não numéricos
@@ -55,3 +102,37 @@ class AgendamentoForm(forms.ModelForm):
         if len(telefone_limpo) < 10:
             raise forms.ValidationError("Número de telefone inválido.")
         return telefone
+
+
+class ListaEsperaForm(forms.ModelForm):
+    class Meta:
+        model = ListaEspera
+        fields = [
+            'nome_cliente', 'telefone_cliente', 'email_cliente', 'servico', 'profissional',
+            'data_inicio', 'data_fim', 'hora_inicio', 'hora_fim',
+        ]
+
+    def __init__(self, *args, **kwargs):
+        self.barbearia = kwargs.pop('barbearia')
+        super().__init__(*args, **kwargs)
+        self.fields['servico'].queryset = Servico.objects.filter(barbearia=self.barbearia, ativo=True)
+        self.fields['profissional'].queryset = Profissional.objects.filter(barbearia=self.barbearia, ativo=True)
+
+    def clean_data_inicio(self):
+        data_inicio = self.cleaned_data.get('data_inicio')
+        if data_inicio and data_inicio < datas.hoje(datas.fuso(self.barbearia)):
+            raise forms.ValidationError("Não é possível entrar na lista de espera para datas passadas.")
+        return data_inicio
+
+    def clean_telefone_cliente(self):
+        telefone = self.cleaned_data.get('telefone_cliente')
+        if len(''.join(filter(str.isdigit, telefone))) < 10:
+            raise forms.ValidationError("Número de telefone inválido.")
+        return telefone
+
+    def save(self, commit=True):
+        entrada = super().save(commit=False)
+        entrada.barbearia = self.barbearia
+        if commit:
+            entrada.save()
+        return entrada
@@ -0,0 +1,393 @@
+"""
+Importação em lote de agendamentos vindos de outros sistemas (CSV ou ICS).
+
+O arquivo é lido em streaming e cada linha é validada em memória: serviços e
+profissionais são resolvidos pelo nome a partir de uma consulta só, e os conflitos de
+horário saem de uma única varredura, por profissional, das linhas ordenadas junto
+com os agendamentos ativos já gravados. As linhas aceitas entram com bulk_create em
+lotes, sem Agendamento.save()/full_clean (que fariam uma busca de conflitos por
+linha), e os clientes são resolvidos por um upsert em lote. Por não passar pelo
+save(), a importação não publica eventos na agenda em tempo real nem envia emails.
+"""
+import csv
+import itertools
+import unicodedata
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from operator import attrgetter
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import router, transaction
+from django.utils import timezone
+
+from barbearias import datas, metricas
+from barbearias.models import Profissional, Servico
+from .models import Agendamento, Cliente
+
+TAMANHO_LOTE = 1000
+STATUS_ATIVOS = ('agendado', 'confirmado')
+FORMATOS = ('csv', 'ics')
+
+# Nomes de coluna aceitos no CSV, já sem acento e em minúsculas
+COLUNAS = {
+    'nome': 'nome', 'nome_cliente': 'nome', 'cliente': 'nome',
+    'telefone': 'telefone', 'telefone_cliente': 'telefone', 'celular': 'telefone',
+    'email': 'email', 'email_cliente': 'email',
+    'servico': 'servico',
+    'profissional': 'profissional',
+    'data_hora': 'data_hora', 'inicio': 'data_hora',
+    'data': 'data',
+    'hora': 'hora',
+    'status': 'status',
+    'observacoes': 'observacoes', 'obs': 'observacoes',
+}
+STATUS = {
+    'agendado': 'agendado', 'confirmado': 'confirmado', 'cancelado': 'cancelado', 'concluido': 'concluido',
+    'scheduled': 'agendado', 'tentative': 'agendado', 'confirmed': 'confirmado',
+    'cancelled': 'cancelado', 'canceled': 'cancelado', 'completed': 'concluido', 'done': 'concluido',
+}
+FORMATOS_DATA_HORA = ('%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S', '%Y%m%dT%H%M%S', '%Y%m%dT%H%M')
+
+
+class LinhaInvalida(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Candidato:
+    linha: int
+    inicio: datetime
+    fim: datetime
+    servico_id: int
+    profissional_id: int
+    nome: str
+    telefone: str
+    email: str
+    status: str
+    observacoes: str
+
+
+@dataclass
+class ResultadoImportacao:
+    lidas: int = 0
+    importados: int = 0
+    # [(número da linha no arquivo, motivo)]
+    rejeitadas: list = field(default_factory=list)
+
+
+def _chave(texto):
+    """Texto comparável: sem acentos, sem espaços sobrando e sem diferença de maiúsculas"""
+    sem_acento = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode()
+    return ' '.join(sem_acento.casefold().split())
+
+
+# ===== LEITURA =====
+
+def formato_do_arquivo(nome):
+    """'csv' ou 'ics' pela extensão do arquivo, ou None"""
+    extensao = nome.rsplit('.', 1)[-1].lower() if '.' in nome else ''
+    return extensao if extensao in FORMATOS else None
+
+
+def ler(arquivo, formato):
+    """(número da linha, campos) de cada agendamento do arquivo texto, sem carregá-lo inteiro"""
+    return ler_ics(arquivo) if formato == 'ics' else ler_csv(arquivo)
+
+
+def ler_csv(arquivo):
+    """Separador vírgula ou ponto e vírgula, detectado pelo cabeçalho"""
+    cabecalho = arquivo.readline()
+    separador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+    leitor = csv.reader(itertools.chain([cabecalho], arquivo), delimiter=separador)
+    colunas = [COLUNAS.get(_chave(nome).replace(' ', '_')) for nome in next(leitor, [])]
+    for valores in leitor:
+        if not any(valor.strip() for valor in valores):
+            continue
+        campos = {coluna: valor.strip() for coluna, valor in zip(colunas, valores) if coluna}
+        if 'data_hora' not in campos and 'data' in campos:
+            campos['data_hora'] = f"{campos['data']} {campos.get('hora', '')}".strip()
+        yield leitor.line_num, campos
+
+
+def _linhas_desdobradas(arquivo):
+    """Linhas lógicas do iCalendar: as continuações (começando com espaço) voltam para a anterior"""
+    atual, numero_atual = None, 0
+    for numero, linha in enumerate(arquivo, 1):
+        linha = linha.rstrip('\r\n')
+        if linha[:1] in (' ', '\t') and atual is not None:
+            atual += linha[1:]
+            continue
+        if atual:
+            yield numero_atual, atual
+        atual, numero_atual = linha, numero
+    if atual:
+        yield numero_atual, atual
+
+
+def _propriedade(linha):
+    """'DTSTART;TZID=America/Sao_Paulo:20250101T090000' -> ('DTSTART', {'TZID': ...}, '20250101T090000')"""
+    aspas = False
+    for posicao, caractere in enumerate(linha):
+        if caractere == '"':
+            aspas = not aspas
+        elif caractere == ':' and not aspas:
+            break
+    else:
+        return linha.upper(), {}, ''
+    nome, *parametros = linha[:posicao].split(';')
+    parametros = dict(parametro.partition('=')[::2] for parametro in parametros)
+    return nome.upper(), {chave.upper(): valor.strip('"') for chave, valor in parametros.items()}, linha[posicao + 1:]
+
+
+def _texto_ics(valor):
+    return valor.replace('\\n', '\n').replace('\\N', '\n').replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\')
+
+
+def _campos_do_evento(propriedades):
+    """
+    SUMMARY é o serviço, ORGANIZER o profissional e ATTENDEE o cliente; linhas
+    "Chave: valor" na DESCRIPTION (Cliente, Telefone, Email, Serviço, Profissional)
+    têm prioridade sobre eles, e o restante da descrição vira observação
+    """
+    campos = {}
+    parametros, valor = propriedades.get('DTSTART', ({}, ''))
+    campos['data_hora'] = (valor, parametros.get('TZID'))
+    campos['servico'] = _texto_ics(propriedades.get('SUMMARY', ({}, ''))[1]).strip()
+    parametros, valor = propriedades.get('ORGANIZER', ({}, ''))
+    campos['profissional'] = parametros.get('CN', '')
+    parametros, valor = propriedades.get('ATTENDEE', ({}, ''))
+    campos['nome'] = parametros.get('CN', '')
+    if valor.lower().startswith('mailto:'):
+        campos['email'] = valor[7:]
+    campos['status'] = propriedades.get('STATUS', ({}, ''))[1]
+
+    observacoes = []
+    for linha in _texto_ics(propriedades.get('DESCRIPTION', ({}, ''))[1]).splitlines():
+        chave, separador, valor = linha.partition(':')
+        coluna = COLUNAS.get(_chave(chave).replace(' ', '_')) if separador else None
+        if coluna in ('nome', 'telefone', 'email', 'servico', 'profissional'):
+            campos[coluna] = valor.strip()
+        elif linha.strip():
+            observacoes.append(linha.strip())
+    campos['observacoes'] = '\n'.join(observacoes)
+    return campos
+
+
+def ler_ics(arquivo):
+    """Um agendamento por VEVENT; o número da linha é o do BEGIN:VEVENT"""
+    evento, inicio = None, 0
+    for numero, linha in _linhas_desdobradas(arquivo):
+        nome, parametros, valor = _propriedade(linha)
+        if nome == 'BEGIN' and valor.upper() == 'VEVENT':
+            evento, inicio = {}, numero
+        elif evento is None:
+            continue
+        elif nome == 'END' and valor.upper() == 'VEVENT':
+            yield inicio, _campos_do_evento(evento)
+            evento = None
+        else:
+            evento.setdefault(nome, (parametros, valor))
+
+
+# ===== VALIDAÇÃO =====
+
+def _data_hora(valor, fuso):
+    """Datetime com fuso; sem fuso explícito vale o da barbearia"""
+    tzid = None
+    if isinstance(valor, tuple):
+        valor, tzid = valor
+    valor = (valor or '').strip()
+    if not valor:
+        raise LinhaInvalida('data e hora vazias')
+    if ':' not in valor and 'T' not in valor.upper():
+        raise LinhaInvalida('data sem horário')
+
+    utc = valor.endswith('Z')
+    texto = valor[:-1] if utc else valor
+    data_hora = None
+    try:
+        data_hora = datetime.fromisoformat(texto)
+    except ValueError:
+        for formato in FORMATOS_DATA_HORA:
+            try:
+                data_hora = datetime.strptime(texto, formato)
+                break
+            except ValueError:
+                continue
+    if data_hora is None:
+        raise LinhaInvalida(f'data e hora "{valor}" em formato desconhecido')
+
+    if utc:
+        return data_hora.replace(tzinfo=ZoneInfo('UTC'))
+    if data_hora.tzinfo is not None:
+        return data_hora
+    if tzid:
+        try:
+            fuso = datas.fuso(tzid)
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    return datas.combinar(data_hora.date(), data_hora.time(), fuso)
+
+
+def _validar(linha, campos, servicos, profissionais, fuso, agora):
+    nome = campos.get('nome', '').strip()
+    if not nome:
+        raise LinhaInvalida('nome do cliente vazio')
+
+    telefone = campos.get('telefone', '').strip()
+    if len(''.join(filter(str.isdigit, telefone))) < 10 or len(telefone) > 20:
+        raise LinhaInvalida(f'telefone "{telefone}" inválido')
+
+    email = campos.get('email', '').strip()
+    if email:
+        try:
+            validate_email(email)
+        except ValidationError:
+            raise LinhaInvalida(f'email "{email}" inválido')
+
+    nome_servico = campos.get('servico', '')
+    if _chave(nome_servico) not in servicos:
+        raise LinhaInvalida(f'serviço "{nome_servico}" não encontrado')
+    servico_id, duracao = servicos[_chave(nome_servico)]
+
+    nome_profissional = campos.get('profissional', '')
+    if not nome_profissional and len(profissionais) == 1:
+        # Com um só profissional a coluna pode ficar vazia
+        profissional_id = next(iter(profissionais.values()))
+    elif _chave(nome_profissional) in profissionais:
+        profissional_id = profissionais[_chave(nome_profissional)]
+    else:
+        raise LinhaInvalida(f'profissional "{nome_profissional}" não encontrado')
+
+    status = STATUS.get(_chave(campos.get('status', '')) or 'agendado')
+    if status is None:
+        raise LinhaInvalida(f'status "{campos["status"]}" desconhecido')
+
+    inicio = _data_hora(campos.get('data_hora'), fuso)
+    if inicio < agora:
+        raise LinhaInvalida('data no passado')
+
+    return Candidato(
+        linha=linha, inicio=inicio, fim=inicio + timedelta(minutes=duracao),
+        servico_id=servico_id, profissional_id=profissional_id,
+        nome=nome[:200], telefone=telefone, email=email, status=status,
+        observacoes=campos.get('observacoes', ''),
+    )
+
+
+def _sem_conflitos(barbearia, candidatos, rejeitadas):
+    """
+    Linhas aceitas. Uma varredura por profissional, com as linhas em ordem de horário
+    e os agendamentos ativos já gravados no mesmo período: cada linha é comparada só
+    com o que ocupa a agenda até o seu início e com o próximo agendamento existente.
+    Linhas canceladas ou concluídas não ocupam horário.
+    """
+    ativos = [candidato for candidato in candidatos if candidato.status in STATUS_ATIVOS]
+    aceitos = [candidato for candidato in candidatos if candidato.status not in STATUS_ATIVOS]
+    if not ativos:
+        return aceitos
+
+    existentes = {}
+    gravados = Agendamento.objects.filter(
+        barbearia=barbearia,
+        status__in=STATUS_ATIVOS,
+        profissional_id__in={candidato.profissional_id for candidato in ativos},
+        # Como em Agendamento.clean: nenhum serviço dura mais de um dia
+        data_hora__gte=min(candidato.inicio for candidato in ativos) - timedelta(days=1),
+        data_hora__lt=max(candidato.fim for candidato in ativos),
+    ).order_by().values_list('profissional_id', 'data_hora', 'servico__duracao_minutos')
+    for profissional_id, inicio, duracao in gravados.iterator(chunk_size=TAMANHO_LOTE):
+        existentes.setdefault(profissional_id, []).append((inicio, inicio + timedelta(minutes=duracao)))
+
+    ativos.sort(key=attrgetter('profissional_id', 'inicio', 'linha'))
+    for profissional_id, linhas in itertools.groupby(ativos, key=attrgetter('profissional_id')):
+        agenda = sorted(existentes.get(profissional_id, ()))
+        proximo = 0
+        ocupado_ate, ocupante = None, None
+        for candidato in linhas:
+            # Os existentes que começam até o início da linha ocupam a agenda até o seu fim
+            while proximo < len(agenda) and agenda[proximo][0] <= candidato.inicio:
+                if ocupado_ate is None or agenda[proximo][1] > ocupado_ate:
+                    ocupado_ate, ocupante = agenda[proximo][1], 'um agendamento existente'
+                proximo += 1
+            if ocupado_ate is not None and candidato.inicio < ocupado_ate:
+                rejeitadas.append((candidato.linha, f'conflito de horário com {ocupante}'))
+            elif proximo < len(agenda) and agenda[proximo][0] < candidato.fim:
+                rejeitadas.append((candidato.linha, 'conflito de horário com um agendamento existente'))
+            else:
+                aceitos.append(candidato)
+                ocupado_ate, ocupante = candidato.fim, f'a linha {candidato.linha}'
+    return aceitos
+
+
+# ===== GRAVAÇÃO =====
+
+def _gravar(barbearia, aceitos):
+    with transaction.atomic(using=router.db_for_write(Agendamento)):
+        # Um upsert em lote, como Cliente.identificar faz para um agendamento só;
+        # o nome que fica é o do agendamento mais adiante na agenda
+        clientes = {}
+        for candidato in sorted(aceitos, key=attrgetter('inicio')):
+            numero = Cliente.normalizar_telefone(candidato.telefone)
+            clientes[numero] = Cliente(barbearia=barbearia, telefone=numero, nome=candidato.nome, email=candidato.email or None)
+        Cliente.objects.bulk_create(
+            list(clientes.values()), batch_size=TAMANHO_LOTE,
+            update_conflicts=True, unique_fields=['barbearia', 'telefone'], update_fields=['nome'],
+        )
+
+        for inicio in range(0, len(aceitos), TAMANHO_LOTE):
+            Agendamento.objects.bulk_create([
+                Agendamento(
+                    barbearia=barbearia,
+                    servico_id=candidato.servico_id,
+                    profissional_id=candidato.profissional_id,
+                    cliente=clientes[Cliente.normalizar_telefone(candidato.telefone)],
+                    nome_cliente=candidato.nome,
+                    telefone_cliente=candidato.telefone,
+                    email_cliente=candidato.email or None,
+                    data_hora=candidato.inicio,
+                    status=candidato.status,
+                    observacoes=candidato.observacoes,
+                )
+                for candidato in aceitos[inicio:inicio + TAMANHO_LOTE]
+            ])
+
+
+def importar(barbearia, registros, simular=False):
+    """
+    Valida os registros (de ler_csv/ler_ics) e grava as linhas aceitas na barbearia,
+    todas na mesma transação. Com simular=True só valida.
+    """
+    fuso = datas.fuso(barbearia)
+    agora = timezone.now()
+    servicos = {
+        _chave(nome): (servico_id, duracao)
+        for servico_id, nome, duracao in Servico.objects.filter(barbearia=barbearia, ativo=True).values_list(
+            'id', 'nome', 'duracao_minutos'
+        )
+    }
+    profissionais = {
+        _chave(nome): profissional_id
+        for profissional_id, nome in Profissional.objects.filter(barbearia=barbearia, ativo=True).values_list('id', 'nome')
+    }
+
+    resultado = ResultadoImportacao()
+    candidatos = []
+    for linha, campos in registros:
+        resultado.lidas += 1
+        try:
+            candidatos.append(_validar(linha, campos, servicos, profissionais, fuso, agora))
+        except LinhaInvalida as erro:
+            resultado.rejeitadas.append((linha, str(erro)))
+
+    aceitos = _sem_conflitos(barbearia, candidatos, resultado.rejeitadas)
+    resultado.rejeitadas.sort()
+    resultado.importados = len(aceitos)
+    if not simular and aceitos:
+        _gravar(barbearia, aceitos)
+        metricas.AGENDAMENTOS.inc(len(aceitos), origem='importacao', resultado='criado')
+    if not simular and resultado.rejeitadas:
+        metricas.AGENDAMENTOS.inc(len(resultado.rejeitadas), origem='importacao', resultado='invalido')
+    return resultado
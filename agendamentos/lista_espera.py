@@ -0,0 +1,116 @@
+"""
+Lista de espera.
+
+Quando um agendamento é cancelado, os clientes da lista de espera compatíveis com a
+vaga (mesma barbearia, período e janela de horário, profissional escolhido ou
+qualquer um, serviço que caiba no tempo liberado) recebem um email avisando.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import router, transaction
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from barbearias import datas
+
+from .entrega import entregar_em_segundo_plano
+from .models import ListaEspera
+
+logger = logging.getLogger(__name__)
+
+
+def candidatos(agendamento, limite=None):
+    """
+    Entradas ativas da lista de espera que cabem na vaga liberada pelo agendamento,
+    em uma única consulta (índice parcial por barbearia e período). Quem nunca foi
+    avisado vem primeiro, depois por ordem de chegada.
+    """
+    limite = limite or settings.LISTA_ESPERA_AVISOS_POR_VAGA
+    inicio = datas.local(agendamento.data_hora, datas.fuso_da_barbearia(agendamento.barbearia_id))
+    duracao = agendamento.servico.duracao_minutos
+    fim = inicio + timedelta(minutes=duracao)
+    if fim.date() != inicio.date():
+        return ListaEspera.objects.none()
+
+    return ListaEspera.objects.filter(
+        Q(profissional__isnull=True) | Q(profissional_id=agendamento.profissional_id),
+        barbearia_id=agendamento.barbearia_id,
+        ativa=True,
+        data_inicio__lte=inicio.date(),
+        data_fim__gte=inicio.date(),
+        hora_inicio__lte=inicio.time(),
+        hora_fim__gte=fim.time(),
+        servico__ativo=True,
+        servico__duracao_minutos__lte=duracao,
+    ).select_related('servico').order_by(
+        F('ultimo_aviso').asc(nulls_first=True), 'criada_em'
+    )[:limite]
+
+
+def montar_email_vaga(entrada, agendamento, url_agendar=None):
+    assunto = f'🎉 Vaga disponível em {agendamento.barbearia.nome}'
+    data_hora = datas.local(agendamento.data_hora, datas.fuso(agendamento.barbearia))
+
+    mensagem_texto = f"""
+Olá {entrada.nome_cliente},
+
+Abriu uma vaga que combina com a sua lista de espera:
+
+📅 Data: {data_hora.strftime('%d/%m/%Y')}
+⏰ Horário: {data_hora.strftime('%H:%M')}
+💼 Serviço: {entrada.servico.nome}
+👨‍💼 Profissional: {agendamento.profissional.nome}
+🏪 Local: {agendamento.barbearia.nome}
+
+Outros clientes da lista também foram avisados: quem agendar primeiro fica com o horário.
+{f"Agende agora: {url_agendar}" if url_agendar else ""}
+
+---
+Sistema de Agendamento
+"""
+
+    mensagem_html = render_to_string('emails/vaga_disponivel.html', {
+        'entrada': entrada,
+        'agendamento': agendamento,
+        'data_hora': data_hora,
+        'url_agendar': url_agendar,
+    })
+
+    email = EmailMultiAlternatives(
+        subject=assunto,
+        body=mensagem_texto,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[entrada.email_cliente]
+    )
+    email.attach_alternative(mensagem_html, "text/html")
+    return email
+
+
+def avisar_vaga(agendamento, url_agendar=None):
+    """
+    Avisa os melhores candidatos da lista de espera sobre a vaga aberta pelo
+    cancelamento. O envio acontece em segundo plano, depois do commit.
+    Retorna quantos clientes serão avisados.
+    """
+    if agendamento.data_hora <= timezone.now():
+        return 0
+
+    entradas = list(candidatos(agendamento))
+    if not entradas:
+        return 0
+
+    ListaEspera.objects.filter(id__in=[entrada.id for entrada in entradas]).update(
+        avisos=F('avisos') + 1, ultimo_aviso=timezone.now()
+    )
+    mensagens = [(entrada.id, montar_email_vaga(entrada, agendamento, url_agendar)) for entrada in entradas]
+    # Depois do commit no banco da barbearia, onde a lista de espera foi atualizada
+    transaction.on_commit(
+        lambda: entregar_em_segundo_plano(mensagens, tipo='lista_espera'), using=router.db_for_write(ListaEspera)
+    )
+
+    logger.info(f"Vaga do agendamento #{agendamento.id}: {len(entradas)} cliente(s) da lista de espera avisado(s)")
+    return len(entradas)
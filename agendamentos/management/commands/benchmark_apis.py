@@ -0,0 +1,136 @@
+import asyncio
+import statistics
+import time
+from datetime import timedelta
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils import timezone
+from barbearias.models import Barbearia
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede requisições/s e latência p99 das APIs públicas com muitos clientes concorrentes. '
+        'Suba o servidor ASGI (uvicorn barbearia_system.asgi:application --workers 4) e o WSGI '
+        '(gunicorn barbearia_system.wsgi -w 4 --threads 8) e passe as duas URLs base para comparar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls_base', nargs='+', help='URLs base dos servidores (ex: http://127.0.0.1:8000)')
+        parser.add_argument('--barbearia', help='Slug da barbearia (padrão: primeira ativa)')
+        parser.add_argument('--clientes', type=int, default=200, help='Clientes concorrentes')
+        parser.add_argument('--duracao', type=float, default=15.0, help='Duração de cada rodada em segundos')
+        parser.add_argument('--api', choices=['horarios', 'dias-fechados'], default='horarios')
+
+    def handle(self, *args, **options):
+        caminho = self._montar_caminho(options)
+        self.stdout.write(f'🎯 Endpoint: {caminho}')
+        self.stdout.write(f'👥 Clientes: {options["clientes"]} | ⏱️  Duração: {options["duracao"]}s')
+
+        for url_base in options['urls_base']:
+            partes = urlsplit(url_base)
+            resultado = asyncio.run(self._rodada(
+                partes.hostname, partes.port or 80, caminho, options['clientes'], options['duracao']
+            ))
+            self._relatorio(url_base, resultado, options['duracao'])
+
+    def _montar_caminho(self, options):
+        barbearias = Barbearia.objects.filter(ativa=True)
+        if options['barbearia']:
+            barbearias = barbearias.filter(slug=options['barbearia'])
+        barbearia = barbearias.first()
+        if not barbearia:
+            raise CommandError('Nenhuma barbearia ativa encontrada.')
+
+        if options['api'] == 'dias-fechados':
+            return reverse('barbearias:api_dias_fechados', kwargs={'slug': barbearia.slug})
+
+        servico = barbearia.servicos.filter(ativo=True).first()
+        profissional = barbearia.profissionais.filter(ativo=True).first()
+        if not servico or not profissional:
+            raise CommandError('A barbearia precisa de ao menos um serviço e um profissional ativos.')
+
+        parametros = urlencode({
+            'profissional_id': profissional.id,
+            'servico_id': servico.id,
+            'data': (timezone.now() + timedelta(days=1)).strftime('%Y-%m-%d'),
+        })
+        return reverse('barbearias:api_horarios_disponiveis', kwargs={'slug': barbearia.slug}) + '?' + parametros
+
+    async def _rodada(self, host, porta, caminho, clientes, duracao):
+        fim = time.monotonic() + duracao
+        latencias = []
+        erros = [0]
+        await asyncio.gather(*[
+            self._cliente(host, porta, caminho, fim, latencias, erros) for _ in range(clientes)
+        ])
+        return latencias, erros[0]
+
+    async def _cliente(self, host, porta, caminho, fim, latencias, erros):
+        """Cliente HTTP/1.1 keep-alive mínimo (apenas biblioteca padrão)"""
+        requisicao = (
+            f'GET {caminho} HTTP/1.1\r\nHost: {host}:{porta}\r\nConnection: keep-alive\r\n\r\n'
+        ).encode()
+        conexao = None
+        while time.monotonic() < fim:
+            try:
+                if conexao is None:
+                    conexao = await asyncio.open_connection(host, porta)
+                leitor, escritor = conexao
+                inicio = time.perf_counter()
+                escritor.write(requisicao)
+                await escritor.drain()
+                status, manter = await self._ler_resposta(leitor)
+                latencias.append(time.perf_counter() - inicio)
+                if status != 200:
+                    erros[0] += 1
+                if not manter:
+                    escritor.close()
+                    conexao = None
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                erros[0] += 1
+                conexao = None
+                await asyncio.sleep(0.05)
+        if conexao is not None:
+            conexao[1].close()
+
+    async def _ler_resposta(self, leitor):
+        cabecalho = await leitor.readuntil(b'\r\n\r\n')
+        linhas = cabecalho.decode('latin-1').split('\r\n')
+        status = int(linhas[0].split()[1])
+        cabecalhos = {}
+        for linha in linhas[1:]:
+            if ':' in linha:
+                nome, valor = linha.split(':', 1)
+                cabecalhos[nome.strip().lower()] = valor.strip().lower()
+
+        if 'content-length' in cabecalhos:
+            await leitor.readexactly(int(cabecalhos['content-length']))
+        elif cabecalhos.get('transfer-encoding') == 'chunked':
+            while True:
+                tamanho = int((await leitor.readuntil(b'\r\n')).strip(), 16)
+                await leitor.readexactly(tamanho + 2)
+                if tamanho == 0:
+                    break
+        else:
+            await leitor.read()
+            return status, False
+        return status, cabecalhos.get('connection') != 'close'
+
+    def _relatorio(self, url_base, resultado, duracao):
+        latencias, erros = resultado
+        self.stdout.write('\n' + '=' * 50)
+        self.stdout.write(f'📊 {url_base}')
+        self.stdout.write('=' * 50)
+        if not latencias:
+            self.stdout.write(self.style.ERROR('❌ Nenhuma resposta recebida'))
+            return
+
+        latencias.sort()
+        p99 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]
+        self.stdout.write(f'⚡ Requisições/s: {len(latencias) / duracao:.1f}')
+        self.stdout.write(f'⏱️  p50: {statistics.median(latencias) * 1000:.1f} ms')
+        self.stdout.write(f'⏱️  p99: {p99 * 1000:.1f} ms')
+        self.stdout.write(f'❌ Erros: {erros}')
@@ -1,24 +1,42 @@
 from django.core.management.base import BaseCommand
-from django.core.mail import send_mail, EmailMultiAlternatives
+from django.db import DEFAULT_DB_ALIAS
+from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.conf import settings
 from datetime import timedelta
+from agendamentos.entrega import entregar_em_lote
 from agendamentos.models import Agendamento
+from barbearias import datas, shards
 
 
 class Command(BaseCommand):
     help = 'Envia notificações por email para agendamentos que acontecem em 24 horas'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'NOTIFICACOES_SMTP_WORKERS', 4),
+            help='Quantidade de conexões SMTP enviando em paralelo'
+        )
+
     def handle(self, *args, **options):
+        # Cada shard guarda os agendamentos das suas barbearias
+        for banco in shards.para_cada_banco():
+            if banco != DEFAULT_DB_ALIAS:
+                self.stdout.write(f'\n🗄️  Banco: {banco}')
+            self.processar(**options)
+
+    def processar(self, **options):
         # Calcular data/hora de 24 horas à frente
         agora = timezone.now()
         amanha = agora + timedelta(hours=24)
-        
+
         # Margem de 1 hora para capturar agendamentos próximos
         inicio_janela = amanha - timedelta(minutes=30)
         fim_janela = amanha + timedelta(minutes=30)
-        
+
         # Buscar agendamentos que precisam de notificação
         agendamentos = Agendamento.objects.filter(
             data_hora__gte=inicio_janela,
@@ -27,75 +45,39 @@ class Command(BaseCommand):
             email_cliente__isnull=False,
             email_cliente__gt='',
             notificacao_enviada=False
-        )
-        
-        contador_enviados = 0
-        contador_erros = 0
-        
-        for agendamento in agendamentos:
-            try:
-                # Enviar email de lembrete
-                assunto = f'Lembrete: Seu agendamento em {agendamento.barbearia.nome}'
-                
-                # Mensagem em texto simples
-                mensagem_texto = f"""
-Olá {agendamento.nome_cliente},
+        ).select_related('barbearia', 'servico', 'profissional')
 
-Este é um lembrete do seu agendamento:
-
-📅 Data: {agendamento.data_hora.strftime('%d/%m/%Y')}
-⏰ Horário: {agendamento.data_hora.strftime('%H:%M')}
-💼 Serviço: {agendamento.servico.nome}
-👨‍💼 Profissional: {agendamento.profissional.nome}
-🏪 Local: {agendamento.barbearia.nome}
-
-Preço: R$ {agendamento.servico.preco}
-Duração estimada: {agendamento.servico.duracao_minutos} minutos
-
-{f"Observações: {agendamento.observacoes}" if agendamento.observacoes else ""}
-
-Caso precise cancelar ou reagendar, entre em contato conosco com antecedência.
-
-Obrigado por escolher nossos serviços!
+        # Os emails são montados aqui e enviados em paralelo pelas threads de entrega
+        agendamentos_por_id = {}
+        resultados = entregar_em_lote(
+            self.montar_lembretes(agendamentos, agendamentos_por_id),
+            workers=options['workers'],
+            tipo='lembrete'
+        )
 
----
-Sistema de Agendamento
-"""
-                
-                # Renderizar template HTML
-                mensagem_html = render_to_string('emails/lembrete_agendamento.html', {
-                    'agendamento': agendamento
-                })
-                
-                # Criar email com versão HTML e texto
-                email = EmailMultiAlternatives(
-                    subject=assunto,
-                    body=mensagem_texto,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to=[agendamento.email_cliente]
-                )
-                email.attach_alternative(mensagem_html, "text/html")
-                email.send()
-                
-                # Marcar como notificação enviada
-                agendamento.notificacao_enviada = True
-                agendamento.save()
-                
-                contador_enviados += 1
+        enviados = []
+        contador_erros = 0
+        for agendamento_id, erro in resultados:
+            agendamento = agendamentos_por_id[agendamento_id]
+            if erro is None:
+                enviados.append(agendamento_id)
                 self.stdout.write(
                     self.style.SUCCESS(
                         f'✅ Notificação enviada para {agendamento.nome_cliente} ({agendamento.email_cliente})'
                     )
                 )
-                
-            except Exception as e:
+            else:
                 contador_erros += 1
                 self.stdout.write(
                     self.style.ERROR(
-                        f'❌ Erro ao enviar para {agendamento.nome_cliente} ({agendamento.email_cliente}): {str(e)}'
+                        f'❌ Erro ao enviar para {agendamento.nome_cliente} ({agendamento.email_cliente}): {str(erro)}'
                     )
                 )
-        
+
+        # Marcar todas as notificações enviadas de uma vez
+        Agendamento.objects.filter(id__in=enviados).update(notificacao_enviada=True)
+        contador_enviados = len(enviados)
+
         # Relatório final
         self.stdout.write('\n' + '='*50)
         self.stdout.write(f'📊 RELATÓRIO DE NOTIFICAÇÕES')
@@ -103,8 +85,62 @@ Sistema de Agendamento
         self.stdout.write(f'📧 Emails enviados com sucesso: {contador_enviados}')
         self.stdout.write(f'❌ Erros: {contador_erros}')
         self.stdout.write(f'📅 Janela de notificação: {inicio_janela.strftime("%d/%m/%Y %H:%M")} até {fim_janela.strftime("%d/%m/%Y %H:%M")}')
-        
+
         if contador_enviados > 0:
             self.stdout.write(self.style.SUCCESS('\n✅ Comando executado com sucesso!'))
         else:
-            self.stdout.write(self.style.WARNING('\n⚠️  Nenhuma notificação para enviar no momento.'))
\ No newline at end of file
+            self.stdout.write(self.style.WARNING('\n⚠️  Nenhuma notificação para enviar no momento.'))
+
+    def montar_lembretes(self, agendamentos, agendamentos_por_id):
+        """Gera (id, email) conforme as threads de entrega consomem a fila"""
+        for agendamento in agendamentos.iterator(chunk_size=500):
+            agendamentos_por_id[agendamento.id] = agendamento
+            yield agendamento.id, self.montar_email(agendamento)
+
+    def montar_email(self, agendamento):
+        fuso = datas.fuso(agendamento.barbearia)
+        data_hora = datas.local(agendamento.data_hora, fuso)
+
+        # Enviar email de lembrete
+        assunto = f'Lembrete: Seu agendamento em {agendamento.barbearia.nome}'
+
+        # Mensagem em texto simples
+        mensagem_texto = f"""
+Olá {agendamento.nome_cliente},
+
+Este é um lembrete do seu agendamento:
+
+📅 Data: {data_hora.strftime('%d/%m/%Y')}
+⏰ Horário: {data_hora.strftime('%H:%M')}
+💼 Serviço: {agendamento.servico.nome}
+👨‍💼 Profissional: {agendamento.profissional.nome}
+🏪 Local: {agendamento.barbearia.nome}
+
+Preço: R$ {agendamento.servico.preco}
+Duração estimada: {agendamento.servico.duracao_minutos} minutos
+
+{f"Observações: {agendamento.observacoes}" if agendamento.observacoes else ""}
+
+Caso precise cancelar ou reagendar, entre em contato conosco com antecedência.
+
+Obrigado por escolher nossos serviços!
+
+---
+Sistema de Agendamento
+"""
+
+        # Renderizar template HTML
+        with timezone.override(fuso):
+            mensagem_html = render_to_string('emails/lembrete_agendamento.html', {
+                'agendamento': agendamento
+            })
+
+        # Criar email com versão HTML e texto
+        email = EmailMultiAlternatives(
+            subject=assunto,
+            body=mensagem_texto,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[agendamento.email_cliente]
+        )
+        email.attach_alternative(mensagem_html, "text/html")
+        return email
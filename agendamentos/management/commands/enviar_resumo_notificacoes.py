@@ -0,0 +1,79 @@
+from itertools import groupby
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
+from django.utils import timezone
+from agendamentos.entrega import entregar_em_lote
+from agendamentos.models import NotificacaoPendente
+from agendamentos.utils import montar_email_resumo
+from barbearias import shards
+
+
+class Command(BaseCommand):
+    help = 'Envia o resumo de novos agendamentos e cancelamentos para os estabelecimentos em modo resumo'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modo',
+            choices=['resumo_horario', 'resumo_diario'],
+            default='resumo_horario',
+            help='Qual grupo de estabelecimentos processar (agende o horário a cada hora e o diário uma vez por dia)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'NOTIFICACOES_SMTP_WORKERS', 4),
+            help='Quantidade de conexões SMTP enviando em paralelo'
+        )
+
+    def handle(self, *args, **options):
+        # Cada shard guarda os agendamentos das suas barbearias
+        for banco in shards.para_cada_banco():
+            if banco != DEFAULT_DB_ALIAS:
+                self.stdout.write(f'\n🗄️  Banco: {banco}')
+            self.processar(**options)
+
+    def processar(self, **options):
+        modo = options['modo']
+        # Estabelecimentos que voltaram para o modo imediato recebem num último resumo
+        # o que ficou pendente do modo anterior
+        pendentes = NotificacaoPendente.objects.filter(
+            Q(barbearia__modo_notificacao=modo) | Q(barbearia__modo_notificacao='imediato'),
+            enviada_em__isnull=True,
+        ).select_related(
+            'barbearia', 'agendamento__servico', 'agendamento__profissional'
+        ).order_by('barbearia_id', 'criado_em')
+
+        emails = []
+        ids_descartados = []
+        for barbearia, eventos in groupby(pendentes, key=lambda p: p.barbearia):
+            eventos = list(eventos)
+            if not barbearia.email_notificacoes:
+                # Sem email configurado: não há para onde enviar, descarta os eventos
+                ids_descartados += [p.id for p in eventos]
+                continue
+            emails.append((tuple(p.id for p in eventos), montar_email_resumo(barbearia, eventos)))
+
+        destinatarios = {ids: email.to[0] for ids, email in emails}
+        ids_enviados = []
+        contador_erros = 0
+        for ids, erro in entregar_em_lote(emails, workers=options['workers'], tipo='resumo'):
+            if erro is None:
+                ids_enviados += ids
+                self.stdout.write(self.style.SUCCESS(f'✅ Resumo enviado para {destinatarios[ids]} ({len(ids)} evento(s))'))
+            else:
+                contador_erros += 1
+                self.stdout.write(self.style.ERROR(f'❌ Erro ao enviar resumo para {destinatarios[ids]}: {str(erro)}'))
+
+        agora = timezone.now()
+        NotificacaoPendente.objects.filter(id__in=ids_enviados + ids_descartados).update(enviada_em=agora)
+
+        # Relatório final
+        self.stdout.write('\n' + '='*50)
+        self.stdout.write(f'📊 RELATÓRIO DE RESUMOS ({modo})')
+        self.stdout.write('='*50)
+        self.stdout.write(f'📧 Resumos enviados: {len(emails) - contador_erros}')
+        self.stdout.write(f'📋 Eventos incluídos: {len(ids_enviados)}')
+        self.stdout.write(f'❌ Erros: {contador_erros}')
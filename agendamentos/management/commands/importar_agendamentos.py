@@ -0,0 +1,69 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agendamentos import importacao
+from barbearias import shards
+from barbearias.models import Barbearia
+
+MOSTRAR_REJEITADAS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa agendamentos exportados de outro sistema (CSV ou ICS) para uma barbearia. '
+        'Colunas do CSV: nome, telefone, email, servico, profissional, data_hora (ou data e hora), '
+        'status e observacoes; serviço e profissional pelo nome. No ICS, SUMMARY é o serviço, '
+        'ORGANIZER o profissional e ATTENDEE o cliente (ou linhas "Cliente:", "Telefone:", '
+        '"Profissional:" na DESCRIPTION). Linhas inválidas ou em conflito de horário são rejeitadas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', help='Slug da barbearia')
+        parser.add_argument('arquivo', help='Caminho do arquivo .csv ou .ics (UTF-8)')
+        parser.add_argument('--formato', choices=importacao.FORMATOS, help='Formato do arquivo (padrão: pela extensão)')
+        parser.add_argument('--simular', action='store_true', help='Só valida e mostra o resultado, sem gravar')
+        parser.add_argument('--rejeitadas', help='Grava as linhas rejeitadas (linha, motivo) neste CSV')
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or importacao.formato_do_arquivo(options['arquivo'])
+        if not formato:
+            raise CommandError('Informe --formato csv ou --formato ics.')
+        entrada = shards.entrada_por_slug(options['slug'])
+        if entrada is None:
+            raise CommandError(f'Barbearia "{options["slug"]}" não encontrada.')
+        banco, somente_leitura = entrada
+        if somente_leitura and not options['simular']:
+            raise CommandError(f'A barbearia "{options["slug"]}" está bloqueada para escrita (mudando de banco).')
+
+        inicio = time.monotonic()
+        with shards.usar_banco(banco):
+            barbearia = Barbearia.objects.get(slug=options['slug'])
+            try:
+                with open(options['arquivo'], encoding='utf-8-sig', newline='') as arquivo:
+                    resultado = importacao.importar(
+                        barbearia, importacao.ler(arquivo, formato), simular=options['simular']
+                    )
+            except OSError as erro:
+                raise CommandError(f'Não foi possível ler o arquivo: {erro}')
+            except (UnicodeDecodeError, csv.Error) as erro:
+                raise CommandError(f'Arquivo inválido (use UTF-8): {erro}')
+        duracao = time.monotonic() - inicio
+
+        for linha, motivo in resultado.rejeitadas[:MOSTRAR_REJEITADAS]:
+            self.stdout.write(self.style.WARNING(f'   linha {linha}: {motivo}'))
+        if len(resultado.rejeitadas) > MOSTRAR_REJEITADAS:
+            self.stdout.write(f'   ... e mais {len(resultado.rejeitadas) - MOSTRAR_REJEITADAS} linha(s)')
+        if options['rejeitadas']:
+            with open(options['rejeitadas'], 'w', encoding='utf-8', newline='') as saida:
+                escritor = csv.writer(saida)
+                escritor.writerow(['linha', 'motivo'])
+                escritor.writerows(resultado.rejeitadas)
+            self.stdout.write(f'📝 Rejeitadas gravadas em {options["rejeitadas"]}')
+
+        verbo = 'seriam importados' if options['simular'] else 'importados'
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {resultado.importados} de {resultado.lidas} agendamento(s) {verbo} em {duracao:.1f}s; '
+            f'{len(resultado.rejeitadas)} rejeitado(s)'
+        ))
@@ -0,0 +1,143 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils import timezone
+from agendamentos.models import Agendamento
+from barbearias.models import Barbearia
+
+TELEFONE_SIMULACAO = '00000000000'
+
+
+class Command(BaseCommand):
+    help = (
+        'Simula muitos clientes disputando os mesmos horários e compara conflitos e novas tentativas '
+        'com e sem reserva temporária. Rode contra um servidor de testes com LIMITES_TAXA = {} '
+        '(todas as requisições saem do mesmo IP). Os agendamentos criados são apagados ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url_base', help='URL base do servidor (ex: http://127.0.0.1:8000)')
+        parser.add_argument('--barbearia', help='Slug da barbearia (padrão: primeira ativa)')
+        parser.add_argument('--clientes', type=int, default=50, help='Clientes concorrentes')
+        parser.add_argument('--disputa', type=int, default=3, help='Cada cliente escolhe entre os N primeiros horários livres')
+        parser.add_argument('--pensar', type=float, default=0.5, help='Segundos entre escolher o horário e enviar o formulário')
+        parser.add_argument('--tentativas', type=int, default=5, help='Máximo de tentativas por cliente')
+        parser.add_argument('--modo', choices=['sem-reservas', 'com-reservas', 'ambos'], default='ambos')
+        parser.add_argument('--manter', action='store_true', help='Não apagar os agendamentos criados')
+
+    def handle(self, *args, **options):
+        barbearias = Barbearia.objects.filter(ativa=True)
+        if options['barbearia']:
+            barbearias = barbearias.filter(slug=options['barbearia'])
+        barbearia = barbearias.first()
+        if not barbearia:
+            raise CommandError('Nenhuma barbearia ativa encontrada.')
+        servico = barbearia.servicos.filter(ativo=True).first()
+        profissional = barbearia.profissionais.filter(ativo=True).first()
+        if not servico or not profissional:
+            raise CommandError('A barbearia precisa de ao menos um serviço e um profissional ativos.')
+
+        self.base = options['url_base'].rstrip('/')
+        self.barbearia = barbearia
+        self.servico = servico
+        self.profissional = profissional
+        self.data = (timezone.localdate() + timedelta(days=1)).isoformat()
+
+        modos = ['sem-reservas', 'com-reservas'] if options['modo'] == 'ambos' else [options['modo']]
+        for modo in modos:
+            try:
+                resultado = self._rodada(modo == 'com-reservas', options)
+                self._relatorio(modo, resultado, options['clientes'])
+            finally:
+                if not options['manter']:
+                    Agendamento.objects.filter(barbearia=barbearia, telefone_cliente=TELEFONE_SIMULACAO).delete()
+
+    def _rodada(self, com_reservas, options):
+        contadores = {
+            'agendados': 0, 'conflitos': 0, 'envios': 0, 'reservas_recusadas': 0,
+            'desistencias': 0, 'erros': 0,
+        }
+        trava = threading.Lock()
+        inicio = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['clientes']) as executor:
+            for numero in range(options['clientes']):
+                executor.submit(self._cliente, numero, com_reservas, options, contadores, trava)
+        contadores['duracao'] = time.monotonic() - inicio
+        return contadores
+
+    def _cliente(self, numero, com_reservas, options, contadores, trava):
+        def contar(chave):
+            with trava:
+                contadores[chave] += 1
+
+        slug = self.barbearia.slug
+        for _ in range(options['tentativas']):
+            try:
+                horarios = self._json('GET', reverse('barbearias:api_horarios_disponiveis', kwargs={'slug': slug}) + '?' + urlencode({
+                    'profissional_id': self.profissional.id, 'servico_id': self.servico.id, 'data': self.data,
+                }))[1].get('horarios', [])
+                if not horarios:
+                    contar('desistencias')
+                    return
+                escolhido = random.choice(horarios[:options['disputa']])['datetime']
+
+                reserva = ''
+                if com_reservas:
+                    status, resposta = self._json('POST', reverse('barbearias:api_criar_reserva', kwargs={'slug': slug}), {
+                        'servico_id': self.servico.id, 'profissional_id': self.profissional.id, 'data_hora': escolhido,
+                    })
+                    if status == 409:
+                        # Recusa barata: o cliente escolhe outro horário antes de preencher o formulário
+                        contar('reservas_recusadas')
+                        continue
+                    reserva = resposta.get('reserva', '')
+
+                time.sleep(options['pensar'])
+                contar('envios')
+                status, _ = self._json('POST', reverse('barbearias:api_criar_agendamento', kwargs={'slug': slug}), {
+                    'nome': f'Simulação {numero}', 'telefone': TELEFONE_SIMULACAO, 'email': 'simulacao@example.com',
+                    'servico_id': self.servico.id, 'profissional_id': self.profissional.id,
+                    'data_hora': escolhido, 'reserva': reserva,
+                })
+                if status == 201:
+                    contar('agendados')
+                    return
+                contar('conflitos' if status == 409 else 'erros')
+            except OSError:
+                contar('erros')
+        contar('desistencias')
+
+    def _json(self, metodo, caminho, corpo=None):
+        requisicao = Request(
+            self.base + caminho, method=metodo,
+            data=json.dumps(corpo).encode() if corpo is not None else None,
+            headers={'Content-Type': 'application/json'},
+        )
+        try:
+            with urlopen(requisicao, timeout=30) as resposta:
+                return resposta.status, json.loads(resposta.read() or b'{}')
+        except HTTPError as e:
+            return e.code, json.loads(e.read() or b'{}')
+
+    def _relatorio(self, modo, contadores, clientes):
+        envios = contadores['envios'] or 1
+        self.stdout.write('\n' + '=' * 50)
+        self.stdout.write(f'📊 {modo} ({clientes} clientes)')
+        self.stdout.write('=' * 50)
+        self.stdout.write(f'✅ Agendamentos criados: {contadores["agendados"]}')
+        self.stdout.write(f'📨 Formulários enviados: {contadores["envios"]}')
+        self.stdout.write(f'⚠️  Conflitos no envio (409): {contadores["conflitos"]} ({contadores["conflitos"] / envios:.0%} dos envios)')
+        self.stdout.write(f'🔁 Reenvios: {contadores["envios"] - contadores["agendados"]}')
+        self.stdout.write(f'🔒 Reservas recusadas: {contadores["reservas_recusadas"]}')
+        self.stdout.write(f'🚪 Desistências: {contadores["desistencias"]}')
+        self.stdout.write(f'❌ Erros: {contadores["erros"]}')
+        self.stdout.write(f'⏱️  Duração: {contadores["duracao"]:.1f}s')
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-19 15:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0002_agendamento_notificacao_enviada'),
+        ('barbearias', '0005_barbearia_modo_notificacao'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='agendamento',
+            name='email_cliente',
+            field=models.EmailField(help_text='Email para receber lembretes do agendamento', max_length=254, null=True),
+        ),
+        migrations.CreateModel(
+            name='NotificacaoPendente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('novo', 'Novo agendamento'), ('cancelamento', 'Cancelamento')], max_length=20)),
+                ('motivo', models.TextField(blank=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('enviada_em', models.DateTimeField(blank=True, null=True)),
+                ('agendamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notificacoes_pendentes', to='agendamentos.agendamento')),
+                ('barbearia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notificacoes_pendentes', to='barbearias.barbearia')),
+            ],
+            options={
+                'verbose_name': 'Notificação Pendente',
+                'verbose_name_plural': 'Notificações Pendentes',
+                'ordering': ['criado_em'],
+                'indexes': [models.Index(fields=['enviada_em', 'barbearia'], name='agendamento_enviada_d9e1a5_idx')],
+            },
+        ),
+    ]
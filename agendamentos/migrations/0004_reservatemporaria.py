@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-19 15:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0003_notificacaopendente'),
+        ('barbearias', '0005_barbearia_modo_notificacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaTemporaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, unique=True)),
+                ('inicio', models.DateTimeField()),
+                ('fim', models.DateTimeField()),
+                ('duracao_minutos', models.PositiveIntegerField()),
+                ('expira_em', models.DateTimeField()),
+                ('criada_em', models.DateTimeField(auto_now_add=True)),
+                ('barbearia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_temporarias', to='barbearias.barbearia')),
+                ('profissional', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_temporarias', to='barbearias.profissional')),
+            ],
+            options={
+                'verbose_name': 'Reserva Temporária',
+                'verbose_name_plural': 'Reservas Temporárias',
+                'indexes': [models.Index(fields=['profissional', 'expira_em'], name='agendamento_profiss_f6d42c_idx'), models.Index(fields=['expira_em'], name='agendamento_expira__d91b1d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-19 15:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0004_reservatemporaria'),
+        ('barbearias', '0005_barbearia_modo_notificacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListaEspera',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome_cliente', models.CharField(max_length=200)),
+                ('telefone_cliente', models.CharField(max_length=20)),
+                ('email_cliente', models.EmailField(max_length=254)),
+                ('data_inicio', models.DateField()),
+                ('data_fim', models.DateField()),
+                ('hora_inicio', models.TimeField()),
+                ('hora_fim', models.TimeField()),
+                ('ativa', models.BooleanField(default=True)),
+                ('avisos', models.PositiveIntegerField(default=0)),
+                ('ultimo_aviso', models.DateTimeField(blank=True, null=True)),
+                ('criada_em', models.DateTimeField(auto_now_add=True)),
+                ('barbearia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lista_espera', to='barbearias.barbearia')),
+                ('profissional', models.ForeignKey(blank=True, help_text='Deixe em branco para aceitar qualquer profissional', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lista_espera', to='barbearias.profissional')),
+                ('servico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lista_espera', to='barbearias.servico')),
+            ],
+            options={
+                'verbose_name': 'Lista de Espera',
+                'verbose_name_plural': 'Lista de Espera',
+                'ordering': ['criada_em'],
+                'indexes': [models.Index(condition=models.Q(('ativa', True)), fields=['barbearia', 'data_fim', 'data_inicio'], name='lista_espera_busca_idx')],
+            },
+        ),
+    ]
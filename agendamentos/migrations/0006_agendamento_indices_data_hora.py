@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-19 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0005_listaespera'),
+        ('barbearias', '0006_barbearia_fuso_horario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['barbearia', 'data_hora'], name='agendamento_barbear_f689a3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['profissional', 'data_hora'], name='agendamento_profiss_e7fd68_idx'),
+        ),
+    ]
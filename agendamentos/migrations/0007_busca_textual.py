@@ -0,0 +1,79 @@
+"""
+Índice FTS5 para a busca de agendamentos (apenas SQLite; veja agendamentos/busca.py).
+
+O telefone é indexado só com os dígitos e também como foi digitado, para que
+"11999" e "9999" encontrem "(11) 99999-9999". O índice de prefixos de 2 a 4 letras
+evita expandir "jo*" ou "119*" em milhares de termos a cada busca.
+"""
+from django.db import migrations
+
+TELEFONE = (
+    "replace(replace(replace(replace(replace(replace({col}, ' ', ''), '(', ''), ')', ''), '-', ''), '+', ''), '.', '')"
+    " || ' ' || {col}"
+)
+
+VALORES = (
+    "'b' || {p}.barbearia_id, {p}.nome_cliente, " + TELEFONE.format(col='{p}.telefone_cliente')
+    + ", coalesce({p}.email_cliente, ''), {p}.observacoes"
+)
+
+CRIAR = [
+    """
+    CREATE VIRTUAL TABLE agendamentos_busca USING fts5(
+        barbearia, nome_cliente, telefone_cliente, email_cliente, observacoes,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4'
+    )
+    """,
+    f"""
+    CREATE TRIGGER agendamentos_busca_insert AFTER INSERT ON agendamentos_agendamento BEGIN
+        INSERT INTO agendamentos_busca (rowid, barbearia, nome_cliente, telefone_cliente, email_cliente, observacoes)
+        VALUES (new.id, {VALORES.format(p='new')});
+    END
+    """,
+    """
+    CREATE TRIGGER agendamentos_busca_delete AFTER DELETE ON agendamentos_agendamento BEGIN
+        DELETE FROM agendamentos_busca WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER agendamentos_busca_update
+    AFTER UPDATE OF barbearia_id, nome_cliente, telefone_cliente, email_cliente, observacoes ON agendamentos_agendamento BEGIN
+        DELETE FROM agendamentos_busca WHERE rowid = old.id;
+        INSERT INTO agendamentos_busca (rowid, barbearia, nome_cliente, telefone_cliente, email_cliente, observacoes)
+        VALUES (new.id, {VALORES.format(p='new')});
+    END
+    """,
+    f"""
+    INSERT INTO agendamentos_busca (rowid, barbearia, nome_cliente, telefone_cliente, email_cliente, observacoes)
+    SELECT a.id, {VALORES.format(p='a')} FROM agendamentos_agendamento a
+    """,
+    "INSERT INTO agendamentos_busca (agendamentos_busca) VALUES ('optimize')",
+]
+
+REMOVER = [
+    'DROP TRIGGER IF EXISTS agendamentos_busca_insert',
+    'DROP TRIGGER IF EXISTS agendamentos_busca_delete',
+    'DROP TRIGGER IF EXISTS agendamentos_busca_update',
+    'DROP TABLE IF EXISTS agendamentos_busca',
+]
+
+
+def _executar(comandos):
+    def executar(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for comando in comandos:
+            schema_editor.execute(comando)
+    return executar
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0006_agendamento_indices_data_hora'),
+    ]
+
+    operations = [
+        migrations.RunPython(_executar(CRIAR), _executar(REMOVER)),
+    ]
@@ -0,0 +1,71 @@
+"""
+Cria um Cliente por (barbearia, telefone normalizado) a partir dos agendamentos
+existentes e liga cada agendamento ao seu cliente.
+
+Tudo em lote: uma leitura dos agendamentos, um bulk_create dos clientes e
+bulk_update dos agendamentos, sem consultas por linha. O nome e o email do cliente
+são os do agendamento mais recente que os informou.
+"""
+from django.db import migrations
+
+LOTE = 1000
+
+
+def _normalizar_telefone(telefone):
+    # Cópia de Cliente.normalizar_telefone, congelada para esta migração
+    digitos = ''.join(filter(str.isdigit, telefone or ''))
+    if len(digitos) >= 12 and digitos.startswith('55'):
+        digitos = digitos[2:]
+    return digitos.lstrip('0')
+
+
+def preencher_clientes(apps, schema_editor):
+    Agendamento = apps.get_model('agendamentos', 'Agendamento')
+    Cliente = apps.get_model('agendamentos', 'Cliente')
+    banco = schema_editor.connection.alias
+
+    grupos = {}
+    linhas = Agendamento.objects.using(banco).filter(cliente__isnull=True).order_by('criado_em', 'id').values_list(
+        'id', 'barbearia_id', 'nome_cliente', 'telefone_cliente', 'email_cliente'
+    )
+    for agendamento_id, barbearia_id, nome, telefone, email in linhas.iterator(chunk_size=LOTE):
+        numero = _normalizar_telefone(telefone)
+        if not numero:
+            continue
+        grupo = grupos.setdefault((barbearia_id, numero), {'ids': [], 'nome': nome, 'email': None})
+        grupo['ids'].append(agendamento_id)
+        grupo['nome'] = nome or grupo['nome']
+        grupo['email'] = email or grupo['email']
+    if not grupos:
+        return
+
+    # Clientes criados por agendamentos gravados durante o deploy continuam valendo
+    existentes = {
+        (barbearia_id, telefone): cliente_id
+        for cliente_id, barbearia_id, telefone in Cliente.objects.using(banco).values_list('id', 'barbearia_id', 'telefone')
+    }
+    novos = [
+        Cliente(barbearia_id=barbearia_id, telefone=numero, nome=grupo['nome'][:200], email=grupo['email'])
+        for (barbearia_id, numero), grupo in grupos.items()
+        if (barbearia_id, numero) not in existentes
+    ]
+    for cliente in Cliente.objects.using(banco).bulk_create(novos, batch_size=LOTE):
+        existentes[(cliente.barbearia_id, cliente.telefone)] = cliente.id
+
+    agendamentos = [
+        Agendamento(id=agendamento_id, cliente_id=existentes[chave])
+        for chave, grupo in grupos.items()
+        for agendamento_id in grupo['ids']
+    ]
+    Agendamento.objects.using(banco).bulk_update(agendamentos, ['cliente'], batch_size=LOTE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0009_cliente'),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_clientes, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,63 @@
-from django.db import models
+from django.db import IntegrityError, models, router, transaction
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from django.conf import settings
 from barbearias.models import Barbearia, Servico, Profissional
+from barbearias import agenda, datas, metricas
 from datetime import datetime, timedelta
+import secrets
+
+class Cliente(models.Model):
+    """
+    Cliente de uma barbearia, identificado pelo telefone normalizado (só dígitos, sem
+    o 55 do país). Cada agendamento guarda o nome, telefone e email como foram
+    digitados e aponta para o cliente, o que dá o histórico por um índice.
+    """
+    barbearia = models.ForeignKey(Barbearia, on_delete=models.CASCADE, related_name='clientes')
+    telefone = models.CharField(max_length=20)
+    nome = models.CharField(max_length=200)
+    email = models.EmailField(blank=True, null=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Cliente"
+        verbose_name_plural = "Clientes"
+        ordering = ['nome']
+        constraints = [
+            models.UniqueConstraint(fields=['barbearia', 'telefone'], name='cliente_telefone_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['barbearia', 'nome']),
+        ]
+
+    def __str__(self):
+        return f"{self.nome} ({self.telefone})"
+
+    @staticmethod
+    def normalizar_telefone(telefone):
+        """'+55 (11) 98888-7777' -> '11988887777'"""
+        digitos = ''.join(filter(str.isdigit, telefone or ''))
+        if len(digitos) >= 12 and digitos.startswith('55'):
+            digitos = digitos[2:]
+        return digitos.lstrip('0')
+
+    @staticmethod
+    def identificar(barbearia_id, nome, telefone, email=None):
+        """
+        Cliente do telefone na barbearia, criado no primeiro agendamento. O nome e o
+        email do agendamento mais recente passam a valer para o cliente. Uma única
+        consulta (INSERT ... ON CONFLICT DO UPDATE), seja o cliente novo ou não.
+        """
+        numero = Cliente.normalizar_telefone(telefone)
+        if not numero:
+            return None
+        cliente = Cliente(barbearia_id=barbearia_id, telefone=numero, nome=nome, email=email or None)
+        Cliente.objects.bulk_create(
+            [cliente], update_conflicts=True, unique_fields=['barbearia', 'telefone'],
+            update_fields=['nome', 'email'] if email else ['nome'],
+        )
+        return cliente
+
 
 class Agendamento(models.Model):
     STATUS_CHOICES = [
@@ -23,10 +78,15 @@ class Agendamento(models.Model):
     observacoes = models.TextField(blank=True)
     criado_em = models.DateTimeField(auto_now_add=True)
     notificacao_enviada = models.BooleanField(default=False)
+    # Sem índice próprio: o índice (cliente, data_hora) do Meta atende as consultas por cliente
+    cliente = models.ForeignKey(
+        Cliente, on_delete=models.SET_NULL, null=True, blank=True, related_name='agendamentos', db_index=False
+    )
     
     def clean(self):
         # Validação para evitar agendamentos no passado
         if self.data_hora and self.data_hora < timezone.now():
+            metricas.AGENDAMENTOS_REJEITADOS.inc(motivo='passado')
             raise ValidationError("Não é possível agendar para datas passadas.")
         
         # Validação para evitar conflitos de horário
@@ -34,11 +94,15 @@ class Agendamento(models.Model):
             inicio = self.data_hora
             fim = inicio + timedelta(minutes=self.servico.duracao_minutos)
             
-            # Busca agendamentos existentes para o mesmo profissional
-            agendamentos_conflitantes = Agendamento.objects.filter(
+            # Busca agendamentos existentes para o mesmo profissional no banco em que este
+            # vai ser gravado: o shard da barbearia, nunca a réplica (que pode estar atrasada)
+            banco = router.db_for_write(Agendamento, instance=self)
+            agendamentos_conflitantes = Agendamento.objects.using(banco).filter(
                 profissional=self.profissional,
-                status__in=['agendado', 'confirmado']
-            ).exclude(pk=self.pk)
+                status__in=['agendado', 'confirmado'],
+                data_hora__lt=fim,
+                data_hora__gte=inicio - timedelta(days=1)
+            ).exclude(pk=self.pk).select_related('servico')
             
             for agendamento in agendamentos_conflitantes:
                 agendamento_inicio = agendamento.data_hora
@@ -46,14 +110,21 @@ class Agendamento(models.Model):
                 
                 # Verifica se há sobreposição de horários
                 if (inicio < agendamento_fim and fim > agendamento_inicio):
-                    raise ValidationError(f"Horário conflitante com agendamento existente de {agendamento.nome_cliente} às {agendamento_inicio.strftime('%H:%M')}")
+                    metricas.AGENDAMENTOS_REJEITADOS.inc(motivo='conflito')
+                    raise ValidationError(
+                        f"Horário conflitante com agendamento existente de {agendamento.nome_cliente} às {datas.local(agendamento_inicio, datas.fuso_da_barbearia(self.barbearia_id)).strftime('%H:%M')}",
+                        code='conflito'
+                    )
     
     def save(self, *args, **kwargs):
-        self.full_clean()
+        # O cliente é resolvido aqui mesmo; validar a chave seria uma consulta a mais
+        self.full_clean(exclude=['cliente'])
+        if self.cliente_id is None and self.telefone_cliente:
+            self.cliente = Cliente.identificar(self.barbearia_id, self.nome_cliente, self.telefone_cliente, self.email_cliente)
         super().save(*args, **kwargs)
     
     def __str__(self):
-        return f"{self.nome_cliente} - {self.servico.nome} - {self.data_hora.strftime('%d/%m/%Y %H:%M')}"
+        return f"{self.nome_cliente} - {self.servico.nome} - {timezone.localtime(self.data_hora).strftime('%d/%m/%Y %H:%M')}"
     
     @staticmethod
     def verificar_disponibilidade(profissional, data_hora, duracao_minutos, agendamento_id=None):
@@ -64,8 +135,10 @@ class Agendamento(models.Model):
         # Busca agendamentos conflitantes
         agendamentos_conflitantes = Agendamento.objects.filter(
             profissional=profissional,
-            status__in=['agendado', 'confirmado']
-        )
+            status__in=['agendado', 'confirmado'],
+            data_hora__lt=fim,
+            data_hora__gte=inicio - timedelta(days=1)
+        ).select_related('servico')
         
         if agendamento_id:
             agendamentos_conflitantes = agendamentos_conflitantes.exclude(pk=agendamento_id)
@@ -76,42 +149,361 @@ class Agendamento(models.Model):
             
             # Verifica se há sobreposição
             if (inicio < agendamento_fim and fim > agendamento_inicio):
-                return False, f"Conflito com agendamento de {agendamento.nome_cliente} às {agendamento_inicio.strftime('%H:%M')}"
+                return False, f"Conflito com agendamento de {agendamento.nome_cliente} às {timezone.localtime(agendamento_inicio).strftime('%H:%M')}"
         
         return True, "Horário disponível"
     
     @staticmethod
-    def obter_horarios_disponiveis(profissional, data, duracao_minutos, horario_inicio='08:00', horario_fim='18:00', intervalo_minutos=30):
-        """Obtém lista de horários disponíveis para um profissional em uma data específica"""
-        from datetime import datetime, time
-        
+    def _ocupacoes_do_dia(profissional, inicio, fim, ignorar_reserva=None):
+        """Agendamentos ativos e reservas temporárias do profissional que podem cruzar o intervalo (uma única consulta)"""
+        agendamentos = Agendamento.objects.filter(
+            profissional_id=profissional.id,
+            status__in=['agendado', 'confirmado'],
+            data_hora__lt=fim,
+            data_hora__gte=inicio - timedelta(days=1)
+        ).order_by().values_list('data_hora', 'servico__duracao_minutos')
+        reservas = ReservaTemporaria.ativas(ignorar=ignorar_reserva).filter(
+            profissional_id=profissional.id, inicio__lt=fim, fim__gt=inicio
+        ).order_by().values_list('inicio', 'duracao_minutos')
+        return agendamentos.union(reservas, all=True)
+
+    @staticmethod
+    def _gerar_horarios_livres(abertos, duracao_minutos, ocupacoes, intervalo_minutos):
+        """
+        Gera os horários livres em memória a partir da agenda compilada e das ocupações
+        (os intervalos da agenda já vêm no fuso da barbearia)
+        """
+        ocupados = [
+            (data_hora, data_hora + timedelta(minutes=duracao))
+            for data_hora, duracao in ocupacoes
+        ]
+        agora = timezone.now()
+        duracao = timedelta(minutes=duracao_minutos)
         horarios_disponiveis = []
-        
-        # Converter strings de horário para objetos time
-        inicio = datetime.strptime(horario_inicio, '%H:%M').time()
-        fim = datetime.strptime(horario_fim, '%H:%M').time()
-        
-        # Gerar horários possíveis com timezone
-        hora_atual = timezone.make_aware(datetime.combine(data, inicio))
-        hora_fim = timezone.make_aware(datetime.combine(data, fim))
-        
-        while hora_atual <= hora_fim - timedelta(minutes=duracao_minutos):
-            # Verifica se não é no passado
-            if hora_atual > timezone.now():
-                disponivel, _ = Agendamento.verificar_disponibilidade(
-                    profissional, hora_atual, duracao_minutos
-                )
-                if disponivel:
-                    horarios_disponiveis.append({
-                        'hora': hora_atual.strftime('%H:%M'),
-                        'datetime': hora_atual.isoformat()
-                    })
-            
-            hora_atual += timedelta(minutes=intervalo_minutos)
-        
+
+        for inicio, fim in abertos:
+            hora_atual = inicio
+            while hora_atual <= fim - duracao:
+                # Verifica se não é no passado
+                if hora_atual > agora:
+                    hora_fim = hora_atual + duracao
+                    if not any(hora_atual < ocupado_fim and hora_fim > ocupado_inicio for ocupado_inicio, ocupado_fim in ocupados):
+                        horarios_disponiveis.append({
+                            'hora': hora_atual.strftime('%H:%M'),
+                            'datetime': hora_atual.isoformat()
+                        })
+
+                hora_atual += timedelta(minutes=intervalo_minutos)
+
         return horarios_disponiveis
+
+    @staticmethod
+    @metricas.HORARIOS_DISPONIVEIS_SEGUNDOS.cronometrar(modo='sync')
+    def obter_horarios_disponiveis(profissional, data, duracao_minutos, intervalo_minutos=30, abertos=None, ignorar_reserva=None):
+        """Obtém lista de horários disponíveis para um profissional em uma data específica"""
+        if abertos is None:
+            abertos = agenda.intervalos_abertos(profissional.barbearia_id, [profissional.id], data)[(profissional.id, data)]
+        if not abertos:
+            return []
+        ocupacoes = list(Agendamento._ocupacoes_do_dia(profissional, abertos[0][0], abertos[-1][1], ignorar_reserva))
+        return Agendamento._gerar_horarios_livres(abertos, duracao_minutos, ocupacoes, intervalo_minutos)
+
+    @staticmethod
+    @metricas.HORARIOS_DISPONIVEIS_SEGUNDOS.cronometrar(modo='async')
+    async def aobter_horarios_disponiveis(profissional, data, duracao_minutos, intervalo_minutos=30, abertos=None, ignorar_reserva=None):
+        """Versão assíncrona de obter_horarios_disponiveis (ORM assíncrono, sem thread pool)"""
+        if abertos is None:
+            abertos = (await agenda.aintervalos_abertos(profissional.barbearia_id, [profissional.id], data))[(profissional.id, data)]
+        if not abertos:
+            return []
+        ocupacoes = [ocupacao async for ocupacao in Agendamento._ocupacoes_do_dia(profissional, abertos[0][0], abertos[-1][1], ignorar_reserva)]
+        return Agendamento._gerar_horarios_livres(abertos, duracao_minutos, ocupacoes, intervalo_minutos)
     
+    @staticmethod
+    def _ocupacoes_periodo(profissional_ids, inicio, fim, ignorar_reserva=None):
+        """Agendamentos ativos e reservas temporárias dos profissionais que podem cruzar o período (uma única consulta)"""
+        agendamentos = Agendamento.objects.filter(
+            profissional_id__in=profissional_ids,
+            status__in=['agendado', 'confirmado'],
+            data_hora__lt=fim,
+            data_hora__gte=inicio - timedelta(days=1)
+        ).order_by().values_list('profissional_id', 'data_hora', 'servico__duracao_minutos')
+        reservas = ReservaTemporaria.ativas(ignorar=ignorar_reserva).filter(
+            profissional_id__in=profissional_ids, inicio__lt=fim, fim__gt=inicio
+        ).order_by().values_list('profissional_id', 'inicio', 'duracao_minutos')
+        return agendamentos.union(reservas, all=True)
+
+    @staticmethod
+    def _gerar_mascaras(abertos_por_chave, ocupacoes, passo_minutos):
+        """
+        Resume a disponibilidade de cada (profissional, data) como o início do primeiro
+        intervalo aberto mais uma máscara de bits: o bit i indica que a faixa
+        [inicio + i * passo, inicio + (i + 1) * passo) está livre.
+        """
+        ocupados = {}
+        for profissional_id, data_hora, duracao in ocupacoes:
+            ocupados.setdefault(profissional_id, []).append((data_hora, data_hora + timedelta(minutes=duracao)))
+
+        agora = timezone.now()
+        passo = timedelta(minutes=passo_minutos)
+        resumo = {}
+        for (profissional_id, data), abertos in abertos_por_chave.items():
+            if not abertos:
+                continue
+            inicio_dia = abertos[0][0]
+            mascara = 0
+            faixa = 0
+            hora_atual = inicio_dia
+            while hora_atual + passo <= abertos[-1][1]:
+                hora_fim = hora_atual + passo
+                livre = (
+                    hora_atual > agora
+                    and any(inicio <= hora_atual and hora_fim <= fim for inicio, fim in abertos)
+                    and not any(hora_atual < fim and hora_fim > inicio for inicio, fim in ocupados.get(profissional_id, ()))
+                )
+                if livre:
+                    mascara |= 1 << faixa
+                faixa += 1
+                hora_atual = hora_fim
+            if mascara:
+                resumo.setdefault(profissional_id, {})[data.isoformat()] = [
+                    inicio_dia.isoformat(), format(mascara, 'x')
+                ]
+        return resumo
+
+    @staticmethod
+    def resumo_disponibilidade(barbearia_id, profissional_ids, data_inicio, dias=7, passo_minutos=30, ignorar_reserva=None):
+        """Máscaras de horários livres por profissional e data, para vários dias de uma vez"""
+        data_fim = data_inicio + timedelta(days=dias - 1)
+        abertos = agenda.intervalos_abertos(barbearia_id, profissional_ids, data_inicio, data_fim)
+        periodos = [intervalo for lista in abertos.values() for intervalo in lista]
+        if not periodos:
+            return {}
+        ocupacoes = list(Agendamento._ocupacoes_periodo(
+            profissional_ids, min(inicio for inicio, _ in periodos), max(fim for _, fim in periodos), ignorar_reserva
+        ))
+        return Agendamento._gerar_mascaras(abertos, ocupacoes, passo_minutos)
+
+    @staticmethod
+    async def aresumo_disponibilidade(barbearia_id, profissional_ids, data_inicio, dias=7, passo_minutos=30, ignorar_reserva=None):
+        """Versão assíncrona de resumo_disponibilidade"""
+        data_fim = data_inicio + timedelta(days=dias - 1)
+        abertos = await agenda.aintervalos_abertos(barbearia_id, profissional_ids, data_inicio, data_fim)
+        periodos = [intervalo for lista in abertos.values() for intervalo in lista]
+        if not periodos:
+            return {}
+        ocupacoes = [ocupacao async for ocupacao in Agendamento._ocupacoes_periodo(
+            profissional_ids, min(inicio for inicio, _ in periodos), max(fim for _, fim in periodos), ignorar_reserva
+        )]
+        return Agendamento._gerar_mascaras(abertos, ocupacoes, passo_minutos)
+
     class Meta:
         verbose_name = "Agendamento"
         verbose_name_plural = "Agendamentos"
         ordering = ['-data_hora']
+        # Consultas por dia usam faixas [início, fim) em data_hora (veja barbearias/datas.py)
+        indexes = [
+            models.Index(fields=['barbearia', 'data_hora']),
+            models.Index(fields=['profissional', 'data_hora']),
+            # Histórico do cliente
+            models.Index(fields=['cliente', 'data_hora']),
+        ]
+
+
+class ReservaTemporaria(models.Model):
+    """Horário segurado por alguns minutos enquanto o cliente termina o agendamento"""
+    barbearia = models.ForeignKey(Barbearia, on_delete=models.CASCADE, related_name='reservas_temporarias')
+    profissional = models.ForeignKey(Profissional, on_delete=models.CASCADE, related_name='reservas_temporarias')
+    token = models.CharField(max_length=64, unique=True)
+    inicio = models.DateTimeField()
+    fim = models.DateTimeField()
+    duracao_minutos = models.PositiveIntegerField()
+    expira_em = models.DateTimeField()
+    criada_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Reserva Temporária"
+        verbose_name_plural = "Reservas Temporárias"
+        indexes = [
+            models.Index(fields=['profissional', 'expira_em']),
+            models.Index(fields=['expira_em']),
+        ]
+
+    def __str__(self):
+        return f"{self.profissional} - {self.inicio.strftime('%d/%m/%Y %H:%M')} (até {self.expira_em.strftime('%H:%M')})"
+
+    @staticmethod
+    def ativas(ignorar=None):
+        """Reservas ainda válidas, opcionalmente sem a reserva do próprio cliente"""
+        reservas = ReservaTemporaria.objects.filter(expira_em__gt=timezone.now())
+        if ignorar:
+            reservas = reservas.exclude(token=ignorar)
+        return reservas
+
+    @staticmethod
+    def criar(barbearia, profissional, data_hora, duracao_minutos, substituir=None):
+        """
+        Segura o horário para o cliente. Retorna a reserva, ou None se o horário não
+        estiver livre (fora do expediente, agendado ou reservado por outro cliente).
+        """
+        agora = timezone.now()
+        # Limpeza preguiçosa: as reservas vencidas saem aqui, sem tarefa agendada
+        ReservaTemporaria.objects.filter(expira_em__lte=agora).delete()
+        if substituir:
+            ReservaTemporaria.objects.filter(token=substituir, barbearia=barbearia).delete()
+
+        fim = data_hora + timedelta(minutes=duracao_minutos)
+        if data_hora <= agora:
+            return None
+        data = datas.local(data_hora, datas.fuso(barbearia)).date()
+        abertos = agenda.intervalos_abertos(barbearia.id, [profissional.id], data)[(profissional.id, data)]
+        if not any(inicio <= data_hora and fim <= fim_aberto for inicio, fim_aberto in abertos):
+            return None
+        for ocupado_inicio, duracao in Agendamento._ocupacoes_do_dia(profissional, data_hora, fim):
+            if data_hora < ocupado_inicio + timedelta(minutes=duracao) and fim > ocupado_inicio:
+                return None
+
+        reserva = ReservaTemporaria.objects.create(
+            barbearia=barbearia,
+            profissional_id=profissional.id,
+            token=secrets.token_urlsafe(24),
+            inicio=data_hora,
+            fim=fim,
+            duracao_minutos=duracao_minutos,
+            expira_em=agora + timedelta(minutes=settings.RESERVA_TEMPORARIA_MINUTOS),
+        )
+
+        # Duas reservas simultâneas podem passar pela verificação acima; fica a mais antiga
+        if ReservaTemporaria.ativas().filter(
+            profissional_id=profissional.id, inicio__lt=fim, fim__gt=data_hora, id__lt=reserva.id
+        ).exists():
+            reserva.delete()
+            return None
+        return reserva
+
+
+class ChaveIdempotencia(models.Model):
+    """
+    Chave enviada pelo cliente com um agendamento (campo oculto do formulário ou
+    cabeçalho Idempotency-Key da API). Um reenvio com a mesma chave devolve o
+    agendamento já criado, sem validar, gravar ou notificar de novo.
+    """
+    barbearia = models.ForeignKey(Barbearia, on_delete=models.CASCADE, related_name='chaves_idempotencia')
+    chave = models.CharField(max_length=64)
+    # Vazio enquanto a primeira requisição ainda está gravando o agendamento
+    agendamento = models.ForeignKey('Agendamento', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    criada_em = models.DateTimeField(auto_now_add=True)
+    expira_em = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Chave de Idempotência"
+        verbose_name_plural = "Chaves de Idempotência"
+        constraints = [
+            models.UniqueConstraint(fields=['barbearia', 'chave'], name='chave_idempotencia_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['expira_em']),
+        ]
+
+    def __str__(self):
+        return f"{self.chave} - #{self.agendamento_id or '...'}"
+
+    @staticmethod
+    def buscar(barbearia, chave):
+        """Registro ainda válido da chave, com o agendamento pronto para a resposta, ou None"""
+        return ChaveIdempotencia.objects.filter(
+            barbearia=barbearia, chave=chave, expira_em__gt=timezone.now()
+        ).select_related('agendamento__servico', 'agendamento__profissional').first()
+
+    @staticmethod
+    def registrar(barbearia, chave):
+        """
+        Registra a chave antes de gravar o agendamento. Retorna None se outra requisição
+        com a mesma chave chegou antes (o índice único decide entre envios simultâneos).
+        """
+        agora = timezone.now()
+        # Limpeza preguiçosa, como nas reservas temporárias
+        ChaveIdempotencia.objects.filter(expira_em__lte=agora).delete()
+        try:
+            # Savepoint no banco da barbearia, onde o índice único pode recusar a chave
+            with transaction.atomic(using=router.db_for_write(ChaveIdempotencia)):
+                return ChaveIdempotencia.objects.create(
+                    barbearia=barbearia,
+                    chave=chave,
+                    expira_em=agora + timedelta(hours=settings.IDEMPOTENCIA_HORAS),
+                )
+        except IntegrityError:
+            return None
+
+    def concluir(self, agendamento):
+        self.agendamento = agendamento
+        self.save(update_fields=['agendamento'])
+
+
+class ListaEspera(models.Model):
+    """Cliente aguardando uma vaga; é avisado quando um agendamento compatível é cancelado"""
+    barbearia = models.ForeignKey(Barbearia, on_delete=models.CASCADE, related_name='lista_espera')
+    servico = models.ForeignKey(Servico, on_delete=models.CASCADE, related_name='lista_espera')
+    profissional = models.ForeignKey(
+        Profissional, on_delete=models.CASCADE, null=True, blank=True, related_name='lista_espera',
+        help_text="Deixe em branco para aceitar qualquer profissional"
+    )
+    nome_cliente = models.CharField(max_length=200)
+    telefone_cliente = models.CharField(max_length=20)
+    email_cliente = models.EmailField()
+    data_inicio = models.DateField()
+    data_fim = models.DateField()
+    hora_inicio = models.TimeField()
+    hora_fim = models.TimeField()
+    ativa = models.BooleanField(default=True)
+    avisos = models.PositiveIntegerField(default=0)
+    ultimo_aviso = models.DateTimeField(null=True, blank=True)
+    criada_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Lista de Espera"
+        verbose_name_plural = "Lista de Espera"
+        ordering = ['criada_em']
+        indexes = [
+            # Busca por vagas: barbearia + período, apenas entradas ativas
+            models.Index(
+                fields=['barbearia', 'data_fim', 'data_inicio'],
+                condition=models.Q(ativa=True),
+                name='lista_espera_busca_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.nome_cliente} - {self.data_inicio.strftime('%d/%m')} a {self.data_fim.strftime('%d/%m')}"
+
+    def clean(self):
+        if self.data_inicio and self.data_fim and self.data_fim < self.data_inicio:
+            raise ValidationError("A data final deve ser igual ou posterior à data inicial.")
+        if self.hora_inicio and self.hora_fim and self.hora_fim <= self.hora_inicio:
+            raise ValidationError("O horário final deve ser posterior ao horário inicial.")
+
+
+class NotificacaoPendente(models.Model):
+    """Evento acumulado para o resumo de notificações do estabelecimento"""
+    TIPOS = [
+        ('novo', 'Novo agendamento'),
+        ('cancelamento', 'Cancelamento'),
+    ]
+
+    barbearia = models.ForeignKey(Barbearia, on_delete=models.CASCADE, related_name='notificacoes_pendentes')
+    agendamento = models.ForeignKey(Agendamento, on_delete=models.CASCADE, related_name='notificacoes_pendentes')
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    motivo = models.TextField(blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    enviada_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Notificação Pendente"
+        verbose_name_plural = "Notificações Pendentes"
+        ordering = ['criado_em']
+        indexes = [
+            models.Index(fields=['enviada_em', 'barbearia']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} - #{self.agendamento_id}"
@@ -1,3 +1,519 @@
-from django.test import TestCase
+"""
+Orçamento de consultas dos comandos de notificação e da importação de agendamentos.
 
-# Create your tests here.
+Mesma ideia dos testes de barbearias/tests.py: cada comando roda com POUCOS e com
+MUITOS agendamentos a notificar (ou linhas a importar) e não pode fazer mais
+consultas no segundo caso, nem passar do orçamento definido.
+
+Depois vêm os testes de comportamento (importação, busca no admin, broker de eventos,
+entrega SMTP, máscaras de disponibilidade, lista de espera).
+"""
+import asyncio
+import json
+import os
+import smtplib
+import tempfile
+import threading
+import time as relogio
+from datetime import time, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from barbearias import datas
+from barbearias.models import Barbearia
+from barbearias.tests import MUITOS, POUCOS, CenarioBarbearia
+from . import busca, importacao
+from .entrega import Regulador, entregar_em_lote
+from .eventos import ARQUIVO_EVENTOS, TAMANHO_FILA, BrokerLocal
+from .lista_espera import candidatos
+from .models import Agendamento, Cliente, ListaEspera, NotificacaoPendente
+
+
+@override_settings(LIMITES_TAXA={}, METRICAS_DIR=None, CAPTURA_TRAFEGO=False)
+class OrcamentoComandosTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.cenarios = [CenarioBarbearia('barbearia-um'), CenarioBarbearia('barbearia-dois')]
+
+    def assertOrcamento(self, maximo, comando, preparar, emails):
+        """
+        `comando` com POUCOS e com MUITOS itens por estabelecimento, criados por
+        `preparar(cenario, total)`; `emails(total)` é quantos emails devem sair
+        """
+        medicoes = []
+        for total in (POUCOS, MUITOS):
+            for cenario in self.cenarios:
+                preparar(cenario, total)
+            mail.outbox = []
+            cache.clear()
+            with CaptureQueriesContext(connection) as consultas:
+                call_command(comando, stdout=StringIO())
+            self.assertEqual(len(mail.outbox), emails(total))
+            medicoes.append(consultas)
+
+        poucos, muitos = medicoes
+        sql = '\n'.join(f'  {consulta["sql"]}' for consulta in muitos.captured_queries)
+        self.assertEqual(
+            len(poucos), len(muitos),
+            f'O número de consultas cresce com os agendamentos: {len(poucos)} com {POUCOS}, '
+            f'{len(muitos)} com {MUITOS}\n{sql}'
+        )
+        self.assertLessEqual(len(muitos), maximo, f'{len(muitos)} consultas, orçamento de {maximo}\n{sql}')
+
+    def test_enviar_notificacoes(self):
+        def preparar(cenario, total):
+            # Agendamentos de amanhã neste mesmo horário, ainda sem lembrete
+            Agendamento.objects.filter(barbearia=cenario.barbearia).update(notificacao_enviada=True)
+            amanha = timezone.now() + timedelta(hours=24)
+            Agendamento.objects.bulk_create([
+                Agendamento(
+                    barbearia=cenario.barbearia, servico=cenario.servicos[indice % len(cenario.servicos)],
+                    profissional=cenario.profissionais[indice % len(cenario.profissionais)],
+                    nome_cliente=f'Cliente {indice}', telefone_cliente='(11) 98888-7777',
+                    email_cliente=f'cliente{indice}@exemplo.com', data_hora=amanha + timedelta(minutes=indice % 20),
+                )
+                for indice in range(total)
+            ])
+
+        # Com o shard dos testes configurado, +1 consulta: os bancos em uso no diretório (idem abaixo)
+        self.assertOrcamento(3, 'enviar_notificacoes', preparar, lambda total: total * len(self.cenarios))
+
+    def test_enviar_resumo_notificacoes(self):
+        Barbearia.objects.update(modo_notificacao='resumo_horario')
+
+        def preparar(cenario, total):
+            # Um resumo por estabelecimento com todos os agendamentos ainda não resumidos
+            NotificacaoPendente.objects.filter(barbearia=cenario.barbearia).update(enviada_em=None)
+            cenario.completar_agendamentos(total)
+            cancelado = cenario.agendamentos[0]
+            NotificacaoPendente.objects.create(
+                barbearia=cenario.barbearia, agendamento=cancelado, tipo='cancelamento', motivo='Cancelado pelo cliente'
+            )
+
+        self.assertOrcamento(3, 'enviar_resumo_notificacoes', preparar, lambda total: len(self.cenarios))
+
+    def test_resumo_pendente_de_quem_voltou_ao_modo_imediato(self):
+        Barbearia.objects.update(modo_notificacao='resumo_diario')
+        um, dois = self.cenarios
+        for cenario in self.cenarios:
+            cenario.completar_agendamentos(POUCOS)
+            NotificacaoPendente.objects.create(barbearia=cenario.barbearia, agendamento=cenario.agendamentos[0], tipo='novo')
+        Barbearia.objects.filter(pk=um.barbearia.pk).update(modo_notificacao='imediato')
+
+        # O horário não pega o resumo diário do outro, mas esvazia o de quem voltou ao imediato
+        call_command('enviar_resumo_notificacoes', '--modo', 'resumo_horario', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [um.barbearia.email_notificacoes])
+        pendentes = NotificacaoPendente.objects.filter(enviada_em__isnull=True)
+        self.assertEqual(set(pendentes.values_list('barbearia_id', flat=True)), {dois.barbearia.id})
+
+
+@override_settings(LIMITES_TAXA={}, METRICAS_DIR=None, CAPTURA_TRAFEGO=False)
+class ImportacaoAgendamentosTest(TestCase):
+    """Comando importar_agendamentos: validação em memória, conflitos em uma varredura e gravação em lote"""
+
+    def setUp(self):
+        cache.clear()
+        self.cenario = CenarioBarbearia()
+        self.dia = self.cenario.hoje + timedelta(days=40)
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.diretorio.cleanup)
+
+    def arquivo(self, nome, conteudo):
+        caminho = os.path.join(self.diretorio.name, nome)
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(conteudo)
+        return caminho
+
+    def importar(self, caminho, *argumentos):
+        saida = StringIO()
+        call_command('importar_agendamentos', self.cenario.barbearia.slug, caminho, *argumentos, stdout=saida)
+        return saida.getvalue()
+
+    def test_csv_com_linhas_rejeitadas(self):
+        # Agendamento já gravado da Ana às 10h
+        Agendamento.objects.bulk_create([Agendamento(
+            barbearia=self.cenario.barbearia, servico=self.cenario.servicos[0], profissional=self.cenario.profissionais[0],
+            nome_cliente='Já agendado', telefone_cliente='(11) 91111-2222', email_cliente='ja@exemplo.com',
+            data_hora=datas.combinar(self.dia, time(10), self.cenario.fuso),
+        )])
+        data = self.dia.strftime('%d/%m/%Y')
+        caminho = self.arquivo('agenda.csv', '\n'.join([
+            'Nome;Telefone;E-mail;Serviço;Profissional;Data;Hora;Status',
+            f'João;+55 11 98888-7777;joao@exemplo.com;corte;Ana;{data};09:00;',
+            f'Maria;(11) 97777-1111;;Corte e Barba;BRUNO;{data};10:00;confirmado',
+            f'Pedro;(11) 96666-1111;;Barba;Bruno;{data};10:30;',
+            f'Paula;(11) 95555-1111;;Corte;Ana;{data};09:45;',
+            f'Rita;(11) 94444-1111;;Corte;Ana;{data};10:15;',
+            f'Caio;(11) 93333-1111;;Corte;Ana;{data};10:15;cancelado',
+            f'Lia;(11) 92222-1111;;Massagem;Ana;{data};11:00;',
+            f'Rui;1234;;Corte;Ana;{data};11:00;',
+            f'Ivo;(11) 91111-3333;;Corte;Ana;01/01/2000;11:00;',
+        ]))
+        saida = self.importar(caminho, '--rejeitadas', os.path.join(self.diretorio.name, 'rejeitadas.csv'))
+        self.assertIn('3 de 9 agendamento(s) importados', saida)
+
+        importados = Agendamento.objects.filter(barbearia=self.cenario.barbearia, data_hora__date__gte=self.dia).exclude(nome_cliente='Já agendado')
+        self.assertEqual(sorted(importados.values_list('nome_cliente', flat=True)), ['Caio', 'João', 'Maria'])
+        # O telefone do cenário, em outro formato, cai no mesmo cliente
+        self.assertEqual(importados.get(nome_cliente='João').cliente_id, self.cenario.cliente.id)
+        self.assertEqual(importados.get(nome_cliente='Maria').cliente.telefone, '11977771111')
+
+        with open(os.path.join(self.diretorio.name, 'rejeitadas.csv'), encoding='utf-8') as arquivo:
+            rejeitadas = arquivo.read()
+        self.assertIn('4,conflito de horário com a linha 3', rejeitadas)
+        self.assertIn('5,conflito de horário com um agendamento existente', rejeitadas)
+        self.assertIn('6,conflito de horário com um agendamento existente', rejeitadas)
+        self.assertIn('8,"serviço ""Massagem"" não encontrado"', rejeitadas)
+        self.assertIn('9,"telefone ""1234"" inválido"', rejeitadas)
+        self.assertIn('10,data no passado', rejeitadas)
+
+        # Reimportado, o arquivo só conflita consigo mesmo; apenas a linha cancelada entra de novo
+        self.assertIn('1 de 9', self.importar(caminho))
+
+    def test_ics(self):
+        conteudo = '\r\n'.join([
+            'BEGIN:VCALENDAR',
+            'BEGIN:VEVENT',
+            f'DTSTART;TZID=America/Sao_Paulo:{self.dia.strftime("%Y%m%d")}T140000',
+            'SUMMARY:Corte',
+            'ORGANIZER;CN=Carla:mailto:carla@exemplo.com',
+            'ATTENDEE;CN="Silva, Ana":mailto:ana.silva@exemplo.com',
+            'DESCRIPTION:Telefone: (11) 95555-4444\\nPrefere máquina 2 nas laterai',
+            ' s',
+            'END:VEVENT',
+            'BEGIN:VEVENT',
+            f'DTSTART:{self.dia.strftime("%Y%m%d")}T170000Z',
+            'SUMMARY:Barba',
+            'DESCRIPTION:Cliente: Beto\\nTelefone: 11944443333\\nProfissional: Carla',
+            'STATUS:CANCELLED',
+            'END:VEVENT',
+            'END:VCALENDAR',
+        ])
+        registros = list(importacao.ler_ics(StringIO(conteudo)))
+        self.assertEqual([linha for linha, _ in registros], [2, 10])
+        self.assertEqual(registros[0][1]['nome'], 'Silva, Ana')
+        self.assertEqual(registros[0][1]['observacoes'], 'Prefere máquina 2 nas laterais')
+
+        self.assertIn('2 de 2', self.importar(self.arquivo('agenda.ics', conteudo)))
+        ana = Agendamento.objects.get(nome_cliente='Silva, Ana')
+        self.assertEqual(ana.data_hora, datas.combinar(self.dia, time(14), self.cenario.fuso))
+        self.assertEqual(ana.email_cliente, 'ana.silva@exemplo.com')
+        self.assertEqual(ana.profissional, self.cenario.profissionais[2])
+        beto = Agendamento.objects.get(nome_cliente='Beto')
+        self.assertEqual(beto.status, 'cancelado')
+        # 17h UTC = 14h em São Paulo: cancelado, não conflita com a Ana
+        self.assertEqual(beto.data_hora, ana.data_hora)
+
+    def test_simular_nao_grava(self):
+        caminho = self.arquivo('agenda.csv', 'nome,telefone,servico,profissional,data_hora\n'
+                                             f'João,(11) 98888-7777,Corte,Ana,{self.dia.isoformat()} 09:00\n')
+        self.assertIn('1 de 1 agendamento(s) seriam importados', self.importar(caminho, '--simular'))
+        self.assertFalse(Agendamento.objects.filter(nome_cliente='João').exists())
+
+    def test_consultas_nao_crescem_com_as_linhas(self):
+        medicoes = []
+        for total, dia in ((POUCOS, self.dia), (MUITOS, self.dia + timedelta(days=1))):
+            linhas = ['nome,telefone,servico,profissional,data_hora']
+            for indice in range(total):
+                profissional = self.cenario.profissionais[indice % 3].nome
+                inicio = datas.combinar(dia, time(8), self.cenario.fuso) + timedelta(minutes=30 * (indice // 3))
+                linhas.append(f'Cliente {indice},(11) 9{total:02d}{indice:02d}-0000,Corte,{profissional},{inicio.isoformat()}')
+            caminho = self.arquivo(f'agenda-{total}.csv', '\n'.join(linhas))
+            cache.clear()
+            with CaptureQueriesContext(connection) as consultas:
+                self.assertIn(f'{total} de {total}', self.importar(caminho))
+            medicoes.append(len(consultas))
+        self.assertEqual(medicoes[0], medicoes[1])
+        self.assertLessEqual(medicoes[1], 9)
+        self.assertEqual(Cliente.objects.filter(barbearia=self.cenario.barbearia).count(), 1 + POUCOS + MUITOS)
+
+
+@override_settings(LIMITES_TAXA={}, METRICAS_DIR=None, CAPTURA_TRAFEGO=False)
+class BuscaAdminTest(TestCase):
+    """Busca do admin do Django pelo índice FTS5, limitada à barbearia de quem busca"""
+
+    def setUp(self):
+        cache.clear()
+        self.um, self.dois = CenarioBarbearia('barbearia-um'), CenarioBarbearia('barbearia-dois')
+        self.admin = site._registry[Agendamento]
+        # Mais resultados na outra barbearia do que o limite do índice
+        for cenario, total in ((self.um, busca.LIMITE_RESULTADOS + 10), (self.dois, 2)):
+            Agendamento.objects.bulk_create([
+                Agendamento(
+                    barbearia=cenario.barbearia, servico=cenario.servicos[0], profissional=cenario.profissionais[0],
+                    nome_cliente=f'Maria Silva {indice}', telefone_cliente='(11) 98888-7777',
+                    email_cliente='maria@exemplo.com', data_hora=cenario.horario_livre(),
+                )
+                for indice in range(total)
+            ])
+
+    def buscar(self, usuario, termo, queryset=None, **filtros):
+        request = RequestFactory().get('/admin/agendamentos/agendamento/', filtros)
+        request.user = usuario
+        # `queryset`: o que os filtros laterais do changelist já deixaram
+        queryset, _ = self.admin.get_search_results(request, queryset or self.admin.get_queryset(request), termo)
+        return queryset
+
+    def test_dono_encontra_os_seus(self):
+        self.assertTrue(busca.fts_disponivel(connection.alias))
+        self.assertEqual(self.buscar(self.dois.dono, 'silva').count(), 2)
+
+    def test_superusuario_com_filtro_de_barbearia(self):
+        raiz = User.objects.create_superuser('raiz', 'raiz@exemplo.com', 'senha-raiz-123')
+        self.assertEqual(self.buscar(raiz, 'silva').count(), busca.LIMITE_RESULTADOS)
+        self.assertEqual(self.buscar(raiz, 'silva', barbearia__id__exact=self.dois.barbearia.id).count(), 2)
+
+    def test_filtros_antes_do_limite(self):
+        # Menos relevante que os LIMITE_RESULTADOS + 10 "Maria Silva": o sobrenome só aparece nas observações
+        cancelado, = Agendamento.objects.bulk_create([Agendamento(
+            barbearia=self.um.barbearia, servico=self.um.servicos[0], profissional=self.um.profissionais[1],
+            nome_cliente='Pedro Souza', telefone_cliente='(11) 95555-4444', email_cliente='pedro@exemplo.com',
+            observacoes='Indicado pela Maria Silva', data_hora=self.um.horario_livre(), status='cancelado',
+        )])
+        queryset = Agendamento.objects.filter(barbearia=self.um.barbearia, status='cancelado')
+        self.assertEqual(list(busca.filtrar(queryset, 'silva', self.um.barbearia.id)), [cancelado])
+        raiz = User.objects.create_superuser('raiz', 'raiz@exemplo.com', 'senha-raiz-123')
+        self.assertEqual(list(self.buscar(raiz, 'silva', Agendamento.objects.filter(status='cancelado'))), [cancelado])
+
+        self.client.force_login(self.um.dono)
+        url = reverse('barbearias:admin_agendamentos_lista', kwargs={'slug': self.um.barbearia.slug})
+        for filtros in ({'status': 'cancelado'}, {'profissional': self.um.profissionais[1].id}):
+            response = self.client.get(url, {'q': 'silva', **filtros})
+            self.assertEqual(list(response.context['agendamentos']), [cancelado])
+
+
+class BrokerEventosTest(SimpleTestCase):
+    """Arquivo de eventos compartilhado entre os workers"""
+
+    def setUp(self):
+        self.diretorio = self.enterContext(tempfile.TemporaryDirectory())
+        self.caminho = os.path.join(self.diretorio, ARQUIVO_EVENTOS)
+
+    def linhas(self, caminho):
+        with open(caminho, encoding='utf-8') as arquivo:
+            return [json.loads(linha) for linha in arquivo]
+
+    def test_rotacao_concorrente_nao_perde_eventos(self):
+        # Arquivo já acima do limite: só o primeiro worker a escrever rotaciona
+        antigo = {'id': 'antigo', 'tipo': 'agendamento_criado', 'barbearia_id': 1, 'dados': {'nome_cliente': 'x' * 10000}}
+        with open(self.caminho, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(json.dumps(antigo) + '\n')
+        total = 40
+        barreira = threading.Barrier(total)
+
+        def publicar(indice):
+            # Um broker por thread, como em processos diferentes
+            broker = BrokerLocal(self.diretorio)
+            barreira.wait()
+            broker.publicar(1, 'agendamento_criado', {'indice': indice})
+
+        substituir = os.replace
+
+        def replace_lento(*args):
+            # Alarga a janela entre conferir o tamanho e rotacionar
+            relogio.sleep(0.05)
+            substituir(*args)
+
+        with mock.patch('agendamentos.eventos.TAMANHO_MAXIMO_ARQUIVO', 10000), \
+                mock.patch('agendamentos.eventos.os.replace', side_effect=replace_lento):
+            threads = [threading.Thread(target=publicar, args=(indice,)) for indice in range(total)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(self.linhas(self.caminho + '.1'), [antigo])
+        publicados = self.linhas(self.caminho)
+        self.assertEqual(sorted(evento['dados']['indice'] for evento in publicados), list(range(total)))
+
+    async def test_evento_de_outro_worker_chega_pelo_arquivo(self):
+        assinante, outro_worker = BrokerLocal(self.diretorio, intervalo=0.01), BrokerLocal(self.diretorio)
+        fila = assinante.assinar(1)
+        try:
+            # O observador começa do fim do arquivo: espera ele abrir antes de publicar
+            await asyncio.sleep(0.1)
+            with mock.patch('agendamentos.eventos.TAMANHO_MAXIMO_ARQUIVO', 1):
+                for indice in range(3):
+                    # Cada publicação rotaciona o arquivo da anterior
+                    outro_worker.publicar(2, 'agendamento_criado', {'indice': -1})
+                    outro_worker.publicar(1, 'agendamento_criado', {'indice': indice})
+                    await asyncio.sleep(0.1)
+            recebidos = [await asyncio.wait_for(fila.get(), 1) for _ in range(3)]
+        finally:
+            assinante.cancelar(1, fila)
+        self.assertEqual([evento['dados']['indice'] for evento in recebidos], [0, 1, 2])
+        self.assertTrue(fila.empty())
+
+    async def test_fila_cheia_descarta_o_mais_antigo(self):
+        broker = BrokerLocal()
+        fila = broker.assinar(1)
+        for indice in range(TAMANHO_FILA + 5):
+            broker.publicar(1, 'status_alterado', {'indice': indice})
+        # As entregas são agendadas no event loop
+        await asyncio.sleep(0)
+        broker.cancelar(1, fila)
+        self.assertEqual(fila.qsize(), TAMANHO_FILA)
+        self.assertEqual(fila.get_nowait()['dados']['indice'], 5)
+        broker.publicar(1, 'status_alterado', {'indice': 'depois'})
+        await asyncio.sleep(0)
+        self.assertEqual(fila.qsize(), TAMANHO_FILA - 1)
+
+
+class BackendLimitado(EmailBackend):
+    """Backend de teste que recusa os primeiros envios com os códigos em `recusas`"""
+    recusas = []
+
+    def send_messages(self, mensagens):
+        try:
+            codigo = BackendLimitado.recusas.pop(0)
+        except IndexError:
+            return super().send_messages(mensagens)
+        raise smtplib.SMTPResponseException(codigo, b'Limite de envios')
+
+
+@override_settings(METRICAS_DIR=None, EMAIL_BACKEND='agendamentos.tests.BackendLimitado')
+class EntregaSMTPTest(SimpleTestCase):
+    """Redução pela metade da concorrência nas recusas temporárias e subida aos poucos"""
+
+    def test_regulador_reduz_e_recupera(self):
+        regulador = Regulador(8, espera_inicial=0.01, sucessos_para_subir=2)
+        for limite, espera in ((4, 0.02), (2, 0.04), (1, 0.08), (1, 0.16)):
+            regulador.entrar()
+            regulador.sair(limitado=True)
+            self.assertEqual((regulador.limite, regulador.espera), (limite, espera))
+        self.assertGreater(regulador.pausa_ate, relogio.monotonic())
+
+        for limite in (1, 2, 2, 3):
+            regulador.entrar()
+            regulador.sair()
+            self.assertEqual(regulador.limite, limite)
+        self.assertEqual(regulador.espera, 0.01)
+        self.assertEqual(regulador.limitacoes, 4)
+
+    def test_lote_com_recusas_421_e_451(self):
+        BackendLimitado.recusas = [421, 451]
+        mail.outbox = []
+        regulador = Regulador(4, espera_inicial=0.01)
+        mensagens = [(indice, EmailMessage('Assunto', 'Corpo', to=[f'{indice}@exemplo.com'])) for indice in range(6)]
+
+        resultados = entregar_em_lote(mensagens, workers=4, regulador=regulador)
+
+        self.assertEqual(sorted(resultados, key=lambda item: item[0]), [(indice, None) for indice in range(6)])
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertEqual(regulador.limitacoes, 2)
+        self.assertEqual(regulador.limite, 1)
+
+    def test_erro_permanente_nao_repete(self):
+        BackendLimitado.recusas = [550]
+        mail.outbox = []
+        regulador = Regulador(1, espera_inicial=0.01)
+        resultados = entregar_em_lote([('a', EmailMessage('Assunto', 'Corpo', to=['a@exemplo.com']))], regulador=regulador)
+
+        self.assertEqual(resultados[0][1].smtp_code, 550)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual((regulador.limitacoes, regulador.limite), (0, 1))
+
+
+class MascarasDisponibilidadeTest(SimpleTestCase):
+    """Bits da máscara de Agendamento._gerar_mascaras: faixa i livre a partir do início do dia"""
+
+    def test_bits_das_faixas_livres(self):
+        fuso = datas.fuso('America/Sao_Paulo')
+        data = datas.hoje(fuso) + timedelta(days=2)
+
+        def hora(h, m=0):
+            return datas.combinar(data, time(h, m), fuso)
+
+        abertos = {
+            # Fecha para o almoço das 12h às 13h
+            (1, data): [(hora(8), hora(12)), (hora(13), hora(15))],
+            # Dia inteiro ocupado: fica fora do resumo
+            (2, data): [(hora(8), hora(9))],
+            (3, data): [],
+        }
+        ocupacoes = [(1, hora(9), 60), (1, hora(14, 30), 30), (2, hora(8), 60)]
+
+        resumo = Agendamento._gerar_mascaras(abertos, ocupacoes, 30)
+
+        # Faixas de 30 minutos a partir das 8h: 9h-10h ocupado, 12h-13h fechado, 14h30 ocupado
+        livres = [0, 1, 4, 5, 6, 7, 10, 11, 12]
+        self.assertEqual(resumo, {1: {data.isoformat(): [hora(8).isoformat(), format(sum(1 << bit for bit in livres), 'x')]}})
+
+    def test_faixas_passadas_ficam_ocupadas(self):
+        inicio = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
+        data = inicio.date()
+
+        resumo = Agendamento._gerar_mascaras({(1, data): [(inicio, inicio + timedelta(hours=3))]}, [], 30)
+
+        inicio_resumo, mascara = resumo[1][data.isoformat()]
+        self.assertEqual(inicio_resumo, inicio.isoformat())
+        mascara = int(mascara, 16)
+        # As duas primeiras faixas já começaram; a última, daqui a mais de uma hora, está livre
+        self.assertEqual(mascara & 0b11, 0)
+        self.assertTrue(mascara & (1 << 5))
+
+
+@override_settings(LIMITES_TAXA={}, METRICAS_DIR=None, CAPTURA_TRAFEGO=False, LISTA_ESPERA_AVISOS_POR_VAGA=3)
+class ListaEsperaTest(TestCase):
+    """Entradas da lista de espera escolhidas para a vaga aberta por um cancelamento"""
+
+    def setUp(self):
+        cache.clear()
+        self.cenario = CenarioBarbearia()
+        ListaEspera.objects.filter(barbearia=self.cenario.barbearia).delete()
+        self.dia = self.cenario.hoje + timedelta(days=2)
+        # Vaga de 30 minutos com a Ana, às 10h
+        self.vaga = Agendamento(
+            barbearia=self.cenario.barbearia, servico=self.cenario.servicos[0], profissional=self.cenario.profissionais[0],
+            data_hora=datas.combinar(self.dia, time(10), self.cenario.fuso),
+        )
+
+    def entrada(self, nome, cenario=None, **campos):
+        cenario = cenario or self.cenario
+        valores = {
+            'barbearia': cenario.barbearia, 'servico': cenario.servicos[0], 'nome_cliente': nome,
+            'telefone_cliente': '(11) 97777-6666', 'email_cliente': 'espera@exemplo.com',
+            'data_inicio': self.dia, 'data_fim': self.dia, 'hora_inicio': time(9), 'hora_fim': time(11),
+        }
+        valores.update(campos)
+        return ListaEspera.objects.create(**valores)
+
+    def test_escolhe_quem_cabe_na_vaga(self):
+        self.entrada('Qualquer profissional')
+        self.entrada('Com a Ana', profissional=self.cenario.profissionais[0])
+        self.entrada('Barba, também 30 minutos', servico=self.cenario.servicos[1])
+        self.entrada('Com o Bruno', profissional=self.cenario.profissionais[1])
+        self.entrada('Só à tarde', hora_inicio=time(14), hora_fim=time(18))
+        self.entrada('Até as 10h15', hora_fim=time(10, 15))
+        self.entrada('Serviço de 60 minutos', servico=self.cenario.servicos[2])
+        self.entrada('Outro dia', data_inicio=self.dia + timedelta(days=1), data_fim=self.dia + timedelta(days=5))
+        self.entrada('Desistiu', ativa=False)
+        self.entrada('Outra barbearia', cenario=CenarioBarbearia('outra-barbearia'))
+
+        nomes = [entrada.nome_cliente for entrada in candidatos(self.vaga, limite=10)]
+        self.assertEqual(nomes, ['Qualquer profissional', 'Com a Ana', 'Barba, também 30 minutos'])
+
+    def test_quem_nunca_foi_avisado_vem_primeiro(self):
+        avisado = self.entrada('Já avisado')
+        ListaEspera.objects.filter(pk=avisado.pk).update(avisos=1, ultimo_aviso=timezone.now())
+        for indice in range(3):
+            self.entrada(f'Na fila {indice}')
+
+        nomes = [entrada.nome_cliente for entrada in candidatos(self.vaga)]
+        self.assertEqual(nomes, ['Na fila 0', 'Na fila 1', 'Na fila 2'])
+        self.assertEqual([entrada.nome_cliente for entrada in candidatos(self.vaga, limite=4)][-1], 'Já avisado')
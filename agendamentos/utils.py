@@ -1,6 +1,8 @@
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.conf import settings
+from django.utils import timezone
+from barbearias import datas, metricas
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,8 +18,11 @@ def enviar_notificacao_novo_agendamento(agendamento):
         return False
     
     try:
+        fuso = datas.fuso(agendamento.barbearia)
+        data_hora = datas.local(agendamento.data_hora, fuso)
+
         # Assunto do email
-        assunto = f'🆕 Novo Agendamento - {agendamento.nome_cliente} ({agendamento.data_hora.strftime("%d/%m/%Y %H:%M")})'
+        assunto = f'🆕 Novo Agendamento - {agendamento.nome_cliente} ({data_hora.strftime("%d/%m/%Y %H:%M")})'
         
         # Mensagem em texto simples
         mensagem_texto = f"""
@@ -27,8 +32,8 @@ Cliente: {agendamento.nome_cliente}
 Telefone: {agendamento.telefone_cliente}
 Email: {agendamento.email_cliente}
 
-Data: {agendamento.data_hora.strftime('%d/%m/%Y')}
-Horário: {agendamento.data_hora.strftime('%H:%M')}
+Data: {data_hora.strftime('%d/%m/%Y')}
+Horário: {data_hora.strftime('%H:%M')}
 Serviço: {agendamento.servico.nome}
 Profissional: {agendamento.profissional.nome}
 Valor: R$ {agendamento.servico.preco}
@@ -38,7 +43,7 @@ Duração: {agendamento.servico.duracao_minutos} minutos
 
 ID do Agendamento: #{agendamento.id}
 Status: {agendamento.get_status_display()}
-Agendamento realizado em: {agendamento.criado_em.strftime('%d/%m/%Y %H:%M')}
+Agendamento realizado em: {datas.local(agendamento.criado_em, fuso).strftime('%d/%m/%Y %H:%M')}
 
 ---
 {agendamento.barbearia.nome}
@@ -46,16 +51,17 @@ Sistema de Agendamento
 """
         
         # Calcular se é hoje ou amanhã para o template
-        from datetime import date, timedelta
-        hoje = date.today()
+        from datetime import timedelta
+        hoje = datas.hoje(fuso)
         amanha = hoje + timedelta(days=1)
         
-        # Renderizar template HTML
-        mensagem_html = render_to_string('emails/novo_agendamento.html', {
-            'agendamento': agendamento,
-            'hoje': hoje,
-            'amanha': amanha
-        })
+        # Renderizar template HTML (filtros de data no fuso da barbearia)
+        with timezone.override(fuso):
+            mensagem_html = render_to_string('emails/novo_agendamento.html', {
+                'agendamento': agendamento,
+                'hoje': hoje,
+                'amanha': amanha
+            })
         
         # Criar email com versão HTML e texto
         email = EmailMultiAlternatives(
@@ -65,12 +71,15 @@ Sistema de Agendamento
             to=[agendamento.barbearia.email_notificacoes]
         )
         email.attach_alternative(mensagem_html, "text/html")
-        email.send()
+        with metricas.EMAIL_ENVIO_SEGUNDOS.medir(tipo='novo_agendamento'):
+            email.send()
+        metricas.EMAILS.inc(tipo='novo_agendamento', resultado='enviado')
         
         logger.info(f"Notificação de novo agendamento enviada para {agendamento.barbearia.email_notificacoes}")
         return True
         
     except Exception as e:
+        metricas.EMAILS.inc(tipo='novo_agendamento', resultado='erro')
         logger.error(f"Erro ao enviar notificação de novo agendamento: {str(e)}")
         return False
 
@@ -84,8 +93,10 @@ def enviar_notificacao_cancelamento(agendamento, motivo=""):
         return False
     
     try:
+        data_hora = datas.local(agendamento.data_hora, datas.fuso(agendamento.barbearia))
+
         # Assunto do email
-        assunto = f'❌ Agendamento Cancelado - {agendamento.nome_cliente} ({agendamento.data_hora.strftime("%d/%m/%Y %H:%M")})'
+        assunto = f'❌ Agendamento Cancelado - {agendamento.nome_cliente} ({data_hora.strftime("%d/%m/%Y %H:%M")})'
         
         # Mensagem em texto simples
         mensagem_texto = f"""
@@ -94,8 +105,8 @@ AGENDAMENTO CANCELADO
 Cliente: {agendamento.nome_cliente}
 Telefone: {agendamento.telefone_cliente}
 
-Data: {agendamento.data_hora.strftime('%d/%m/%Y')}
-Horário: {agendamento.data_hora.strftime('%H:%M')}
+Data: {data_hora.strftime('%d/%m/%Y')}
+Horário: {data_hora.strftime('%H:%M')}
 Serviço: {agendamento.servico.nome}
 Profissional: {agendamento.profissional.nome}
 
@@ -115,11 +126,83 @@ Sistema de Agendamento
             from_email=settings.DEFAULT_FROM_EMAIL,
             to=[agendamento.barbearia.email_notificacoes]
         )
-        email.send()
+        with metricas.EMAIL_ENVIO_SEGUNDOS.medir(tipo='cancelamento'):
+            email.send()
+        metricas.EMAILS.inc(tipo='cancelamento', resultado='enviado')
         
         logger.info(f"Notificação de cancelamento enviada para {agendamento.barbearia.email_notificacoes}")
         return True
         
     except Exception as e:
+        metricas.EMAILS.inc(tipo='cancelamento', resultado='erro')
         logger.error(f"Erro ao enviar notificação de cancelamento: {str(e)}")
-        return False
\ No newline at end of file
+        return False
+
+def notificar_novo_agendamento(agendamento):
+    """
+    Notifica o estabelecimento sobre um novo agendamento: envia na hora ou
+    acumula para o resumo, conforme o modo de notificação da barbearia
+    """
+    if agendamento.barbearia.modo_notificacao == 'imediato':
+        return enviar_notificacao_novo_agendamento(agendamento)
+
+    from .models import NotificacaoPendente
+    NotificacaoPendente.objects.create(barbearia=agendamento.barbearia, agendamento=agendamento, tipo='novo')
+    return True
+
+
+def notificar_cancelamento(agendamento, motivo=""):
+    """Mesma lógica de notificar_novo_agendamento para cancelamentos"""
+    if agendamento.barbearia.modo_notificacao == 'imediato':
+        return enviar_notificacao_cancelamento(agendamento, motivo)
+
+    from .models import NotificacaoPendente
+    NotificacaoPendente.objects.create(barbearia=agendamento.barbearia, agendamento=agendamento, tipo='cancelamento', motivo=motivo)
+    return True
+
+
+def montar_email_resumo(barbearia, pendentes):
+    """
+    Monta um único email com todos os eventos pendentes da barbearia
+    (o template é renderizado uma vez por resumo)
+    """
+    novos = [p.agendamento for p in pendentes if p.tipo == 'novo']
+    cancelamentos = [(p.agendamento, p.motivo) for p in pendentes if p.tipo == 'cancelamento']
+
+    fuso = datas.fuso(barbearia)
+    assunto = f'📋 Resumo de Agendamentos - {len(novos)} novo(s), {len(cancelamentos)} cancelamento(s)'
+
+    linhas = ['RESUMO DE AGENDAMENTOS', '']
+    if novos:
+        linhas.append('NOVOS AGENDAMENTOS:')
+        for agendamento in novos:
+            linhas.append(
+                f"- {datas.local(agendamento.data_hora, fuso).strftime('%d/%m/%Y %H:%M')} | {agendamento.nome_cliente} "
+                f"({agendamento.telefone_cliente}) | {agendamento.servico.nome} com {agendamento.profissional.nome}"
+            )
+        linhas.append('')
+    if cancelamentos:
+        linhas.append('CANCELAMENTOS:')
+        for agendamento, motivo in cancelamentos:
+            linhas.append(
+                f"- {datas.local(agendamento.data_hora, fuso).strftime('%d/%m/%Y %H:%M')} | {agendamento.nome_cliente} "
+                f"| {agendamento.servico.nome}{f' | Motivo: {motivo}' if motivo else ''}"
+            )
+        linhas.append('')
+    linhas += ['---', barbearia.nome, 'Sistema de Agendamento']
+
+    with timezone.override(fuso):
+        mensagem_html = render_to_string('emails/resumo_agendamentos.html', {
+            'barbearia': barbearia,
+            'novos': novos,
+            'cancelamentos': cancelamentos,
+        })
+
+    email = EmailMultiAlternatives(
+        subject=assunto,
+        body='\n'.join(linhas),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[barbearia.email_notificacoes]
+    )
+    email.attach_alternative(mensagem_html, "text/html")
+    return email
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,12 +44,18 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'barbearias.middleware.CapturaMiddleware',
+    'barbearias.middleware.SessaoMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'barbearias.middleware.ShardMiddleware',
+    'barbearias.middleware.LimiteTaxaMiddleware',
+    'barbearias.middleware.FusoHorarioMiddleware',
+    'barbearias.middleware.ReplicaLeituraMiddleware',
+    'barbearias.middleware.PerfilMiddleware',
 ]
 
 ROOT_URLCONF = 'barbearia_system.urls'
@@ -63,6 +70,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'barbearias.context_processors.eventos_agenda',
             ],
         },
     },
@@ -70,6 +78,24 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'barbearia_system.wsgi.application'
 
+# Sessões (veja barbearias/sessoes.py): o painel lê a sessão do cache, as mensagens
+# ficam em cookies assinados e as rotas abaixo nem carregam sessão. Com mais de um
+# worker, o cache 'default' precisa ser compartilhado (veja CACHES) para o logout
+# valer em todos eles
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+ROTAS_SEM_SESSAO = {
+    'mini_site',
+    'api_horarios_disponiveis',
+    'api_dias_fechados',
+    'api_bootstrap',
+    'api_criar_reserva',
+    'api_liberar_reserva',
+    'api_lista_espera',
+    'api_criar_agendamento',
+    'api_agendamento',
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -78,9 +104,76 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Réplica de leitura para as rotas públicas (veja REPLICA_BANCO.md). Para testar
+    # localmente, descomente e rode: python manage.py sincronizar_replica --intervalo 5
+    # 'replica': {
+    #     'ENGINE': 'django.db.backends.sqlite3',
+    #     'NAME': BASE_DIR / 'db-replica.sqlite3',
+    #     'TEST': {'MIRROR': 'default'},
+    # },
+    # Shards para os dados das barbearias (veja SHARDS.md). Crie o esquema com
+    # python manage.py migrate --database shard1
+    # 'shard1': {
+    #     'ENGINE': 'django.db.backends.sqlite3',
+    #     'NAME': BASE_DIR / 'db-shard1.sqlite3',
+    # },
 }
 
+# Cache
+# O 'default' guarda as versões da agenda compilada e do catálogo (trocadas a cada
+# alteração de horário, serviço ou profissional), as contagens do LimiteTaxaMiddleware, o
+# diretório de shards e as sessões do painel. Com mais de um processo ele precisa ser
+# compartilhado, senão uma alteração feita em um worker não chega aos outros e cada um
+# aplica o próprio limite: defina REDIS_URL (ex: redis://127.0.0.1:6379/1, requer
+# pip install redis). Sem ela, o LocMemCache serve só para um worker; a app barbearias
+# recusa subir com ele se WEB_CONCURRENCY (lido pelo gunicorn e pelo uvicorn) passar de 1
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+SERVIDOR_WORKERS = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+DATABASE_ROUTERS = ['barbearias.shards.RoteadorShards', 'barbearias.replica.RoteadorReplica']
+
+# Alias em DATABASES usado nas leituras públicas; None envia tudo para o 'default'
+BANCO_REPLICA = 'replica'
+
+# Rotas (nome da URL -> métodos) cujas leituras podem ir para a réplica
+ROTAS_REPLICA = {
+    'mini_site': ['GET'],
+    'api_horarios_disponiveis': ['GET'],
+    'api_dias_fechados': ['GET'],
+    'api_bootstrap': ['GET'],
+    'consultar_agendamentos_local': ['GET', 'POST'],
+}
+
+# Depois de uma escrita, o cliente lê do banco principal por este tempo (read-your-writes)
+REPLICA_ADERENCIA_SEGUNDOS = 10
+
+# Perfil sob demanda (veja PERFIL_REQUISICOES.md): validade do token do cabeçalho
+# X-Perfil, máximo de consultas SQL guardadas por requisição e se os parâmetros
+# delas (nomes, telefones e e-mails de clientes) também são guardados
+PERFIL_TOKEN_VALIDADE = 15 * 60
+PERFIL_MAX_CONSULTAS = 1000
+PERFIL_PARAMETROS_SQL = False
+
+# Métricas do /metrics (veja METRICAS.md): cada processo grava os seus números nesta
+# pasta para o endpoint somar todos os workers e comandos. None mantém só em memória
+METRICAS_DIR = BASE_DIR / 'metricas'
+METRICAS_INTERVALO_GRAVACAO = 1.0
+# O /metrics responde 404 a menos que a requisição traga "Authorization: Bearer <token>"
+# com este token ou venha de um dos IPs permitidos (REMOTE_ADDR, ex: o Prometheus na rede interna)
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN')
+METRICAS_IPS_PERMITIDOS = []
+
+# Captura de tráfego para o replay_trafego (veja REPLAY_TRAFEGO.md). Desligada, o
+# middleware nem é carregado; CAPTURA_AMOSTRAGEM é a fração das requisições gravadas
+CAPTURA_TRAFEGO = False
+CAPTURA_ARQUIVO = BASE_DIR / 'captura' / 'trafego.jsonl'
+CAPTURA_AMOSTRAGEM = 1.0
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -117,6 +210,14 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATICFILES_DIRS = [BASE_DIR / 'static']
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Arquivos com hash no nome + versões .gz/.br (veja ARQUIVOS_ESTATICOS.md)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'barbearia_system.storage.ArmazenamentoEstaticoComprimido'},
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -140,3 +241,46 @@ EMAIL_HOST_USER = 'menulybusiness@gmail.com'  # Seu email Gmail
 EMAIL_HOST_PASSWORD = 'tpnoprhrpqlozwtz'  # VOCÊ PRECISA COLOCAR SUA SENHA DE APP AQUI
 
 DEFAULT_FROM_EMAIL = 'Sistema de Agendamento <noreply@agendamento.com>'
+
+# Conexões SMTP simultâneas usadas pelos comandos de envio em lote
+NOTIFICACOES_SMTP_WORKERS = 4
+
+# Eventos em tempo real da agenda (Server-Sent Events no painel administrativo)
+# Exigem o servidor ASGI (uvicorn barbearia_system.asgi); sob WSGI o endpoint responde 501
+# e o painel não abre o stream
+# Diretório compartilhado entre os workers do servidor; use None para manter
+# os eventos apenas dentro do processo atual
+EVENTOS_AGENDA_DIR = BASE_DIR / '.eventos'
+EVENTOS_AGENDA_HEARTBEAT = 15  # Segundos entre comentários de keep-alive
+
+# Minutos que um horário fica segurado depois que o cliente o seleciona
+RESERVA_TEMPORARIA_MINUTOS = 5
+
+# Horas em que um reenvio do mesmo agendamento (mesma chave de idempotência) devolve o original
+IDEMPOTENCIA_HORAS = 24
+
+# Quantos clientes da lista de espera são avisados a cada vaga aberta por cancelamento
+LISTA_ESPERA_AVISOS_POR_VAGA = 3
+
+# Limite de requisições nas rotas públicas (por IP e barbearia)
+# taxa: requisições por minuto | capacidade: tamanho máximo da rajada, liberada a cada
+# janela de capacidade / taxa minutos
+LIMITES_TAXA = {
+    'agendar': {'taxa': 10, 'capacidade': 5, 'metodos': ['POST']},
+    'consultar_agendamentos_local': {'taxa': 20, 'capacidade': 10, 'metodos': ['POST']},
+    'cancelar_agendamento_cliente': {'taxa': 10, 'capacidade': 5, 'metodos': ['POST']},
+    'api_horarios_disponiveis': {'taxa': 120, 'capacidade': 30, 'metodos': ['GET']},
+    'api_dias_fechados': {'taxa': 60, 'capacidade': 20, 'metodos': ['GET']},
+    'api_bootstrap': {'taxa': 60, 'capacidade': 20, 'metodos': ['GET']},
+    'api_criar_reserva': {'taxa': 30, 'capacidade': 10, 'metodos': ['POST']},
+    'api_liberar_reserva': {'taxa': 30, 'capacidade': 10, 'metodos': ['DELETE']},
+    'api_lista_espera': {'taxa': 10, 'capacidade': 5, 'metodos': ['POST']},
+    'api_criar_agendamento': {'taxa': 10, 'capacidade': 5, 'metodos': ['POST']},
+    'api_agendamento': {'taxa': 20, 'capacidade': 10, 'metodos': ['GET']},
+}
+LIMITES_TAXA_CACHE = 'default'
+# Atrás de um proxy reverso, use o cabeçalho com o IP real (ex: 'HTTP_X_FORWARDED_FOR')
+LIMITES_TAXA_CABECALHO_IP = None
+# Proxies à frente do servidor que acrescentam o endereço ao cabeçalho: o IP do cliente é
+# o N-ésimo a partir da direita (os da esquerda podem ter sido forjados pelo cliente)
+LIMITES_TAXA_PROXIES_CONFIAVEIS = 1
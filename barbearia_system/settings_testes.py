@@ -0,0 +1,23 @@
+"""
+Settings dos testes automatizados: os de produção mais um shard e uma réplica extras.
+
+O manage.py usa este módulo no comando test; outros executores (pytest-django,
+coverage etc.) devem apontar DJANGO_SETTINGS_MODULE para ele.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES
+
+# Exercitam o roteamento por barbearia, o mover_barbearia e as leituras na réplica; só
+# as classes que os pedem os criam (SQLite em memória). A réplica é um banco à parte
+# (sem MIRROR), que faz o papel de uma réplica atrasada
+DATABASES = {
+    **DATABASES,
+    'shard_teste': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db-shard-teste.sqlite3',
+    },
+    'replica_teste': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db-replica-teste.sqlite3',
+    },
+}
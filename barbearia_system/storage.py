@@ -0,0 +1,63 @@
+"""
+Armazenamento dos arquivos estáticos.
+
+Nomes com hash do conteúdo (ManifestStaticFilesStorage), para que o servidor web
+possa mandar cabeçalhos de cache de um ano, e versões pré-comprimidas .gz e .br ao
+lado de cada arquivo, servidas direto pelo nginx (gzip_static / brotli_static).
+
+O collectstatic recusa publicar sem o CSS gerado pelo compilar_css, e um arquivo fora
+do manifesto é erro (manifest_strict do Django), em vez de ser servido sem hash.
+"""
+import gzip
+import logging
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli é opcional
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+FOLHA_DE_ESTILOS = 'css/app.css'
+EXTENSOES_COMPRIMIVEIS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map', '.xml')
+
+
+class ArmazenamentoEstaticoComprimido(ManifestStaticFilesStorage):
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run and FOLHA_DE_ESTILOS not in paths:
+            raise ValueError(
+                f"'{FOLHA_DE_ESTILOS}' não foi gerado. Rode 'python manage.py compilar_css' antes do collectstatic."
+            )
+        gerados = []
+        for nome, nome_hash, processado in super().post_process(paths, dry_run, **options):
+            yield nome, nome_hash, processado
+            if nome_hash and not isinstance(processado, Exception):
+                gerados.append(nome_hash)
+
+        if dry_run:
+            return
+        if brotli is None:
+            logger.warning("Pacote 'brotli' não instalado: apenas as versões .gz serão geradas")
+        for nome in gerados:
+            if nome.endswith(EXTENSOES_COMPRIMIVEIS):
+                self._comprimir(nome)
+
+    def _comprimir(self, nome):
+        with self.open(nome) as arquivo:
+            conteudo = arquivo.read()
+
+        # mtime=0 deixa o .gz idêntico entre builds com o mesmo conteúdo
+        variantes = [('.gz', gzip.compress(conteudo, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variantes.append(('.br', brotli.compress(conteudo, quality=11)))
+
+        for extensao, comprimido in variantes:
+            if len(comprimido) >= len(conteudo):
+                continue
+            if self.exists(nome + extensao):
+                self.delete(nome + extensao)
+            self._save(nome + extensao, ContentFile(comprimido))
@@ -16,10 +16,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from barbearias.views import consultar_agendamentos
+from barbearias.views import consultar_agendamentos, metricas_prometheus
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('consultar-agendamentos/', consultar_agendamentos, name='consultar_agendamentos'),
+    path('metrics', metricas_prometheus, name='metricas'),
     path('', include('barbearias.urls')),
 ]
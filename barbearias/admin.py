@@ -1,5 +1,17 @@
-from django.contrib import admin
-from .models import Barbearia, Servico, Profissional, HorarioFuncionamento
+import json
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from .agenda import invalidar_agenda
+from .middleware import ShardMiddleware
+from .models import DiretorioBarbearia, PerfilRequisicao, Barbearia, Servico, Profissional, HorarioFuncionamento, ExcecaoFuncionamento, IntervaloProfissional, BloqueioProfissional
+from .models import DiaModeloHorario, ModeloHorario
 
 @admin.register(Barbearia)
 class BarbeariaAdmin(admin.ModelAdmin):
@@ -24,4 +36,138 @@ class ProfissionalAdmin(admin.ModelAdmin):
 class HorarioFuncionamentoAdmin(admin.ModelAdmin):
     list_display = ['barbearia', 'dia_semana', 'abertura', 'fechamento', 'fechado']
     list_filter = ['barbearia', 'dia_semana', 'fechado']
-    search_fields = ['barbearia__nome']
\ No newline at end of file
+    search_fields = ['barbearia__nome']
+
+@admin.register(ExcecaoFuncionamento)
+class ExcecaoFuncionamentoAdmin(admin.ModelAdmin):
+    list_display = ['barbearia', 'data', 'tipo', 'abertura', 'fechamento', 'descricao']
+    list_filter = ['barbearia', 'tipo']
+    search_fields = ['barbearia__nome', 'descricao']
+    date_hierarchy = 'data'
+
+class DiaModeloHorarioInline(admin.TabularInline):
+    model = DiaModeloHorario
+    extra = 0
+
+@admin.register(ModeloHorario)
+class ModeloHorarioAdmin(admin.ModelAdmin):
+    list_display = ['nome', 'barbearia', 'data_inicio', 'data_fim', 'semanas', 'ativo']
+    list_filter = ['barbearia', 'ativo']
+    search_fields = ['nome', 'barbearia__nome']
+    inlines = [DiaModeloHorarioInline]
+
+    # Os modelos não têm sinais (o editor da barbearia invalida só as datas do período)
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        invalidar_agenda(form.instance.barbearia_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidar_agenda(obj.barbearia_id)
+
+    def delete_queryset(self, request, queryset):
+        barbearia_ids = set(queryset.values_list('barbearia_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for barbearia_id in barbearia_ids:
+            invalidar_agenda(barbearia_id)
+
+@admin.register(IntervaloProfissional)
+class IntervaloProfissionalAdmin(admin.ModelAdmin):
+    list_display = ['profissional', 'dia_semana', 'inicio', 'fim']
+    list_filter = ['profissional__barbearia', 'dia_semana']
+    search_fields = ['profissional__nome']
+
+@admin.register(BloqueioProfissional)
+class BloqueioProfissionalAdmin(admin.ModelAdmin):
+    list_display = ['profissional', 'inicio', 'fim', 'motivo']
+    list_filter = ['profissional__barbearia']
+    search_fields = ['profissional__nome', 'motivo']
+    date_hierarchy = 'inicio'
+
+
+@admin.register(DiretorioBarbearia)
+class DiretorioBarbeariaAdmin(admin.ModelAdmin):
+    list_display = ['slug', 'banco', 'somente_leitura', 'atualizado_em']
+    list_filter = ['banco', 'somente_leitura']
+    search_fields = ['slug']
+    readonly_fields = ['slug', 'banco', 'atualizado_em']
+    actions = ['administrar_shard', 'voltar_ao_principal']
+
+    def has_add_permission(self, request):
+        # As entradas nascem com a barbearia; a troca de banco é feita pelo comando mover_barbearia
+        return False
+
+    @admin.action(description='Administrar o banco (shard) destes estabelecimentos')
+    def administrar_shard(self, request, queryset):
+        bancos = set(queryset.values_list('banco', flat=True))
+        if len(bancos) != 1:
+            self.message_user(request, 'Selecione estabelecimentos de um único banco.', messages.ERROR)
+            return
+        banco = bancos.pop()
+        if banco not in settings.DATABASES:
+            self.message_user(request, f'O banco "{banco}" não está configurado.', messages.ERROR)
+            return
+        request.session[ShardMiddleware.CHAVE_SESSAO] = banco
+        self.message_user(request, f'O admin agora mostra os dados do banco "{banco}".', messages.SUCCESS)
+
+    @admin.action(description='Voltar ao banco principal')
+    def voltar_ao_principal(self, request, queryset):
+        request.session.pop(ShardMiddleware.CHAVE_SESSAO, None)
+        self.message_user(request, f'O admin voltou ao banco "{DEFAULT_DB_ALIAS}".', messages.SUCCESS)
+
+
+@admin.register(PerfilRequisicao)
+class PerfilRequisicaoAdmin(admin.ModelAdmin):
+    list_display = ['criado_em', 'metodo', 'caminho', 'status', 'duracao_ms', 'total_consultas', 'tempo_consultas_ms', 'usuario']
+    list_filter = ['rota', 'barbearia_slug', 'metodo']
+    search_fields = ['caminho', 'rota', 'barbearia_slug']
+    list_select_related = ['usuario']
+    date_hierarchy = 'criado_em'
+    fields = [
+        'criado_em', 'usuario', 'metodo', 'caminho', 'rota', 'barbearia_slug', 'status',
+        'duracao_ms', 'total_consultas', 'tempo_consultas_ms', 'download', 'resumo_formatado', 'consultas_formatadas',
+    ]
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    # Os perfis trazem o SQL das requisições de qualquer estabelecimento
+    def has_module_permission(self, request):
+        return request.user.is_active and request.user.is_superuser
+
+    def has_view_permission(self, request, obj=None):
+        return self.has_module_permission(request)
+
+    def has_delete_permission(self, request, obj=None):
+        return self.has_module_permission(request)
+
+    def get_urls(self):
+        urls = [
+            path('<int:perfil_id>/download/', self.admin_site.admin_view(self.baixar_perfil), name='barbearias_perfilrequisicao_download'),
+        ]
+        return urls + super().get_urls()
+
+    def baixar_perfil(self, request, perfil_id):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        registro = get_object_or_404(PerfilRequisicao.objects.only('perfil'), pk=perfil_id)
+        response = HttpResponse(bytes(registro.perfil), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="perfil-{perfil_id}.prof"'
+        return response
+
+    @admin.display(description='Arquivo .prof')
+    def download(self, obj):
+        url = reverse('admin:barbearias_perfilrequisicao_download', args=[obj.pk])
+        return format_html('<a href="{}">Baixar (abra com snakeviz ou python -m pstats)</a>', url)
+
+    @admin.display(description='Resumo (tempo acumulado)')
+    def resumo_formatado(self, obj):
+        return format_html('<pre style="white-space: pre; overflow-x: auto;">{}</pre>', obj.resumo)
+
+    @admin.display(description='Consultas SQL')
+    def consultas_formatadas(self, obj):
+        return format_html('<pre style="white-space: pre-wrap;">{}</pre>', json.dumps(obj.consultas, indent=2, ensure_ascii=False))
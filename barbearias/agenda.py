@@ -0,0 +1,356 @@
+"""
+Compilador da agenda.
+
+Transforma o horário semanal, os modelos de horário por período, as exceções por data
+(fechamentos, feriados e horários especiais), os intervalos recorrentes e os bloqueios
+dos profissionais em listas de intervalos abertos por (profissional, data). O resultado
+fica no cache, versionado por barbearia: qualquer alteração nessas tabelas gera uma
+nova versão. Os editores de horário descartam só as datas que mudaram
+(veja invalidar_datas).
+"""
+import time as relogio
+from datetime import time, timedelta
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+from . import datas as datas_locais
+from .replica import ler_do_principal
+from .models import (
+    Barbearia, BloqueioProfissional, DiaModeloHorario, ExcecaoFuncionamento, HorarioFuncionamento,
+    IntervaloProfissional, Profissional,
+)
+
+# Usado quando o dia da semana ainda não foi configurado pela barbearia
+HORARIO_PADRAO = (time(8, 0), time(18, 0))
+TEMPO_CACHE = 60 * 60 * 24
+# Invalidações por data guardadas junto da versão; passando disso, vira uma versão nova
+MAX_INVALIDACOES = 50
+
+
+# ===== VERSÃO DO CACHE =====
+
+def _chave_versao(barbearia_id):
+    return f'agenda-estado:{barbearia_id}'
+
+
+def obter_versao(barbearia_id):
+    """(versão, invalidações por data) da agenda da barbearia"""
+    estado = cache.get(_chave_versao(barbearia_id))
+    if estado is None:
+        cache.add(_chave_versao(barbearia_id), (relogio.time_ns(), ()), None)
+        estado = cache.get(_chave_versao(barbearia_id))
+    return estado
+
+
+async def aobter_versao(barbearia_id):
+    estado = await cache.aget(_chave_versao(barbearia_id))
+    if estado is None:
+        await cache.aadd(_chave_versao(barbearia_id), (relogio.time_ns(), ()), None)
+        estado = await cache.aget(_chave_versao(barbearia_id))
+    return estado
+
+
+def invalidar_agenda(barbearia_id):
+    """Descarta todas as agendas compiladas da barbearia"""
+    cache.set(_chave_versao(barbearia_id), (relogio.time_ns(), ()), None)
+
+
+def invalidar_datas(barbearia_id, data_inicio=None, data_fim=None, dias_semana=None):
+    """
+    Descarta só as agendas compiladas das datas entre data_inicio e data_fim (None =
+    sem limite), e apenas dos dias da semana informados. As entradas do cache guardam
+    quando foram compiladas; as anteriores a uma invalidação que alcança a sua data
+    são recompiladas na próxima leitura.
+    """
+    agora = relogio.time_ns()
+    versao, invalidacoes = obter_versao(barbearia_id)
+    # Passado o TEMPO_CACHE (com folga para compilações em andamento), nenhuma
+    # entrada anterior à invalidação continua no cache
+    limite = agora - (TEMPO_CACHE + 60) * 10**9
+    recentes = tuple(invalidacao for invalidacao in invalidacoes if invalidacao[0] > limite)
+    if len(recentes) >= MAX_INVALIDACOES:
+        invalidar_agenda(barbearia_id)
+        return
+    dias = frozenset(dias_semana) if dias_semana is not None else None
+    cache.set(_chave_versao(barbearia_id), (versao, recentes + ((agora, data_inicio, data_fim, dias),)), None)
+
+
+def _invalidada(invalidacoes, compilado_em, data):
+    """Se alguma invalidação posterior à compilação alcança a data"""
+    return any(
+        momento > compilado_em
+        and (inicio is None or inicio <= data)
+        and (fim is None or data <= fim)
+        and (dias is None or data.weekday() in dias)
+        for momento, inicio, fim, dias in invalidacoes
+    )
+
+
+def _periodo_invalidado(invalidacoes, compilado_em, data_inicio, data_fim):
+    return bool(invalidacoes) and any(
+        _invalidada(invalidacoes, compilado_em, data) for data in _datas(data_inicio, data_fim)
+    )
+
+
+def _validos(em_cache, chaves, invalidacoes):
+    """{(profissional_id, data): abertos} das entradas do cache que continuam valendo"""
+    resultado = {}
+    for chave, (compilado_em, abertos) in em_cache.items():
+        if not _invalidada(invalidacoes, compilado_em, chaves[chave][1]):
+            resultado[chaves[chave]] = abertos
+    return resultado
+
+
+def _chave_dia(barbearia_id, versao, profissional_id, data):
+    return f'agenda:{barbearia_id}:{versao}:{profissional_id}:{data.isoformat()}'
+
+
+def _chave_fechadas(barbearia_id, versao, data_inicio, data_fim):
+    return f'agenda-fechadas:{barbearia_id}:{versao}:{data_inicio.isoformat()}:{data_fim.isoformat()}'
+
+
+# ===== CONSULTAS =====
+
+def _datas(data_inicio, data_fim):
+    return [data_inicio + timedelta(days=i) for i in range((data_fim - data_inicio).days + 1)]
+
+
+def _consultas_funcionamento(barbearia_id, data_inicio, data_fim):
+    return [
+        HorarioFuncionamento.objects.filter(barbearia_id=barbearia_id).order_by().values_list(
+            'dia_semana', 'abertura', 'fechamento', 'fechado'
+        ),
+        ExcecaoFuncionamento.objects.filter(
+            barbearia_id=barbearia_id, data__range=(data_inicio, data_fim)
+        ).order_by().values_list('data', 'tipo', 'abertura', 'fechamento'),
+        DiaModeloHorario.objects.filter(
+            modelo__barbearia_id=barbearia_id, modelo__ativo=True, modelo__data_inicio__lte=data_fim,
+        ).exclude(modelo__data_fim__lt=data_inicio).order_by().values_list(
+            'modelo_id', 'modelo__data_inicio', 'modelo__data_fim', 'modelo__semanas',
+            'semana', 'dia_semana', 'abertura', 'fechamento', 'fechado',
+        ),
+    ]
+
+
+def _consultas_profissionais(profissional_ids, data_inicio, data_fim, fuso):
+    inicio, fim = datas_locais.intervalo_datas(data_inicio, data_fim, fuso)
+    return [
+        IntervaloProfissional.objects.filter(profissional_id__in=profissional_ids).order_by().values_list(
+            'profissional_id', 'dia_semana', 'inicio', 'fim'
+        ),
+        BloqueioProfissional.objects.filter(
+            profissional_id__in=profissional_ids,
+            inicio__lt=fim,
+            fim__gt=inicio,
+        ).order_by().values_list('profissional_id', 'inicio', 'fim'),
+    ]
+
+
+# ===== COMPILAÇÃO =====
+
+def _horario_do_dia(data, semanais, excecoes, modelos):
+    """
+    (abertura, fechamento) da barbearia na data, ou None se estiver fechada.
+    Exceção da data > modelo de horário do período > horário semanal
+    """
+    if data in excecoes:
+        tipo, abertura, fechamento = excecoes[data]
+        if tipo != 'horario_especial' or not abertura or not fechamento:
+            return None
+        return abertura, fechamento
+
+    semanal = semanais.get(data.weekday())
+    for data_inicio, _, data_fim, semanas, dias in modelos:
+        if data_inicio <= data and (data_fim is None or data <= data_fim):
+            # As semanas do ciclo contam a partir da segunda-feira da semana de data_inicio
+            semana = (data - data_inicio + timedelta(days=data_inicio.weekday())).days // 7
+            semanal = dias.get((semana % semanas, data.weekday()), semanal)
+            break
+    if semanal is None:
+        return HORARIO_PADRAO
+    abertura, fechamento, fechado = semanal
+    if fechado:
+        return None
+    if not abertura or not fechamento:
+        return HORARIO_PADRAO
+    return abertura, fechamento
+
+
+def _subtrair(abertos, inicio, fim):
+    """Remove [inicio, fim) da lista ordenada de intervalos abertos"""
+    resultado = []
+    for aberto_inicio, aberto_fim in abertos:
+        if fim <= aberto_inicio or inicio >= aberto_fim:
+            resultado.append((aberto_inicio, aberto_fim))
+            continue
+        if aberto_inicio < inicio:
+            resultado.append((aberto_inicio, inicio))
+        if fim < aberto_fim:
+            resultado.append((fim, aberto_fim))
+    return resultado
+
+
+def _indexar_funcionamento(horarios, excecoes, modelos):
+    semanais = {dia: (abertura, fechamento, fechado) for dia, abertura, fechamento, fechado in horarios}
+    excecoes = {data: (tipo, abertura, fechamento) for data, tipo, abertura, fechamento in excecoes}
+    por_modelo = {}
+    for modelo_id, data_inicio, data_fim, semanas, semana, dia_semana, abertura, fechamento, fechado in modelos:
+        modelo = por_modelo.setdefault(modelo_id, (data_inicio, modelo_id, data_fim, semanas, {}))
+        modelo[4][(semana, dia_semana)] = (abertura, fechamento, fechado)
+    # Quando dois modelos cobrem a mesma data vale o que começou por último
+    return semanais, excecoes, sorted(por_modelo.values(), key=lambda modelo: modelo[:2], reverse=True)
+
+
+def _compilar(profissional_ids, datas, fuso, horarios, excecoes, modelos, intervalos, bloqueios):
+    """Os intervalos saem no fuso da barbearia, inclusive as bordas vindas dos bloqueios"""
+    semanais, excecoes, modelos = _indexar_funcionamento(horarios, excecoes, modelos)
+    combinar = datas_locais.combinar
+
+    intervalos_por_profissional = {}
+    for profissional_id, dia_semana, inicio, fim in intervalos:
+        intervalos_por_profissional.setdefault(profissional_id, []).append((dia_semana, inicio, fim))
+    bloqueios_por_profissional = {}
+    for profissional_id, inicio, fim in bloqueios:
+        bloqueios_por_profissional.setdefault(profissional_id, []).append((inicio.astimezone(fuso), fim.astimezone(fuso)))
+
+    compilado = {}
+    for data in datas:
+        horario = _horario_do_dia(data, semanais, excecoes, modelos)
+        for profissional_id in profissional_ids:
+            if horario is None:
+                compilado[(profissional_id, data)] = []
+                continue
+
+            abertos = [(combinar(data, horario[0], fuso), combinar(data, horario[1], fuso))]
+            for dia_semana, inicio, fim in intervalos_por_profissional.get(profissional_id, ()):
+                if dia_semana is None or dia_semana == data.weekday():
+                    abertos = _subtrair(abertos, combinar(data, inicio, fuso), combinar(data, fim, fuso))
+            for inicio, fim in bloqueios_por_profissional.get(profissional_id, ()):
+                abertos = _subtrair(abertos, inicio, fim)
+            compilado[(profissional_id, data)] = abertos
+    return compilado
+
+
+def _datas_fechadas(datas, horarios, excecoes, modelos):
+    semanais, excecoes, modelos = _indexar_funcionamento(horarios, excecoes, modelos)
+    return [data for data in datas if _horario_do_dia(data, semanais, excecoes, modelos) is None]
+
+
+# ===== API PÚBLICA =====
+
+def intervalos_abertos(barbearia_id, profissional_ids, data_inicio, data_fim=None):
+    """
+    Intervalos abertos [(inicio, fim), ...] por (profissional_id, data) no período,
+    com datas e horários no fuso da barbearia.
+    Usa o cache; apenas as combinações ausentes são compiladas.
+    """
+    data_fim = data_fim or data_inicio
+    versao, invalidacoes = obter_versao(barbearia_id)
+    chaves = {
+        _chave_dia(barbearia_id, versao, profissional_id, data): (profissional_id, data)
+        for data in _datas(data_inicio, data_fim)
+        for profissional_id in profissional_ids
+    }
+    em_cache = cache.get_many(list(chaves))
+    resultado = _validos(em_cache, chaves, invalidacoes)
+
+    faltantes = [chave for chave in chaves if chaves[chave] not in resultado]
+    if faltantes:
+        compilado_em = relogio.time_ns()
+        pendentes = sorted({chaves[chave][0] for chave in faltantes})
+        # Do principal: com a réplica atrasada, o cache guardaria a agenda antiga como nova
+        with ler_do_principal():
+            fuso = datas_locais.fuso_da_barbearia(barbearia_id)
+            linhas = [list(q) for q in _consultas_funcionamento(barbearia_id, data_inicio, data_fim)]
+            linhas += [list(q) for q in _consultas_profissionais(pendentes, data_inicio, data_fim, fuso)]
+        compilado = _compilar(pendentes, _datas(data_inicio, data_fim), fuso, *linhas)
+        cache.set_many({chave: (compilado_em, compilado[chaves[chave]]) for chave in faltantes}, TEMPO_CACHE)
+        resultado.update({chaves[chave]: compilado[chaves[chave]] for chave in faltantes})
+    return resultado
+
+
+async def aintervalos_abertos(barbearia_id, profissional_ids, data_inicio, data_fim=None):
+    """Versão assíncrona de intervalos_abertos"""
+    data_fim = data_fim or data_inicio
+    versao, invalidacoes = await aobter_versao(barbearia_id)
+    chaves = {
+        _chave_dia(barbearia_id, versao, profissional_id, data): (profissional_id, data)
+        for data in _datas(data_inicio, data_fim)
+        for profissional_id in profissional_ids
+    }
+    em_cache = await cache.aget_many(list(chaves))
+    resultado = _validos(em_cache, chaves, invalidacoes)
+
+    faltantes = [chave for chave in chaves if chaves[chave] not in resultado]
+    if faltantes:
+        compilado_em = relogio.time_ns()
+        pendentes = sorted({chaves[chave][0] for chave in faltantes})
+        with ler_do_principal():
+            fuso = await datas_locais.afuso_da_barbearia(barbearia_id)
+            linhas = [[linha async for linha in q] for q in _consultas_funcionamento(barbearia_id, data_inicio, data_fim)]
+            linhas += [[linha async for linha in q] for q in _consultas_profissionais(pendentes, data_inicio, data_fim, fuso)]
+        compilado = _compilar(pendentes, _datas(data_inicio, data_fim), fuso, *linhas)
+        await cache.aset_many({chave: (compilado_em, compilado[chaves[chave]]) for chave in faltantes}, TEMPO_CACHE)
+        resultado.update({chaves[chave]: compilado[chaves[chave]] for chave in faltantes})
+    return resultado
+
+
+def datas_fechadas(barbearia_id, data_inicio, data_fim):
+    """Datas do período em que a barbearia não abre (horário semanal + exceções)"""
+    versao, invalidacoes = obter_versao(barbearia_id)
+    chave = _chave_fechadas(barbearia_id, versao, data_inicio, data_fim)
+    em_cache = cache.get(chave)
+    if em_cache is not None and not _periodo_invalidado(invalidacoes, em_cache[0], data_inicio, data_fim):
+        return em_cache[1]
+
+    compilado_em = relogio.time_ns()
+    with ler_do_principal():
+        linhas = [list(q) for q in _consultas_funcionamento(barbearia_id, data_inicio, data_fim)]
+    fechadas = _datas_fechadas(_datas(data_inicio, data_fim), *linhas)
+    cache.set(chave, (compilado_em, fechadas), TEMPO_CACHE)
+    return fechadas
+
+
+async def adatas_fechadas(barbearia_id, data_inicio, data_fim):
+    """Versão assíncrona de datas_fechadas"""
+    versao, invalidacoes = await aobter_versao(barbearia_id)
+    chave = _chave_fechadas(barbearia_id, versao, data_inicio, data_fim)
+    em_cache = await cache.aget(chave)
+    if em_cache is not None and not _periodo_invalidado(invalidacoes, em_cache[0], data_inicio, data_fim):
+        return em_cache[1]
+
+    compilado_em = relogio.time_ns()
+    with ler_do_principal():
+        linhas = [[linha async for linha in q] for q in _consultas_funcionamento(barbearia_id, data_inicio, data_fim)]
+    fechadas = _datas_fechadas(_datas(data_inicio, data_fim), *linhas)
+    await cache.aset(chave, (compilado_em, fechadas), TEMPO_CACHE)
+    return fechadas
+
+
+# ===== INVALIDAÇÃO =====
+
+def _invalidar_por_barbearia(sender, instance, **kwargs):
+    invalidar_agenda(instance.barbearia_id)
+
+
+def _invalidar_por_fuso(sender, instance, **kwargs):
+    # A agenda compilada guarda horários já convertidos para o fuso da barbearia
+    invalidar_agenda(instance.pk)
+
+
+def _invalidar_por_profissional(sender, instance, **kwargs):
+    barbearia_id = Profissional.objects.db_manager(instance._state.db).filter(pk=instance.profissional_id).values_list('barbearia_id', flat=True).first()
+    if barbearia_id:
+        invalidar_agenda(barbearia_id)
+
+
+for _modelo in (HorarioFuncionamento, ExcecaoFuncionamento, Profissional):
+    post_save.connect(_invalidar_por_barbearia, sender=_modelo, dispatch_uid=f'agenda-{_modelo.__name__}-save')
+    post_delete.connect(_invalidar_por_barbearia, sender=_modelo, dispatch_uid=f'agenda-{_modelo.__name__}-delete')
+
+post_save.connect(_invalidar_por_fuso, sender=Barbearia, dispatch_uid='agenda-Barbearia-save')
+
+for _modelo in (IntervaloProfissional, BloqueioProfissional):
+    post_save.connect(_invalidar_por_profissional, sender=_modelo, dispatch_uid=f'agenda-{_modelo.__name__}-save')
+    post_delete.connect(_invalidar_por_profissional, sender=_modelo, dispatch_uid=f'agenda-{_modelo.__name__}-delete')
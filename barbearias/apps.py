@@ -1,6 +1,34 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+CACHE_LOCAL = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+def verificar_cache_compartilhado():
+    """
+    As versões da agenda e do catálogo e os limites de requisição ficam no cache: com
+    vários workers, um cache local a cada processo deixaria as invalidações e os
+    limites valendo só no worker que os gravou
+    """
+    if getattr(settings, 'SERVIDOR_WORKERS', 1) <= 1:
+        return
+    for alias in {'default', getattr(settings, 'LIMITES_TAXA_CACHE', 'default')}:
+        backend = settings.CACHES.get(alias, {}).get('BACKEND')
+        if backend == CACHE_LOCAL:
+            raise ImproperlyConfigured(
+                f'O cache "{alias}" ({backend}) é local a cada processo e o servidor roda com '
+                f'{settings.SERVIDOR_WORKERS} workers. Defina REDIS_URL ou configure um cache '
+                f'compartilhado em CACHES (veja settings.py).'
+            )
 
 
 class BarbeariasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'barbearias'
+
+    def ready(self):
+        verificar_cache_compartilhado()
+        # Registra os signals que invalidam as agendas compiladas e o catálogo
+        # e que mantêm o diretório de shards
+        from . import agenda, catalogo, datas, shards  # noqa: F401
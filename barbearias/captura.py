@@ -0,0 +1,184 @@
+"""
+Captura de tráfego para o comando replay_trafego.
+
+Com CAPTURA_TRAFEGO ligado, o CapturaMiddleware registra cada requisição (método,
+rota, parâmetros, corpo, status e duração) em CAPTURA_ARQUIVO, uma linha JSON por
+requisição. Dados pessoais são trocados por valores fictícios com o mesmo formato
+(o mesmo telefone vira sempre o mesmo telefone fictício), senhas e tokens são
+descartados. A gravação fica com uma thread em segundo plano: a requisição só
+monta o registro e o coloca na fila.
+
+Desligada, o Django remove o middleware na inicialização (MiddlewareNotUsed).
+"""
+import atexit
+import hashlib
+import hmac
+import json
+import queue
+import random
+import re
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+# Campos descartados e campos trocados por valores fictícios (pelo nome, sem acento).
+# A chave de idempotência sai para o replay não receber os agendamentos já gravados
+CAMPOS_DESCARTADOS = ('senha', 'password', 'csrf', 'token', 'idempotencia')
+CAMPOS_PESSOAIS = {
+    'email': 'email',
+    'telefone': 'telefone',
+    'phone': 'telefone',
+    'nome_cliente': 'nome',
+    'observacoes': 'texto',
+    'motivo': 'texto',
+}
+# A API pública recebe o nome do cliente em "nome"; só o nome exato, não nome_*
+CAMPOS_PESSOAIS_EXATOS = {'nome': 'nome'}
+ROTAS_IGNORADAS = ('admin:',)
+PREFIXOS_IGNORADOS = ('/static/', '/metrics')
+
+_fila = queue.SimpleQueue()
+_escritor = {'thread': None}
+_lock = threading.Lock()
+_DIGITO = re.compile(r'\d')
+
+
+def _semente(valor):
+    return hmac.new(settings.SECRET_KEY.encode(), str(valor).encode(), hashlib.sha256).hexdigest()
+
+
+def _ficticio(tipo, valor):
+    if valor in (None, ''):
+        return valor
+    semente = _semente(valor)
+    if tipo == 'email':
+        return f'cliente-{semente[:10]}@exemplo.com'
+    if tipo == 'telefone':
+        # Mantém o formato (DDD, parênteses, hífen), trocando só os dígitos
+        digitos = iter(str(int(semente, 16)))
+        return _DIGITO.sub(lambda _: next(digitos), str(valor))
+    if tipo == 'nome':
+        return f'Cliente {semente[:6]}'
+    return ''
+
+
+def sanitizar(dados):
+    """Cópia de um dicionário (query, formulário ou JSON) sem dados pessoais"""
+    if isinstance(dados, list):
+        return [sanitizar(item) for item in dados]
+    if not isinstance(dados, dict):
+        return dados
+    resultado = {}
+    for campo, valor in dados.items():
+        nome = str(campo).lower()
+        if any(trecho in nome for trecho in CAMPOS_DESCARTADOS):
+            continue
+        tipo = CAMPOS_PESSOAIS_EXATOS.get(nome) or next(
+            (tipo for trecho, tipo in CAMPOS_PESSOAIS.items() if trecho in nome), None
+        )
+        if tipo is None:
+            resultado[campo] = sanitizar(valor)
+        elif isinstance(valor, list):
+            resultado[campo] = [_ficticio(tipo, item) for item in valor]
+        else:
+            resultado[campo] = _ficticio(tipo, valor)
+    return resultado
+
+
+def _corpo(request):
+    """(formato, dados) do corpo da requisição, ou (None, None)"""
+    if request.method in ('GET', 'HEAD', 'OPTIONS'):
+        return None, None
+    tipo = request.content_type or ''
+    if tipo == 'application/json':
+        try:
+            return 'json', sanitizar(json.loads(request.body or b'null'))
+        except ValueError:
+            return None, None
+    if tipo in ('application/x-www-form-urlencoded', 'multipart/form-data'):
+        return 'form', sanitizar(dict(request.POST.lists()))
+    return None, None
+
+
+def montar_registro(request, response, inicio, duracao_ms):
+    match = request.resolver_match
+    if match is None or request.path.startswith(PREFIXOS_IGNORADOS):
+        return None
+    if match.view_name.startswith(ROTAS_IGNORADAS):
+        return None
+    formato, corpo = _corpo(request)
+    usuario = getattr(request, 'user', None)
+    return {
+        'ts': round(inicio, 3),
+        'metodo': request.method,
+        'caminho': request.path,
+        'rota': match.view_name,
+        'kwargs': {chave: str(valor) for chave, valor in match.kwargs.items()},
+        'query': sanitizar(dict(request.GET.lists())),
+        'formato': formato,
+        'corpo': corpo,
+        'autenticado': bool(usuario is not None and usuario.is_authenticated),
+        'status': response.status_code,
+        'duracao_ms': round(duracao_ms, 3),
+    }
+
+
+def amostrar():
+    taxa = getattr(settings, 'CAPTURA_AMOSTRAGEM', 1.0)
+    return taxa >= 1 or random.random() < taxa
+
+
+# ===== GRAVAÇÃO =====
+
+def enfileirar(registro):
+    _iniciar_escritor()
+    _fila.put(registro)
+
+
+def _iniciar_escritor():
+    # is_alive: depois de um fork (workers do servidor) a thread do processo pai não existe
+    if _escritor['thread'] is not None and _escritor['thread'].is_alive():
+        return
+    with _lock:
+        if _escritor['thread'] is None or not _escritor['thread'].is_alive():
+            _escritor['thread'] = threading.Thread(target=_escrever, name='captura-trafego', daemon=True)
+            _escritor['thread'].start()
+
+
+def _linha(registro):
+    return json.dumps(registro, ensure_ascii=False, default=str) + '\n'
+
+
+def _drenar():
+    linhas = []
+    while True:
+        try:
+            linhas.append(_linha(_fila.get_nowait()))
+        except queue.Empty:
+            return linhas
+
+
+def _gravar(linhas):
+    if not linhas:
+        return
+    caminho = Path(settings.CAPTURA_ARQUIVO)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    # Um único write em modo append por lote: processos diferentes não intercalam linhas
+    with open(caminho, 'ab', buffering=0) as arquivo:
+        arquivo.write(''.join(linhas).encode('utf-8'))
+
+
+def _escrever():
+    # Junta o que chegar em meio segundo em um único write
+    while True:
+        time.sleep(0.5)
+        with _lock:
+            _gravar(_drenar())
+
+
+@atexit.register
+def gravar_pendentes():
+    with _lock:
+        _gravar(_drenar())
@@ -0,0 +1,159 @@
+"""
+Catálogo da barbearia.
+
+Fotografia imutável dos serviços e profissionais ativos e do horário semanal de uma
+barbearia, compartilhada pelo formulário de agendamento, pelo mini site e pelas APIs
+públicas. Fica no cache, versionada por barbearia, e só é remontada quando algum
+serviço, profissional ou horário muda.
+"""
+import time as relogio
+from dataclasses import dataclass
+from datetime import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+from .models import HorarioFuncionamento, Profissional, Servico
+from .replica import ler_do_principal
+
+TEMPO_CACHE = 60 * 60 * 24
+
+
+@dataclass(frozen=True)
+class ServicoCatalogo:
+    id: int
+    nome: str
+    preco: Decimal
+    duracao_minutos: int
+
+    @property
+    def pk(self):
+        return self.id
+
+
+@dataclass(frozen=True)
+class ProfissionalCatalogo:
+    id: int
+    nome: str
+
+    @property
+    def pk(self):
+        return self.id
+
+
+@dataclass(frozen=True)
+class HorarioCatalogo:
+    dia_semana: int
+    abertura: time
+    fechamento: time
+    fechado: bool
+
+
+@dataclass(frozen=True)
+class CatalogoBarbearia:
+    barbearia_id: int
+    servicos: tuple
+    profissionais: tuple
+    horarios: tuple
+
+    def servico(self, servico_id):
+        """Serviço ativo com o id informado, ou None"""
+        for servico in self.servicos:
+            if str(servico.id) == str(servico_id):
+                return servico
+        return None
+
+    def profissional(self, profissional_id):
+        """Profissional ativo com o id informado, ou None"""
+        for profissional in self.profissionais:
+            if str(profissional.id) == str(profissional_id):
+                return profissional
+        return None
+
+    @property
+    def dias_fechados(self):
+        """Dias da semana (0=segunda) em que a barbearia não abre"""
+        return [horario.dia_semana for horario in self.horarios if horario.fechado]
+
+
+# ===== VERSÃO DO CACHE =====
+
+def _chave_versao(barbearia_id):
+    return f'catalogo-versao:{barbearia_id}'
+
+
+def _chave(barbearia_id, versao):
+    return f'catalogo:{barbearia_id}:{versao}'
+
+
+def invalidar_catalogo(barbearia_id):
+    """Descarta o catálogo em cache da barbearia"""
+    cache.set(_chave_versao(barbearia_id), relogio.time_ns(), None)
+
+
+# ===== MONTAGEM =====
+
+def _consultas(barbearia_id):
+    return [
+        Servico.objects.filter(barbearia_id=barbearia_id, ativo=True).order_by('id').values_list(
+            'id', 'nome', 'preco', 'duracao_minutos'
+        ),
+        Profissional.objects.filter(barbearia_id=barbearia_id, ativo=True).order_by('id').values_list('id', 'nome'),
+        HorarioFuncionamento.objects.filter(barbearia_id=barbearia_id).order_by('dia_semana').values_list(
+            'dia_semana', 'abertura', 'fechamento', 'fechado'
+        ),
+    ]
+
+
+def _montar(barbearia_id, servicos, profissionais, horarios):
+    return CatalogoBarbearia(
+        barbearia_id=barbearia_id,
+        servicos=tuple(ServicoCatalogo(*linha) for linha in servicos),
+        profissionais=tuple(ProfissionalCatalogo(*linha) for linha in profissionais),
+        horarios=tuple(HorarioCatalogo(*linha) for linha in horarios),
+    )
+
+
+# ===== API PÚBLICA =====
+
+def obter_catalogo(barbearia_id):
+    """Catálogo da barbearia, montado a partir do banco só quando não está no cache"""
+    versao = cache.get(_chave_versao(barbearia_id))
+    if versao is None:
+        cache.add(_chave_versao(barbearia_id), relogio.time_ns(), None)
+        versao = cache.get(_chave_versao(barbearia_id))
+
+    catalogo = cache.get(_chave(barbearia_id, versao))
+    if catalogo is None:
+        # Do principal: com a réplica atrasada, o cache guardaria o catálogo antigo como novo
+        with ler_do_principal():
+            catalogo = _montar(barbearia_id, *[list(q) for q in _consultas(barbearia_id)])
+        cache.set(_chave(barbearia_id, versao), catalogo, TEMPO_CACHE)
+    return catalogo
+
+
+async def aobter_catalogo(barbearia_id):
+    """Versão assíncrona de obter_catalogo"""
+    versao = await cache.aget(_chave_versao(barbearia_id))
+    if versao is None:
+        await cache.aadd(_chave_versao(barbearia_id), relogio.time_ns(), None)
+        versao = await cache.aget(_chave_versao(barbearia_id))
+
+    catalogo = await cache.aget(_chave(barbearia_id, versao))
+    if catalogo is None:
+        with ler_do_principal():
+            catalogo = _montar(barbearia_id, *[[linha async for linha in q] for q in _consultas(barbearia_id)])
+        await cache.aset(_chave(barbearia_id, versao), catalogo, TEMPO_CACHE)
+    return catalogo
+
+
+# ===== INVALIDAÇÃO =====
+
+def _invalidar(sender, instance, **kwargs):
+    invalidar_catalogo(instance.barbearia_id)
+
+
+for _modelo in (Servico, Profissional, HorarioFuncionamento):
+    post_save.connect(_invalidar, sender=_modelo, dispatch_uid=f'catalogo-{_modelo.__name__}-save')
+    post_delete.connect(_invalidar, sender=_modelo, dispatch_uid=f'catalogo-{_modelo.__name__}-delete')
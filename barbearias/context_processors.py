@@ -0,0 +1,10 @@
+from django.core.handlers.asgi import ASGIRequest
+
+
+def eventos_agenda(request):
+    """Indica se o stream de eventos da agenda pode ser aberto nesta requisição
+
+    O stream é um gerador assíncrono infinito: sob WSGI o Django o consome por
+    inteiro antes de responder, então o painel só abre o EventSource com ASGI.
+    """
+    return {'eventos_agenda_disponiveis': isinstance(request, ASGIRequest)}
@@ -0,0 +1,110 @@
+"""
+Datas no fuso horário de cada barbearia.
+
+O banco guarda tudo em UTC. "Hoje", "o dia 10" ou "das 9h às 18h" são sempre no
+fuso da barbearia, então toda consulta por dia passa por aqui: a data local vira um
+intervalo semiaberto [início, fim) de datetimes com fuso, que o banco resolve com
+uma varredura de faixa no índice de data_hora (ao contrário de data_hora__date, que
+aplica uma função na coluna e calcula o dia em UTC).
+"""
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .models import Barbearia
+from .replica import ler_do_principal
+
+FUSO_PADRAO = 'America/Sao_Paulo'
+TEMPO_CACHE = 60 * 60 * 24
+
+
+@lru_cache(maxsize=None)
+def _zona(nome):
+    return ZoneInfo(nome or FUSO_PADRAO)
+
+
+def fuso(barbearia):
+    """ZoneInfo da barbearia (instância com fuso_horario ou o nome do fuso)"""
+    if isinstance(barbearia, str):
+        return _zona(barbearia)
+    return _zona(getattr(barbearia, 'fuso_horario', None))
+
+
+def _chave_fuso(barbearia_id):
+    return f'fuso:{barbearia_id}'
+
+
+def fuso_da_barbearia(barbearia_id):
+    """Fuso a partir do id (cache; usado onde só o id está disponível, como no compilador da agenda)"""
+    nome = cache.get(_chave_fuso(barbearia_id))
+    if nome is None:
+        # Vai para o cache: lido do principal mesmo nas rotas da réplica
+        with ler_do_principal():
+            nome = Barbearia.objects.filter(pk=barbearia_id).values_list('fuso_horario', flat=True).first() or FUSO_PADRAO
+        cache.set(_chave_fuso(barbearia_id), nome, TEMPO_CACHE)
+    return _zona(nome)
+
+
+async def afuso_da_barbearia(barbearia_id):
+    """Versão assíncrona de fuso_da_barbearia"""
+    nome = await cache.aget(_chave_fuso(barbearia_id))
+    if nome is None:
+        with ler_do_principal():
+            nome = await Barbearia.objects.filter(pk=barbearia_id).values_list('fuso_horario', flat=True).afirst() or FUSO_PADRAO
+        await cache.aset(_chave_fuso(barbearia_id), nome, TEMPO_CACHE)
+    return _zona(nome)
+
+
+def _chave_fuso_slug(slug):
+    return f'fuso-slug:{slug}'
+
+
+def fuso_por_slug(slug):
+    """Fuso da barbearia pelo slug da URL, ou None se a barbearia não existir"""
+    nome = cache.get(_chave_fuso_slug(slug))
+    if nome is None:
+        with ler_do_principal():
+            nome = Barbearia.objects.filter(slug=slug).values_list('fuso_horario', flat=True).first()
+        if nome is None:
+            return None
+        cache.set(_chave_fuso_slug(slug), nome, TEMPO_CACHE)
+    return _zona(nome)
+
+
+def hoje(zona):
+    """Data atual no fuso informado"""
+    return timezone.localdate(timezone=zona)
+
+
+def local(data_hora, zona):
+    """Converte um datetime com fuso para o horário local da barbearia"""
+    return timezone.localtime(data_hora, zona)
+
+
+def combinar(data, hora, zona):
+    """Datetime com fuso para a data e hora locais"""
+    return datetime.combine(data, hora, tzinfo=zona)
+
+
+def intervalo_datas(data_inicio, data_fim, zona):
+    """[início de data_inicio, início do dia seguinte a data_fim) no fuso, com data_fim inclusiva"""
+    return combinar(data_inicio, time(0, 0), zona), combinar(data_fim + timedelta(days=1), time(0, 0), zona)
+
+
+def intervalo_dia(data, zona):
+    """[início, fim) do dia local"""
+    return intervalo_datas(data, data, zona)
+
+
+# ===== INVALIDAÇÃO =====
+
+def _invalidar_fuso(sender, instance, **kwargs):
+    cache.delete_many([_chave_fuso(instance.pk), _chave_fuso_slug(instance.slug)])
+
+
+post_save.connect(_invalidar_fuso, sender=Barbearia, dispatch_uid='fuso-barbearia-save')
+post_delete.connect(_invalidar_fuso, sender=Barbearia, dispatch_uid='fuso-barbearia-delete')
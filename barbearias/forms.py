@@ -95,42 +95,135 @@ class LoginBarbeiroForm(forms.Form):
 
 from .models import HorarioFuncionamento
 
-class HorarioFuncionamentoForm(forms.ModelForm):
+class GradeHorariosForm(forms.Form):
+    """
+    Abertura, fechamento e "fechado" de todos os dias de uma ou mais semanas em um
+    único formulário. Os campos de cada dia têm o prefixo dia_{n} (semana_{s}-dia_{n}
+    nos ciclos de várias semanas).
+    """
+    def __init__(self, *args, semanas=1, horarios=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.semanas = semanas
+        for semana in range(semanas):
+            for dia, _ in HorarioFuncionamento.DIAS_DA_SEMANA:
+                prefixo = self._prefixo(semana, dia)
+                abertura, fechamento, fechado = (horarios or {}).get((semana, dia), (None, None, False))
+                self.fields[f'{prefixo}-abertura'] = forms.TimeField(
+                    required=False, label='Abertura', initial=abertura,
+                    widget=forms.TimeInput(attrs={
+                        'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors',
+                        'type': 'time'
+                    }, format='%H:%M')
+                )
+                self.fields[f'{prefixo}-fechamento'] = forms.TimeField(
+                    required=False, label='Fechamento', initial=fechamento,
+                    widget=forms.TimeInput(attrs={
+                        'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors',
+                        'type': 'time'
+                    }, format='%H:%M')
+                )
+                self.fields[f'{prefixo}-fechado'] = forms.BooleanField(
+                    required=False, label='Fechado o dia todo', initial=fechado,
+                    widget=forms.CheckboxInput(attrs={
+                        'class': 'w-4 h-4 text-blue-600 bg-gray-100 border-gray-300 rounded focus:ring-blue-500 focus:ring-2'
+                    })
+                )
+
+    def _prefixo(self, semana, dia):
+        return f'dia_{dia}' if self.semanas == 1 else f'semana_{semana}-dia_{dia}'
+
+    def grade(self):
+        """[{'numero', 'dias': [{'nome', 'abertura', 'fechamento', 'fechado'}]}] para o template"""
+        return [
+            {
+                'numero': semana + 1,
+                'dias': [
+                    {
+                        'nome': nome,
+                        'abertura': self[f'{self._prefixo(semana, dia)}-abertura'],
+                        'fechamento': self[f'{self._prefixo(semana, dia)}-fechamento'],
+                        'fechado': self[f'{self._prefixo(semana, dia)}-fechado'],
+                    }
+                    for dia, nome in HorarioFuncionamento.DIAS_DA_SEMANA
+                ],
+            }
+            for semana in range(self.semanas)
+        ]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for semana in range(self.semanas):
+            for dia, _ in HorarioFuncionamento.DIAS_DA_SEMANA:
+                prefixo = self._prefixo(semana, dia)
+                abertura = cleaned_data.get(f'{prefixo}-abertura')
+                fechamento = cleaned_data.get(f'{prefixo}-fechamento')
+                if cleaned_data.get(f'{prefixo}-fechado'):
+                    cleaned_data[f'{prefixo}-abertura'] = None
+                    cleaned_data[f'{prefixo}-fechamento'] = None
+                elif not abertura or not fechamento:
+                    if f'{prefixo}-abertura' in cleaned_data and f'{prefixo}-fechamento' in cleaned_data:
+                        self.add_error(f'{prefixo}-abertura', "Obrigatório se não estiver fechado.")
+                        self.add_error(f'{prefixo}-fechamento', "Obrigatório se não estiver fechado.")
+                elif abertura >= fechamento:
+                    self.add_error(f'{prefixo}-fechamento', "Deve ser depois do horário de abertura.")
+        return cleaned_data
+
+    def horarios(self):
+        """{(semana, dia_semana): (abertura, fechamento, fechado)} do formulário validado"""
+        return {
+            (semana, dia): (
+                self.cleaned_data[f'{self._prefixo(semana, dia)}-abertura'],
+                self.cleaned_data[f'{self._prefixo(semana, dia)}-fechamento'],
+                self.cleaned_data[f'{self._prefixo(semana, dia)}-fechado'],
+            )
+            for semana in range(self.semanas)
+            for dia, _ in HorarioFuncionamento.DIAS_DA_SEMANA
+        }
+
+
+from .models import ModeloHorario
+
+class ModeloHorarioForm(forms.ModelForm):
     class Meta:
-        model = HorarioFuncionamento
-        fields = ['dia_semana', 'abertura', 'fechamento', 'fechado']
+        model = ModeloHorario
+        fields = ['nome', 'data_inicio', 'data_fim', 'ativo']
         widgets = {
-            'dia_semana': forms.HiddenInput(),
-            'abertura': forms.TimeInput(attrs={
+            'nome': forms.TextInput(attrs={
                 'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors',
-                'type': 'time'
+                'placeholder': 'Ex: Horário de verão, Sábados alternados'
             }),
-            'fechamento': forms.TimeInput(attrs={
+            'data_inicio': forms.DateInput(attrs={
                 'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors',
-                'type': 'time'
-            }),
-            'fechado': forms.CheckboxInput(attrs={
+                'type': 'date'
+            }, format='%Y-%m-%d'),
+            'data_fim': forms.DateInput(attrs={
+                'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors',
+                'type': 'date'
+            }, format='%Y-%m-%d'),
+            'ativo': forms.CheckboxInput(attrs={
                 'class': 'w-4 h-4 text-blue-600 bg-gray-100 border-gray-300 rounded focus:ring-blue-500 focus:ring-2'
             })
         }
         labels = {
-            'dia_semana': 'Dia da Semana',
-            'abertura': 'Horário de Abertura',
-            'fechamento': 'Horário de Fechamento',
-            'fechado': 'Fechado o dia todo'
+            'nome': 'Nome',
+            'data_inicio': 'Início',
+            'data_fim': 'Fim',
+            'ativo': 'Ativo'
         }
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.fields['dia_semana'].required = False
-        self.fields['abertura'].required = False
-        self.fields['fechamento'].required = False
+    def clean(self):
+        cleaned_data = super().clean()
+        data_inicio = cleaned_data.get('data_inicio')
+        data_fim = cleaned_data.get('data_fim')
+        if data_inicio and data_fim and data_fim < data_inicio:
+            raise forms.ValidationError("O fim do período deve ser depois do início.")
+        return cleaned_data
 
 
 class BarbeariaConfigForm(forms.ModelForm):
     class Meta:
         model = Barbearia
-        fields = ['nome', 'endereco', 'telefone', 'email_notificacoes']
+        fields = ['nome', 'endereco', 'telefone', 'email_notificacoes', 'modo_notificacao', 'fuso_horario']
         widgets = {
             'nome': forms.TextInput(attrs={
                 'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors',
@@ -148,14 +241,196 @@ class BarbeariaConfigForm(forms.ModelForm):
             'email_notificacoes': forms.EmailInput(attrs={
                 'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors',
                 'placeholder': 'email@exemplo.com (opcional)'
+            }),
+            'modo_notificacao': forms.Select(attrs={
+                'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors'
+            }),
+            'fuso_horario': forms.Select(attrs={
+                'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors'
             })
         }
         labels = {
             'nome': 'Nome do Estabelecimento',
             'endereco': 'Endereço',
             'telefone': 'Telefone',
-            'email_notificacoes': 'Email para Notificações'
+            'email_notificacoes': 'Email para Notificações',
+            'modo_notificacao': 'Frequência das Notificações',
+            'fuso_horario': 'Fuso Horário'
         }
         help_texts = {
-            'email_notificacoes': 'Email onde você receberá notificações de novos agendamentos'
+            'email_notificacoes': 'Email onde você receberá notificações de novos agendamentos',
+            'modo_notificacao': 'Em dias movimentados, o resumo reúne vários agendamentos em um único email',
+            'fuso_horario': 'Os horários da agenda e dos emails seguem este fuso'
+        }
+
+
+from .models import ExcecaoFuncionamento, IntervaloProfissional, BloqueioProfissional
+
+class ExcecaoFuncionamentoForm(forms.ModelForm):
+    class Meta:
+        model = ExcecaoFuncionamento
+        fields = ['data', 'tipo', 'abertura', 'fechamento', 'descricao']
+        widgets = {
+            'data': forms.DateInput(attrs={
+                'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors',
+                'type': 'date'
+            }),
+            'tipo': forms.Select(attrs={
+                'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors'
+            }),
+            'abertura': forms.TimeInput(attrs={
+                'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors',
+                'type': 'time'
+            }),
+            'fechamento': forms.TimeInput(attrs={
+                'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors',
+                'type': 'time'
+            }),
+            'descricao': forms.TextInput(attrs={
+                'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors',
+                'placeholder': 'Ex: Natal, Reforma, Evento'
+            })
+        }
+        labels = {
+            'data': 'Data',
+            'tipo': 'Tipo',
+            'abertura': 'Abertura',
+            'fechamento': 'Fechamento',
+            'descricao': 'Descrição'
+        }
+
+    def __init__(self, *args, **kwargs):
+        self.barbearia = kwargs.pop('barbearia', None)
+        super().__init__(*args, **kwargs)
+
+    def clean_data(self):
+        data = self.cleaned_data.get('data')
+        if self.barbearia and data and ExcecaoFuncionamento.objects.filter(barbearia=self.barbearia, data=data).exists():
+            raise forms.ValidationError("Já existe uma exceção cadastrada para esta data.")
+        return data
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('tipo') == 'horario_especial':
+            abertura = cleaned_data.get('abertura')
+            fechamento = cleaned_data.get('fechamento')
+            if not abertura or not fechamento:
+                raise forms.ValidationError("Informe abertura e fechamento para o horário especial.")
+            if abertura >= fechamento:
+                raise forms.ValidationError("O fechamento deve ser depois da abertura.")
+        else:
+            cleaned_data['abertura'] = None
+            cleaned_data['fechamento'] = None
+        return cleaned_data
+
+
+class IntervaloProfissionalForm(forms.ModelForm):
+    class Meta:
+        model = IntervaloProfissional
+        fields = ['profissional', 'dia_semana', 'inicio', 'fim']
+        widgets = {
+            'profissional': forms.Select(attrs={
+                'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors'
+            }),
+            'dia_semana': forms.Select(attrs={
+                'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors'
+            }),
+            'inicio': forms.TimeInput(attrs={
+                'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors',
+                'type': 'time'
+            }),
+            'fim': forms.TimeInput(attrs={
+                'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors',
+                'type': 'time'
+            })
+        }
+        labels = {
+            'profissional': 'Profissional',
+            'dia_semana': 'Dia da Semana',
+            'inicio': 'Início',
+            'fim': 'Fim'
+        }
+
+    def __init__(self, *args, **kwargs):
+        barbearia = kwargs.pop('barbearia', None)
+        super().__init__(*args, **kwargs)
+        if barbearia:
+            self.fields['profissional'].queryset = barbearia.profissionais.filter(ativo=True)
+        self.fields['dia_semana'].choices = [('', 'Todos os dias')] + list(HorarioFuncionamento.DIAS_DA_SEMANA)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        inicio = cleaned_data.get('inicio')
+        fim = cleaned_data.get('fim')
+        if inicio and fim and inicio >= fim:
+            raise forms.ValidationError("O fim do intervalo deve ser depois do início.")
+        return cleaned_data
+
+
+class BloqueioProfissionalForm(forms.ModelForm):
+    class Meta:
+        model = BloqueioProfissional
+        fields = ['profissional', 'inicio', 'fim', 'motivo']
+        widgets = {
+            'profissional': forms.Select(attrs={
+                'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors'
+            }),
+            'inicio': forms.DateTimeInput(attrs={
+                'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors',
+                'type': 'datetime-local'
+            }),
+            'fim': forms.DateTimeInput(attrs={
+                'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors',
+                'type': 'datetime-local'
+            }),
+            'motivo': forms.TextInput(attrs={
+                'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors',
+                'placeholder': 'Ex: Férias, Folga, Consulta médica'
+            })
         }
+        labels = {
+            'profissional': 'Profissional',
+            'inicio': 'Início',
+            'fim': 'Fim',
+            'motivo': 'Motivo'
+        }
+
+    def __init__(self, *args, **kwargs):
+        barbearia = kwargs.pop('barbearia', None)
+        super().__init__(*args, **kwargs)
+        if barbearia:
+            self.fields['profissional'].queryset = barbearia.profissionais.filter(ativo=True)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        inicio = cleaned_data.get('inicio')
+        fim = cleaned_data.get('fim')
+        if inicio and fim and inicio >= fim:
+            raise forms.ValidationError("O fim do bloqueio deve ser depois do início.")
+        return cleaned_data
+
+
+from agendamentos.importacao import formato_do_arquivo
+
+class ImportacaoAgendamentosForm(forms.Form):
+    arquivo = forms.FileField(
+        label='Arquivo',
+        help_text='CSV ou ICS exportado do sistema anterior, em UTF-8',
+        widget=forms.ClearableFileInput(attrs={
+            'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 transition-colors',
+            'accept': '.csv,.ics'
+        })
+    )
+    simular = forms.BooleanField(
+        required=False,
+        label='Só conferir, sem importar',
+        widget=forms.CheckboxInput(attrs={
+            'class': 'w-4 h-4 text-blue-600 bg-gray-100 border-gray-300 rounded focus:ring-blue-500 focus:ring-2'
+        })
+    )
+
+    def clean_arquivo(self):
+        arquivo = self.cleaned_data.get('arquivo')
+        if arquivo and not formato_do_arquivo(arquivo.name):
+            raise forms.ValidationError("Envie um arquivo .csv ou .ics.")
+        return arquivo
@@ -0,0 +1,78 @@
+"""
+Limitador de requisições por IP e barbearia para as rotas públicas.
+
+Cada regra libera `capacidade` requisições por janela de capacidade / taxa segundos
+(o tempo que um token bucket levaria para encher de novo): a mesma vazão média e a
+mesma rajada. A contagem da janela fica no cache do Django, compartilhado entre os
+workers (veja CACHES em settings.py), com cache.add + cache.incr: atômico, sem o
+get → calcula → set em que workers simultâneos liam o mesmo saldo. Se o cache estiver
+indisponível, um dicionário em memória do processo assume o papel.
+"""
+import logging
+import math
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+PREFIXO = 'limite-taxa'
+
+_janelas_locais = {}
+_rejeicoes_locais = Counter()
+_lock = threading.Lock()
+
+
+def obter_regra(url_name, metodo):
+    """Retorna a regra configurada em LIMITES_TAXA para a URL, ou None"""
+    regra = getattr(settings, 'LIMITES_TAXA', {}).get(url_name)
+    if not regra:
+        return None
+    if metodo not in regra.get('metodos', ('GET', 'POST')):
+        return None
+    return regra
+
+
+def consumir(chave, taxa_por_minuto, capacidade):
+    """
+    Conta a requisição na janela atual. Retorna (permitido, segundos_até_a_próxima_janela).
+    """
+    agora = time.time()
+    janela = capacidade * 60.0 / taxa_por_minuto
+    indice = int(agora // janela)
+    espera = (indice + 1) * janela - agora
+
+    try:
+        cache = caches[getattr(settings, 'LIMITES_TAXA_CACHE', 'default')]
+        chave_janela = f'{chave}:{indice}'
+        timeout = math.ceil(janela) + 1
+        cache.add(chave_janela, 0, timeout=timeout)
+        try:
+            usadas = cache.incr(chave_janela)
+        except ValueError:
+            # A janela expirou entre o add e o incr
+            cache.add(chave_janela, 1, timeout=timeout)
+            usadas = 1
+        return usadas <= capacidade, 0 if usadas <= capacidade else espera
+    except Exception as e:
+        logger.warning(f"Cache indisponível para o limitador, usando memória local: {str(e)}")
+
+    with _lock:
+        indice_anterior, usadas = _janelas_locais.get(chave, (indice, 0))
+        usadas = usadas + 1 if indice_anterior == indice else 1
+        _janelas_locais[chave] = (indice, usadas)
+    return usadas <= capacidade, 0 if usadas <= capacidade else espera
+
+
+def registrar_rejeicao(url_name):
+    with _lock:
+        _rejeicoes_locais[url_name] += 1
+
+
+def obter_rejeicoes():
+    """Contadores de requisições rejeitadas por nome de URL (neste processo)"""
+    with _lock:
+        return dict(_rejeicoes_locais)
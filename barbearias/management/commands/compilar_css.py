@@ -0,0 +1,36 @@
+import shutil
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera static/css/app.css com o Tailwind, apenas com as classes usadas nos templates '
+        '(requer Node.js; rode "npm install" uma vez). Depois rode o collectstatic.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', action='store_true', help='Recompila a cada alteração nos templates')
+
+    def handle(self, *args, **options):
+        npx = shutil.which('npx')
+        if not npx:
+            raise CommandError('npx não encontrado. Instale o Node.js e rode "npm install" na raiz do projeto.')
+
+        comando = [
+            npx, '--no-install', 'tailwindcss',
+            '-c', 'tailwind.config.js',
+            '-i', 'assets/css/entrada.css',
+            '-o', 'static/css/app.css',
+        ]
+        comando.append('--watch' if options['watch'] else '--minify')
+
+        self.stdout.write(f'🎨 Compilando CSS: {" ".join(comando[1:])}')
+        resultado = subprocess.run(comando, cwd=settings.BASE_DIR)
+        if resultado.returncode != 0:
+            raise CommandError('Falha ao compilar o CSS. Verifique se rodou "npm install".')
+
+        arquivo = settings.BASE_DIR / 'static' / 'css' / 'app.css'
+        self.stdout.write(self.style.SUCCESS(f'✅ CSS gerado: {arquivo} ({arquivo.stat().st_size / 1024:.1f} KB)'))
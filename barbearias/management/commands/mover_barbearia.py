@@ -0,0 +1,118 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from barbearias import shards
+from barbearias.models import Barbearia, DiretorioBarbearia
+
+TAMANHO_LOTE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Move uma barbearia (e tudo que pertence a ela) para outro shard com o sistema no ar: '
+        'copia os dados, bloqueia as escritas da barbearia por alguns segundos, copia só o que '
+        'mudou nesse meio tempo e aponta o diretório para o novo banco.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', help='Slug da barbearia')
+        parser.add_argument('destino', help='Alias do banco de destino em settings.DATABASES')
+        parser.add_argument('--espera', type=float, default=2.0, help='Segundos para as requisições em andamento terminarem após o bloqueio')
+        parser.add_argument('--manter-origem', action='store_true', help='Não apagar os dados do banco de origem')
+
+    def handle(self, *args, **options):
+        diretorio = DiretorioBarbearia.objects.using(DEFAULT_DB_ALIAS).filter(slug=options['slug']).first()
+        if not diretorio:
+            raise CommandError(f'Barbearia "{options["slug"]}" não encontrada no diretório.')
+        origem, destino = diretorio.banco, options['destino']
+        if destino not in settings.DATABASES:
+            raise CommandError(f'Banco "{destino}" não existe em settings.DATABASES.')
+        if destino == origem:
+            raise CommandError(f'A barbearia já está em "{destino}".')
+        if Barbearia._meta.db_table not in connections[destino].introspection.table_names():
+            raise CommandError(f'O banco "{destino}" não tem as tabelas. Rode: python manage.py migrate --database {destino}')
+
+        barbearia_id = diretorio.pk
+        self.stdout.write(f'🚚 Movendo {diretorio.slug} (#{barbearia_id}): {origem} → {destino}')
+
+        # 1ª cópia com a barbearia funcionando normalmente
+        inicio = time.monotonic()
+        total = self._copiar(barbearia_id, origem, destino)
+        self.stdout.write(f'📦 Cópia inicial: {total} registro(s) em {time.monotonic() - inicio:.1f}s')
+
+        # Bloqueia as escritas e copia só as diferenças
+        self._marcar(diretorio, somente_leitura=True)
+        try:
+            time.sleep(options['espera'])
+            inicio = time.monotonic()
+            with transaction.atomic(using=destino):
+                total = self._copiar(barbearia_id, origem, destino)
+            diretorio.banco = destino
+            self._marcar(diretorio, somente_leitura=False)
+        except Exception:
+            self._marcar(diretorio, somente_leitura=False)
+            raise
+        self.stdout.write(f'🔁 Diferenças: {total} registro(s); escritas bloqueadas por {options["espera"] + time.monotonic() - inicio:.1f}s')
+
+        if not options['manter_origem']:
+            Barbearia.objects.using(origem).filter(pk=barbearia_id).delete()
+            self.stdout.write(f'🧹 Dados removidos de {origem}')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {diretorio.slug} agora está em {destino}'))
+
+    def _marcar(self, diretorio, somente_leitura):
+        diretorio.somente_leitura = somente_leitura
+        diretorio.save(using=DEFAULT_DB_ALIAS, update_fields=['banco', 'somente_leitura', 'atualizado_em'])
+        shards.invalidar_entrada(diretorio.slug)
+
+    def _copiar(self, barbearia_id, origem, destino):
+        """Deixa o destino igual à origem para os dados da barbearia; retorna quantos registros mudaram"""
+        total = 0
+        remocoes = []
+        for model, filtro in shards.modelos_da_barbearia():
+            campos = [field.attname for field in model._meta.concrete_fields]
+            pk = model._meta.pk.attname
+            na_origem = {linha[pk]: linha for linha in model.objects.using(origem).filter(**{filtro: barbearia_id}).order_by().values(*campos)}
+            no_destino = {linha[pk]: linha for linha in model.objects.using(destino).filter(**{filtro: barbearia_id}).order_by().values(*campos)}
+
+            novos = [chave for chave in na_origem if chave not in no_destino]
+            alterados = [chave for chave in na_origem if chave in no_destino and na_origem[chave] != no_destino[chave]]
+            remocoes.append((model, [chave for chave in no_destino if chave not in na_origem]))
+
+            for lote in range(0, len(novos), TAMANHO_LOTE):
+                ids = novos[lote:lote + TAMANHO_LOTE]
+                conflitos = list(model.objects.using(destino).filter(pk__in=ids).values_list(pk, flat=True)[:5])
+                if conflitos:
+                    raise CommandError(
+                        f'{model.__name__} com id(s) {conflitos} já existe(m) em {destino} para outra barbearia. '
+                        f'Os ids de {model.__name__} precisam ser únicos entre os shards para a mudança.'
+                    )
+
+            objetos = [model(**na_origem[chave]) for chave in novos]
+            model.objects.using(destino).bulk_create(objetos, batch_size=TAMANHO_LOTE)
+            # bulk_create reaplica auto_now/auto_now_add; restaura os valores originais
+            automaticos = [
+                field.name for field in model._meta.concrete_fields
+                if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+            ]
+            if objetos and automaticos:
+                model.objects.using(destino).bulk_update(
+                    [model(**na_origem[chave]) for chave in novos], automaticos, batch_size=TAMANHO_LOTE
+                )
+
+            if alterados:
+                nomes = [field.name for field in model._meta.concrete_fields if not field.primary_key]
+                model.objects.using(destino).bulk_update(
+                    [model(**na_origem[chave]) for chave in alterados], nomes, batch_size=TAMANHO_LOTE
+                )
+            total += len(novos) + len(alterados)
+
+        # Remoções dos filhos para os pais
+        for model, ids in reversed(remocoes):
+            if ids:
+                model.objects.using(destino).filter(pk__in=ids).delete()
+                total += len(ids)
+        return total
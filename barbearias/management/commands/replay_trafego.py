@@ -0,0 +1,326 @@
+import http.client
+import json
+import logging
+import math
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+
+from agendamentos import eventos
+from barbearias import shards
+from barbearias.models import Barbearia
+
+DATA = re.compile(r'\b(\d{4})-(\d{2})-(\d{2})\b')
+
+
+def _percentil(ordenados, fracao):
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * fracao))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Reproduz uma captura do CapturaMiddleware (JSONL) mantendo o ritmo original (ou N vezes mais '
+        'rápido) e mostra a distribuição de latência por rota. Sem --url, roda dentro do processo contra '
+        'uma cópia temporária dos bancos SQLite, sem enviar emails nem publicar eventos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', nargs='?', help='Captura JSONL (padrão: CAPTURA_ARQUIVO)')
+        parser.add_argument('--velocidade', type=float, default=1.0, help='Multiplicador do ritmo original (0 = sem pausas)')
+        parser.add_argument('--concorrencia', type=int, default=8, help='Requisições simultâneas no máximo')
+        parser.add_argument('--url', help='Servidor em execução (ex: http://127.0.0.1:8000) em vez do modo interno')
+        parser.add_argument('--rota', action='append', default=[], help='Reproduz só estas rotas (ex: barbearias:api_horarios_disponiveis)')
+        parser.add_argument('--limite', type=int, help='Reproduz só as N primeiras requisições')
+        parser.add_argument('--manter-datas', action='store_true', help='Não desloca as datas da captura para hoje')
+        parser.add_argument('--sem-copia', action='store_true', help='Modo interno direto nos bancos configurados (use só com um banco de teste)')
+        parser.add_argument('--saida', help='Grava o relatório em JSON para comparar execuções')
+
+    def handle(self, *args, **options):
+        arquivo = Path(options['arquivo'] or settings.CAPTURA_ARQUIVO)
+        if not arquivo.exists():
+            raise CommandError(f'Captura não encontrada: {arquivo}')
+        registros = self._carregar(arquivo, options)
+        if not registros:
+            raise CommandError('Nenhuma requisição para reproduzir.')
+
+        modo = f'HTTP {options["url"]}' if options['url'] else 'interno'
+        velocidade = f'{options["velocidade"]:g}x' if options['velocidade'] > 0 else 'sem pausas'
+        self.stdout.write(f'🎬 {len(registros)} requisição(ões) de {arquivo.name} | modo {modo} | {velocidade} | concorrência {options["concorrencia"]}')
+
+        if options['url']:
+            resultados, duracao = self._reproduzir(registros, options, self._executor_http(options['url']))
+        else:
+            with self._ambiente_isolado(options):
+                resultados, duracao = self._reproduzir(registros, options, self._executor_interno())
+
+        self._relatorio(registros, resultados, duracao, options)
+
+    # ===== CAPTURA =====
+
+    def _carregar(self, arquivo, options):
+        registros = []
+        with open(arquivo, encoding='utf-8') as entrada:
+            for numero, linha in enumerate(entrada, 1):
+                if not linha.strip():
+                    continue
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    self.stdout.write(self.style.WARNING(f'⚠️  Linha {numero} ignorada (JSON inválido)'))
+                    continue
+                if options['rota'] and registro.get('rota') not in options['rota']:
+                    continue
+                registros.append(registro)
+        if options['url']:
+            # Sem a sessão do painel, páginas autenticadas só mediriam o redirect do login
+            autenticados = sum(1 for registro in registros if registro.get('autenticado'))
+            if autenticados:
+                self.stdout.write(self.style.WARNING(f'⚠️  {autenticados} requisição(ões) autenticada(s) ignorada(s) no modo HTTP'))
+                registros = [registro for registro in registros if not registro.get('autenticado')]
+        registros.sort(key=lambda registro: registro['ts'])
+        if options['limite']:
+            registros = registros[:options['limite']]
+
+        if registros and not options['manter_datas']:
+            # Datas da captura viram datas a partir de hoje, senão tudo cai no passado.
+            # O deslocamento é em semanas inteiras para manter os dias da semana
+            dias = (date.today() - datetime.fromtimestamp(registros[0]['ts']).date()).days
+            deslocamento = timedelta(weeks=math.ceil(dias / 7)) if dias > 0 else timedelta(0)
+            if deslocamento.days:
+                self.stdout.write(f'📅 Datas deslocadas em {deslocamento.days} dia(s)')
+                registros = [self._deslocar(registro, deslocamento) for registro in registros]
+        return registros
+
+    def _deslocar(self, registro, deslocamento):
+        def trocar(valor):
+            if isinstance(valor, str):
+                return DATA.sub(lambda m: self._somar_dias(m, deslocamento), valor)
+            if isinstance(valor, list):
+                return [trocar(item) for item in valor]
+            if isinstance(valor, dict):
+                return {chave: trocar(item) for chave, item in valor.items()}
+            return valor
+
+        registro = dict(registro)
+        for campo in ('caminho', 'query', 'corpo', 'kwargs'):
+            registro[campo] = trocar(registro.get(campo))
+        return registro
+
+    @staticmethod
+    def _somar_dias(match, deslocamento):
+        try:
+            return (date(*map(int, match.groups())) + deslocamento).isoformat()
+        except ValueError:
+            return match.group(0)
+
+    # ===== EXECUÇÃO =====
+
+    def _reproduzir(self, registros, options, executar):
+        resultados = []
+        lock = threading.Lock()
+        velocidade = options['velocidade']
+
+        def tarefa(registro, previsto):
+            atraso = time.perf_counter() - previsto if velocidade > 0 else 0.0
+            inicio = time.perf_counter()
+            try:
+                status = executar(registro)
+            except Exception as e:
+                status = f'erro: {type(e).__name__}'
+            with lock:
+                resultados.append((registro, status, time.perf_counter() - inicio, atraso))
+
+        inicio = time.perf_counter()
+        ts_inicial = registros[0]['ts']
+        with ThreadPoolExecutor(max_workers=options['concorrencia']) as pool:
+            futuros = []
+            for registro in registros:
+                previsto = inicio + (registro['ts'] - ts_inicial) / velocidade if velocidade > 0 else inicio
+                espera = previsto - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+                futuros.append(pool.submit(tarefa, registro, previsto))
+            wait(futuros)
+        return resultados, time.perf_counter() - inicio
+
+    def _executor_interno(self):
+        local = threading.local()
+        donos = {}
+
+        def cliente(registro):
+            if not hasattr(local, 'clientes'):
+                local.clientes = {}
+            slug = registro.get('kwargs', {}).get('slug') if registro.get('autenticado') else None
+            if slug not in local.clientes:
+                novo = Client(raise_request_exception=False)
+                if slug:
+                    if slug not in donos:
+                        entrada = shards.entrada_por_slug(slug)
+                        with shards.usar_banco(entrada[0] if entrada else None):
+                            barbearia = Barbearia.objects.select_related('usuario').filter(slug=slug).first()
+                        donos[slug] = barbearia.usuario if barbearia else None
+                    if donos[slug] is not None:
+                        # Páginas do painel: entra como o dono do estabelecimento
+                        novo.force_login(donos[slug])
+                local.clientes[slug] = novo
+            return local.clientes[slug]
+
+        def executar(registro):
+            extras = {'QUERY_STRING': urlencode(registro.get('query') or {}, doseq=True)}
+            corpo, tipo = self._corpo(registro)
+            if tipo:
+                extras['content_type'] = tipo
+            response = cliente(registro).generic(registro['metodo'], registro['caminho'], corpo, **extras)
+            if response.streaming:
+                response.close()
+            return response.status_code
+
+        return executar
+
+    def _executor_http(self, url):
+        partes = urlsplit(url)
+        local = threading.local()
+
+        def executar(registro):
+            if not hasattr(local, 'conexao'):
+                classe = http.client.HTTPSConnection if partes.scheme == 'https' else http.client.HTTPConnection
+                local.conexao = classe(partes.hostname, partes.port, timeout=30)
+            caminho = registro['caminho']
+            if registro.get('query'):
+                caminho += '?' + urlencode(registro['query'], doseq=True)
+            corpo, tipo = self._corpo(registro)
+            try:
+                local.conexao.request(registro['metodo'], caminho, body=corpo or None, headers={'Content-Type': tipo} if tipo else {})
+                resposta = local.conexao.getresponse()
+                resposta.read()
+                return resposta.status
+            except (OSError, http.client.HTTPException):
+                local.conexao.close()
+                del local.conexao
+                raise
+
+        return executar
+
+    @staticmethod
+    def _corpo(registro):
+        if registro.get('formato') == 'json':
+            return json.dumps(registro.get('corpo')), 'application/json'
+        if registro.get('formato') == 'form':
+            return urlencode(registro.get('corpo') or {}, doseq=True), 'application/x-www-form-urlencoded'
+        return '', None
+
+    @contextmanager
+    def _ambiente_isolado(self, options):
+        """Cópia dos bancos SQLite, emails em memória, sem eventos, métricas, captura nem limites"""
+        pasta = None
+        originais = {}
+        if not options['sem_copia']:
+            bancos = {alias: config for alias, config in settings.DATABASES.items() if config['ENGINE'] == 'django.db.backends.sqlite3'}
+            if len(bancos) != len(settings.DATABASES):
+                raise CommandError('O modo interno só copia bancos SQLite; use --sem-copia com um banco de teste ou --url.')
+            connections.close_all()
+            pasta = tempfile.mkdtemp(prefix='replay-')
+            for alias, config in bancos.items():
+                copia = str(Path(pasta) / f'{alias}.sqlite3')
+                with sqlite3.connect(str(config['NAME'])) as origem, sqlite3.connect(copia) as destino:
+                    origem.backup(destino)
+                originais[alias] = config['NAME']
+                config['NAME'] = copia
+            self.stdout.write(f'🗄️  Banco(s) copiado(s) para {pasta}')
+
+        broker = eventos.broker
+        eventos.broker = eventos.BrokerLocal(None)
+        # Respostas 4xx/5xx são contadas no relatório em vez de logadas
+        log = logging.getLogger('django.request')
+        nivel_log = log.level
+        log.setLevel(logging.CRITICAL)
+        try:
+            with override_settings(
+                EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                LIMITES_TAXA={}, CAPTURA_TRAFEGO=False, METRICAS_DIR=None,
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            ):
+                yield
+        finally:
+            log.setLevel(nivel_log)
+            eventos.broker = broker
+            connections.close_all()
+            for alias, nome in originais.items():
+                settings.DATABASES[alias]['NAME'] = nome
+            if pasta:
+                shutil.rmtree(pasta, ignore_errors=True)
+
+    # ===== RELATÓRIO =====
+
+    def _relatorio(self, registros, resultados, duracao, options):
+        por_rota = defaultdict(list)
+        capturado = defaultdict(list)
+        status_por_rota = defaultdict(Counter)
+        atrasos = []
+        for registro, status, latencia, atraso in resultados:
+            por_rota[registro['rota']].append(latencia * 1000)
+            capturado[registro['rota']].append(registro.get('duracao_ms', 0))
+            status_por_rota[registro['rota']][status] += 1
+            atrasos.append(atraso * 1000)
+
+        todas = sorted(latencia for latencias in por_rota.values() for latencia in latencias)
+        atrasos.sort()
+        self.stdout.write('\n' + '=' * 110)
+        self.stdout.write('📊 RELATÓRIO DO REPLAY (ms)')
+        self.stdout.write('=' * 110)
+        self.stdout.write(f'{"rota":<50} {"n":>6} {"p50":>8} {"p95":>8} {"p99":>8} {"máx":>8} {"orig p50":>9} {"orig p99":>9}')
+
+        relatorio = {'duracao_s': duracao, 'requisicoes': len(resultados), 'rotas': {}}
+        for rota in sorted(por_rota, key=lambda nome: -len(por_rota[nome])):
+            latencias = sorted(por_rota[rota])
+            originais = sorted(capturado[rota])
+            linha = {
+                'n': len(latencias),
+                'p50': _percentil(latencias, 0.50), 'p95': _percentil(latencias, 0.95),
+                'p99': _percentil(latencias, 0.99), 'max': latencias[-1],
+                'original_p50': _percentil(originais, 0.50), 'original_p99': _percentil(originais, 0.99),
+                'status': {str(status): total for status, total in status_por_rota[rota].items()},
+            }
+            relatorio['rotas'][rota] = linha
+            self.stdout.write(
+                f'{rota[:50]:<50} {linha["n"]:>6} {linha["p50"]:>8.1f} {linha["p95"]:>8.1f} {linha["p99"]:>8.1f} '
+                f'{linha["max"]:>8.1f} {linha["original_p50"]:>9.1f} {linha["original_p99"]:>9.1f}'
+            )
+
+        falhas = {
+            rota: {status: total for status, total in contagem.items() if not isinstance(status, int) or status >= 500}
+            for rota, contagem in status_por_rota.items()
+        }
+        falhas = {rota: contagem for rota, contagem in falhas.items() if contagem}
+
+        self.stdout.write('-' * 110)
+        self.stdout.write(f'⚡ {len(resultados)} requisição(ões) em {duracao:.1f}s ({len(resultados) / duracao if duracao else 0:.1f}/s)')
+        self.stdout.write(f'⏱️  Geral: p50 {_percentil(todas, 0.50):.1f} | p95 {_percentil(todas, 0.95):.1f} | p99 {_percentil(todas, 0.99):.1f}')
+        if options['velocidade'] > 0:
+            # Atraso alto: a concorrência não deu conta do ritmo pedido
+            self.stdout.write(f'🐢 Atraso para iniciar: p95 {_percentil(atrasos, 0.95):.1f} | máx {atrasos[-1] if atrasos else 0:.1f}')
+        for rota, contagem in falhas.items():
+            self.stdout.write(self.style.ERROR(f'❌ {rota}: {dict(contagem)}'))
+        relatorio.update(p50=_percentil(todas, 0.50), p95=_percentil(todas, 0.95), p99=_percentil(todas, 0.99))
+
+        if options['saida']:
+            Path(options['saida']).write_text(json.dumps(relatorio, indent=2, ensure_ascii=False))
+            self.stdout.write(f'💾 Relatório salvo em {options["saida"]}')
+        if not falhas:
+            self.stdout.write(self.style.SUCCESS('✅ Replay concluído sem erros de servidor'))
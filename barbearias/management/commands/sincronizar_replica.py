@@ -0,0 +1,48 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from barbearias.replica import banco_replica
+
+
+class Command(BaseCommand):
+    help = (
+        'Copia o banco SQLite principal para o arquivo da réplica (BANCO_REPLICA), para testar '
+        'o roteamento de leituras localmente. Usa a API de backup do SQLite: a cópia é consistente '
+        'mesmo com o servidor gravando.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalo', type=float, default=0, help='Repete a cópia a cada N segundos (0 = uma vez)')
+
+    def handle(self, *args, **options):
+        alias = banco_replica()
+        if not alias:
+            raise CommandError('Nenhuma réplica configurada: defina BANCO_REPLICA e o alias em DATABASES.')
+
+        origem = settings.DATABASES[DEFAULT_DB_ALIAS]
+        destino = settings.DATABASES[alias]
+        for banco in (origem, destino):
+            if banco['ENGINE'] != 'django.db.backends.sqlite3':
+                raise CommandError('A sincronização por cópia só funciona com SQLite; em produção use a replicação do banco.')
+
+        self.stdout.write(f'🔁 {origem["NAME"]} → {destino["NAME"]}')
+        while True:
+            inicio = time.monotonic()
+            self._copiar(str(origem['NAME']), str(destino['NAME']))
+            self.stdout.write(self.style.SUCCESS(f'✅ Réplica sincronizada em {(time.monotonic() - inicio) * 1000:.0f} ms'))
+            if not options['intervalo']:
+                return
+            time.sleep(options['intervalo'])
+
+    def _copiar(self, caminho_origem, caminho_destino):
+        origem = sqlite3.connect(caminho_origem)
+        destino = sqlite3.connect(caminho_destino)
+        try:
+            origem.backup(destino)
+        finally:
+            destino.close()
+            origem.close()
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from barbearias.perfil import gerar_token
+
+
+class Command(BaseCommand):
+    help = 'Gera o token do cabeçalho X-Perfil para um superusuário pedir o perfil de requisições'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usuario', help='Username de um superusuário')
+
+    def handle(self, *args, **options):
+        usuario = User.objects.filter(username=options['usuario']).first()
+        if usuario is None:
+            raise CommandError(f'Usuário "{options["usuario"]}" não encontrado.')
+        if not usuario.is_superuser or not usuario.is_active:
+            raise CommandError(f'O usuário "{usuario.username}" precisa estar ativo e ser superusuário.')
+
+        token = gerar_token(usuario)
+        validade = getattr(settings, 'PERFIL_TOKEN_VALIDADE', 15 * 60) // 60
+        self.stdout.write(self.style.SUCCESS(f'🔑 Token válido por {validade} minuto(s):'))
+        self.stdout.write(token)
+        self.stdout.write('\n📈 Use no cabeçalho ou envie o link (vale uma vez) para quem está com a lentidão:')
+        self.stdout.write(f'   curl -H "X-Perfil: {token}" "http://localhost:8000/<slug>/api/horarios-disponiveis/?..."')
+        self.stdout.write(f'   http://localhost:8000/<slug>/admin/agendamentos/?_perfil={token}')
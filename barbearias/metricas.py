@@ -0,0 +1,371 @@
+"""
+Métricas no formato de texto do Prometheus, expostas em /metrics.
+
+Contadores e histogramas ficam em memória no processo e são gravados em
+METRICAS_DIR/metricas-<pid>.json (no máximo a cada METRICAS_INTERVALO_GRAVACAO
+segundos e ao sair). O /metrics, atendido por qualquer worker, soma os arquivos de
+todos os processos: workers do servidor e comandos como enviar_notificacoes. Os
+arquivos de processos que já terminaram são somados em acumulado.json, então os
+contadores nunca voltam para trás. Sem METRICAS_DIR, cada processo só vê os próprios
+números.
+
+Medidores (filas de lembretes e resumos) são calculados na hora da coleta.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem compactação dos arquivos de processos encerrados
+    fcntl = None
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ARQUIVO_ACUMULADO = 'acumulado.json'
+
+_metricas = {}
+_valores = {}
+_lock = threading.Lock()
+_estado = {'pid': None, 'gravado_em': 0.0, 'pendente': False}
+
+
+def _diretorio():
+    diretorio = getattr(settings, 'METRICAS_DIR', None)
+    return Path(diretorio) if diretorio else None
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        _metricas[nome] = self
+
+    def _chave(self, rotulos):
+        if set(rotulos) != set(self.rotulos):
+            raise ValueError(f'{self.nome} espera os rótulos {self.rotulos}, recebeu {tuple(rotulos)}')
+        return tuple((nome, str(rotulos[nome])) for nome in self.rotulos)
+
+
+class Contador(_Metrica):
+    tipo = 'counter'
+
+    def inc(self, valor=1, **rotulos):
+        _somar([((self.nome, '_total', self._chave(rotulos)), valor)])
+
+
+class Histograma(_Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, rotulos=(), buckets=BUCKETS_LATENCIA):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(buckets)
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        amostras = [
+            ((self.nome, '_bucket', chave + (('le', _formatar(limite)),)), 1)
+            for limite in self.buckets if valor <= limite
+        ]
+        amostras += [
+            ((self.nome, '_bucket', chave + (('le', '+Inf'),)), 1),
+            ((self.nome, '_count', chave), 1),
+            ((self.nome, '_sum', chave), valor),
+        ]
+        _somar(amostras)
+
+    @contextmanager
+    def medir(self, **rotulos):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def cronometrar(self, **rotulos):
+        """Decorator que observa a duração de cada chamada (funções síncronas ou assíncronas)"""
+        def decorator(funcao):
+            if iscoroutinefunction(funcao):
+                @wraps(funcao)
+                async def _async(*args, **kwargs):
+                    with self.medir(**rotulos):
+                        return await funcao(*args, **kwargs)
+                return _async
+
+            @wraps(funcao)
+            def _sync(*args, **kwargs):
+                with self.medir(**rotulos):
+                    return funcao(*args, **kwargs)
+            return _sync
+        return decorator
+
+
+class Medidor(_Metrica):
+    """Valor calculado na coleta: `funcao` retorna um número ou {(valores dos rótulos): número}"""
+    tipo = 'gauge'
+
+    def __init__(self, nome, ajuda, funcao, rotulos=()):
+        super().__init__(nome, ajuda, rotulos)
+        self.funcao = funcao
+
+    def amostras(self):
+        resultado = self.funcao()
+        if not isinstance(resultado, dict):
+            resultado = {(): resultado}
+        return {
+            (self.nome, '', tuple(zip(self.rotulos, (str(valor) for valor in valores)))): numero
+            for valores, numero in resultado.items()
+        }
+
+
+def _formatar(numero):
+    if numero == float('inf'):
+        return '+Inf'
+    return repr(float(numero))
+
+
+# ===== ARMAZENAMENTO =====
+
+def _somar(amostras):
+    with _lock:
+        if _estado['pid'] != os.getpid():
+            # Processo novo (início ou fork do servidor): não herda os números do pai,
+            # mas continua os de um processo encerrado que tinha o mesmo pid
+            _valores.clear()
+            _estado.update(pid=os.getpid(), gravado_em=0.0, pendente=False)
+            diretorio = _diretorio()
+            if diretorio is not None:
+                diretorio.mkdir(parents=True, exist_ok=True)
+                with _travado(diretorio):
+                    _valores.update(_ler(diretorio / f'metricas-{os.getpid()}.json'))
+        for chave, valor in amostras:
+            _valores[chave] = _valores.get(chave, 0) + valor
+        _estado['pendente'] = True
+        intervalo = getattr(settings, 'METRICAS_INTERVALO_GRAVACAO', 1.0)
+        if time.monotonic() - _estado['gravado_em'] >= intervalo:
+            _gravar()
+
+
+def _serializar(valores):
+    return [[nome, sufixo, [list(rotulo) for rotulo in rotulos], valor] for (nome, sufixo, rotulos), valor in valores.items()]
+
+
+def _desserializar(linhas):
+    return {(nome, sufixo, tuple(tuple(rotulo) for rotulo in rotulos)): valor for nome, sufixo, rotulos, valor in linhas}
+
+
+def _gravar():
+    """Grava os valores deste processo (chamar com _lock)"""
+    diretorio = _diretorio()
+    _estado.update(gravado_em=time.monotonic(), pendente=False)
+    if diretorio is None or _estado['pid'] != os.getpid():
+        return
+    diretorio.mkdir(parents=True, exist_ok=True)
+    destino = diretorio / f'metricas-{os.getpid()}.json'
+    temporario = destino.with_suffix('.tmp')
+    temporario.write_text(json.dumps(_serializar(_valores)))
+    os.replace(temporario, destino)
+
+
+@atexit.register
+def gravar_pendentes():
+    with _lock:
+        if _estado['pendente']:
+            _gravar()
+
+
+def _ler(caminho):
+    try:
+        return _desserializar(json.loads(caminho.read_text()))
+    except (OSError, ValueError):
+        return {}
+
+
+def _processo_ativo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@contextmanager
+def _travado(diretorio):
+    """Exclusão entre processos para compactar e ler os arquivos"""
+    if fcntl is None:
+        yield
+        return
+    with open(diretorio / '.lock', 'w') as trava:
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        yield
+
+
+def _compactar(diretorio):
+    """Soma os arquivos de processos encerrados em acumulado.json (chamar com _travado)"""
+    encerrados = [
+        caminho for caminho in diretorio.glob('metricas-*.json')
+        if not _processo_ativo(int(caminho.stem.split('-')[1]))
+    ]
+    if not encerrados:
+        return
+    acumulado = _ler(diretorio / ARQUIVO_ACUMULADO)
+    for caminho in encerrados:
+        for chave, valor in _ler(caminho).items():
+            acumulado[chave] = acumulado.get(chave, 0) + valor
+    temporario = diretorio / f'{ARQUIVO_ACUMULADO}.tmp'
+    temporario.write_text(json.dumps(_serializar(acumulado)))
+    os.replace(temporario, diretorio / ARQUIVO_ACUMULADO)
+    for caminho in encerrados:
+        caminho.unlink(missing_ok=True)
+
+
+def coletar():
+    """Valores somados de todos os processos"""
+    with _lock:
+        if _estado['pid'] == os.getpid():
+            _gravar()
+        proprios = dict(_valores) if _estado['pid'] == os.getpid() else {}
+
+    diretorio = _diretorio()
+    if diretorio is None or not diretorio.exists():
+        return proprios
+
+    total = dict(proprios)
+    with _travado(diretorio):
+        _compactar(diretorio)
+        for caminho in [diretorio / ARQUIVO_ACUMULADO, *diretorio.glob('metricas-*.json')]:
+            if caminho.name == f'metricas-{os.getpid()}.json':
+                continue
+            for chave, valor in _ler(caminho).items():
+                total[chave] = total.get(chave, 0) + valor
+    return total
+
+
+# ===== EXPOSIÇÃO =====
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _linha(nome, rotulos, valor):
+    if rotulos:
+        texto = ','.join(f'{rotulo}="{_escapar(conteudo)}"' for rotulo, conteudo in rotulos)
+        return f'{nome}{{{texto}}} {_formatar(valor)}'
+    return f'{nome} {_formatar(valor)}'
+
+
+def _ordem_amostra(item):
+    (_, sufixo, rotulos), _ = item
+    # Buckets em ordem crescente de "le", como o Prometheus espera
+    rotulos_sem_le = tuple(rotulo for rotulo in rotulos if rotulo[0] != 'le')
+    le = dict(rotulos).get('le')
+    return (rotulos_sem_le, {'_bucket': 0, '_count': 1, '_sum': 2}.get(sufixo, 0), float(le) if le else 0.0)
+
+
+def exportar():
+    """Texto no formato de exposição do Prometheus (version 0.0.4)"""
+    valores = coletar()
+    for metrica in _metricas.values():
+        if isinstance(metrica, Medidor):
+            valores.update(metrica.amostras())
+
+    por_metrica = {}
+    for chave, valor in valores.items():
+        por_metrica.setdefault(chave[0], []).append((chave, valor))
+
+    linhas = []
+    for nome in sorted(_metricas):
+        metrica = _metricas[nome]
+        linhas.append(f'# HELP {nome} {metrica.ajuda}')
+        linhas.append(f'# TYPE {nome} {metrica.tipo}')
+        for (_, sufixo, rotulos), valor in sorted(por_metrica.get(nome, []), key=_ordem_amostra):
+            linhas.append(_linha(nome + sufixo, rotulos, valor))
+    return '\n'.join(linhas) + '\n'
+
+
+# ===== MÉTRICAS DO SISTEMA =====
+
+def _lembretes_atrasados():
+    """Lembretes de 24h cuja janela de envio já passou sem envio, somados em todos os shards"""
+    from datetime import timedelta
+
+    from django.db.models import F
+    from django.utils import timezone
+
+    from agendamentos.models import Agendamento
+    from . import shards
+
+    # Janela do enviar_notificacoes: 24h antes, com 30 minutos de margem
+    fim_janela = timedelta(hours=24) - timedelta(minutes=30)
+    agora = timezone.now()
+    total = 0
+    for _ in shards.para_cada_banco():
+        total += Agendamento.objects.filter(
+            data_hora__gt=agora,
+            data_hora__lt=agora + fim_janela,
+            # Agendados em cima da hora nunca entram na janela do lembrete
+            criado_em__lt=F('data_hora') - fim_janela,
+            status__in=['agendado', 'confirmado'],
+            email_cliente__gt='',
+            notificacao_enviada=False,
+        ).count()
+    return total
+
+
+def _resumos_pendentes():
+    from django.db.models import Count
+
+    from agendamentos.models import NotificacaoPendente
+    from . import shards
+
+    total = {('resumo_horario',): 0, ('resumo_diario',): 0}
+    for _ in shards.para_cada_banco():
+        pendentes = NotificacaoPendente.objects.filter(enviada_em__isnull=True).values('barbearia__modo_notificacao').annotate(total=Count('id'))
+        for linha in pendentes:
+            chave = (linha['barbearia__modo_notificacao'],)
+            total[chave] = total.get(chave, 0) + linha['total']
+    return total
+
+
+AGENDAMENTOS = Contador(
+    'barbearia_agendamentos', 'Tentativas de agendamento por origem e resultado', ['origem', 'resultado']
+)
+AGENDAMENTOS_REJEITADOS = Contador(
+    'barbearia_agendamentos_rejeitados', 'Agendamentos recusados na validação do modelo', ['motivo']
+)
+HORARIOS_DISPONIVEIS_SEGUNDOS = Histograma(
+    'barbearia_horarios_disponiveis_segundos', 'Tempo para calcular os horários livres de um profissional em um dia', ['modo']
+)
+API_HORARIOS_SEGUNDOS = Histograma(
+    'barbearia_api_horarios_disponiveis_segundos', 'Latência da API de horários disponíveis'
+)
+EMAILS = Contador(
+    'barbearia_emails', 'Emails enviados por tipo e resultado', ['tipo', 'resultado']
+)
+EMAIL_ENVIO_SEGUNDOS = Histograma(
+    'barbearia_email_envio_segundos', 'Tempo de envio de um email pelo SMTP (com novas tentativas)', ['tipo']
+)
+SMTP_LIMITACOES = Contador(
+    'barbearia_smtp_limitacoes', 'Recusas temporárias do servidor SMTP por excesso de envios'
+)
+REQUISICOES_LIMITADAS = Contador(
+    'barbearia_requisicoes_limitadas', 'Requisições rejeitadas pelo limitador de taxa', ['rota']
+)
+LEMBRETES_ATRASADOS = Medidor(
+    'barbearia_lembretes_atrasados', 'Lembretes de 24h que já deveriam ter sido enviados', _lembretes_atrasados
+)
+RESUMOS_PENDENTES = Medidor(
+    'barbearia_notificacoes_resumo_pendentes', 'Eventos aguardando o próximo email de resumo', _resumos_pendentes, ['modo']
+)
@@ -0,0 +1,215 @@
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.deprecation import MiddlewareMixin
+
+from . import captura, datas, limitador, metricas, perfil, replica, sessoes, shards
+
+logger = logging.getLogger(__name__)
+
+
+def obter_ip_cliente(request):
+    """
+    IP do cliente, respeitando o cabeçalho do proxy quando configurado. Cada proxy
+    acrescenta um endereço ao final do X-Forwarded-For e o começo vem do próprio
+    cliente: vale o endereço anotado pelo primeiro dos LIMITES_TAXA_PROXIES_CONFIAVEIS,
+    contando da direita.
+    """
+    cabecalho = getattr(settings, 'LIMITES_TAXA_CABECALHO_IP', None)
+    valor = request.META.get(cabecalho, '') if cabecalho else ''
+    enderecos = [endereco.strip() for endereco in valor.split(',') if endereco.strip()]
+    if enderecos:
+        proxies = max(1, getattr(settings, 'LIMITES_TAXA_PROXIES_CONFIAVEIS', 1))
+        return enderecos[-min(proxies, len(enderecos))]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+class SessaoMiddleware(SessionMiddleware):
+    """
+    SessionMiddleware que entrega uma sessão vazia, sem banco nem cookie, às rotas
+    de ROTAS_SEM_SESSAO (veja barbearias/sessoes.py)
+    """
+
+    def process_request(self, request):
+        if sessoes.rota_sem_sessao(request):
+            request.session = sessoes.SessaoVazia()
+            return None
+        return super().process_request(request)
+
+    def process_response(self, request, response):
+        if isinstance(getattr(request, 'session', None), sessoes.SessaoVazia):
+            return response
+        return super().process_response(request, response)
+
+
+class LimiteTaxaMiddleware(MiddlewareMixin):
+    """Aplica LIMITES_TAXA por nome de URL, com uma contagem por IP e barbearia"""
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if not match or not match.url_name:
+            return None
+
+        regra = limitador.obter_regra(match.url_name, request.method)
+        if not regra:
+            return None
+
+        slug = view_kwargs.get('slug', '')
+        chave = f'{limitador.PREFIXO}:{match.url_name}:{slug}:{obter_ip_cliente(request)}'
+        permitido, espera = limitador.consumir(chave, regra['taxa'], regra['capacidade'])
+        if permitido:
+            return None
+
+        limitador.registrar_rejeicao(match.url_name)
+        metricas.REQUISICOES_LIMITADAS.inc(rota=match.url_name)
+        logger.warning(f"Limite de requisições excedido em {match.url_name} ({slug}) por {obter_ip_cliente(request)}")
+
+        mensagem = 'Muitas requisições. Tente novamente em instantes.'
+        if match.url_name.startswith('api_'):
+            response = JsonResponse({'erro': mensagem}, status=429)
+        else:
+            response = HttpResponse(mensagem, status=429, content_type='text/plain; charset=utf-8')
+        response['Retry-After'] = str(max(1, math.ceil(espera)))
+        return response
+
+
+class FusoHorarioMiddleware(MiddlewareMixin):
+    """
+    Ativa o fuso da barbearia da URL durante a requisição, para que templates
+    (filtros date/time), formulários e timezone.localtime() usem o horário local dela
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        slug = view_kwargs.get('slug')
+        zona = datas.fuso_por_slug(slug) if slug else None
+        if zona is not None:
+            timezone.activate(zona)
+        return None
+
+    def process_response(self, request, response):
+        timezone.deactivate()
+        return response
+
+
+class ReplicaLeituraMiddleware(MiddlewareMixin):
+    """
+    Envia as leituras das rotas em ROTAS_REPLICA para a réplica e, depois de uma
+    escrita, mantém o cliente no banco principal por alguns segundos
+    """
+    METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS')
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if not replica.banco_replica() or not match or not match.url_name:
+            return None
+        if request.COOKIES.get(replica.COOKIE_ADERENCIA):
+            return None
+        # A réplica espelha apenas o banco principal
+        if shards.banco_atual() not in (None, DEFAULT_DB_ALIAS):
+            return None
+        if replica.rota_usa_replica(match.url_name, request.method):
+            replica.ativar_replica()
+            request.leitura_replica = True
+        return None
+
+    def process_response(self, request, response):
+        if getattr(request, 'leitura_replica', False):
+            replica.desativar_replica()
+
+        if replica.banco_replica() and request.method not in self.METODOS_SEGUROS and response.status_code < 400:
+            match = request.resolver_match
+            if not (match and replica.rota_usa_replica(match.url_name, request.method)):
+                response.set_cookie(
+                    replica.COOKIE_ADERENCIA, '1',
+                    max_age=getattr(settings, 'REPLICA_ADERENCIA_SEGUNDOS', 10),
+                    httponly=True, samesite='Lax',
+                )
+        return response
+
+
+class ShardMiddleware(MiddlewareMixin):
+    """
+    Ativa o banco da barbearia da URL (DiretorioBarbearia). No admin do Django, o
+    superusuário trabalha no shard escolhido pela ação do diretório (sessão).
+    Enquanto a barbearia muda de shard, escritas recebem 503.
+    """
+    METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS')
+    CHAVE_SESSAO = 'shard_admin'
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        slug = view_kwargs.get('slug')
+        if slug:
+            entrada = shards.entrada_por_slug(slug)
+            if entrada is None:
+                return None
+            banco, somente_leitura = entrada
+            if somente_leitura and request.method not in self.METODOS_SEGUROS:
+                mensagem = 'Estabelecimento em manutenção. Tente novamente em instantes.'
+                match = request.resolver_match
+                if match and match.url_name and match.url_name.startswith('api_'):
+                    response = JsonResponse({'erro': mensagem}, status=503)
+                else:
+                    response = HttpResponse(mensagem, status=503, content_type='text/plain; charset=utf-8')
+                response['Retry-After'] = '30'
+                return response
+            shards.ativar(banco)
+            return None
+
+        match = request.resolver_match
+        if match and match.app_name == 'admin' and request.user.is_superuser:
+            banco = request.session.get(self.CHAVE_SESSAO)
+            if banco in settings.DATABASES:
+                shards.ativar(banco)
+        return None
+
+    def process_response(self, request, response):
+        shards.desativar()
+        return response
+
+
+class PerfilMiddleware(MiddlewareMixin):
+    """
+    Executa a view sob o profiler quando um superusuário pede (?_perfil=1, token
+    em ?_perfil= ou no cabeçalho X-Perfil). Fica por último para perfilar só a
+    view, já no shard, fuso e banco de leitura certos.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if perfil.PARAMETRO not in request.GET and perfil.CABECALHO not in request.META:
+            return None
+        usuario = perfil.solicitante(request)
+        if usuario is None:
+            return None
+        return perfil.executar(request, usuario, view_func, view_args, view_kwargs)
+
+
+class CapturaMiddleware(MiddlewareMixin):
+    """
+    Registra as requisições para o replay_trafego quando CAPTURA_TRAFEGO está
+    ligado (veja barbearias/captura.py). Fica no topo para medir a requisição inteira.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'CAPTURA_TRAFEGO', False):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process_request(self, request):
+        if captura.amostrar():
+            request.captura_inicio = (time.time(), time.perf_counter())
+        return None
+
+    def process_response(self, request, response):
+        inicio = getattr(request, 'captura_inicio', None)
+        if inicio is not None:
+            registro = captura.montar_registro(request, response, inicio[0], (time.perf_counter() - inicio[1]) * 1000)
+            if registro is not None:
+                captura.enfileirar(registro)
+        return response
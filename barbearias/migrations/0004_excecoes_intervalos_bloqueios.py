@@ -0,0 +1,63 @@
+# Generated by Django 5.2.4 on 2026-10-19 15:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('barbearias', '0003_alter_barbearia_options_barbearia_email_notificacoes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IntervaloProfissional',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia_semana', models.IntegerField(blank=True, choices=[(0, 'Segunda-feira'), (1, 'Terça-feira'), (2, 'Quarta-feira'), (3, 'Quinta-feira'), (4, 'Sexta-feira'), (5, 'Sábado'), (6, 'Domingo')], help_text='Deixe vazio para repetir todos os dias', null=True)),
+                ('inicio', models.TimeField()),
+                ('fim', models.TimeField()),
+                ('profissional', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='intervalos', to='barbearias.profissional')),
+            ],
+            options={
+                'verbose_name': 'Intervalo do Profissional',
+                'verbose_name_plural': 'Intervalos dos Profissionais',
+                'ordering': ['dia_semana', 'inicio'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BloqueioProfissional',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inicio', models.DateTimeField()),
+                ('fim', models.DateTimeField()),
+                ('motivo', models.CharField(blank=True, max_length=200)),
+                ('profissional', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bloqueios', to='barbearias.profissional')),
+            ],
+            options={
+                'verbose_name': 'Bloqueio do Profissional',
+                'verbose_name_plural': 'Bloqueios dos Profissionais',
+                'ordering': ['inicio'],
+                'indexes': [models.Index(fields=['profissional', 'fim'], name='barbearias__profiss_0f95cf_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExcecaoFuncionamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('tipo', models.CharField(choices=[('fechado', 'Fechado'), ('feriado', 'Feriado'), ('horario_especial', 'Horário especial')], default='fechado', max_length=20)),
+                ('abertura', models.TimeField(blank=True, help_text='Apenas para horário especial', null=True)),
+                ('fechamento', models.TimeField(blank=True, help_text='Apenas para horário especial', null=True)),
+                ('descricao', models.CharField(blank=True, max_length=200)),
+                ('barbearia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='excecoes_funcionamento', to='barbearias.barbearia')),
+            ],
+            options={
+                'verbose_name': 'Exceção de Funcionamento',
+                'verbose_name_plural': 'Exceções de Funcionamento',
+                'ordering': ['data'],
+                'unique_together': {('barbearia', 'data')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 15:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('barbearias', '0004_excecoes_intervalos_bloqueios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='barbearia',
+            name='modo_notificacao',
+            field=models.CharField(choices=[('imediato', 'Imediato (um email por agendamento)'), ('resumo_horario', 'Resumo a cada hora'), ('resumo_diario', 'Resumo diário')], default='imediato', help_text='Como o estabelecimento recebe as notificações de agendamentos', max_length=20),
+        ),
+    ]
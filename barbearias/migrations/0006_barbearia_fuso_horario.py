@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('barbearias', '0005_barbearia_modo_notificacao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='barbearia',
+            name='fuso_horario',
+            field=models.CharField(choices=[('America/Sao_Paulo', 'Brasília (SP, RJ, MG, Sul, Nordeste, GO, DF)'), ('America/Bahia', 'Bahia'), ('America/Fortaleza', 'Fortaleza (CE, RN, PB, MA, PI)'), ('America/Recife', 'Recife (PE)'), ('America/Maceio', 'Maceió (AL, SE)'), ('America/Belem', 'Belém (PA, AP)'), ('America/Araguaina', 'Araguaína (TO)'), ('America/Cuiaba', 'Cuiabá (MT)'), ('America/Campo_Grande', 'Campo Grande (MS)'), ('America/Porto_Velho', 'Porto Velho (RO)'), ('America/Boa_Vista', 'Boa Vista (RR)'), ('America/Manaus', 'Manaus (AM)'), ('America/Rio_Branco', 'Rio Branco (AC)'), ('America/Noronha', 'Fernando de Noronha')], default='America/Sao_Paulo', help_text='Fuso horário usado na agenda, nos filtros por dia e nos emails', max_length=50),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-19 15:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, migrations, models
+
+
+def preencher_diretorio(apps, schema_editor):
+    """As barbearias existentes ficam no banco principal, com o mesmo id"""
+    if schema_editor.connection.alias != DEFAULT_DB_ALIAS:
+        return
+    Barbearia = apps.get_model('barbearias', 'Barbearia')
+    DiretorioBarbearia = apps.get_model('barbearias', 'DiretorioBarbearia')
+    DiretorioBarbearia.objects.bulk_create([
+        DiretorioBarbearia(id=id_, slug=slug, banco=DEFAULT_DB_ALIAS)
+        for id_, slug in Barbearia.objects.values_list('id', 'slug')
+    ])
+    # Ids explícitos não avançam a sequência em todos os bancos (ex: PostgreSQL)
+    comandos = schema_editor.connection.ops.sequence_reset_sql(no_style(), [DiretorioBarbearia])
+    for comando in comandos:
+        schema_editor.execute(comando)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('barbearias', '0006_barbearia_fuso_horario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiretorioBarbearia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(max_length=200, unique=True)),
+                ('banco', models.CharField(default='default', help_text='Alias em settings.DATABASES', max_length=100)),
+                ('somente_leitura', models.BooleanField(default=False, help_text='Bloqueia escritas enquanto a barbearia muda de shard')),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Diretório de Estabelecimentos',
+                'verbose_name_plural': 'Diretório de Estabelecimentos',
+            },
+        ),
+        migrations.AlterField(
+            model_name='barbearia',
+            name='usuario',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(preencher_diretorio, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('barbearias', '0007_diretorio_barbearias'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerfilRequisicao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('metodo', models.CharField(max_length=10)),
+                ('caminho', models.CharField(max_length=500)),
+                ('rota', models.CharField(blank=True, help_text='Nome da URL', max_length=100)),
+                ('barbearia_slug', models.SlugField(blank=True, max_length=200)),
+                ('status', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('duracao_ms', models.FloatField()),
+                ('total_consultas', models.PositiveIntegerField(default=0)),
+                ('tempo_consultas_ms', models.FloatField(default=0)),
+                ('consultas', models.JSONField(default=list, help_text='SQL executado: banco, sql, parâmetros e duração')),
+                ('resumo', models.TextField(blank=True, help_text='Funções com maior tempo acumulado')),
+                ('perfil', models.BinaryField(help_text='Estatísticas no formato do pstats (.prof)')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Perfil de Requisição',
+                'verbose_name_plural': 'Perfis de Requisições',
+                'ordering': ['-criado_em'],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('barbearias', '0008_perfil_requisicao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModeloHorario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100)),
+                ('data_inicio', models.DateField()),
+                ('data_fim', models.DateField(blank=True, help_text='Deixe vazio para valer sem data de término', null=True)),
+                ('semanas', models.PositiveSmallIntegerField(choices=[(1, 'Toda semana'), (2, 'Alterna a cada 2 semanas'), (3, 'Ciclo de 3 semanas'), (4, 'Ciclo de 4 semanas')], default=1)),
+                ('ativo', models.BooleanField(default=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('barbearia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='modelos_horario', to='barbearias.barbearia')),
+            ],
+            options={
+                'verbose_name': 'Modelo de Horário',
+                'verbose_name_plural': 'Modelos de Horário',
+                'ordering': ['-data_inicio'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DiaModeloHorario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('semana', models.PositiveSmallIntegerField(default=0)),
+                ('dia_semana', models.IntegerField(choices=[(0, 'Segunda-feira'), (1, 'Terça-feira'), (2, 'Quarta-feira'), (3, 'Quinta-feira'), (4, 'Sexta-feira'), (5, 'Sábado'), (6, 'Domingo')])),
+                ('abertura', models.TimeField(blank=True, null=True)),
+                ('fechamento', models.TimeField(blank=True, null=True)),
+                ('fechado', models.BooleanField(default=False)),
+                ('modelo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dias', to='barbearias.modelohorario')),
+            ],
+            options={
+                'verbose_name': 'Dia do Modelo de Horário',
+                'verbose_name_plural': 'Dias do Modelo de Horário',
+                'ordering': ['semana', 'dia_semana'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='modelohorario',
+            index=models.Index(fields=['barbearia', 'data_inicio'], name='barbearias__barbear_38a7ab_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='diamodelohorario',
+            unique_together={('modelo', 'semana', 'dia_semana')},
+        ),
+    ]
@@ -1,20 +1,72 @@
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, models, router, transaction
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 
+
+class DiretorioBarbearia(models.Model):
+    """
+    Em qual banco (shard) ficam os dados de cada barbearia. Fica sempre no banco
+    principal; o id é o próprio id da barbearia, único entre todos os shards.
+    """
+    slug = models.SlugField(unique=True, max_length=200)
+    banco = models.CharField(max_length=100, default=DEFAULT_DB_ALIAS, help_text="Alias em settings.DATABASES")
+    somente_leitura = models.BooleanField(default=False, help_text="Bloqueia escritas enquanto a barbearia muda de shard")
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Diretório de Estabelecimentos"
+        verbose_name_plural = "Diretório de Estabelecimentos"
+
+    def __str__(self):
+        return f"{self.slug} → {self.banco}"
+
+
 class Barbearia(models.Model):
+    MODOS_NOTIFICACAO = [
+        ('imediato', 'Imediato (um email por agendamento)'),
+        ('resumo_horario', 'Resumo a cada hora'),
+        ('resumo_diario', 'Resumo diário'),
+    ]
+    FUSOS_HORARIOS = [
+        ('America/Sao_Paulo', 'Brasília (SP, RJ, MG, Sul, Nordeste, GO, DF)'),
+        ('America/Bahia', 'Bahia'),
+        ('America/Fortaleza', 'Fortaleza (CE, RN, PB, MA, PI)'),
+        ('America/Recife', 'Recife (PE)'),
+        ('America/Maceio', 'Maceió (AL, SE)'),
+        ('America/Belem', 'Belém (PA, AP)'),
+        ('America/Araguaina', 'Araguaína (TO)'),
+        ('America/Cuiaba', 'Cuiabá (MT)'),
+        ('America/Campo_Grande', 'Campo Grande (MS)'),
+        ('America/Porto_Velho', 'Porto Velho (RO)'),
+        ('America/Boa_Vista', 'Boa Vista (RR)'),
+        ('America/Manaus', 'Manaus (AM)'),
+        ('America/Rio_Branco', 'Rio Branco (AC)'),
+        ('America/Noronha', 'Fernando de Noronha'),
+    ]
+
     nome = models.CharField(max_length=200)
     endereco = models.TextField()
     telefone = models.CharField(max_length=20)
     email_notificacoes = models.EmailField(blank=True, null=True, help_text="Email para receber notificações de novos agendamentos")
+    modo_notificacao = models.CharField(max_length=20, choices=MODOS_NOTIFICACAO, default='imediato', help_text="Como o estabelecimento recebe as notificações de agendamentos")
+    fuso_horario = models.CharField(max_length=50, choices=FUSOS_HORARIOS, default='America/Sao_Paulo', help_text="Fuso horário usado na agenda, nos filtros por dia e nos emails")
     slug = models.SlugField(unique=True, max_length=200)
-    usuario = models.OneToOneField(User, on_delete=models.CASCADE)
+    # Sem constraint no banco: os usuários ficam no banco principal e a barbearia pode estar em outro shard
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, db_constraint=False)
     ativa = models.BooleanField(default=True)
     criada_em = models.DateTimeField(auto_now_add=True)
     
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.nome)
+        if self.pk is None:
+            # O id é reservado no diretório, então não se repete entre shards
+            banco = kwargs.get('using') or router.db_for_write(Barbearia)
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                self.pk = DiretorioBarbearia.objects.using(DEFAULT_DB_ALIAS).create(slug=self.slug, banco=banco).pk
+                kwargs.setdefault('force_insert', True)
+                super().save(*args, **kwargs)
+            return
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -81,3 +133,155 @@ class HorarioFuncionamento(models.Model):
         if self.fechado:
             return f"{dia} - Fechado"
         return f"{dia} - {self.abertura.strftime('%H:%M')} às {self.fechamento.strftime('%H:%M')}"
+
+
+class ExcecaoFuncionamento(models.Model):
+    """Fechamentos, feriados e horários especiais em uma data específica"""
+    TIPOS = [
+        ('fechado', 'Fechado'),
+        ('feriado', 'Feriado'),
+        ('horario_especial', 'Horário especial'),
+    ]
+
+    barbearia = models.ForeignKey(Barbearia, on_delete=models.CASCADE, related_name='excecoes_funcionamento')
+    data = models.DateField()
+    tipo = models.CharField(max_length=20, choices=TIPOS, default='fechado')
+    abertura = models.TimeField(null=True, blank=True, help_text="Apenas para horário especial")
+    fechamento = models.TimeField(null=True, blank=True, help_text="Apenas para horário especial")
+    descricao = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        verbose_name = "Exceção de Funcionamento"
+        verbose_name_plural = "Exceções de Funcionamento"
+        unique_together = ('barbearia', 'data')
+        ordering = ['data']
+
+    @property
+    def fechado(self):
+        return self.tipo != 'horario_especial'
+
+    def __str__(self):
+        if self.fechado:
+            return f"{self.data.strftime('%d/%m/%Y')} - {self.get_tipo_display()}"
+        return f"{self.data.strftime('%d/%m/%Y')} - {self.abertura.strftime('%H:%M')} às {self.fechamento.strftime('%H:%M')}"
+
+
+class ModeloHorario(models.Model):
+    """
+    Horário alternado ou sazonal aplicado a um período de datas (ex: verão, escala
+    de sábados alternados). Com mais de uma semana no ciclo, as semanas se revezam a
+    partir da semana de data_inicio. Vale sobre o horário semanal; as exceções por
+    data continuam valendo sobre ele.
+    """
+    SEMANAS_DO_CICLO = [
+        (1, 'Toda semana'),
+        (2, 'Alterna a cada 2 semanas'),
+        (3, 'Ciclo de 3 semanas'),
+        (4, 'Ciclo de 4 semanas'),
+    ]
+
+    barbearia = models.ForeignKey(Barbearia, on_delete=models.CASCADE, related_name='modelos_horario')
+    nome = models.CharField(max_length=100)
+    data_inicio = models.DateField()
+    data_fim = models.DateField(null=True, blank=True, help_text="Deixe vazio para valer sem data de término")
+    semanas = models.PositiveSmallIntegerField(choices=SEMANAS_DO_CICLO, default=1)
+    ativo = models.BooleanField(default=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Modelo de Horário"
+        verbose_name_plural = "Modelos de Horário"
+        ordering = ['-data_inicio']
+        indexes = [
+            models.Index(fields=['barbearia', 'data_inicio']),
+        ]
+
+    def __str__(self):
+        fim = self.data_fim.strftime('%d/%m/%Y') if self.data_fim else 'sem término'
+        return f"{self.nome} ({self.data_inicio.strftime('%d/%m/%Y')} a {fim})"
+
+
+class DiaModeloHorario(models.Model):
+    """Horário de um dia da semana em uma das semanas do ciclo do modelo (semana 0 = a de data_inicio)"""
+    modelo = models.ForeignKey(ModeloHorario, on_delete=models.CASCADE, related_name='dias')
+    semana = models.PositiveSmallIntegerField(default=0)
+    dia_semana = models.IntegerField(choices=HorarioFuncionamento.DIAS_DA_SEMANA)
+    abertura = models.TimeField(null=True, blank=True)
+    fechamento = models.TimeField(null=True, blank=True)
+    fechado = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name = "Dia do Modelo de Horário"
+        verbose_name_plural = "Dias do Modelo de Horário"
+        unique_together = ('modelo', 'semana', 'dia_semana')
+        ordering = ['semana', 'dia_semana']
+
+    def __str__(self):
+        dia = self.get_dia_semana_display()
+        if self.fechado:
+            return f"Semana {self.semana + 1} - {dia} - Fechado"
+        return f"Semana {self.semana + 1} - {dia} - {self.abertura.strftime('%H:%M')} às {self.fechamento.strftime('%H:%M')}"
+
+
+class IntervaloProfissional(models.Model):
+    """Pausa recorrente de um profissional (ex: almoço)"""
+    profissional = models.ForeignKey(Profissional, on_delete=models.CASCADE, related_name='intervalos')
+    dia_semana = models.IntegerField(choices=HorarioFuncionamento.DIAS_DA_SEMANA, null=True, blank=True, help_text="Deixe vazio para repetir todos os dias")
+    inicio = models.TimeField()
+    fim = models.TimeField()
+
+    class Meta:
+        verbose_name = "Intervalo do Profissional"
+        verbose_name_plural = "Intervalos dos Profissionais"
+        ordering = ['dia_semana', 'inicio']
+
+    def __str__(self):
+        dia = self.get_dia_semana_display() if self.dia_semana is not None else 'Todos os dias'
+        return f"{self.profissional.nome} - {dia} - {self.inicio.strftime('%H:%M')} às {self.fim.strftime('%H:%M')}"
+
+
+class BloqueioProfissional(models.Model):
+    """Folga, férias ou ausência de um profissional em um período"""
+    profissional = models.ForeignKey(Profissional, on_delete=models.CASCADE, related_name='bloqueios')
+    inicio = models.DateTimeField()
+    fim = models.DateTimeField()
+    motivo = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        verbose_name = "Bloqueio do Profissional"
+        verbose_name_plural = "Bloqueios dos Profissionais"
+        ordering = ['inicio']
+        indexes = [
+            models.Index(fields=['profissional', 'fim']),
+        ]
+
+    def __str__(self):
+        return f"{self.profissional.nome} - {self.inicio.strftime('%d/%m/%Y %H:%M')} até {self.fim.strftime('%d/%m/%Y %H:%M')}"
+
+
+class PerfilRequisicao(models.Model):
+    """
+    Perfil (cProfile) e consultas SQL de uma requisição executada sob demanda por um
+    superusuário (veja barbearias/perfil.py). Fica sempre no banco principal.
+    """
+    criado_em = models.DateTimeField(auto_now_add=True)
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    metodo = models.CharField(max_length=10)
+    caminho = models.CharField(max_length=500)
+    rota = models.CharField(max_length=100, blank=True, help_text="Nome da URL")
+    barbearia_slug = models.SlugField(max_length=200, blank=True)
+    status = models.PositiveSmallIntegerField(null=True, blank=True)
+    duracao_ms = models.FloatField()
+    total_consultas = models.PositiveIntegerField(default=0)
+    tempo_consultas_ms = models.FloatField(default=0)
+    consultas = models.JSONField(default=list, help_text="SQL executado: banco, sql, parâmetros e duração")
+    resumo = models.TextField(blank=True, help_text="Funções com maior tempo acumulado")
+    perfil = models.BinaryField(help_text="Estatísticas no formato do pstats (.prof)")
+
+    class Meta:
+        verbose_name = "Perfil de Requisição"
+        verbose_name_plural = "Perfis de Requisições"
+        ordering = ['-criado_em']
+
+    def __str__(self):
+        return f"{self.metodo} {self.caminho} ({self.duracao_ms:.0f} ms)"
@@ -0,0 +1,160 @@
+"""
+Perfil de uma requisição sob demanda.
+
+Um superusuário pede o perfil de uma única requisição com ?_perfil=1 (logado) ou
+com um token assinado, gerado por `python manage.py token_perfil <usuario>`, no
+cabeçalho X-Perfil ou no próprio parâmetro (?_perfil=<token>). Com o token, o dono
+do estabelecimento que reclamou abre o link na sessão dele e o perfil sai com os
+dados reais; no parâmetro o token vale para uma única requisição, já que fica no
+histórico do navegador. A view roda sob o cProfile, com o SQL de todos os bancos
+registrado (sem os parâmetros, que trazem nomes e telefones de clientes, a não ser
+com PERFIL_PARAMETROS_SQL), e o resultado vai para PerfilRequisicao, que só
+superusuários veem e baixam (.prof) no admin do Django.
+
+Requisições sem o parâmetro e sem o cabeçalho não passam por nada disto: o
+PerfilMiddleware só olha o query string e um cabeçalho.
+"""
+import cProfile
+import io
+import marshal
+import pstats
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from django.db import connections
+
+from .models import PerfilRequisicao
+
+PARAMETRO = '_perfil'
+CABECALHO = 'HTTP_X_PERFIL'
+SAL_TOKEN = 'barbearias.perfil'
+LINHAS_RESUMO = 40
+
+
+def gerar_token(usuario):
+    """Token assinado que permite a um superusuário pedir perfis sem sessão"""
+    return signing.TimestampSigner(salt=SAL_TOKEN).sign(str(usuario.pk))
+
+
+def usuario_do_token(token):
+    validade = getattr(settings, 'PERFIL_TOKEN_VALIDADE', 15 * 60)
+    try:
+        usuario_id = signing.TimestampSigner(salt=SAL_TOKEN).unsign(token, max_age=validade)
+    except signing.BadSignature:
+        return None
+    return User.objects.filter(pk=usuario_id, is_superuser=True, is_active=True).first()
+
+
+def solicitante(request):
+    """Superusuário que pediu o perfil desta requisição, ou None"""
+    token = request.META.get(CABECALHO)
+    if token:
+        return usuario_do_token(token)
+    token = request.GET.get(PARAMETRO)
+    if not token:
+        return None
+    if token == '1':
+        return request.user if request.user.is_superuser else None
+    usuario = usuario_do_token(token)
+    # O link com o token fica no histórico: no parâmetro ele vale uma vez só
+    validade = getattr(settings, 'PERFIL_TOKEN_VALIDADE', 15 * 60)
+    if usuario is None or not cache.add(f'perfil:token:{token}', True, validade):
+        return None
+    return usuario
+
+
+@contextmanager
+def capturar_sql(consultas):
+    """
+    Registra em `consultas` o SQL executado em qualquer banco durante o bloco. Os
+    parâmetros (nomes, telefones e e-mails de clientes) só com PERFIL_PARAMETROS_SQL.
+    """
+    maximo = getattr(settings, 'PERFIL_MAX_CONSULTAS', 1000)
+    com_parametros = getattr(settings, 'PERFIL_PARAMETROS_SQL', False)
+
+    def registrar(banco):
+        def wrapper(execute, sql, params, many, context):
+            inicio = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                if len(consultas) < maximo:
+                    consulta = {
+                        'banco': banco,
+                        'sql': sql,
+                        'duracao_ms': round((time.perf_counter() - inicio) * 1000, 3),
+                    }
+                    if com_parametros:
+                        consulta['parametros'] = str(params)[:1000]
+                    consultas.append(consulta)
+        return wrapper
+
+    with ExitStack() as pilha:
+        for banco in connections:
+            pilha.enter_context(connections[banco].execute_wrapper(registrar(banco)))
+        yield consultas
+
+
+def executar(request, usuario, view_func, view_args, view_kwargs):
+    """Executa a view sob o profiler e grava o PerfilRequisicao"""
+    perfis = [cProfile.Profile()]
+    chamada = view_func
+    if iscoroutinefunction(view_func):
+        # A corrotina roda na thread do event loop; o SQL volta para esta thread
+        # (sync_to_async thread_sensitive), então cada uma tem o seu profiler
+        async def view_com_perfil(*args, **kwargs):
+            perfil = cProfile.Profile()
+            perfis.append(perfil)
+            perfil.enable()
+            try:
+                return await view_func(*args, **kwargs)
+            finally:
+                perfil.disable()
+        chamada = async_to_sync(view_com_perfil)
+
+    consultas = []
+    response = None
+    inicio = time.perf_counter()
+    try:
+        with capturar_sql(consultas):
+            response = perfis[0].runcall(chamada, request, *view_args, **view_kwargs)
+    finally:
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        registro = _gravar(request, usuario, response, duracao_ms, consultas, perfis, view_kwargs)
+    response['X-Perfil-Requisicao'] = str(registro.pk)
+    return response
+
+
+def _gravar(request, usuario, response, duracao_ms, consultas, perfis, view_kwargs):
+    estatisticas = pstats.Stats(perfis[0])
+    for perfil in perfis[1:]:
+        estatisticas.add(perfil)
+    texto = io.StringIO()
+    estatisticas.stream = texto
+    estatisticas.sort_stats('cumulative').print_stats(LINHAS_RESUMO)
+
+    # O token não fica gravado no caminho
+    parametros = request.GET.copy()
+    parametros.pop(PARAMETRO, None)
+    caminho = f'{request.path}?{parametros.urlencode()}' if parametros else request.path
+
+    match = request.resolver_match
+    return PerfilRequisicao.objects.create(
+        usuario=usuario,
+        metodo=request.method,
+        caminho=caminho[:500],
+        rota=(match.url_name or '') if match else '',
+        barbearia_slug=view_kwargs.get('slug', ''),
+        status=response.status_code if response is not None else 500,
+        duracao_ms=duracao_ms,
+        total_consultas=len(consultas),
+        tempo_consultas_ms=sum(consulta['duracao_ms'] for consulta in consultas),
+        consultas=consultas,
+        resumo=texto.getvalue(),
+        perfil=marshal.dumps(estatisticas.stats),
+    )
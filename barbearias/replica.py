@@ -0,0 +1,85 @@
+"""
+Leituras públicas em uma réplica do banco.
+
+As rotas listadas em ROTAS_REPLICA (páginas e APIs públicas que só leem) consultam o
+banco BANCO_REPLICA; todo o resto, inclusive qualquer escrita, vai para o 'default'.
+Depois de um POST (ex: um agendamento), o cliente recebe um cookie que mantém as
+leituras dele no banco principal por REPLICA_ADERENCIA_SEGUNDOS, para que veja o que
+acabou de gravar mesmo que a réplica ainda não tenha sido sincronizada.
+
+O que vai para o cache (agenda compilada, catálogo, fuso) é sempre lido do principal,
+mesmo nessas rotas (veja ler_do_principal): uma réplica atrasada gravaria no cache, com
+data nova, o que acabou de ser invalidado.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+COOKIE_ADERENCIA = 'leitura_principal'
+
+_banco_leitura = ContextVar('banco_leitura', default=None)
+
+
+def banco_replica():
+    """Alias da réplica configurada, ou None se não houver"""
+    alias = getattr(settings, 'BANCO_REPLICA', None)
+    if alias and alias in settings.DATABASES:
+        return alias
+    return None
+
+
+def rota_usa_replica(url_name, metodo):
+    metodos = getattr(settings, 'ROTAS_REPLICA', {}).get(url_name)
+    return metodos is not None and metodo in metodos
+
+
+def ativar_replica():
+    """Direciona as leituras do contexto atual para a réplica"""
+    _banco_leitura.set(banco_replica())
+
+
+def desativar_replica():
+    # set em vez de reset: em views assíncronas o middleware roda em contextos copiados
+    _banco_leitura.set(None)
+
+
+@contextmanager
+def ler_da_replica():
+    token = _banco_leitura.set(banco_replica())
+    try:
+        yield
+    finally:
+        _banco_leitura.reset(token)
+
+
+@contextmanager
+def ler_do_principal():
+    """Leituras do bloco no banco principal, mesmo em uma rota que lê da réplica"""
+    token = _banco_leitura.set(None)
+    try:
+        yield
+    finally:
+        _banco_leitura.reset(token)
+
+
+class RoteadorReplica:
+    """Router do Django: leituras na réplica só quando o contexto pediu; escritas nunca vão para ela"""
+
+    def db_for_read(self, model, **hints):
+        return _banco_leitura.get()
+
+    def db_for_write(self, model, **hints):
+        # Nunca na réplica; sem opinião, o Django usa o banco da instância ou o 'default'
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica e principal têm os mesmos dados
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # A réplica é uma cópia do principal (veja o comando sincronizar_replica)
+        if db == banco_replica():
+            return False
+        return None
@@ -0,0 +1,53 @@
+"""
+Sessões só onde elas servem para alguma coisa.
+
+As rotas em ROTAS_SEM_SESSAO (mini site e APIs JSON públicas) recebem uma sessão
+vazia que nunca lê nem grava: nada de consulta ao django_session, de Set-Cookie ou
+de `Vary: Cookie`, e o usuário é sempre anônimo. As mensagens (flash) usam cookies
+assinados (MESSAGE_STORAGE), então o agendamento feito pelo site também não cria
+sessão. O painel usa SESSION_ENGINE = cached_db, que lê a sessão do cache e só vai
+ao banco quando ela não está lá.
+"""
+from django.conf import settings
+from django.contrib.sessions.backends.base import SessionBase
+from django.urls import Resolver404, resolve
+
+from . import perfil
+
+
+class SessaoVazia(SessionBase):
+    """Sessão sempre vazia que não persiste nada"""
+
+    def exists(self, session_key):
+        return False
+
+    def create(self):
+        pass
+
+    def save(self, must_create=False):
+        pass
+
+    def delete(self, session_key=None):
+        pass
+
+    def load(self):
+        return {}
+
+    @classmethod
+    def clear_expired(cls):
+        pass
+
+
+def rota_sem_sessao(request):
+    """True se a URL da requisição está em ROTAS_SEM_SESSAO"""
+    rotas = getattr(settings, 'ROTAS_SEM_SESSAO', ())
+    if not rotas:
+        return False
+    # ?_perfil=1 usa o usuário logado (veja barbearias/perfil.py)
+    if request.GET.get(perfil.PARAMETRO) == '1':
+        return False
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return False
+    return match.url_name in rotas
@@ -0,0 +1,177 @@
+"""
+Shards por barbearia.
+
+Os dados de cada barbearia (serviços, profissionais, horários, agendamentos...) ficam
+no banco indicado por DiretorioBarbearia. O ShardMiddleware resolve o banco pelo slug da
+URL e o RoteadorShards direciona as consultas desses modelos para ele; usuários, sessões
+e o próprio diretório ficam sempre no banco principal. Sem shards configurados, todas as
+barbearias ficam no 'default' e nada muda.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+
+from .models import (
+    Barbearia, BloqueioProfissional, DiaModeloHorario, DiretorioBarbearia, ExcecaoFuncionamento,
+    HorarioFuncionamento, IntervaloProfissional, ModeloHorario, PerfilRequisicao, Profissional, Servico,
+)
+
+APPS_POR_BARBEARIA = {'barbearias', 'agendamentos'}
+# Modelos desses apps que ficam sempre no banco principal
+MODELOS_GLOBAIS = {DiretorioBarbearia, PerfilRequisicao}
+TEMPO_CACHE = 60 * 5
+
+_banco_atual = ContextVar('banco_barbearia', default=None)
+
+
+def modelo_da_barbearia(model):
+    return model._meta.app_label in APPS_POR_BARBEARIA and model not in MODELOS_GLOBAIS
+
+
+def modelos_da_barbearia():
+    """
+    (modelo, filtro pelo id da barbearia) de tudo que pertence a uma barbearia, na
+    ordem em que pode ser inserido (pais antes dos filhos)
+    """
+    from agendamentos.models import Agendamento, ChaveIdempotencia, Cliente, ListaEspera, NotificacaoPendente, ReservaTemporaria
+    return [
+        (Barbearia, 'pk'),
+        (Servico, 'barbearia_id'),
+        (Profissional, 'barbearia_id'),
+        (HorarioFuncionamento, 'barbearia_id'),
+        (ExcecaoFuncionamento, 'barbearia_id'),
+        (ModeloHorario, 'barbearia_id'),
+        (DiaModeloHorario, 'modelo__barbearia_id'),
+        (IntervaloProfissional, 'profissional__barbearia_id'),
+        (BloqueioProfissional, 'profissional__barbearia_id'),
+        (Cliente, 'barbearia_id'),
+        (Agendamento, 'barbearia_id'),
+        (ReservaTemporaria, 'barbearia_id'),
+        (ListaEspera, 'barbearia_id'),
+        (NotificacaoPendente, 'barbearia_id'),
+        (ChaveIdempotencia, 'barbearia_id'),
+    ]
+
+
+# ===== DIRETÓRIO =====
+
+def _chave(slug):
+    return f'shard:{slug}'
+
+
+def entrada_por_slug(slug):
+    """(banco, somente_leitura) da barbearia, ou None se o slug não existir"""
+    entrada = cache.get(_chave(slug))
+    if entrada is None:
+        entrada = DiretorioBarbearia.objects.using(DEFAULT_DB_ALIAS).filter(slug=slug).values_list(
+            'banco', 'somente_leitura'
+        ).first()
+        if entrada is None:
+            return None
+        cache.set(_chave(slug), entrada, TEMPO_CACHE)
+    return tuple(entrada)
+
+
+def invalidar_entrada(*slugs):
+    cache.delete_many([_chave(slug) for slug in slugs])
+
+
+def bancos_em_uso():
+    """Bancos que guardam ao menos uma barbearia (o principal sempre entra)"""
+    if len(settings.DATABASES) == 1:
+        return [DEFAULT_DB_ALIAS]
+    bancos = set(DiretorioBarbearia.objects.using(DEFAULT_DB_ALIAS).values_list('banco', flat=True).distinct())
+    bancos.add(DEFAULT_DB_ALIAS)
+    return [banco for banco in settings.DATABASES if banco in bancos]
+
+
+# ===== CONTEXTO =====
+
+def banco_atual():
+    return _banco_atual.get()
+
+
+def ativar(banco):
+    _banco_atual.set(banco)
+
+
+def desativar():
+    # set em vez de reset: em views assíncronas o middleware roda em contextos copiados
+    _banco_atual.set(None)
+
+
+@contextmanager
+def usar_banco(banco):
+    """Consultas aos modelos das barbearias vão para o banco informado dentro do bloco"""
+    token = _banco_atual.set(banco)
+    try:
+        yield
+    finally:
+        _banco_atual.reset(token)
+
+
+def para_cada_banco():
+    """Percorre os shards em uso, ativando cada um (comandos que processam todas as barbearias)"""
+    for banco in bancos_em_uso():
+        with usar_banco(banco):
+            yield banco
+
+
+# ===== ROTEAMENTO =====
+
+class RoteadorShards:
+    """
+    Modelos das barbearias vão para o shard ativo; os demais (usuários, sessões,
+    diretório) ficam no principal. Sem shard ativo, a decisão passa para o próximo
+    router (réplica de leitura) e, por fim, para o banco da instância relacionada.
+    """
+
+    def _banco(self, model):
+        if not modelo_da_barbearia(model):
+            return DEFAULT_DB_ALIAS
+        banco = _banco_atual.get()
+        if banco and banco != DEFAULT_DB_ALIAS:
+            return banco
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._banco(model)
+
+    def db_for_write(self, model, **hints):
+        return self._banco(model)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if modelo_da_barbearia(obj1._meta.model) and modelo_da_barbearia(obj2._meta.model):
+            return obj1._state.db == obj2._state.db
+        # Barbearia -> usuário: o usuário fica sempre no principal
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Todos os shards têm o mesmo esquema
+        return None
+
+
+# ===== SINCRONIZAÇÃO DO DIRETÓRIO =====
+
+def _atualizar_diretorio(sender, instance, created, **kwargs):
+    if created:
+        invalidar_entrada(instance.slug)
+        return
+    anterior = DiretorioBarbearia.objects.using(DEFAULT_DB_ALIAS).filter(pk=instance.pk).values_list('slug', flat=True).first()
+    if anterior is not None and anterior != instance.slug:
+        DiretorioBarbearia.objects.using(DEFAULT_DB_ALIAS).filter(pk=instance.pk).update(slug=instance.slug)
+        invalidar_entrada(anterior, instance.slug)
+
+
+def _remover_do_diretorio(sender, instance, **kwargs):
+    # Filtra pelo banco: ao mudar de shard, a cópia antiga é apagada quando o diretório já aponta para o destino
+    DiretorioBarbearia.objects.using(DEFAULT_DB_ALIAS).filter(pk=instance.pk, banco=instance._state.db).delete()
+    invalidar_entrada(instance.slug)
+
+
+post_save.connect(_atualizar_diretorio, sender=Barbearia, dispatch_uid='shards-barbearia-save')
+post_delete.connect(_remover_do_diretorio, sender=Barbearia, dispatch_uid='shards-barbearia-delete')
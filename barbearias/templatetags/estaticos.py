@@ -0,0 +1,40 @@
+import logging
+
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.html import format_html
+
+from barbearia_system.storage import FOLHA_DE_ESTILOS
+
+logger = logging.getLogger(__name__)
+register = template.Library()
+
+TAILWIND_CDN = 'https://cdn.tailwindcss.com'
+
+_compilada = None
+
+
+def _folha_compilada():
+    """Verifica (uma vez por processo) se o CSS já foi gerado pelo compilar_css"""
+    global _compilada
+    if _compilada is None:
+        _compilada = bool(finders.find(FOLHA_DE_ESTILOS)) or staticfiles_storage.exists(FOLHA_DE_ESTILOS)
+        if not _compilada and not settings.DEBUG:
+            logger.error(f"'{FOLHA_DE_ESTILOS}' não encontrado: rode compilar_css e collectstatic. Páginas sem estilo.")
+    return _compilada
+
+
+@register.simple_tag
+def folha_de_estilos():
+    """
+    <link> para o CSS compilado com nome com hash. Só em desenvolvimento (DEBUG), enquanto
+    o CSS não foi gerado (python manage.py compilar_css), usa o Tailwind pelo CDN para a
+    página não ficar sem estilo; fora dele o CDN nunca é usado.
+    """
+    if _folha_compilada():
+        return format_html('<link rel="stylesheet" href="{}">', staticfiles_storage.url(FOLHA_DE_ESTILOS))
+    if settings.DEBUG:
+        return format_html('<script src="{}"></script>', TAILWIND_CDN)
+    return ''
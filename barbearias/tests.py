@@ -1,3 +1,1287 @@
-from django.test import TestCase
+"""
+Orçamento de consultas das views de barbearias/urls.py.
 
-# Create your tests here.
+Cada URL roda sobre um estabelecimento completo (serviços, profissionais, horários,
+exceções, intervalos, bloqueios, lista de espera) em dois tamanhos: com POUCOS e com
+MUITOS agendamentos. O teste falha se a view passar do número máximo de consultas
+definido para ela ou se esse número crescer com a quantidade de agendamentos, que é
+o sintoma de um N+1 (ex: {{ agendamento.servico.nome }} em um loop sem select_related).
+
+Ao mudar uma view de propósito, ajuste o orçamento dela no próprio teste.
+
+Depois dos orçamentos vêm os testes de comportamento (sessões, idempotência, clientes,
+modelos de horário, shards, réplica, limite de requisições, reservas temporárias,
+eventos da agenda, métricas, captura de tráfego, perfil sob demanda). Os de shards e réplica usam os bancos extras
+'shard_teste' e 'replica_teste', declarados em barbearia_system/settings_testes.py
+(o manage.py test já usa esse módulo).
+"""
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time as relogio
+from datetime import time, timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from agendamentos.eventos import broker
+from agendamentos.models import Agendamento, ChaveIdempotencia, Cliente, ListaEspera, NotificacaoPendente, ReservaTemporaria
+from . import agenda, captura, catalogo, datas, limitador, metricas, perfil, replica, shards
+from .apps import verificar_cache_compartilhado
+from .middleware import obter_ip_cliente
+from .models import (
+    Barbearia, BloqueioProfissional, DiaModeloHorario, DiretorioBarbearia, ExcecaoFuncionamento, HorarioFuncionamento,
+    IntervaloProfissional, ModeloHorario, PerfilRequisicao, Profissional, Servico,
+)
+from .templatetags import estaticos
+
+POUCOS = 3
+MUITOS = 40
+TELEFONE_CLIENTE = '(11) 98888-7777'
+SENHA = 'senha-teste-123'
+
+
+class CenarioBarbearia:
+    """Estabelecimento com tudo que as telas mostram; os agendamentos são acrescentados aos poucos"""
+
+    def __init__(self, slug='barbearia-teste'):
+        self.dono = User.objects.create_user(f'dono-{slug}', f'dono@{slug}.com', SENHA)
+        self.barbearia = Barbearia.objects.create(
+            nome='Barbearia Teste', endereco='Rua A, 1', telefone='(11) 3333-4444',
+            email_notificacoes=f'contato@{slug}.com', slug=slug, usuario=self.dono,
+            fuso_horario='America/Sao_Paulo',
+        )
+        self.fuso = datas.fuso(self.barbearia)
+        self.hoje = datas.hoje(self.fuso)
+        self.servicos = [
+            Servico.objects.create(barbearia=self.barbearia, nome=nome, preco=preco, duracao_minutos=duracao)
+            for nome, preco, duracao in [('Corte', 40, 30), ('Barba', 30, 30), ('Corte e barba', 60, 60)]
+        ]
+        self.profissionais = [
+            Profissional.objects.create(barbearia=self.barbearia, nome=nome) for nome in ('Ana', 'Bruno', 'Carla')
+        ]
+        for dia in range(7):
+            # Domingo fechado
+            HorarioFuncionamento.objects.create(
+                barbearia=self.barbearia, dia_semana=dia, fechado=dia == 6,
+                abertura=None if dia == 6 else time(8), fechamento=None if dia == 6 else time(20),
+            )
+        ExcecaoFuncionamento.objects.create(barbearia=self.barbearia, data=self.hoje + timedelta(days=15), descricao='Feriado')
+        for profissional in self.profissionais:
+            IntervaloProfissional.objects.create(profissional=profissional, inicio=time(12), fim=time(13))
+        BloqueioProfissional.objects.create(
+            profissional=self.profissionais[0], motivo='Curso',
+            inicio=datas.combinar(self.hoje + timedelta(days=3), time(14), self.fuso),
+            fim=datas.combinar(self.hoje + timedelta(days=3), time(18), self.fuso),
+        )
+        ListaEspera.objects.create(
+            barbearia=self.barbearia, servico=self.servicos[0], nome_cliente='Cliente em espera',
+            telefone_cliente='(11) 97777-6666', email_cliente='espera@exemplo.com',
+            data_inicio=self.hoje, data_fim=self.hoje + timedelta(days=14), hora_inicio=time(8), hora_fim=time(20),
+        )
+        ReservaTemporaria.objects.create(
+            barbearia=self.barbearia, profissional=self.profissionais[1], token=f'reserva-{slug}',
+            inicio=datas.combinar(self.hoje + timedelta(days=2), time(19), self.fuso),
+            fim=datas.combinar(self.hoje + timedelta(days=2), time(19, 30), self.fuso),
+            duracao_minutos=30, expira_em=timezone.now() + timedelta(minutes=10),
+        )
+        self.cliente = Cliente.objects.create(
+            barbearia=self.barbearia, telefone=Cliente.normalizar_telefone(TELEFONE_CLIENTE), nome='Cliente'
+        )
+        self.agendamentos = []
+        self.horarios_usados = 0
+
+    def completar_agendamentos(self, total):
+        """
+        Acrescenta agendamentos até `total`, espalhados entre hoje e os próximos dias,
+        todos os profissionais, serviços e status, do mesmo cliente (aparecem na consulta
+        por telefone) e com notificação pendente de resumo
+        """
+        novos = []
+        status = ['agendado', 'confirmado', 'agendado', 'concluido', 'cancelado']
+        for indice in range(len(self.agendamentos), total):
+            dia = self.hoje + timedelta(days=indice % 7)
+            # A partir das 8h, de hora em hora, sem repetir profissional e horário
+            faixa = indice // 7
+            novos.append(Agendamento(
+                barbearia=self.barbearia,
+                servico=self.servicos[indice % len(self.servicos)],
+                profissional=self.profissionais[faixa % len(self.profissionais)],
+                nome_cliente=f'Cliente {indice}',
+                telefone_cliente=TELEFONE_CLIENTE,
+                email_cliente=f'cliente{indice}@exemplo.com',
+                cliente=self.cliente,
+                data_hora=datas.combinar(dia, time(8), self.fuso) + timedelta(hours=faixa // len(self.profissionais)),
+                status=status[indice % len(status)],
+            ))
+        # bulk_create: o seed não passa por clean() (há agendamentos de hoje já no passado)
+        self.agendamentos += Agendamento.objects.bulk_create(novos)
+        NotificacaoPendente.objects.bulk_create([
+            NotificacaoPendente(barbearia=self.barbearia, agendamento=agendamento, tipo='novo') for agendamento in novos
+        ])
+
+    def horario_livre(self):
+        """Um horário futuro, em dia aberto e sem agendamentos, diferente a cada chamada"""
+        self.horarios_usados += 1
+        dia = self.hoje + timedelta(days=21 + self.horarios_usados)
+        while dia.weekday() == 6:
+            dia += timedelta(days=1)
+        return datas.combinar(dia, time(9), self.fuso)
+
+
+@override_settings(LIMITES_TAXA={}, METRICAS_DIR=None, CAPTURA_TRAFEGO=False)
+class OrcamentoConsultasTestCase(TestCase):
+    """Base: `assertOrcamento` mede a requisição com POUCOS e com MUITOS agendamentos"""
+
+    def setUp(self):
+        cache.clear()
+        self.cenario = CenarioBarbearia()
+        self.barbearia = self.cenario.barbearia
+        self.slug = self.barbearia.slug
+
+    def url(self, nome, **kwargs):
+        return reverse(f'barbearias:{nome}', kwargs={'slug': self.slug, **kwargs})
+
+    def medir(self, requisicao, preparar=None):
+        argumentos = preparar() if preparar else ()
+        # Cache frio nas duas medições: catálogo, agenda compilada e diretório de shards
+        cache.clear()
+        with CaptureQueriesContext(connection) as consultas:
+            response = requisicao(*argumentos)
+        if hasattr(response, 'close'):
+            response.close()
+        return response, consultas
+
+    def assertOrcamento(self, maximo, requisicao, preparar=None, status=200):
+        """
+        `requisicao(*preparar())` não pode passar de `maximo` consultas nem fazer mais
+        consultas com MUITOS agendamentos do que com POUCOS
+        """
+        medicoes = []
+        for total in (POUCOS, MUITOS):
+            self.cenario.completar_agendamentos(total)
+            response, consultas = self.medir(requisicao, preparar)
+            self.assertEqual(response.status_code, status, getattr(response, 'content', b'')[:500])
+            medicoes.append(consultas)
+
+        poucos, muitos = medicoes
+        sql = '\n'.join(f'  {consulta["sql"]}' for consulta in muitos.captured_queries)
+        self.assertEqual(
+            len(poucos), len(muitos),
+            f'O número de consultas cresce com os agendamentos: {len(poucos)} com {POUCOS}, '
+            f'{len(muitos)} com {MUITOS}\n{sql}'
+        )
+        self.assertLessEqual(len(muitos), maximo, f'{len(muitos)} consultas, orçamento de {maximo}\n{sql}')
+
+
+class OrcamentoViewsPublicasTest(OrcamentoConsultasTestCase):
+
+    def test_redirect_to_default(self):
+        self.assertOrcamento(1, lambda: self.client.get(reverse('barbearias:redirect_to_default')), status=302)
+
+    def test_mini_site(self):
+        self.assertOrcamento(6, lambda: self.client.get(self.url('mini_site')))
+
+    def test_agendar_formulario(self):
+        self.assertOrcamento(6, lambda: self.client.get(self.url('agendar')))
+
+    def test_agendar_envio(self):
+        def enviar(data_hora):
+            return self.client.post(self.url('agendar'), {
+                'nome_cliente': 'Cliente Novo', 'telefone_cliente': '(11) 96666-5555',
+                'email_cliente': 'novo@exemplo.com', 'servico': self.cenario.servicos[0].id,
+                'profissional': self.cenario.profissionais[0].id,
+                'data_hora': timezone.localtime(data_hora, self.cenario.fuso).strftime('%Y-%m-%dT%H:%M'),
+            })
+        self.assertOrcamento(27, enviar, preparar=lambda: (self.cenario.horario_livre(),), status=302)
+
+    def test_consultar_agendamentos(self):
+        self.assertOrcamento(4, lambda: self.client.get(self.url('consultar_agendamentos_local'), {'telefone': TELEFONE_CLIENTE}))
+
+    def test_consultar_agendamentos_envio(self):
+        self.assertOrcamento(4, lambda: self.client.post(self.url('consultar_agendamentos_local'), {'telefone': TELEFONE_CLIENTE}))
+
+    def test_cancelar_agendamento_cliente(self):
+        def preparar():
+            return (Agendamento.objects.create(
+                barbearia=self.barbearia, servico=self.cenario.servicos[0], profissional=self.cenario.profissionais[2],
+                nome_cliente='Cliente', telefone_cliente=TELEFONE_CLIENTE, email_cliente='cliente@exemplo.com',
+                data_hora=self.cenario.horario_livre(),
+            ),)
+
+        def cancelar(agendamento):
+            return self.client.post(self.url('cancelar_agendamento_cliente', agendamento_id=agendamento.id), {'telefone': TELEFONE_CLIENTE})
+        self.assertOrcamento(14, cancelar, preparar=preparar, status=302)
+
+    def test_api_horarios_disponiveis(self):
+        self.assertOrcamento(13, lambda: self.client.get(self.url('api_horarios_disponiveis'), {
+            'data': (self.cenario.hoje + timedelta(days=1)).isoformat(),
+            'servico_id': self.cenario.servicos[0].id, 'profissional_id': self.cenario.profissionais[0].id,
+        }))
+
+    def test_api_dias_fechados(self):
+        self.assertOrcamento(9, lambda: self.client.get(self.url('api_dias_fechados')))
+
+    def test_api_bootstrap(self):
+        self.assertOrcamento(16, lambda: self.client.get(self.url('api_bootstrap')))
+
+    def test_api_criar_reserva(self):
+        def reservar(data_hora):
+            return self.client.post(self.url('api_criar_reserva'), json.dumps({
+                'servico_id': self.cenario.servicos[0].id, 'profissional_id': self.cenario.profissionais[0].id,
+                'data_hora': data_hora.isoformat(),
+            }), content_type='application/json')
+        self.assertOrcamento(16, reservar, preparar=lambda: (self.cenario.horario_livre(),), status=201)
+
+    def test_api_liberar_reserva(self):
+        self.assertOrcamento(4, lambda: self.client.delete(self.url('api_liberar_reserva', token='reserva-barbearia-teste')), status=204)
+
+    def test_api_lista_espera(self):
+        self.assertOrcamento(6, lambda: self.client.post(self.url('api_lista_espera'), json.dumps({
+            'nome': 'Cliente', 'telefone': '(11) 95555-4444', 'email': 'espera2@exemplo.com',
+            'servico_id': self.cenario.servicos[0].id, 'data_inicio': self.cenario.hoje.isoformat(),
+            'data_fim': (self.cenario.hoje + timedelta(days=7)).isoformat(), 'hora_inicio': '08:00', 'hora_fim': '12:00',
+        }), content_type='application/json'), status=201)
+
+    def test_api_criar_agendamento(self):
+        def criar(data_hora):
+            return self.client.post(self.url('api_criar_agendamento'), json.dumps({
+                'nome': 'Cliente', 'telefone': '(11) 94444-3333', 'email': 'api@exemplo.com',
+                'servico_id': self.cenario.servicos[1].id, 'profissional_id': self.cenario.profissionais[1].id,
+                'data_hora': data_hora.isoformat(),
+            }), content_type='application/json')
+        self.assertOrcamento(27, criar, preparar=lambda: (self.cenario.horario_livre(),), status=201)
+
+    def test_api_agendamento(self):
+        self.assertOrcamento(4, lambda: self.client.get(
+            self.url('api_agendamento', agendamento_id=self.cenario.agendamentos[0].id), {'telefone': TELEFONE_CLIENTE}
+        ))
+
+    def test_admin_login_formulario(self):
+        self.assertOrcamento(3, lambda: self.client.get(self.url('admin_login')))
+
+    def test_admin_login_envio(self):
+        self.assertOrcamento(13, lambda: self.client.post(self.url('admin_login'), {
+            'usuario': self.cenario.dono.username, 'senha': SENHA,
+        }), preparar=lambda: self.client.logout() or (), status=302)
+
+
+class OrcamentoViewsAdministrativasTest(OrcamentoConsultasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.cenario.dono)
+
+    def test_admin_logout(self):
+        self.assertOrcamento(6, lambda: self.client.get(self.url('admin_logout')), preparar=lambda: self.client.force_login(self.cenario.dono) or (), status=302)
+
+    def test_admin_dashboard(self):
+        self.assertOrcamento(11, lambda: self.client.get(self.url('admin_dashboard')))
+
+    def test_admin_servicos_lista(self):
+        self.assertOrcamento(7, lambda: self.client.get(self.url('admin_servicos_lista')))
+
+    def test_admin_servico_criar(self):
+        self.assertOrcamento(6, lambda: self.client.get(self.url('admin_servico_criar')))
+
+    def test_admin_servico_criar_envio(self):
+        self.assertOrcamento(7, lambda: self.client.post(self.url('admin_servico_criar'), {
+            'nome': 'Sobrancelha', 'preco': '15.00', 'duracao_minutos': 15, 'ativo': 'on',
+        }), status=302)
+
+    def test_admin_servico_editar(self):
+        servico = self.cenario.servicos[0]
+        self.assertOrcamento(8, lambda: self.client.get(self.url('admin_servico_editar', servico_id=servico.id)))
+
+    def test_admin_servico_editar_envio(self):
+        servico = self.cenario.servicos[0]
+        self.assertOrcamento(8, lambda: self.client.post(self.url('admin_servico_editar', servico_id=servico.id), {
+            'nome': 'Corte', 'preco': '45.00', 'duracao_minutos': 30, 'ativo': 'on',
+        }), status=302)
+
+    def test_admin_servico_deletar(self):
+        servico = self.cenario.servicos[0]
+        self.assertOrcamento(8, lambda: self.client.get(self.url('admin_servico_deletar', servico_id=servico.id)))
+
+    def test_admin_servico_deletar_envio(self):
+        def preparar():
+            return (Servico.objects.create(barbearia=self.barbearia, nome='Temporário', preco=10, duracao_minutos=10),)
+        self.assertOrcamento(10, lambda servico: self.client.post(self.url('admin_servico_deletar', servico_id=servico.id)), preparar=preparar, status=302)
+
+    def test_admin_agendamentos_lista(self):
+        self.assertOrcamento(8, lambda: self.client.get(self.url('admin_agendamentos_lista')))
+
+    def test_admin_agendamentos_lista_filtros(self):
+        self.assertOrcamento(8, lambda: self.client.get(self.url('admin_agendamentos_lista'), {
+            'data': (self.cenario.hoje + timedelta(days=1)).isoformat(), 'status': 'agendado',
+            'profissional': self.cenario.profissionais[0].id,
+        }))
+
+    def test_admin_agendamentos_lista_busca(self):
+        self.assertOrcamento(9, lambda: self.client.get(self.url('admin_agendamentos_lista'), {'q': 'Cliente'}))
+
+    def test_admin_agendamento_atualizar_status(self):
+        def preparar():
+            return (Agendamento.objects.create(
+                barbearia=self.barbearia, servico=self.cenario.servicos[0], profissional=self.cenario.profissionais[2],
+                nome_cliente='Cliente', telefone_cliente=TELEFONE_CLIENTE, email_cliente='cliente@exemplo.com',
+                data_hora=self.cenario.horario_livre(),
+            ),)
+
+        def cancelar(agendamento):
+            return self.client.post(self.url('admin_agendamento_atualizar_status', agendamento_id=agendamento.id), {'status': 'cancelado'})
+        self.assertOrcamento(16, cancelar, preparar=preparar, status=302)
+
+    def test_admin_clientes_lista(self):
+        self.assertOrcamento(8, lambda: self.client.get(self.url('admin_clientes_lista')))
+
+    def test_admin_clientes_lista_busca(self):
+        self.assertOrcamento(8, lambda: self.client.get(self.url('admin_clientes_lista'), {'q': '1198888'}))
+
+    def test_admin_cliente_detalhe(self):
+        self.assertOrcamento(9, lambda: self.client.get(self.url('admin_cliente_detalhe', cliente_id=self.cenario.cliente.id)))
+
+    def test_admin_importar_agendamentos(self):
+        self.assertOrcamento(6, lambda: self.client.get(self.url('admin_importar_agendamentos')))
+
+    def test_admin_importar_agendamentos_envio(self):
+        def preparar():
+            # Um arquivo novo a cada envio, com horários ainda livres
+            linhas = ['nome;telefone;servico;profissional;data_hora']
+            for indice in range(MUITOS):
+                inicio = self.cenario.horario_livre()
+                linhas.append(f'Importado {indice};(11) 9{self.cenario.horarios_usados:04d}-{indice:04d};Corte;Ana;{inicio.isoformat()}')
+            return (SimpleUploadedFile('agenda.csv', '\n'.join(linhas).encode(), content_type='text/csv'),)
+        self.assertOrcamento(13, lambda arquivo: self.client.post(self.url('admin_importar_agendamentos'), {'arquivo': arquivo}), preparar=preparar)
+        self.assertGreater(Agendamento.objects.filter(barbearia=self.barbearia, nome_cliente__startswith='Importado').count(), MUITOS)
+
+    def test_admin_profissionais_lista(self):
+        self.assertOrcamento(7, lambda: self.client.get(self.url('admin_profissionais_lista')))
+
+    def test_admin_profissional_criar(self):
+        self.assertOrcamento(6, lambda: self.client.get(self.url('admin_profissional_criar')))
+
+    def test_admin_profissional_criar_envio(self):
+        self.assertOrcamento(7, lambda: self.client.post(self.url('admin_profissional_criar'), {'nome': 'Diego', 'ativo': 'on'}), status=302)
+
+    def test_admin_eventos_agenda(self):
+        # O stream só existe sob ASGI
+        self.async_client.force_login(self.cenario.dono)
+        self.assertOrcamento(5, lambda: async_to_sync(self.async_client.get)(self.url('admin_eventos_agenda')))
+
+    def test_admin_agenda_profissional(self):
+        profissional = self.cenario.profissionais[0]
+        self.assertOrcamento(14, lambda: self.client.get(
+            self.url('admin_agenda_profissional', profissional_id=profissional.id),
+            {'data': (self.cenario.hoje + timedelta(days=1)).isoformat()},
+        ))
+
+    def test_admin_horarios_funcionamento(self):
+        self.assertOrcamento(8, lambda: self.client.get(self.url('admin_horarios_funcionamento')))
+
+    def test_admin_horarios_funcionamento_envio(self):
+        def preparar():
+            # Um horário diferente a cada envio, para que a semana seja de fato gravada
+            self.cenario.horarios_usados += 1
+            dados = {}
+            for dia in range(7):
+                dados.update({
+                    f'dia_{dia}-abertura': '09:00', f'dia_{dia}-fechamento': f'{17 + self.cenario.horarios_usados}:00',
+                })
+            return (dados,)
+        self.assertOrcamento(8, lambda dados: self.client.post(self.url('admin_horarios_funcionamento'), dados), preparar=preparar, status=302)
+
+    def test_admin_modelo_horario_novo(self):
+        self.assertOrcamento(7, lambda: self.client.get(self.url('admin_modelo_horario_novo'), {'semanas': 2}))
+
+    def test_admin_modelo_horario_envio(self):
+        def preparar():
+            self.cenario.horarios_usados += 1
+            dados = {
+                'nome': f'Verão {self.cenario.horarios_usados}', 'data_inicio': self.cenario.hoje.isoformat(),
+                'data_fim': (self.cenario.hoje + timedelta(days=60)).isoformat(), 'ativo': 'on', 'semanas': 2,
+            }
+            for semana in range(2):
+                for dia in range(7):
+                    dados.update({
+                        f'semana_{semana}-dia_{dia}-abertura': '10:00', f'semana_{semana}-dia_{dia}-fechamento': '16:00',
+                    })
+            return (dados,)
+        self.assertOrcamento(12, lambda dados: self.client.post(self.url('admin_modelo_horario_novo'), dados), preparar=preparar, status=302)
+
+    def test_admin_horarios_excecoes(self):
+        self.assertOrcamento(11, lambda: self.client.get(self.url('admin_horarios_excecoes')))
+
+    def test_admin_horarios_excecoes_envio(self):
+        def preparar():
+            self.cenario.horarios_usados += 1
+            return (self.cenario.hoje + timedelta(days=60 + self.cenario.horarios_usados),)
+
+        def cadastrar(data):
+            return self.client.post(self.url('admin_horarios_excecoes'), {
+                'acao': 'excecao', 'excecao-data': data.isoformat(), 'excecao-tipo': 'fechado', 'excecao-descricao': 'Folga',
+            })
+        self.assertOrcamento(8, cadastrar, preparar=preparar, status=302)
+
+    def test_admin_configuracoes(self):
+        self.assertOrcamento(6, lambda: self.client.get(self.url('admin_configuracoes')))
+
+    def test_admin_configuracoes_envio(self):
+        self.assertOrcamento(8, lambda: self.client.post(self.url('admin_configuracoes'), {
+            'nome': 'Barbearia Teste', 'endereco': 'Rua A, 1', 'telefone': '(11) 3333-4444',
+            'email_notificacoes': 'contato@barbearia-teste.com', 'modo_notificacao': 'imediato',
+            'fuso_horario': 'America/Sao_Paulo',
+        }), status=302)
+
+
+@override_settings(LIMITES_TAXA={}, METRICAS_DIR=None, CAPTURA_TRAFEGO=False)
+class SessoesTest(TestCase):
+    """Rotas públicas sem sessão, mensagens em cookie e sessão do painel no cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.cenario = CenarioBarbearia()
+        self.slug = self.cenario.barbearia.slug
+
+    def url(self, nome, **kwargs):
+        return reverse(f'barbearias:{nome}', kwargs={'slug': self.slug, **kwargs})
+
+    def consultas_de_sessao(self, consultas):
+        return [consulta['sql'] for consulta in consultas.captured_queries if 'django_session' in consulta['sql']]
+
+    def test_rotas_publicas_nao_usam_sessao_do_dono_logado(self):
+        self.client.force_login(self.cenario.dono)
+        for nome, parametros in [('mini_site', {}), ('api_dias_fechados', {}), ('api_bootstrap', {})]:
+            cache.clear()
+            with CaptureQueriesContext(connection) as consultas:
+                response = self.client.get(self.url(nome), parametros)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.consultas_de_sessao(consultas), [], nome)
+            self.assertNotIn('Cookie', response.get('Vary', ''), nome)
+            self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies, nome)
+            self.assertFalse(response.wsgi_request.user.is_authenticated, nome)
+
+    def test_agendamento_pelo_site_nao_cria_sessao(self):
+        data_hora = self.cenario.horario_livre()
+        response = self.client.post(self.url('agendar'), {
+            'nome_cliente': 'Cliente Novo', 'telefone_cliente': '(11) 96666-5555',
+            'email_cliente': 'novo@exemplo.com', 'servico': self.cenario.servicos[0].id,
+            'profissional': self.cenario.profissionais[0].id,
+            'data_hora': timezone.localtime(data_hora, self.cenario.fuso).strftime('%Y-%m-%dT%H:%M'),
+        }, follow=True)
+        self.assertContains(response, 'Agendamento realizado')
+        self.assertFalse(Session.objects.exists())
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+
+    def test_painel_le_a_sessao_do_cache(self):
+        self.client.force_login(self.cenario.dono)
+        self.client.get(self.url('admin_dashboard'))
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(self.url('admin_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.consultas_de_sessao(consultas), [])
+
+
+@override_settings(LIMITES_TAXA={}, METRICAS_DIR=None, CAPTURA_TRAFEGO=False)
+class IdempotenciaTest(TestCase):
+    """Reenvios com a mesma chave devolvem o agendamento original sem gravar nem notificar de novo"""
+
+    def setUp(self):
+        cache.clear()
+        self.cenario = CenarioBarbearia()
+        self.slug = self.cenario.barbearia.slug
+
+    def url(self, nome, **kwargs):
+        return reverse(f'barbearias:{nome}', kwargs={'slug': self.slug, **kwargs})
+
+    def test_formulario_reenviado(self):
+        data_hora = self.cenario.horario_livre()
+        formulario = self.client.get(self.url('agendar')).context['form']
+        chave = formulario['chave_idempotencia'].value()
+        self.assertTrue(chave)
+        dados = {
+            'nome_cliente': 'Cliente Novo', 'telefone_cliente': '(11) 96666-5555',
+            'email_cliente': 'novo@exemplo.com', 'servico': self.cenario.servicos[0].id,
+            'profissional': self.cenario.profissionais[0].id, 'chave_idempotencia': chave,
+            'data_hora': timezone.localtime(data_hora, self.cenario.fuso).strftime('%Y-%m-%dT%H:%M'),
+        }
+        self.client.post(self.url('agendar'), dados)
+        emails = len(mail.outbox)
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.post(self.url('agendar'), dados, follow=True)
+        self.assertContains(response, 'Agendamento realizado com sucesso')
+        self.assertEqual(Agendamento.objects.filter(telefone_cliente='(11) 96666-5555').count(), 1)
+        self.assertEqual(len(mail.outbox), emails)
+        self.assertFalse(any('INSERT' in consulta['sql'] for consulta in consultas.captured_queries))
+
+    def test_api_repetida(self):
+        corpo = json.dumps({
+            'nome': 'Cliente', 'telefone': '(11) 94444-3333', 'email': 'api@exemplo.com',
+            'servico_id': self.cenario.servicos[1].id, 'profissional_id': self.cenario.profissionais[1].id,
+            'data_hora': self.cenario.horario_livre().isoformat(),
+        })
+        primeira = self.client.post(self.url('api_criar_agendamento'), corpo, content_type='application/json', HTTP_IDEMPOTENCY_KEY='pedido-1')
+        self.assertEqual(primeira.status_code, 201)
+        emails = len(mail.outbox)
+
+        segunda = self.client.post(self.url('api_criar_agendamento'), corpo, content_type='application/json', HTTP_IDEMPOTENCY_KEY='pedido-1')
+        self.assertEqual(segunda.status_code, 201)
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.assertEqual(segunda.json(), primeira.json())
+        self.assertEqual(len(mail.outbox), emails)
+
+        # Sem a chave, o mesmo corpo é um agendamento novo e esbarra no horário ocupado
+        terceira = self.client.post(self.url('api_criar_agendamento'), corpo, content_type='application/json')
+        self.assertEqual(terceira.status_code, 409)
+
+    def test_chave_em_andamento(self):
+        ChaveIdempotencia.registrar(self.cenario.barbearia, 'pedido-2')
+        response = self.client.post(self.url('api_criar_agendamento'), '{}', content_type='application/json', HTTP_IDEMPOTENCY_KEY='pedido-2')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_chave_liberada_quando_o_agendamento_falha(self):
+        ocupado = self.cenario.horario_livre()
+        Agendamento.objects.create(
+            barbearia=self.cenario.barbearia, servico=self.cenario.servicos[0], profissional=self.cenario.profissionais[0],
+            nome_cliente='Outro', telefone_cliente=TELEFONE_CLIENTE, email_cliente='outro@exemplo.com', data_hora=ocupado,
+        )
+        corpo = {
+            'nome': 'Cliente', 'telefone': '(11) 94444-3333', 'email': 'api@exemplo.com',
+            'servico_id': self.cenario.servicos[0].id, 'profissional_id': self.cenario.profissionais[0].id,
+            'data_hora': ocupado.isoformat(),
+        }
+        response = self.client.post(self.url('api_criar_agendamento'), json.dumps(corpo), content_type='application/json', HTTP_IDEMPOTENCY_KEY='pedido-3')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(ChaveIdempotencia.objects.filter(chave='pedido-3').exists())
+
+        corpo['data_hora'] = self.cenario.horario_livre().isoformat()
+        response = self.client.post(self.url('api_criar_agendamento'), json.dumps(corpo), content_type='application/json', HTTP_IDEMPOTENCY_KEY='pedido-3')
+        self.assertEqual(response.status_code, 201)
+
+
+@override_settings(LIMITES_TAXA={}, METRICAS_DIR=None, CAPTURA_TRAFEGO=False)
+class ClientesTest(TestCase):
+    """Agendamentos do mesmo telefone, em qualquer formato, ficam no mesmo cliente"""
+
+    def setUp(self):
+        cache.clear()
+        self.cenario = CenarioBarbearia()
+        self.slug = self.cenario.barbearia.slug
+
+    def test_agendamento_identifica_o_cliente(self):
+        agendamento = Agendamento.objects.create(
+            barbearia=self.cenario.barbearia, servico=self.cenario.servicos[0], profissional=self.cenario.profissionais[0],
+            nome_cliente='Cliente Renomeado', telefone_cliente='+55 11 98888 7777', email_cliente='novo@exemplo.com',
+            data_hora=self.cenario.horario_livre(),
+        )
+        self.assertEqual(agendamento.cliente_id, self.cenario.cliente.id)
+        self.cenario.cliente.refresh_from_db()
+        self.assertEqual(self.cenario.cliente.nome, 'Cliente Renomeado')
+        self.assertEqual(self.cenario.cliente.email, 'novo@exemplo.com')
+        self.assertEqual(Cliente.objects.filter(barbearia=self.cenario.barbearia).count(), 1)
+
+    def test_consulta_por_telefone_em_outro_formato(self):
+        self.cenario.completar_agendamentos(POUCOS)
+        response = self.client.post(
+            reverse('barbearias:consultar_agendamentos_local', kwargs={'slug': self.slug}), {'telefone': '11988887777'}
+        )
+        self.assertEqual(len(response.context['agendamentos']), POUCOS)
+
+    def test_consulta_sem_ddd(self):
+        self.cenario.completar_agendamentos(POUCOS)
+        # Mesmo número em outro DDD, de outro cliente
+        Agendamento.objects.create(
+            barbearia=self.cenario.barbearia, servico=self.cenario.servicos[0], profissional=self.cenario.profissionais[0],
+            nome_cliente='Outro DDD', telefone_cliente='(21) 98888-7777', email_cliente='outro@exemplo.com',
+            data_hora=self.cenario.horario_livre(),
+        )
+        url = reverse('barbearias:consultar_agendamentos_local', kwargs={'slug': self.slug})
+        for telefone in ('98888-7777', '7777'):
+            response = self.client.post(url, {'telefone': telefone})
+            self.assertEqual(len(response.context['agendamentos']), 0)
+            self.assertContains(response, 'Número incompleto')
+
+    def test_cancelar_a_partir_da_consulta(self):
+        agendamento = Agendamento.objects.create(
+            barbearia=self.cenario.barbearia, servico=self.cenario.servicos[0], profissional=self.cenario.profissionais[0],
+            nome_cliente='Cliente', telefone_cliente=TELEFONE_CLIENTE, email_cliente='cliente@exemplo.com',
+            data_hora=self.cenario.horario_livre(),
+        )
+        # O formulário de cancelamento reenvia o telefone digitado na consulta
+        response = self.client.post(
+            reverse('barbearias:consultar_agendamentos_local', kwargs={'slug': self.slug}), {'telefone': '11 988887777'}
+        )
+        self.assertIn(agendamento, response.context['agendamentos'])
+        self.assertContains(response, 'name="telefone" value="11 988887777"')
+        self.client.post(
+            reverse('barbearias:cancelar_agendamento_cliente', kwargs={'slug': self.slug, 'agendamento_id': agendamento.id}),
+            {'telefone': '11 988887777'},
+        )
+        agendamento.refresh_from_db()
+        self.assertEqual(agendamento.status, 'cancelado')
+
+
+@override_settings(LIMITES_TAXA={}, METRICAS_DIR=None, CAPTURA_TRAFEGO=False)
+class ModelosHorarioTest(TestCase):
+    """Modelos de horário por período e invalidação da agenda só nas datas alteradas"""
+
+    def setUp(self):
+        cache.clear()
+        self.cenario = CenarioBarbearia()
+        self.barbearia = self.cenario.barbearia
+        self.client.force_login(self.cenario.dono)
+        # Uma segunda-feira futura, longe do feriado do cenário
+        self.segunda = self.cenario.hoje + timedelta(days=28 - self.cenario.hoje.weekday())
+
+    def url(self, nome, **kwargs):
+        return reverse(f'barbearias:{nome}', kwargs={'slug': self.barbearia.slug, **kwargs})
+
+    def test_sabados_alternados(self):
+        modelo = ModeloHorario.objects.create(barbearia=self.barbearia, nome='Sábados alternados', data_inicio=self.segunda, semanas=2)
+        # Sem linha para os outros dias: valem os do horário semanal
+        DiaModeloHorario.objects.bulk_create([
+            DiaModeloHorario(modelo=modelo, semana=0, dia_semana=5, abertura=time(9), fechamento=time(14)),
+            DiaModeloHorario(modelo=modelo, semana=1, dia_semana=5, fechado=True),
+        ])
+
+        sabados = [self.segunda + timedelta(days=5 + 7 * semana) for semana in range(4)]
+        fechadas = agenda.datas_fechadas(self.barbearia.id, sabados[0], sabados[-1])
+        self.assertEqual([sabado for sabado in sabados if sabado in fechadas], [sabados[1], sabados[3]])
+
+        profissional_id = self.cenario.profissionais[1].id
+        abertos = agenda.intervalos_abertos(self.barbearia.id, [profissional_id], sabados[0])[(profissional_id, sabados[0])]
+        self.assertEqual(abertos[0][0], datas.combinar(sabados[0], time(9), self.cenario.fuso))
+        self.assertEqual(abertos[-1][1], datas.combinar(sabados[0], time(14), self.cenario.fuso))
+
+        # A exceção por data continua valendo sobre o modelo
+        ExcecaoFuncionamento.objects.create(barbearia=self.barbearia, data=sabados[2], descricao='Folga')
+        self.assertIn(sabados[2], agenda.datas_fechadas(self.barbearia.id, sabados[0], sabados[-1]))
+
+    def test_editor_semanal_invalida_so_os_dias_alterados(self):
+        profissional_id = self.cenario.profissionais[1].id
+        terca = self.segunda + timedelta(days=1)
+        agenda.intervalos_abertos(self.barbearia.id, [profissional_id], self.segunda, terca)
+
+        dados = {}
+        for dia in range(7):
+            if dia == 6:
+                dados[f'dia_{dia}-fechado'] = 'on'
+            else:
+                dados.update({f'dia_{dia}-abertura': '10:00' if dia == 0 else '08:00', f'dia_{dia}-fechamento': '20:00'})
+        response = self.client.post(self.url('admin_horarios_funcionamento'), dados)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(HorarioFuncionamento.objects.get(barbearia=self.barbearia, dia_semana=0).abertura, time(10))
+
+        # A terça continua no cache; só a segunda é recompilada
+        with CaptureQueriesContext(connection) as consultas:
+            abertos = agenda.intervalos_abertos(self.barbearia.id, [profissional_id], terca)
+        self.assertEqual(len(consultas), 0)
+        self.assertEqual(abertos[(profissional_id, terca)][0][0], datas.combinar(terca, time(8), self.cenario.fuso))
+        abertos = agenda.intervalos_abertos(self.barbearia.id, [profissional_id], self.segunda)
+        self.assertEqual(abertos[(profissional_id, self.segunda)][0][0], datas.combinar(self.segunda, time(10), self.cenario.fuso))
+
+    def test_modelo_salvo_pelo_editor_invalida_so_o_periodo(self):
+        fora = self.segunda - timedelta(days=7)
+        agenda.datas_fechadas(self.barbearia.id, fora, fora)
+        agenda.datas_fechadas(self.barbearia.id, self.segunda, self.segunda)
+
+        dados = {'nome': 'Reforma', 'data_inicio': self.segunda.isoformat(), 'data_fim': self.segunda.isoformat(), 'ativo': 'on'}
+        for dia in range(7):
+            dados[f'dia_{dia}-fechado'] = 'on'
+        response = self.client.post(self.url('admin_modelo_horario_novo'), dados)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(ModeloHorario.objects.get(barbearia=self.barbearia).dias.count(), 7)
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(agenda.datas_fechadas(self.barbearia.id, fora, fora), [])
+        self.assertEqual(len(consultas), 0)
+        self.assertEqual(agenda.datas_fechadas(self.barbearia.id, self.segunda, self.segunda), [self.segunda])
+
+        # Ao remover o modelo, a data volta ao horário semanal
+        modelo = ModeloHorario.objects.get(barbearia=self.barbearia)
+        response = self.client.post(self.url('admin_modelo_horario', modelo_id=modelo.id), {'acao': 'remover'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(agenda.datas_fechadas(self.barbearia.id, self.segunda, self.segunda), [])
+
+
+class CacheCompartilhadoTest(TestCase):
+    """A app recusa subir com um cache local a cada processo quando há mais de um worker"""
+
+    def test_locmem_com_varios_workers(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with self.settings(CACHES=locmem, SERVIDOR_WORKERS=1):
+            verificar_cache_compartilhado()
+        with self.settings(CACHES=locmem, SERVIDOR_WORKERS=4):
+            with self.assertRaises(ImproperlyConfigured):
+                verificar_cache_compartilhado()
+
+    def test_cache_compartilhado(self):
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'}}
+        with self.settings(CACHES=redis, SERVIDOR_WORKERS=4, LIMITES_TAXA_CACHE='default'):
+            verificar_cache_compartilhado()
+
+
+class FolhaDeEstilosTest(TestCase):
+    """O CDN do Tailwind só entra em desenvolvimento; a publicação exige o CSS compilado"""
+
+    def setUp(self):
+        estaticos._compilada = None
+        self.addCleanup(setattr, estaticos, '_compilada', None)
+
+    def test_sem_css_compilado(self):
+        with self.settings(DEBUG=True):
+            self.assertIn(estaticos.TAILWIND_CDN, estaticos.folha_de_estilos())
+        with self.settings(DEBUG=False), self.assertLogs(estaticos.logger, 'ERROR'):
+            estaticos._compilada = None
+            self.assertEqual(estaticos.folha_de_estilos(), '')
+
+    def test_collectstatic_exige_o_css(self):
+        with tempfile.TemporaryDirectory() as destino, self.settings(STATIC_ROOT=destino):
+            with self.assertRaisesMessage(ValueError, 'compilar_css'):
+                call_command('collectstatic', interactive=False, verbosity=0, stdout=StringIO())
+
+
+@override_settings(LIMITES_TAXA={}, METRICAS_DIR=None, CAPTURA_TRAFEGO=False)
+class ShardsTest(TestCase):
+    """Barbearia movida para outro banco com o mover_barbearia"""
+    databases = {'default', 'shard_teste'}
+
+    def setUp(self):
+        cache.clear()
+        self.cenario = CenarioBarbearia()
+        self.slug = self.cenario.barbearia.slug
+        call_command('mover_barbearia', self.slug, 'shard_teste', espera=0, stdout=StringIO())
+
+    def novo_agendamento(self, nome, data_hora):
+        return Agendamento(
+            barbearia_id=self.cenario.barbearia.id, servico_id=self.cenario.servicos[0].id,
+            profissional_id=self.cenario.profissionais[0].id, nome_cliente=nome,
+            telefone_cliente=TELEFONE_CLIENTE, email_cliente='cliente@exemplo.com', data_hora=data_hora,
+        )
+
+    def test_dados_movidos_e_servidos_pelo_shard(self):
+        barbearia_id = self.cenario.barbearia.id
+        self.assertEqual(shards.entrada_por_slug(self.slug), ('shard_teste', False))
+        self.assertFalse(Barbearia.objects.using('default').filter(pk=barbearia_id).exists())
+        self.assertFalse(Agendamento.objects.using('default').filter(barbearia_id=barbearia_id).exists())
+        self.assertEqual(Servico.objects.using('shard_teste').filter(barbearia_id=barbearia_id).count(), 3)
+        self.assertEqual(HorarioFuncionamento.objects.using('shard_teste').filter(barbearia_id=barbearia_id).count(), 7)
+        self.assertEqual(
+            Agendamento.objects.using('shard_teste').filter(barbearia_id=barbearia_id).count(), len(self.cenario.agendamentos)
+        )
+
+        # As rotas públicas resolvem o banco pelo diretório
+        data_hora = self.cenario.horario_livre()
+        response = self.client.get(reverse('barbearias:api_horarios_disponiveis', kwargs={'slug': self.slug}), {
+            'data': datas.local(data_hora, self.cenario.fuso).date().isoformat(),
+            'servico_id': self.cenario.servicos[1].id, 'profissional_id': self.cenario.profissionais[1].id,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(datas.local(data_hora, self.cenario.fuso).strftime('%H:%M'), [h['hora'] for h in response.json()['horarios']])
+
+        response = self.client.post(reverse('barbearias:api_criar_agendamento', kwargs={'slug': self.slug}), json.dumps({
+            'nome': 'Cliente', 'telefone': '(11) 94444-3333', 'email': 'api@exemplo.com',
+            'servico_id': self.cenario.servicos[1].id, 'profissional_id': self.cenario.profissionais[1].id,
+            'data_hora': data_hora.isoformat(),
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Agendamento.objects.using('shard_teste').filter(data_hora=data_hora).exists())
+
+    def test_escritas_bloqueadas_durante_a_mudanca(self):
+        DiretorioBarbearia.objects.filter(slug=self.slug).update(somente_leitura=True)
+        shards.invalidar_entrada(self.slug)
+
+        response = self.client.post(reverse('barbearias:api_criar_reserva', kwargs={'slug': self.slug}), json.dumps({
+            'servico_id': self.cenario.servicos[0].id, 'profissional_id': self.cenario.profissionais[0].id,
+            'data_hora': self.cenario.horario_livre().isoformat(),
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(self.client.get(reverse('barbearias:mini_site', kwargs={'slug': self.slug})).status_code, 200)
+
+    def test_mover_de_volta(self):
+        with self.assertRaises(CommandError):
+            call_command('mover_barbearia', self.slug, 'shard_teste', espera=0, stdout=StringIO())
+        call_command('mover_barbearia', self.slug, 'default', espera=0, stdout=StringIO())
+        self.assertEqual(shards.entrada_por_slug(self.slug), ('default', False))
+        self.assertEqual(Profissional.objects.using('default').filter(barbearia_id=self.cenario.barbearia.id).count(), 3)
+        self.assertFalse(Barbearia.objects.using('shard_teste').filter(pk=self.cenario.barbearia.id).exists())
+
+    def test_conflito_verificado_no_shard(self):
+        data_hora = self.cenario.horario_livre()
+        with shards.usar_banco('shard_teste'):
+            self.novo_agendamento('Primeiro', data_hora).save()
+            with self.assertRaises(ValidationError) as erro:
+                self.novo_agendamento('Segundo', data_hora + timedelta(minutes=15)).save()
+        self.assertEqual(erro.exception.error_dict['__all__'][0].code, 'conflito')
+        self.assertEqual(Agendamento.objects.using('shard_teste').filter(barbearia_id=self.cenario.barbearia.id, data_hora=data_hora).count(), 1)
+
+    def test_chave_repetida_no_shard(self):
+        with shards.usar_banco('shard_teste'):
+            barbearia = Barbearia.objects.get(pk=self.cenario.barbearia.id)
+            self.assertIsNotNone(ChaveIdempotencia.registrar(barbearia, 'pedido-1'))
+            self.assertIsNone(ChaveIdempotencia.registrar(barbearia, 'pedido-1'))
+            # O savepoint no shard deixa a transação dele utilizável depois do IntegrityError
+            self.assertEqual(ChaveIdempotencia.objects.filter(barbearia_id=self.cenario.barbearia.id).count(), 1)
+
+    def test_evento_publicado_no_commit_do_shard(self):
+        with mock.patch.object(broker, 'publicar') as publicar:
+            with self.captureOnCommitCallbacks(using='shard_teste', execute=True):
+                with shards.usar_banco('shard_teste'):
+                    agendamento = self.novo_agendamento('Evento', self.cenario.horario_livre())
+                    agendamento.save()
+        publicar.assert_called_once()
+        self.assertEqual(publicar.call_args.args[:2], (self.cenario.barbearia.id, 'agendamento_criado'))
+        self.assertEqual(publicar.call_args.args[2]['agendamento_id'], agendamento.id)
+
+
+@override_settings(LIMITES_TAXA={}, METRICAS_DIR=None, CAPTURA_TRAFEGO=False, BANCO_REPLICA='replica_teste')
+class ReplicaTest(TestCase):
+    """Leituras públicas na réplica; o que vai para o cache sempre do principal"""
+    # Banco à parte e vazio: faz o papel de uma réplica atrasada
+    databases = {'default', 'replica_teste'}
+
+    def setUp(self):
+        cache.clear()
+        self.cenario = CenarioBarbearia()
+        self.barbearia = self.cenario.barbearia
+        self.domingo = self.cenario.hoje + timedelta(days=6 - self.cenario.hoje.weekday() + 7)
+
+    def test_cache_nao_e_preenchido_pela_replica(self):
+        with replica.ler_da_replica():
+            self.assertFalse(Servico.objects.filter(barbearia=self.barbearia).exists())
+            self.assertEqual(agenda.datas_fechadas(self.barbearia.id, self.domingo, self.domingo), [self.domingo])
+            self.assertEqual(len(catalogo.obter_catalogo(self.barbearia.id).servicos), 3)
+            profissional_id = self.cenario.profissionais[0].id
+            abertos = async_to_sync(agenda.aintervalos_abertos)(self.barbearia.id, [profissional_id], self.domingo - timedelta(days=1))
+            self.assertTrue(abertos[(profissional_id, self.domingo - timedelta(days=1))])
+        # E o que ficou no cache é o do principal
+        self.assertEqual(agenda.datas_fechadas(self.barbearia.id, self.domingo, self.domingo), [self.domingo])
+
+    def copiar_para_replica(self, **alteracoes):
+        """Cópia da barbearia na réplica, com os campos ainda sem as últimas alterações"""
+        campos = [campo.attname for campo in Barbearia._meta.concrete_fields]
+        valores = Barbearia.objects.filter(pk=self.barbearia.pk).values(*campos).get()
+        Barbearia.objects.using('replica_teste').bulk_create([Barbearia(**dict(valores, **alteracoes))])
+
+    def test_rotas_publicas_leem_da_replica_ate_uma_escrita(self):
+        self.copiar_para_replica(nome='Nome antigo')
+        mini_site = reverse('barbearias:mini_site', kwargs={'slug': self.barbearia.slug})
+        self.assertContains(self.client.get(mini_site), 'Nome antigo')
+
+        # Fora de ROTAS_REPLICA, lê do principal; depois da escrita o cliente fica nele
+        response = self.client.post(reverse('barbearias:api_criar_reserva', kwargs={'slug': self.barbearia.slug}), json.dumps({
+            'servico_id': self.cenario.servicos[0].id, 'profissional_id': self.cenario.profissionais[0].id,
+            'data_hora': self.cenario.horario_livre().isoformat(),
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(replica.COOKIE_ADERENCIA, response.cookies)
+        response = self.client.get(mini_site)
+        self.assertContains(response, 'Barbearia Teste')
+        self.assertNotContains(response, 'Nome antigo')
+
+
+@override_settings(
+    METRICAS_DIR=None, CAPTURA_TRAFEGO=False,
+    LIMITES_TAXA={'api_dias_fechados': {'taxa': 60, 'capacidade': 2, 'metodos': ['GET']}},
+)
+class LimiteTaxaTest(TestCase):
+    """Janelas de requisições por rota, barbearia e IP"""
+
+    def setUp(self):
+        cache.clear()
+        self.um, self.dois = CenarioBarbearia('barbearia-um'), CenarioBarbearia('barbearia-dois')
+        self.relogio = mock.patch.object(limitador, 'time', mock.Mock(time=mock.Mock(return_value=1000.0)))
+        self.relogio.start()
+        self.addCleanup(self.relogio.stop)
+
+    def dias_fechados(self, cenario, ip='10.0.0.1'):
+        return self.client.get(reverse('barbearias:api_dias_fechados', kwargs={'slug': cenario.barbearia.slug}), REMOTE_ADDR=ip)
+
+    def test_rajada_e_nova_janela(self):
+        self.assertEqual([self.dias_fechados(self.um).status_code for _ in range(2)], [200, 200])
+        response = self.dias_fechados(self.um)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertIn('erro', response.json())
+
+        # Outro IP e outra barbearia têm contagens próprias
+        self.assertEqual(self.dias_fechados(self.um, ip='10.0.0.2').status_code, 200)
+        self.assertEqual(self.dias_fechados(self.dois).status_code, 200)
+
+        # 60 por minuto com rajada de 2: duas requisições a cada janela de 2 segundos
+        limitador.time.time.return_value = 1001.5
+        response = self.dias_fechados(self.um)
+        self.assertEqual((response.status_code, response['Retry-After']), (429, '1'))
+        limitador.time.time.return_value = 1002.0
+        self.assertEqual([self.dias_fechados(self.um).status_code for _ in range(3)], [200, 200, 429])
+
+    def test_workers_simultaneos_nao_passam_da_rajada(self):
+        total = 20
+        barreira = threading.Barrier(total)
+        permitidos = []
+
+        ler = LocMemCache.get
+
+        def ler_devagar(*args, **kwargs):
+            # Alarga a janela entre ler e gravar a contagem, se houver uma
+            valor = ler(*args, **kwargs)
+            relogio.sleep(0.01)
+            return valor
+
+        def consumir():
+            barreira.wait()
+            permitidos.append(limitador.consumir('limite-taxa:teste', 60, 5)[0])
+
+        with mock.patch.object(LocMemCache, 'get', ler_devagar):
+            threads = [threading.Thread(target=consumir) for _ in range(total)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(permitidos.count(True), 5)
+
+    @override_settings(LIMITES_TAXA_CABECALHO_IP='HTTP_X_FORWARDED_FOR', LIMITES_TAXA_PROXIES_CONFIAVEIS=1)
+    def test_ip_anotado_pelo_proxy(self):
+        url = reverse('barbearias:api_dias_fechados', kwargs={'slug': self.um.barbearia.slug})
+        # O cliente forja um endereço novo a cada requisição; o proxy acrescenta o real no fim
+        status = [
+            self.client.get(url, HTTP_X_FORWARDED_FOR=f'198.51.100.{indice}, 203.0.113.7').status_code
+            for indice in range(3)
+        ]
+        self.assertEqual(status, [200, 200, 429])
+
+        request = RequestFactory().get(url, HTTP_X_FORWARDED_FOR='198.51.100.1, 203.0.113.7, 10.0.0.9')
+        with override_settings(LIMITES_TAXA_PROXIES_CONFIAVEIS=2):
+            self.assertEqual(obter_ip_cliente(request), '203.0.113.7')
+        with override_settings(LIMITES_TAXA_PROXIES_CONFIAVEIS=5):
+            self.assertEqual(obter_ip_cliente(request), '198.51.100.1')
+
+    def test_metodo_fora_da_regra(self):
+        for _ in range(3):
+            self.dias_fechados(self.um)
+        response = self.client.post(reverse('barbearias:api_dias_fechados', kwargs={'slug': self.um.barbearia.slug}), REMOTE_ADDR='10.0.0.1')
+        self.assertNotEqual(response.status_code, 429)
+
+
+@override_settings(LIMITES_TAXA={}, METRICAS_DIR=None, CAPTURA_TRAFEGO=False)
+class ReservaTemporariaTest(TestCase):
+    """Horário segurado por RESERVA_TEMPORARIA_MINUTOS para quem o escolheu"""
+
+    def setUp(self):
+        cache.clear()
+        self.cenario = CenarioBarbearia()
+        self.data_hora = self.cenario.horario_livre()
+        self.hora = datas.local(self.data_hora, self.cenario.fuso).strftime('%H:%M')
+
+    def url(self, nome):
+        return reverse(f'barbearias:{nome}', kwargs={'slug': self.cenario.barbearia.slug})
+
+    def reservar(self):
+        return self.client.post(self.url('api_criar_reserva'), json.dumps({
+            'servico_id': self.cenario.servicos[0].id, 'profissional_id': self.cenario.profissionais[0].id,
+            'data_hora': self.data_hora.isoformat(),
+        }), content_type='application/json')
+
+    def horarios(self, **extra):
+        response = self.client.get(self.url('api_horarios_disponiveis'), {
+            'data': datas.local(self.data_hora, self.cenario.fuso).date().isoformat(),
+            'servico_id': self.cenario.servicos[0].id, 'profissional_id': self.cenario.profissionais[0].id, **extra,
+        })
+        return [horario['hora'] for horario in response.json()['horarios']]
+
+    def agendar(self, **extra):
+        return self.client.post(self.url('api_criar_agendamento'), json.dumps({
+            'nome': 'Cliente', 'telefone': '(11) 94444-3333', 'email': 'api@exemplo.com',
+            'servico_id': self.cenario.servicos[0].id, 'profissional_id': self.cenario.profissionais[0].id,
+            'data_hora': self.data_hora.isoformat(), **extra,
+        }), content_type='application/json')
+
+    def test_reserva_segura_o_horario(self):
+        response = self.reservar()
+        self.assertEqual(response.status_code, 201)
+        token = response.json()['reserva']
+
+        self.assertNotIn(self.hora, self.horarios())
+        self.assertIn(self.hora, self.horarios(reserva=token))
+        self.assertEqual(self.reservar().status_code, 409)
+        self.assertEqual(self.agendar().status_code, 409)
+        self.assertEqual(self.agendar(reserva=token).status_code, 201)
+
+    def test_reserva_vencida_libera_o_horario(self):
+        token = self.reservar().json()['reserva']
+        ReservaTemporaria.objects.filter(token=token).update(expira_em=timezone.now() - timedelta(seconds=1))
+
+        self.assertIn(self.hora, self.horarios())
+        self.assertEqual(self.reservar().status_code, 201)
+        # A vencida sai na limpeza feita pela próxima reserva
+        self.assertFalse(ReservaTemporaria.objects.filter(token=token).exists())
+
+
+
+
+@override_settings(LIMITES_TAXA={}, METRICAS_DIR=None, CAPTURA_TRAFEGO=False)
+class ApiHorariosTest(TestCase):
+    """Erros da API de horários disponíveis"""
+
+    def setUp(self):
+        cache.clear()
+        self.cenario = CenarioBarbearia()
+        self.url = reverse('barbearias:api_horarios_disponiveis', kwargs={'slug': self.cenario.barbearia.slug})
+        self.parametros = {
+            'data': (self.cenario.hoje + timedelta(days=1)).isoformat(),
+            'servico_id': self.cenario.servicos[0].id, 'profissional_id': self.cenario.profissionais[0].id,
+        }
+
+    def test_profissional_ou_servico_inexistente(self):
+        for campo in ('profissional_id', 'servico_id'):
+            for valor in (999999, 'abc'):
+                response = self.client.get(self.url, {**self.parametros, campo: valor})
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json(), {'erro': 'Profissional ou serviço não encontrado.'})
+
+    def test_data_invalida(self):
+        response = self.client.get(self.url, {**self.parametros, 'data': '31/12/2030'})
+        self.assertEqual(response.status_code, 400)
+@override_settings(LIMITES_TAXA={}, METRICAS_DIR=None, CAPTURA_TRAFEGO=False)
+class EventosAgendaTest(TestCase):
+    """Stream de Server-Sent Events do painel (broker só em processo, sem o arquivo compartilhado)"""
+
+    def setUp(self):
+        cache.clear()
+        self.cenario = CenarioBarbearia()
+        self.url = reverse('barbearias:admin_eventos_agenda', kwargs={'slug': self.cenario.barbearia.slug})
+        self.client.force_login(self.cenario.dono)
+        self.async_client.force_login(self.cenario.dono)
+        self.enterContext(mock.patch.object(broker, 'diretorio', None))
+
+    async def test_evento_publicado_chega_ao_stream(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        conteudo = aiter(response.streaming_content)
+        self.assertEqual(await anext(conteudo), b'retry: 3000\n\n')
+
+        broker.publicar(self.cenario.barbearia.id, 'agendamento_criado', {'nome_cliente': 'Fulano'})
+        broker.publicar(self.cenario.barbearia.id + 1, 'agendamento_criado', {'nome_cliente': 'Outra barbearia'})
+        broker.publicar(self.cenario.barbearia.id, 'agendamento_cancelado', {'nome_cliente': 'Beltrano'})
+
+        criado = (await asyncio.wait_for(anext(conteudo), 1)).decode()
+        self.assertIn('event: agendamento_criado\n', criado)
+        self.assertIn('data: {"nome_cliente": "Fulano"}\n', criado)
+        cancelado = (await asyncio.wait_for(anext(conteudo), 1)).decode()
+        self.assertIn('event: agendamento_cancelado\n', cancelado)
+        self.assertIn('Beltrano', cancelado)
+
+    def test_wsgi_recusa_o_stream(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 501)
+        # Sob WSGI o painel também não abre o EventSource
+        painel = self.client.get(reverse('barbearias:admin_dashboard', kwargs={'slug': self.cenario.barbearia.slug}))
+        self.assertNotContains(painel, 'new EventSource')
+        self.assertFalse(painel.context['eventos_agenda_disponiveis'])
+
+    async def test_dono_de_outra_barbearia_nao_assina(self):
+        outra = await sync_to_async(CenarioBarbearia)('outra-barbearia')
+        await self.async_client.aforce_login(outra.dono)
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+
+
+class MetricasTest(TestCase):
+    """Soma dos arquivos de cada processo em METRICAS_DIR e acesso ao /metrics"""
+
+    def setUp(self):
+        self.diretorio = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(override_settings(METRICAS_DIR=self.diretorio, METRICAS_INTERVALO_GRAVACAO=0))
+        # Estado do processo isolado do restante da suíte
+        self.enterContext(mock.patch.dict(metricas._metricas))
+        self.enterContext(mock.patch.dict(metricas._valores, clear=True))
+        self.enterContext(mock.patch.dict(metricas._estado, pid=None))
+        # Processos encerrados: qualquer pid diferente do atual
+        self.enterContext(mock.patch.object(metricas, '_processo_ativo', lambda pid: pid == os.getpid()))
+        self.contador = metricas.Contador('teste_eventos', 'Eventos de teste', ['tipo'])
+        self.chave = ('teste_eventos', '_total', (('tipo', 'a'),))
+
+    def gravar_processo(self, pid, valor):
+        caminho = self.diretorio / f'metricas-{pid}.json'
+        caminho.write_text(json.dumps(metricas._serializar({self.chave: valor})))
+        return caminho
+
+    def test_compacta_processos_encerrados(self):
+        encerrados = [self.gravar_processo(pid, valor) for pid, valor in ((999991, 2), (999992, 3))]
+        self.contador.inc(tipo='a')
+
+        self.assertEqual(metricas.coletar()[self.chave], 6)
+        self.assertFalse(any(caminho.exists() for caminho in encerrados))
+        self.assertEqual(metricas._ler(self.diretorio / metricas.ARQUIVO_ACUMULADO), {self.chave: 5})
+        # O processo atual continua no próprio arquivo
+        self.assertTrue((self.diretorio / f'metricas-{os.getpid()}.json').exists())
+
+    def test_acumulado_continua_entre_coletas(self):
+        self.gravar_processo(999991, 2)
+        self.assertEqual(metricas.coletar()[self.chave], 2)
+        # Outro worker reinicia depois da primeira coleta: o contador não volta para trás
+        self.gravar_processo(999993, 4)
+        self.assertEqual(metricas.coletar()[self.chave], 6)
+        self.assertEqual(metricas.coletar()[self.chave], 6)
+        self.assertEqual(metricas._ler(self.diretorio / metricas.ARQUIVO_ACUMULADO), {self.chave: 6})
+
+    def test_pid_reaproveitado_continua_os_numeros(self):
+        # Arquivo de um processo encerrado com o mesmo pid, ainda não compactado
+        self.gravar_processo(os.getpid(), 7)
+        self.contador.inc(tipo='a')
+
+        self.assertEqual(metricas.coletar()[self.chave], 8)
+        self.assertEqual(metricas._ler(self.diretorio / f'metricas-{os.getpid()}.json'), {self.chave: 8})
+        self.assertFalse((self.diretorio / metricas.ARQUIVO_ACUMULADO).exists())
+
+    def test_metrics_fechado_por_padrao(self):
+        with override_settings(METRICAS_TOKEN=None, METRICAS_IPS_PERMITIDOS=[]):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+            # O X-Forwarded-For não libera o acesso
+            self.assertEqual(self.client.get('/metrics', HTTP_X_FORWARDED_FOR='10.0.0.5').status_code, 404)
+        with override_settings(METRICAS_TOKEN=None, METRICAS_IPS_PERMITIDOS=['127.0.0.1']):
+            self.assertContains(self.client.get('/metrics'), '# TYPE teste_eventos counter')
+
+    def test_metrics_com_token(self):
+        with override_settings(METRICAS_TOKEN='segredo', METRICAS_IPS_PERMITIDOS=[]):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer outro').status_code, 401)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer segredo').status_code, 200)
+
+
+@override_settings(LIMITES_TAXA={}, METRICAS_DIR=None, CAPTURA_TRAFEGO=True, CAPTURA_AMOSTRAGEM=1.0)
+class CapturaTrafegoTest(TestCase):
+    """O arquivo da captura nunca recebe nome, telefone, email, observações ou chaves do cliente"""
+
+    def setUp(self):
+        cache.clear()
+        self.cenario = CenarioBarbearia()
+        self.arquivo = Path(self.enterContext(tempfile.TemporaryDirectory())) / 'trafego.jsonl'
+        self.enterContext(override_settings(CAPTURA_ARQUIVO=self.arquivo))
+
+    def url(self, nome):
+        return reverse(f'barbearias:{nome}', kwargs={'slug': self.cenario.barbearia.slug})
+
+    def test_sanitizar(self):
+        dados = {
+            'nome': 'Joana Prado', 'nome_servico': 'Corte', 'senha': 'segredo', 'csrfmiddlewaretoken': 'abc',
+            'telefone': ['(11) 98888-7777', '(11) 98888-7777'],
+            'cliente': {'email': 'joana@exemplo.com', 'observacoes': 'Alergia a lâmina'},
+            'itens': [{'nome_cliente': 'Joana Prado', 'servico_id': 1}],
+        }
+        limpo = captura.sanitizar(dados)
+
+        self.assertEqual(set(limpo), {'nome', 'nome_servico', 'telefone', 'cliente', 'itens'})
+        self.assertEqual(limpo['nome_servico'], 'Corte')
+        self.assertEqual(limpo['itens'][0]['servico_id'], 1)
+        # O mesmo telefone vira sempre o mesmo telefone fictício, no mesmo formato
+        self.assertEqual(limpo['telefone'][0], limpo['telefone'][1])
+        self.assertRegex(limpo['telefone'][0], r'^\(\d{2}\) \d{5}-\d{4}$')
+        self.assertNotIn('Joana', json.dumps(limpo))
+        self.assertNotIn('joana@exemplo.com', json.dumps(limpo))
+        self.assertEqual(limpo['cliente']['observacoes'], '')
+
+    def test_arquivo_sem_dados_pessoais(self):
+        pessoais = ['Joana Prado', '98888-7777', '988887777', 'joana@exemplo.com', 'Alergia', 'pedido-secreto']
+        self.client.post(self.url('api_criar_agendamento'), json.dumps({
+            'nome': 'Joana Prado', 'telefone': '(11) 98888-7777', 'email': 'joana@exemplo.com',
+            'observacoes': 'Alergia a lâmina', 'servico_id': self.cenario.servicos[0].id,
+            'profissional_id': self.cenario.profissionais[0].id, 'data_hora': self.cenario.horario_livre().isoformat(),
+        }), content_type='application/json', HTTP_IDEMPOTENCY_KEY='pedido-secreto')
+        self.client.post(self.url('consultar_agendamentos_local'), {'telefone': '(11) 98888-7777'})
+        self.client.get(self.url('consultar_agendamentos_local'), {'telefone': '11988887777'})
+        captura.gravar_pendentes()
+
+        conteudo = self.arquivo.read_text(encoding='utf-8')
+        registros = [json.loads(linha) for linha in conteudo.splitlines()]
+        self.assertEqual([registro['rota'] for registro in registros], [
+            'barbearias:api_criar_agendamento', 'barbearias:consultar_agendamentos_local', 'barbearias:consultar_agendamentos_local',
+        ])
+        self.assertEqual(registros[0]['status'], 201)
+        for dado in pessoais:
+            self.assertNotIn(dado, conteudo)
+
+
+@override_settings(
+    LIMITES_TAXA={}, METRICAS_DIR=None, CAPTURA_TRAFEGO=False,
+    # O admin do Django renderiza sem o manifesto do collectstatic
+    STORAGES={**settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}},
+)
+class PerfilTest(TestCase):
+    """Só superusuários pedem e veem perfis, que não guardam os parâmetros do SQL"""
+
+    def setUp(self):
+        cache.clear()
+        self.cenario = CenarioBarbearia()
+        self.url = reverse('barbearias:mini_site', kwargs={'slug': self.cenario.barbearia.slug})
+        self.equipe = User.objects.create_user('equipe', 'equipe@exemplo.com', SENHA, is_staff=True)
+        self.superusuario = User.objects.create_superuser('super', 'super@exemplo.com', SENHA)
+
+    def test_equipe_sem_superusuario_nao_perfila(self):
+        self.client.force_login(self.equipe)
+        self.client.get(self.url, {perfil.PARAMETRO: '1'})
+        self.client.get(self.url, HTTP_X_PERFIL=perfil.gerar_token(self.equipe))
+        self.assertFalse(PerfilRequisicao.objects.exists())
+
+        self.client.force_login(self.superusuario)
+        response = self.client.get(self.url, {perfil.PARAMETRO: '1'})
+        self.assertEqual(PerfilRequisicao.objects.get().pk, int(response['X-Perfil-Requisicao']))
+
+    def test_token_no_parametro_vale_uma_vez(self):
+        token = perfil.gerar_token(self.superusuario)
+        self.assertIn('X-Perfil-Requisicao', self.client.get(self.url, {perfil.PARAMETRO: token}))
+        self.assertNotIn('X-Perfil-Requisicao', self.client.get(self.url, {perfil.PARAMETRO: token}))
+        # No cabeçalho o token não fica no histórico e pode ser reusado até expirar
+        for _ in range(2):
+            self.assertIn('X-Perfil-Requisicao', self.client.get(self.url, HTTP_X_PERFIL=token))
+        self.assertEqual(PerfilRequisicao.objects.count(), 3)
+
+    def test_parametros_do_sql_so_quando_pedidos(self):
+        token = perfil.gerar_token(self.superusuario)
+        self.client.get(self.url, HTTP_X_PERFIL=token)
+        consultas = PerfilRequisicao.objects.get().consultas
+        self.assertTrue(consultas)
+        self.assertFalse(any('parametros' in consulta for consulta in consultas))
+
+        with override_settings(PERFIL_PARAMETROS_SQL=True):
+            response = self.client.get(self.url, HTTP_X_PERFIL=token)
+        consultas = PerfilRequisicao.objects.get(pk=response['X-Perfil-Requisicao']).consultas
+        self.assertIn(repr(self.cenario.barbearia.slug), ' '.join(consulta['parametros'] for consulta in consultas))
+
+    def test_admin_somente_superusuario(self):
+        self.client.get(self.url, HTTP_X_PERFIL=perfil.gerar_token(self.superusuario))
+        registro = PerfilRequisicao.objects.get()
+        urls = [
+            reverse('admin:barbearias_perfilrequisicao_changelist'),
+            reverse('admin:barbearias_perfilrequisicao_change', args=[registro.pk]),
+            reverse('admin:barbearias_perfilrequisicao_download', args=[registro.pk]),
+        ]
+
+        self.client.force_login(self.equipe)
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 403, url)
+        self.client.force_login(self.superusuario)
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 200, url)
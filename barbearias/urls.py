@@ -12,6 +12,12 @@ urlpatterns = [
     path('<slug:slug>/agendamentos/<int:agendamento_id>/cancelar/', views.cancelar_agendamento_cliente, name='cancelar_agendamento_cliente'),
     path('<slug:slug>/api/horarios-disponiveis/', views.api_horarios_disponiveis, name='api_horarios_disponiveis'),
     path('<slug:slug>/api/dias-fechados/', views.api_dias_fechados, name='api_dias_fechados'),
+    path('<slug:slug>/api/bootstrap/', views.api_bootstrap, name='api_bootstrap'),
+    path('<slug:slug>/api/reservas/', views.api_criar_reserva, name='api_criar_reserva'),
+    path('<slug:slug>/api/reservas/<str:token>/', views.api_liberar_reserva, name='api_liberar_reserva'),
+    path('<slug:slug>/api/lista-espera/', views.api_lista_espera, name='api_lista_espera'),
+    path('<slug:slug>/api/agendamentos/', views.api_criar_agendamento, name='api_criar_agendamento'),
+    path('<slug:slug>/api/agendamentos/<int:agendamento_id>/', views.api_agendamento, name='api_agendamento'),
     
     # URLs administrativas (protegidas por login próprio)
     path('<slug:slug>/admin/login/', views.admin_login, name='admin_login'),
@@ -22,12 +28,19 @@ urlpatterns = [
     path('<slug:slug>/admin/servicos/<int:servico_id>/editar/', views.admin_servico_editar, name='admin_servico_editar'),
     path('<slug:slug>/admin/servicos/<int:servico_id>/deletar/', views.admin_servico_deletar, name='admin_servico_deletar'),
     path('<slug:slug>/admin/agendamentos/', views.admin_agendamentos_lista, name='admin_agendamentos_lista'),
+    path('<slug:slug>/admin/agendamentos/importar/', views.admin_importar_agendamentos, name='admin_importar_agendamentos'),
     path('<slug:slug>/admin/agendamentos/<int:agendamento_id>/status/', views.admin_agendamento_atualizar_status, name='admin_agendamento_atualizar_status'),
+    path('<slug:slug>/admin/clientes/', views.admin_clientes_lista, name='admin_clientes_lista'),
+    path('<slug:slug>/admin/clientes/<int:cliente_id>/', views.admin_cliente_detalhe, name='admin_cliente_detalhe'),
     path('<slug:slug>/admin/profissionais/', views.admin_profissionais_lista, name='admin_profissionais_lista'),
     path('<slug:slug>/admin/profissionais/criar/', views.admin_profissional_criar, name='admin_profissional_criar'),
     # path('<slug:slug>/admin/profissionais/<int:profissional_id>/editar/', views.admin_profissional_editar, name='admin_profissional_editar'),
     # path('<slug:slug>/admin/profissionais/<int:profissional_id>/deletar/', views.admin_profissional_deletar, name='admin_profissional_deletar'),
+    path('<slug:slug>/admin/eventos/', views.admin_eventos_agenda, name='admin_eventos_agenda'),
     path('<slug:slug>/admin/profissionais/<int:profissional_id>/agenda/', views.admin_agenda_profissional, name='admin_agenda_profissional'),
     path('<slug:slug>/admin/horarios/', views.admin_horarios_funcionamento, name='admin_horarios_funcionamento'),
+    path('<slug:slug>/admin/horarios/excecoes/', views.admin_horarios_excecoes, name='admin_horarios_excecoes'),
+    path('<slug:slug>/admin/horarios/modelos/novo/', views.admin_modelo_horario, name='admin_modelo_horario_novo'),
+    path('<slug:slug>/admin/horarios/modelos/<int:modelo_id>/', views.admin_modelo_horario, name='admin_modelo_horario'),
     path('<slug:slug>/admin/configuracoes/', views.admin_configuracoes, name='admin_configuracoes'),
 ]
@@ -1,17 +1,35 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, Http404
 from django.conf import settings
+from django.urls import reverse
 from django.views.decorators.http import require_http_methods
-from .models import Barbearia, Servico, Profissional, HorarioFuncionamento
-from .forms import ServicoForm, ProfissionalForm, LoginBarbeiroForm, HorarioFuncionamentoForm, BarbeariaConfigForm
+from django.views.decorators.csrf import csrf_exempt
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db import router, transaction
+from django.db.models import Count, Max, Q
+from django.core.paginator import Paginator
+from .models import Barbearia, Servico, Profissional, HorarioFuncionamento, ExcecaoFuncionamento, IntervaloProfissional, BloqueioProfissional
+from .models import DiaModeloHorario, ModeloHorario
+from . import agenda, datas, metricas
+from .catalogo import obter_catalogo, aobter_catalogo, invalidar_catalogo
+from .forms import ServicoForm, ProfissionalForm, LoginBarbeiroForm, GradeHorariosForm, ModeloHorarioForm, BarbeariaConfigForm
+from .forms import ExcecaoFuncionamentoForm, IntervaloProfissionalForm, BloqueioProfissionalForm, ImportacaoAgendamentosForm
 from django.contrib.auth import login, logout
-from agendamentos.models import Agendamento
-from agendamentos.forms import AgendamentoForm
-from agendamentos.utils import enviar_notificacao_novo_agendamento
+from agendamentos.models import Agendamento, ChaveIdempotencia, Cliente, ReservaTemporaria
+from agendamentos.forms import AgendamentoForm, ListaEsperaForm
+from agendamentos.lista_espera import avisar_vaga
+from agendamentos import busca, importacao
+from agendamentos.utils import notificar_novo_agendamento, notificar_cancelamento
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from datetime import datetime, timedelta
+import asyncio
+import csv
+import io
+import json
 
 def redirect_to_default(request):
     """Redireciona para o estabelecimento padrão"""
@@ -35,6 +53,10 @@ def redirect_to_default(request):
     # Se não houver nenhuma barbearia ativa, mostra página de erro
     return render(request, 'barbearias/no_barbearia.html', status=404)
 
+# Consulta pelo telefone: só com DDD, casando o número inteiro (o mesmo que o cancelamento confere)
+DIGITOS_TELEFONE_COM_DDD = 10
+
+
 def consultar_agendamentos_local(request, slug):
     """Consulta de agendamentos de uma barbearia específica"""
     barbearia = get_object_or_404(Barbearia, slug=slug, ativa=True)
@@ -44,26 +66,26 @@ def consultar_agendamentos_local(request, slug):
     
     if request.method == 'POST':
         telefone = request.POST.get('telefone', '').strip()
-        if telefone:
-            agendamentos = Agendamento.objects.filter(
-                barbearia=barbearia,  # Filtra apenas por esta barbearia
-                telefone_cliente__icontains=telefone,
-                data_hora__gte=timezone.now() - timedelta(days=30)
-            ).order_by('-data_hora')
     elif request.method == 'GET' and request.GET.get('telefone'):
         # Para preservar telefone após redirecionamento
         telefone = request.GET.get('telefone', '').strip()
-        if telefone:
-            agendamentos = Agendamento.objects.filter(
-                barbearia=barbearia,
-                telefone_cliente__icontains=telefone,
-                data_hora__gte=timezone.now() - timedelta(days=30)
-            ).order_by('-data_hora')
+    
+    numero = Cliente.normalizar_telefone(telefone)
+    # Sem o DDD o número é ambíguo (outro cliente, outro DDD) e não usaria o índice
+    telefone_completo = len(numero) >= DIGITOS_TELEFONE_COM_DDD
+    if telefone_completo:
+        # Telefone completo, em qualquer formato: índice do cliente + (cliente, data_hora)
+        agendamentos = Agendamento.objects.filter(
+            barbearia=barbearia,  # Filtra apenas por esta barbearia
+            cliente__telefone=numero,
+            data_hora__gte=timezone.now() - timedelta(days=30),
+        ).select_related('barbearia', 'servico', 'profissional').order_by('-data_hora')
     
     context = {
         'barbearia': barbearia,
         'agendamentos': agendamentos,
         'telefone': telefone,
+        'telefone_incompleto': bool(telefone) and not telefone_completo,
     }
     return render(request, 'barbearias/consultar_agendamentos.html', context)
 
@@ -80,10 +102,11 @@ def painel_admin_default(request):
         return redirect('admin:index')
     
     # Estatísticas básicas
-    hoje = timezone.now().date()
+    inicio_dia, fim_dia = datas.intervalo_dia(datas.hoje(datas.fuso(barbearia)), datas.fuso(barbearia))
     agendamentos_hoje = Agendamento.objects.filter(
         barbearia=barbearia,
-        data_hora__date=hoje
+        data_hora__gte=inicio_dia,
+        data_hora__lt=fim_dia
     ).count()
     
     agendamentos_pendentes = Agendamento.objects.filter(
@@ -97,7 +120,7 @@ def painel_admin_default(request):
         barbearia=barbearia,
         data_hora__gte=timezone.now(),
         status__in=['agendado', 'confirmado']
-    )[:10]
+    ).select_related('servico', 'profissional')[:10]
     
     context = {
         'barbearia': barbearia,
@@ -110,13 +133,12 @@ def painel_admin_default(request):
 def mini_site(request, slug):
     """Mini site público da barbearia"""
     barbearia = get_object_or_404(Barbearia, slug=slug, ativa=True)
-    servicos = barbearia.servicos.filter(ativo=True)
-    profissionais = barbearia.profissionais.filter(ativo=True)
+    catalogo = obter_catalogo(barbearia.id)
     
     context = {
         'barbearia': barbearia,
-        'servicos': servicos,
-        'profissionais': profissionais,
+        'servicos': catalogo.servicos,
+        'profissionais': catalogo.profissionais,
     }
     return render(request, 'barbearias/mini_site.html', context)
 
@@ -125,17 +147,38 @@ def agendar(request, slug):
     barbearia = get_object_or_404(Barbearia, slug=slug, ativa=True)
     
     if request.method == 'POST':
+        # Reenvio do mesmo formulário (duplo clique, F5): devolve o resultado original
+        chave = request.POST.get('chave_idempotencia', '').strip()
+        anterior = ChaveIdempotencia.buscar(barbearia, chave) if chave else None
+        if anterior is not None:
+            return _repetir_agendamento_site(request, slug, anterior)
+
         form = AgendamentoForm(request.POST, barbearia=barbearia)
         if form.is_valid():
+            registro = None
+            if form.cleaned_data.get('chave_idempotencia'):
+                registro = ChaveIdempotencia.registrar(barbearia, form.cleaned_data['chave_idempotencia'])
+                if registro is None:
+                    # Outro envio com a mesma chave chegou enquanto este era validado
+                    return _repetir_agendamento_site(request, slug, ChaveIdempotencia.buscar(barbearia, chave))
             agendamento = form.save(commit=False)
             agendamento.barbearia = barbearia
             try:
                 agendamento.save()
+                if registro:
+                    registro.concluir(agendamento)
+                metricas.AGENDAMENTOS.inc(origem='site', resultado='criado')
+                
+                # O horário deixou de ser apenas segurado
+                if form.cleaned_data.get('reserva'):
+                    ReservaTemporaria.objects.filter(token=form.cleaned_data['reserva'], barbearia=barbearia).delete()
                 
-                # Enviar notificação para o estabelecimento
+                # Notificar o estabelecimento (na hora ou no próximo resumo)
                 try:
-                    resultado = enviar_notificacao_novo_agendamento(agendamento)
-                    if resultado:
+                    resultado = notificar_novo_agendamento(agendamento)
+                    if resultado and barbearia.modo_notificacao != 'imediato':
+                        messages.success(request, 'Agendamento realizado com sucesso!')
+                    elif resultado:
                         print(f"✅ Notificação enviada com sucesso para agendamento #{agendamento.id}")
                         messages.success(request, f'Agendamento realizado com sucesso! Uma notificação foi enviada para {barbearia.nome}.')
                     else:
@@ -150,7 +193,12 @@ def agendar(request, slug):
                 
                 return redirect('barbearias:mini_site', slug=slug)
             except Exception as e:
+                if registro:
+                    registro.delete()
+                metricas.AGENDAMENTOS.inc(origem='site', resultado='erro')
                 messages.error(request, f'Erro ao realizar agendamento: {str(e)}')
+        else:
+            metricas.AGENDAMENTOS.inc(origem='site', resultado='invalido')
     else:
         form = AgendamentoForm(barbearia=barbearia)
     
@@ -160,6 +208,15 @@ def agendar(request, slug):
     }
     return render(request, 'barbearias/agendar.html', context)
 
+def _repetir_agendamento_site(request, slug, registro):
+    """Resposta a um reenvio do formulário de agendamento, sem validar, gravar ou notificar"""
+    metricas.AGENDAMENTOS.inc(origem='site', resultado='repetido')
+    if registro is None or registro.agendamento_id is None:
+        messages.info(request, 'Seu agendamento já foi recebido e está sendo processado.')
+    else:
+        messages.success(request, 'Agendamento realizado com sucesso!')
+    return redirect('barbearias:mini_site', slug=slug)
+
 @login_required
 def painel_admin(request, slug):
     """Painel administrativo da barbearia"""
@@ -170,10 +227,11 @@ def painel_admin(request, slug):
         return redirect('admin:index')
     
     # Estatísticas básicas
-    hoje = timezone.now().date()
+    inicio_dia, fim_dia = datas.intervalo_dia(datas.hoje(datas.fuso(barbearia)), datas.fuso(barbearia))
     agendamentos_hoje = Agendamento.objects.filter(
         barbearia=barbearia,
-        data_hora__date=hoje
+        data_hora__gte=inicio_dia,
+        data_hora__lt=fim_dia
     ).count()
     
     agendamentos_pendentes = Agendamento.objects.filter(
@@ -187,7 +245,7 @@ def painel_admin(request, slug):
         barbearia=barbearia,
         data_hora__gte=timezone.now(),
         status__in=['agendado', 'confirmado']
-    )[:10]
+    ).select_related('servico', 'profissional')[:10]
     
     context = {
         'barbearia': barbearia,
@@ -208,7 +266,7 @@ def consultar_agendamentos(request):
             agendamentos = Agendamento.objects.filter(
                 telefone_cliente__icontains=telefone,
                 data_hora__gte=timezone.now() - timedelta(days=30)  # Últimos 30 dias
-            ).order_by('-data_hora')
+            ).select_related('barbearia', 'servico', 'profissional').order_by('-data_hora')
     
     context = {
         'agendamentos': agendamentos,
@@ -229,7 +287,7 @@ def barbeiro_required(view_func):
         # Verificar se tem acesso à barbearia
         try:
             barbearia = Barbearia.objects.get(slug=slug, ativa=True)
-            if barbearia.usuario != request.user:
+            if barbearia.usuario_id != request.user.id:
                 messages.error(request, 'Você não tem permissão para acessar esta barbearia.')
                 logout(request)
                 return redirect('barbearias:admin_login', slug=slug)
@@ -251,7 +309,7 @@ def admin_login(request, slug):
     
     # Se já está logado e tem acesso, redirecionar
     if request.user.is_authenticated:
-        if barbearia.usuario == request.user:
+        if barbearia.usuario_id == request.user.id:
             return redirect('barbearias:admin_dashboard', slug=slug)
         else:
             # Logado com usuário errado, fazer logout
@@ -285,10 +343,11 @@ def admin_dashboard(request, slug):
     barbearia = Barbearia.objects.get(slug=slug, ativa=True)
     
     # Estatísticas básicas
-    hoje = timezone.now().date()
+    inicio_dia, fim_dia = datas.intervalo_dia(datas.hoje(datas.fuso(barbearia)), datas.fuso(barbearia))
     agendamentos_hoje = Agendamento.objects.filter(
         barbearia=barbearia,
-        data_hora__date=hoje
+        data_hora__gte=inicio_dia,
+        data_hora__lt=fim_dia
     ).count()
     
     agendamentos_pendentes = Agendamento.objects.filter(
@@ -301,11 +360,13 @@ def admin_dashboard(request, slug):
     total_profissionais = barbearia.profissionais.filter(ativo=True).count()
     
     # Próximos agendamentos
-    proximos_agendamentos = Agendamento.objects.filter(
+    proximos_agendamentos = list(Agendamento.objects.filter(
         barbearia=barbearia,
         data_hora__gte=timezone.now(),
         status__in=['agendado', 'confirmado']
-    )[:5]
+    ).select_related('servico', 'profissional')[:5])
+    # Eventos da agenda depois deste horário não mudam a lista exibida
+    limite_proximos = proximos_agendamentos[-1].data_hora if len(proximos_agendamentos) == 5 else None
     
     context = {
         'barbearia': barbearia,
@@ -314,6 +375,9 @@ def admin_dashboard(request, slug):
         'total_servicos': total_servicos,
         'total_profissionais': total_profissionais,
         'proximos_agendamentos': proximos_agendamentos,
+        'limite_proximos': limite_proximos,
+        'inicio_dia': inicio_dia,
+        'fim_dia': fim_dia,
     }
     return render(request, 'barbearias/admin/dashboard.html', context)
 
@@ -371,6 +435,7 @@ def admin_servico_editar(request, slug, servico_id):
     context = {
         'barbearia': barbearia,
         'servico': servico,
+        'total_agendamentos': servico.agendamento_set.count(),
         'form': form,
         'titulo': 'Editar Serviço',
         'botao': 'Salvar Alterações',
@@ -391,6 +456,7 @@ def admin_servico_deletar(request, slug, servico_id):
     context = {
         'barbearia': barbearia,
         'servico': servico,
+        'total_agendamentos': servico.agendamento_set.count(),
     }
     return render(request, 'barbearias/admin/servico_deletar.html', context)
 
@@ -403,16 +469,19 @@ def admin_agendamentos_lista(request, slug):
     data_filtro = request.GET.get('data', '')
     status_filtro = request.GET.get('status', '')
     profissional_filtro = request.GET.get('profissional', '')
+    busca_filtro = request.GET.get('q', '').strip()
     
     # Query base
-    agendamentos = Agendamento.objects.filter(barbearia=barbearia)
+    agendamentos = Agendamento.objects.filter(barbearia=barbearia).select_related('servico', 'profissional')
+    fuso = datas.fuso(barbearia)
     
     # Aplicar filtros
     if data_filtro:
         try:
             from datetime import datetime
             data = datetime.strptime(data_filtro, '%Y-%m-%d').date()
-            agendamentos = agendamentos.filter(data_hora__date=data)
+            inicio, fim = datas.intervalo_dia(data, fuso)
+            agendamentos = agendamentos.filter(data_hora__gte=inicio, data_hora__lt=fim)
         except ValueError:
             pass
     
@@ -426,18 +495,22 @@ def admin_agendamentos_lista(request, slug):
         except (ValueError, TypeError):
             pass
     
-    # Se não houver filtro de data, mostrar apenas agendamentos dos próximos 30 dias
-    if not data_filtro:
-        from datetime import date, timedelta
-        hoje = date.today()
-        data_limite = hoje + timedelta(days=30)
-        agendamentos = agendamentos.filter(
-            data_hora__date__gte=hoje,
-            data_hora__date__lte=data_limite
-        )
-    
-    # Ordenar por data/hora
-    agendamentos = agendamentos.order_by('data_hora')
+    if busca_filtro:
+        # A busca percorre todo o histórico, do resultado mais relevante para o menos
+        agendamentos = busca.filtrar(agendamentos, busca_filtro, barbearia.id)
+    else:
+        # Se não houver filtro de data, mostrar apenas agendamentos dos próximos 30 dias
+        if not data_filtro:
+            from datetime import timedelta
+            hoje = datas.hoje(fuso)
+            inicio, fim = datas.intervalo_datas(hoje, hoje + timedelta(days=30), fuso)
+            agendamentos = agendamentos.filter(
+                data_hora__gte=inicio,
+                data_hora__lt=fim
+            )
+        
+        # Ordenar por data/hora
+        agendamentos = agendamentos.order_by('data_hora')
     
     # Para os filtros no template
     profissionais = barbearia.profissionais.filter(ativo=True)
@@ -451,6 +524,7 @@ def admin_agendamentos_lista(request, slug):
         'data_filtro': data_filtro,
         'status_filtro': status_filtro,
         'profissional_filtro': profissional_filtro,
+        'busca_filtro': busca_filtro,
     }
     return render(request, 'barbearias/admin/agendamentos_lista.html', context)
 
@@ -463,9 +537,16 @@ def admin_agendamento_atualizar_status(request, slug, agendamento_id):
     if request.method == 'POST':
         novo_status = request.POST.get('status')
         if novo_status in dict(Agendamento.STATUS_CHOICES):
+            status_anterior = agendamento.status
             agendamento.status = novo_status
             agendamento.save()
             
+            if novo_status == 'cancelado' and status_anterior in ['agendado', 'confirmado']:
+                try:
+                    avisar_vaga(agendamento, request.build_absolute_uri(reverse('barbearias:agendar', kwargs={'slug': slug})))
+                except Exception as e:
+                    print(f"🚨 Erro ao avisar lista de espera: {str(e)}")
+            
             status_nome = dict(Agendamento.STATUS_CHOICES)[novo_status]
             messages.success(request, f'Agendamento de {agendamento.nome_cliente} atualizado para "{status_nome}".')
         else:
@@ -473,15 +554,102 @@ def admin_agendamento_atualizar_status(request, slug, agendamento_id):
     
     return redirect('barbearias:admin_agendamentos_lista', slug=slug)
 
+@barbeiro_required
+def admin_importar_agendamentos(request, slug):
+    """Importar agendamentos de outro sistema a partir de um arquivo CSV ou ICS"""
+    barbearia = get_object_or_404(Barbearia, slug=slug, usuario=request.user, ativa=True)
+    resultado = None
+
+    if request.method == 'POST':
+        form = ImportacaoAgendamentosForm(request.POST, request.FILES)
+        if form.is_valid():
+            arquivo = form.cleaned_data['arquivo']
+            # Lido em streaming direto do upload, sem carregar o arquivo inteiro
+            texto = io.TextIOWrapper(arquivo.file, encoding='utf-8-sig', newline='')
+            try:
+                resultado = importacao.importar(
+                    barbearia, importacao.ler(texto, importacao.formato_do_arquivo(arquivo.name)),
+                    simular=form.cleaned_data['simular'],
+                )
+            except (UnicodeDecodeError, csv.Error):
+                form.add_error('arquivo', 'Não foi possível ler o arquivo. Salve-o como CSV ou ICS em UTF-8.')
+            finally:
+                texto.detach()
+            if resultado and not form.cleaned_data['simular'] and resultado.importados:
+                messages.success(request, f'{resultado.importados} agendamento(s) importado(s) com sucesso!')
+    else:
+        form = ImportacaoAgendamentosForm()
+
+    context = {
+        'barbearia': barbearia,
+        'form': form,
+        'resultado': resultado,
+    }
+    return render(request, 'barbearias/admin/importar_agendamentos.html', context)
+
+@barbeiro_required
+def admin_clientes_lista(request, slug):
+    """Lista de clientes com o resumo dos agendamentos de cada um"""
+    barbearia = Barbearia.objects.get(slug=slug, ativa=True)
+    busca_filtro = request.GET.get('q', '').strip()
+    
+    clientes = Cliente.objects.filter(barbearia=barbearia)
+    if busca_filtro:
+        numero = Cliente.normalizar_telefone(busca_filtro)
+        if numero and len(numero) >= 4:
+            clientes = clientes.filter(telefone__startswith=numero)
+        else:
+            clientes = clientes.filter(nome__istartswith=busca_filtro)
+    
+    # Totais de cada cliente na mesma consulta da página (índice cliente, data_hora)
+    clientes = clientes.annotate(
+        total_agendamentos=Count('agendamentos'),
+        total_cancelados=Count('agendamentos', filter=Q(agendamentos__status='cancelado')),
+        ultimo_agendamento=Max('agendamentos__data_hora'),
+    ).order_by('nome', 'id')
+    pagina = Paginator(clientes, 50).get_page(request.GET.get('pagina'))
+    
+    context = {
+        'barbearia': barbearia,
+        'pagina': pagina,
+        'clientes': pagina.object_list,
+        'busca_filtro': busca_filtro,
+    }
+    return render(request, 'barbearias/admin/clientes_lista.html', context)
+
+@barbeiro_required
+def admin_cliente_detalhe(request, slug, cliente_id):
+    """Histórico de agendamentos de um cliente"""
+    barbearia = Barbearia.objects.get(slug=slug, ativa=True)
+    cliente = get_object_or_404(Cliente, id=cliente_id, barbearia=barbearia)
+    
+    agendamentos = cliente.agendamentos.select_related('servico', 'profissional').order_by('-data_hora')
+    resumo = cliente.agendamentos.aggregate(
+        total=Count('id'),
+        concluidos=Count('id', filter=Q(status='concluido')),
+        cancelados=Count('id', filter=Q(status='cancelado')),
+        futuros=Count('id', filter=Q(status__in=['agendado', 'confirmado'], data_hora__gte=timezone.now())),
+    )
+    
+    context = {
+        'barbearia': barbearia,
+        'cliente': cliente,
+        'agendamentos': agendamentos,
+        'resumo': resumo,
+    }
+    return render(request, 'barbearias/admin/cliente_detalhe.html', context)
+
 @barbeiro_required
 def admin_profissionais_lista(request, slug):
     """Lista de profissionais para administração"""
     barbearia = Barbearia.objects.get(slug=slug, ativa=True)
-    profissionais = barbearia.profissionais.all().order_by('nome')
+    # Total de agendamentos de cada profissional na mesma consulta da lista
+    profissionais = barbearia.profissionais.annotate(total_agendamentos=Count('agendamento')).order_by('nome')
     
     context = {
         'barbearia': barbearia,
         'profissionais': profissionais,
+        'total_agendamentos': sum(profissional.total_agendamentos for profissional in profissionais),
     }
     return render(request, 'barbearias/admin/profissionais_lista.html', context)
 
@@ -569,7 +737,7 @@ def cancelar_agendamento_cliente(request, slug, agendamento_id):
         telefone = request.POST.get('telefone', '').strip()
         
         # Verificar se o telefone corresponde ao agendamento
-        if not telefone or agendamento.telefone_cliente != telefone:
+        if not telefone or Cliente.normalizar_telefone(agendamento.telefone_cliente) != Cliente.normalizar_telefone(telefone):
             messages.error(request, 'Telefone não corresponde ao agendamento.')
             return redirect('barbearias:consultar_agendamentos_local', slug=slug)
         
@@ -591,20 +759,31 @@ def cancelar_agendamento_cliente(request, slug, agendamento_id):
         agendamento.status = 'cancelado'
         agendamento.save()
         
-        messages.success(request, f'Agendamento de {agendamento.data_hora.strftime("%d/%m/%Y às %H:%M")} foi cancelado com sucesso.')
+        try:
+            notificar_cancelamento(agendamento, motivo='Cancelado pelo cliente')
+        except Exception as e:
+            print(f"🚨 Erro ao notificar cancelamento: {str(e)}")
+        
+        # Avisar quem está na lista de espera que o horário abriu
+        try:
+            avisar_vaga(agendamento, request.build_absolute_uri(reverse('barbearias:agendar', kwargs={'slug': slug})))
+        except Exception as e:
+            print(f"🚨 Erro ao avisar lista de espera: {str(e)}")
+        
+        messages.success(request, f'Agendamento de {timezone.localtime(agendamento.data_hora).strftime("%d/%m/%Y às %H:%M")} foi cancelado com sucesso.')
         
         # Redirecionar de volta para consulta mantendo o telefone
         from django.http import HttpResponseRedirect
-        from django.urls import reverse
         url = reverse('barbearias:consultar_agendamentos_local', kwargs={'slug': slug})
         return HttpResponseRedirect(f"{url}?telefone={telefone}")
     
     return redirect('barbearias:consultar_agendamentos_local', slug=slug)
 
 @require_http_methods(["GET"])
-def api_horarios_disponiveis(request, slug):
+@metricas.API_HORARIOS_SEGUNDOS.cronometrar()
+async def api_horarios_disponiveis(request, slug):
     """API para consultar horários disponíveis de um profissional"""
-    barbearia = get_object_or_404(Barbearia, slug=slug, ativa=True)
+    barbearia = await aget_object_or_404(Barbearia, slug=slug, ativa=True)
     
     profissional_id = request.GET.get('profissional_id')
     data_str = request.GET.get('data')
@@ -615,33 +794,37 @@ def api_horarios_disponiveis(request, slug):
             'erro': 'Parâmetros obrigatórios: profissional_id, data, servico_id'
         }, status=400)
     
+    # Fora do try: o except Exception abaixo transformaria o 404 em 500
+    catalogo = await aobter_catalogo(barbearia.id)
+    profissional = catalogo.profissional(profissional_id)
+    servico = catalogo.servico(servico_id)
+    if profissional is None or servico is None:
+        return JsonResponse({'erro': 'Profissional ou serviço não encontrado.'}, status=404)
+    
     try:
-        profissional = get_object_or_404(Profissional, id=profissional_id, barbearia=barbearia, ativo=True)
-        servico = get_object_or_404(Servico, id=servico_id, barbearia=barbearia, ativo=True)
-        
         # Converter string de data para objeto date
-        from datetime import datetime
         data = datetime.strptime(data_str, '%Y-%m-%d').date()
         
-        # Verificar se a barbearia está fechada no dia da semana
-        dia_semana = data.weekday()
-        horario_funcionamento = HorarioFuncionamento.objects.filter(barbearia=barbearia, dia_semana=dia_semana).first()
+        # Agenda compilada do dia (horário semanal, exceções, intervalos e bloqueios)
+        abertos = (await agenda.aintervalos_abertos(barbearia.id, [profissional.id], data))[(profissional.id, data)]
         
-        if horario_funcionamento and horario_funcionamento.fechado:
+        if not abertos:
             return JsonResponse({
                 'horarios': [],
                 'profissional': profissional.nome,
                 'servico': servico.nome,
                 'duracao': servico.duracao_minutos,
                 'data': data_str,
-                'mensagem': 'O estabelecimento está fechado neste dia.'
+                'mensagem': 'O estabelecimento ou o profissional não atende neste dia.'
             })
 
         # Obter horários disponíveis
-        horarios = Agendamento.obter_horarios_disponiveis(
+        horarios = await Agendamento.aobter_horarios_disponiveis(
             profissional=profissional,
             data=data,
-            duracao_minutos=servico.duracao_minutos
+            duracao_minutos=servico.duracao_minutos,
+            abertos=abertos,
+            ignorar_reserva=request.GET.get('reserva')
         )
         
         return JsonResponse({
@@ -657,49 +840,305 @@ def api_horarios_disponiveis(request, slug):
     except Exception as e:
         return JsonResponse({'erro': str(e)}, status=500)
 
-def api_dias_fechados(request, slug):
-    """API para obter dias da semana em que a barbearia está fechada"""
-    barbearia = get_object_or_404(Barbearia, slug=slug, ativa=True)
+async def api_dias_fechados(request, slug):
+    """API para obter os dias em que a barbearia está fechada em um mês (?mes=YYYY-MM)"""
+    barbearia = await aget_object_or_404(Barbearia, slug=slug, ativa=True)
     
-    # Buscar horários de funcionamento onde fechado=True
-    horarios_fechados = HorarioFuncionamento.objects.filter(
-        barbearia=barbearia, 
-        fechado=True
-    ).values_list('dia_semana', flat=True)
+    try:
+        mes = request.GET.get('mes')
+        inicio = datetime.strptime(mes, '%Y-%m').date() if mes else datas.hoje(datas.fuso(barbearia)).replace(day=1)
+    except ValueError:
+        return JsonResponse({'erro': 'Formato de mês inválido. Use YYYY-MM'}, status=400)
+    fim = (inicio + timedelta(days=32)).replace(day=1) - timedelta(days=1)
     
+    catalogo = await aobter_catalogo(barbearia.id)
+    datas_fechadas = await agenda.adatas_fechadas(barbearia.id, inicio, fim)
+    
+    return JsonResponse({
+        'dias_fechados': catalogo.dias_fechados,
+        'mes': inicio.strftime('%Y-%m'),
+        'datas_fechadas': [data.isoformat() for data in datas_fechadas],
+    })
+
+async def api_bootstrap(request, slug):
+    """
+    API com tudo que a página de agendamento precisa em uma única resposta: catálogo,
+    datas fechadas dos próximos 60 dias e resumo de horários livres dos próximos 7 dias
+    """
+    barbearia = await aget_object_or_404(Barbearia, slug=slug, ativa=True)
+    catalogo = await aobter_catalogo(barbearia.id)
+    hoje = datas.hoje(datas.fuso(barbearia))
+    passo = 30
+
+    datas_fechadas = await agenda.adatas_fechadas(barbearia.id, hoje, hoje + timedelta(days=59))
+    disponibilidade = await Agendamento.aresumo_disponibilidade(
+        barbearia.id, [profissional.id for profissional in catalogo.profissionais], hoje, dias=7, passo_minutos=passo,
+        ignorar_reserva=request.GET.get('reserva')
+    )
+
     return JsonResponse({
-        'dias_fechados': list(horarios_fechados)
+        'servicos': [
+            {'id': servico.id, 'nome': servico.nome, 'preco': str(servico.preco), 'duracao': servico.duracao_minutos}
+            for servico in catalogo.servicos
+        ],
+        'profissionais': [{'id': profissional.id, 'nome': profissional.nome} for profissional in catalogo.profissionais],
+        'dias_fechados': catalogo.dias_fechados,
+        'datas_fechadas': {
+            'inicio': hoje.isoformat(),
+            'fim': (hoje + timedelta(days=59)).isoformat(),
+            'datas': [data.isoformat() for data in datas_fechadas],
+        },
+        # {profissional_id: {data: [inicio, mascara_hex]}}; o bit i marca a faixa inicio + i * passo como livre
+        'disponibilidade': {
+            'inicio': hoje.isoformat(),
+            'fim': (hoje + timedelta(days=6)).isoformat(),
+            'passo': passo,
+            'profissionais': disponibilidade,
+        },
     })
 
+
+# Campos do JSON público -> campos do AgendamentoForm
+CAMPOS_API_AGENDAMENTO = {
+    'nome': 'nome_cliente',
+    'telefone': 'telefone_cliente',
+    'email': 'email_cliente',
+    'servico_id': 'servico',
+    'profissional_id': 'profissional',
+    'data_hora': 'data_hora',
+    'observacoes': 'observacoes',
+    'reserva': 'reserva',
+}
+CAMPOS_FORM_AGENDAMENTO = {campo_form: campo_api for campo_api, campo_form in CAMPOS_API_AGENDAMENTO.items()}
+
+
+def _agendamento_json(agendamento):
+    """Representação compacta de um agendamento para as APIs públicas"""
+    return {
+        'id': agendamento.id,
+        'status': agendamento.status,
+        'data_hora': timezone.localtime(agendamento.data_hora).isoformat(),
+        'fim': timezone.localtime(agendamento.data_hora + timedelta(minutes=agendamento.servico.duracao_minutos)).isoformat(),
+        'nome': agendamento.nome_cliente,
+        'telefone': agendamento.telefone_cliente,
+        'servico': {
+            'id': agendamento.servico_id,
+            'nome': agendamento.servico.nome,
+            'preco': str(agendamento.servico.preco),
+            'duracao': agendamento.servico.duracao_minutos,
+        },
+        'profissional': {'id': agendamento.profissional_id, 'nome': agendamento.profissional.nome},
+        'observacoes': agendamento.observacoes,
+    }
+
+
+def _erros_api(form, campos=CAMPOS_FORM_AGENDAMENTO):
+    """Erros do formulário no formato {campo: [{mensagem, codigo}]}, com os nomes de campo da API"""
+    erros = {}
+    for campo, lista in form.errors.get_json_data().items():
+        campo = campos.get(campo, 'geral' if campo == '__all__' else campo)
+        erros[campo] = [{'mensagem': erro['message'], 'codigo': erro['code']} for erro in lista]
+    return erros
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_criar_agendamento(request, slug):
+    """API para criar um agendamento a partir de um JSON (clientes móveis/SPA)"""
+    barbearia = get_object_or_404(Barbearia, slug=slug, ativa=True)
+
+    try:
+        dados = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'erro': 'Corpo da requisição não é um JSON válido.'}, status=400)
+    if not isinstance(dados, dict):
+        return JsonResponse({'erro': 'O corpo da requisição deve ser um objeto JSON.'}, status=400)
+
+    # Com o cabeçalho Idempotency-Key, repetir a requisição devolve o agendamento original
+    chave = request.headers.get('Idempotency-Key', '').strip()
+    if len(chave) > 64:
+        return JsonResponse({'erro': 'Idempotency-Key deve ter no máximo 64 caracteres.'}, status=400)
+    if chave:
+        anterior = ChaveIdempotencia.buscar(barbearia, chave)
+        if anterior is not None:
+            return _repetir_agendamento_api(anterior)
+
+    form = AgendamentoForm(
+        {campo_form: dados.get(campo_api) or '' for campo_api, campo_form in CAMPOS_API_AGENDAMENTO.items()},
+        barbearia=barbearia
+    )
+    if not form.is_valid():
+        metricas.AGENDAMENTOS.inc(origem='api', resultado='invalido')
+        status = 409 if form.has_error(NON_FIELD_ERRORS, code='conflito') else 400
+        return JsonResponse({'erros': _erros_api(form)}, status=status)
+
+    registro = None
+    if chave:
+        registro = ChaveIdempotencia.registrar(barbearia, chave)
+        if registro is None:
+            return _repetir_agendamento_api(ChaveIdempotencia.buscar(barbearia, chave))
+
+    agendamento = form.save(commit=False)
+    agendamento.barbearia = barbearia
+    try:
+        agendamento.save()
+    except ValidationError as e:
+        # Outro agendamento pode ter ocupado o horário entre a validação e o save
+        if registro:
+            registro.delete()
+        metricas.AGENDAMENTOS.inc(origem='api', resultado='erro')
+        form.add_error(None, e)
+        status = 409 if form.has_error(NON_FIELD_ERRORS, code='conflito') else 400
+        return JsonResponse({'erros': _erros_api(form)}, status=status)
+    except Exception:
+        if registro:
+            registro.delete()
+        raise
+    if registro:
+        registro.concluir(agendamento)
+    metricas.AGENDAMENTOS.inc(origem='api', resultado='criado')
+
+    if form.cleaned_data.get('reserva'):
+        ReservaTemporaria.objects.filter(token=form.cleaned_data['reserva'], barbearia=barbearia).delete()
+
+    try:
+        notificar_novo_agendamento(agendamento)
+    except Exception as e:
+        print(f"🚨 Erro ao enviar notificação: {str(e)}")
+
+    return JsonResponse({'agendamento': _agendamento_json(agendamento)}, status=201)
+
+
+def _repetir_agendamento_api(registro):
+    """Resposta a uma requisição repetida com a mesma Idempotency-Key"""
+    metricas.AGENDAMENTOS.inc(origem='api', resultado='repetido')
+    if registro is None or registro.agendamento_id is None:
+        # A primeira requisição ainda está gravando o agendamento
+        response = JsonResponse({'erro': 'Uma requisição com esta Idempotency-Key ainda está em andamento.'}, status=409)
+        response['Retry-After'] = '1'
+        return response
+    response = JsonResponse({'agendamento': _agendamento_json(registro.agendamento)}, status=201)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_criar_reserva(request, slug):
+    """API para segurar por alguns minutos o horário escolhido pelo cliente"""
+    barbearia = get_object_or_404(Barbearia, slug=slug, ativa=True)
+
+    try:
+        dados = json.loads(request.body or b'{}')
+        catalogo = obter_catalogo(barbearia.id)
+        servico = catalogo.servico(dados.get('servico_id'))
+        profissional = catalogo.profissional(dados.get('profissional_id'))
+        data_hora = datetime.fromisoformat(dados.get('data_hora') or '')
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'erro': 'Parâmetros obrigatórios: servico_id, profissional_id, data_hora (ISO 8601)'}, status=400)
+    if servico is None or profissional is None:
+        return JsonResponse({'erro': 'Profissional ou serviço não encontrado.'}, status=404)
+    if timezone.is_naive(data_hora):
+        data_hora = timezone.make_aware(data_hora, datas.fuso(barbearia))
+
+    reserva = ReservaTemporaria.criar(
+        barbearia, profissional, data_hora, servico.duracao_minutos, substituir=dados.get('substituir')
+    )
+    if reserva is None:
+        return JsonResponse({'erro': 'Este horário não está mais disponível.'}, status=409)
+
+    return JsonResponse({
+        'reserva': reserva.token,
+        'expira_em': timezone.localtime(reserva.expira_em).isoformat(),
+    }, status=201)
+
+
+@csrf_exempt
+@require_http_methods(["DELETE"])
+def api_liberar_reserva(request, slug, token):
+    """API para liberar uma reserva temporária (cliente desistiu do horário)"""
+    barbearia = get_object_or_404(Barbearia, slug=slug, ativa=True)
+    ReservaTemporaria.objects.filter(token=token, barbearia=barbearia).delete()
+    return HttpResponse(status=204)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_lista_espera(request, slug):
+    """API para entrar na lista de espera (aviso por email quando abrir uma vaga compatível)"""
+    barbearia = get_object_or_404(Barbearia, slug=slug, ativa=True)
+
+    try:
+        dados = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'erro': 'Corpo da requisição não é um JSON válido.'}, status=400)
+    if not isinstance(dados, dict):
+        return JsonResponse({'erro': 'O corpo da requisição deve ser um objeto JSON.'}, status=400)
+
+    campos = dict(CAMPOS_API_AGENDAMENTO, data_inicio='data_inicio', data_fim='data_fim', hora_inicio='hora_inicio', hora_fim='hora_fim')
+    form = ListaEsperaForm(
+        {campo_form: dados.get(campo_api) or '' for campo_api, campo_form in campos.items()},
+        barbearia=barbearia
+    )
+    if not form.is_valid():
+        return JsonResponse({'erros': _erros_api(form, {campo_form: campo_api for campo_api, campo_form in campos.items()})}, status=400)
+
+    entrada = form.save()
+    return JsonResponse({'lista_espera': {'id': entrada.id}}, status=201)
+
+
+@require_http_methods(["GET"])
+def api_agendamento(request, slug, agendamento_id):
+    """API para consultar um agendamento pelo id e telefone do cliente (?telefone=...)"""
+    barbearia = get_object_or_404(Barbearia, slug=slug, ativa=True)
+    telefone = request.GET.get('telefone', '').strip()
+    if not telefone:
+        return JsonResponse({'erro': 'Parâmetro obrigatório: telefone'}, status=400)
+
+    agendamento = Agendamento.objects.select_related('servico', 'profissional').filter(
+        id=agendamento_id, barbearia=barbearia
+    ).first()
+    if agendamento is None or Cliente.normalizar_telefone(agendamento.telefone_cliente) != Cliente.normalizar_telefone(telefone):
+        # Mesma resposta para id inexistente e telefone errado
+        return JsonResponse({'erro': 'Agendamento não encontrado.'}, status=404)
+
+    return JsonResponse({'agendamento': _agendamento_json(agendamento)})
+
 @barbeiro_required
 def admin_agenda_profissional(request, slug, profissional_id):
     """Visualizar agenda de um profissional específico"""
     barbearia = Barbearia.objects.get(slug=slug, ativa=True)
     profissional = get_object_or_404(Profissional, id=profissional_id, barbearia=barbearia)
     
-    # Data selecionada (default hoje)
-    data_str = request.GET.get('data', timezone.now().date().strftime('%Y-%m-%d'))
+    # Data selecionada (default hoje, no fuso da barbearia)
+    fuso = datas.fuso(barbearia)
+    data_str = request.GET.get('data', datas.hoje(fuso).strftime('%Y-%m-%d'))
     try:
         from datetime import datetime
         data_selecionada = datetime.strptime(data_str, '%Y-%m-%d').date()
     except ValueError:
-        data_selecionada = timezone.now().date()
+        data_selecionada = datas.hoje(fuso)
     
     # Buscar agendamentos do profissional para a data
+    inicio_dia, fim_dia = datas.intervalo_dia(data_selecionada, fuso)
     agendamentos = Agendamento.objects.filter(
         profissional=profissional,
-        data_hora__date=data_selecionada,
+        data_hora__gte=inicio_dia,
+        data_hora__lt=fim_dia,
         status__in=['agendado', 'confirmado']
-    ).order_by('data_hora')
+    ).select_related('servico').order_by('data_hora')
     
-    # Gerar horários do dia (8h às 18h)
+    # Gerar horários do dia conforme o expediente compilado (8h às 18h se não houver)
     from datetime import datetime, time, timedelta
     horarios_dia = []
-    hora_inicio = time(8, 0)  # 8:00
-    hora_fim = time(18, 0)    # 18:00
+    abertos = agenda.intervalos_abertos(barbearia.id, [profissional.id], data_selecionada)[(profissional.id, data_selecionada)]
     
-    hora_atual = datetime.combine(data_selecionada, hora_inicio)
-    hora_limite = datetime.combine(data_selecionada, hora_fim)
+    if abertos:
+        hora_atual = datas.local(abertos[0][0], fuso)
+        hora_limite = datas.local(abertos[-1][1], fuso)
+    else:
+        hora_atual = datas.combinar(data_selecionada, time(8, 0), fuso)
+        hora_limite = datas.combinar(data_selecionada, time(18, 0), fuso)
     
     while hora_atual <= hora_limite:
         # Verificar se há agendamento neste horário
@@ -727,95 +1166,230 @@ def admin_agenda_profissional(request, slug, profissional_id):
         'data_selecionada': data_selecionada,
         'horarios_dia': horarios_dia,
         'agendamentos': agendamentos,
+        'inicio_dia': inicio_dia,
+        'fim_dia': fim_dia,
     }
     return render(request, 'barbearias/admin/agenda_profissional.html', context)
 
+async def admin_eventos_agenda(request, slug):
+    """Stream de eventos da agenda (Server-Sent Events) para o painel administrativo"""
+    from agendamentos.eventos import broker
+
+    if not isinstance(request, ASGIRequest):
+        # Sob WSGI o gerador infinito seria consumido inteiro antes da resposta
+        return JsonResponse({'error': 'Eventos em tempo real exigem o servidor ASGI'}, status=501)
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    barbearia = await Barbearia.objects.filter(slug=slug, ativa=True).afirst()
+    if barbearia is None or barbearia.usuario_id != user.id:
+        return HttpResponse(status=403)
+
+    heartbeat = getattr(settings, 'EVENTOS_AGENDA_HEARTBEAT', 15)
+
+    async def stream():
+        fila = broker.assinar(barbearia.id)
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    evento = await asyncio.wait_for(fila.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    # Comentário de keep-alive para proxies não fecharem a conexão
+                    yield ': ping\n\n'
+                    continue
+                dados = json.dumps(evento['dados'], ensure_ascii=False)
+                yield f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {dados}\n\n"
+        finally:
+            broker.cancelar(barbearia.id, fila)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @barbeiro_required
 def admin_horarios_funcionamento(request, slug):
-    """Gerenciar horários de funcionamento da barbearia"""
+    """Gerenciar o horário semanal da barbearia e listar os modelos de horário por período"""
     barbearia = get_object_or_404(Barbearia, slug=slug, usuario=request.user, ativa=True)
 
-    # Obter ou criar instâncias de HorarioFuncionamento para cada dia da semana
-    horarios_existentes = {h.dia_semana: h for h in HorarioFuncionamento.objects.filter(barbearia=barbearia)}
-    
-    # Criar uma lista de formulários, um para cada dia da semana
-    forms = []
-    for dia_num, dia_nome in HorarioFuncionamento.DIAS_DA_SEMANA:
-        instance = horarios_existentes.get(dia_num)
-        initial_data = {'dia_semana': dia_num} # Garante que o dia da semana esteja no formulário
-        
-        if request.method == 'POST':
-            # Para cada dia, precisamos de um prefixo único para o formset
-            form = HorarioFuncionamentoForm(request.POST, instance=instance, prefix=f'dia_{dia_num}')
-        else:
-            form = HorarioFuncionamentoForm(instance=instance, initial=initial_data, prefix=f'dia_{dia_num}')
-        
-        forms.append({'dia_nome': dia_nome, 'form': form})
+    atuais = {
+        (0, dia): (abertura, fechamento, fechado)
+        for dia, abertura, fechamento, fechado in HorarioFuncionamento.objects.filter(barbearia=barbearia).values_list(
+            'dia_semana', 'abertura', 'fechamento', 'fechado'
+        )
+    }
 
     if request.method == 'POST':
-        all_forms_valid = True
-        forms_to_process = []
+        form = GradeHorariosForm(request.POST, horarios=atuais)
+        if form.is_valid():
+            novos = {dia: horario for (_, dia), horario in form.horarios().items()}
+            alterados = {dia for dia, horario in novos.items() if atuais.get((0, dia)) != horario}
+            if alterados:
+                # A semana inteira em um único upsert. bulk_create não dispara os sinais:
+                # o cache da agenda descarta só os dias da semana que mudaram
+                HorarioFuncionamento.objects.bulk_create(
+                    [
+                        HorarioFuncionamento(
+                            barbearia=barbearia, dia_semana=dia, abertura=abertura, fechamento=fechamento, fechado=fechado
+                        )
+                        for dia, (abertura, fechamento, fechado) in novos.items()
+                    ],
+                    update_conflicts=True,
+                    unique_fields=['barbearia', 'dia_semana'],
+                    update_fields=['abertura', 'fechamento', 'fechado'],
+                )
+                agenda.invalidar_datas(barbearia.id, dias_semana=alterados)
+                invalidar_catalogo(barbearia.id)
+            messages.success(request, 'Horários de funcionamento atualizados com sucesso!')
+            return redirect('barbearias:admin_horarios_funcionamento', slug=slug)
+        messages.error(request, 'Por favor, corrija os erros nos horários.')
+    else:
+        form = GradeHorariosForm(horarios=atuais)
 
-        # Criar uma cópia mutável de request.POST
-        post_data = request.POST.copy()
+    context = {
+        'barbearia': barbearia,
+        'form': form,
+        'modelos': barbearia.modelos_horario.all(),
+    }
+    return render(request, 'barbearias/admin/horarios_funcionamento.html', context)
 
-        for dia_num, dia_nome in HorarioFuncionamento.DIAS_DA_SEMANA:
-            instance = horarios_existentes.get(dia_num)
-            
-            # Garantir que dia_semana esteja em post_data para este formulário
-            post_data[f'dia_{dia_num}-dia_semana'] = str(dia_num) # Converte para string para o POST data
+@barbeiro_required
+def admin_modelo_horario(request, slug, modelo_id=None):
+    """Criar, editar ou remover um modelo de horário (alternado ou sazonal) aplicado a um período"""
+    barbearia = get_object_or_404(Barbearia, slug=slug, usuario=request.user, ativa=True)
+    modelo = get_object_or_404(ModeloHorario, id=modelo_id, barbearia=barbearia) if modelo_id else None
+    # Período antes da edição: as datas que saem do modelo também mudam de horário
+    anterior = (modelo.data_inicio, modelo.data_fim) if modelo else None
 
-            form = HorarioFuncionamentoForm(post_data, instance=instance, prefix=f'dia_{dia_num}')
-            forms_to_process.append(form)
+    if request.method == 'POST' and request.POST.get('acao') == 'remover' and modelo:
+        modelo.delete()
+        agenda.invalidar_datas(barbearia.id, *anterior)
+        messages.success(request, 'Modelo de horário removido com sucesso!')
+        return redirect('barbearias:admin_horarios_funcionamento', slug=slug)
 
-        for form in forms_to_process:
-            if form.is_valid():
-                fechado = form.cleaned_data['fechado']
-                abertura = form.cleaned_data['abertura']
-                fechamento = form.cleaned_data['fechamento']
-
-                if fechado:
-                    # Se fechado, garantir que abertura e fechamento sejam None
-                    form.cleaned_data['abertura'] = None
-                    form.cleaned_data['fechamento'] = None
-                elif not abertura or not fechamento:
-                    # Se não está fechado, mas faltam horários, é um erro
-                    form.add_error('abertura', "Obrigatório se não estiver fechado.")
-                    form.add_error('fechamento', "Obrigatório se não estiver fechado.")
-                    all_forms_valid = False
-                elif abertura and fechamento and abertura >= fechamento:
-                    form.add_error('fechamento', "Deve ser depois do horário de abertura.")
-                    all_forms_valid = False
-            else:
-                all_forms_valid = False
-        
-        if all_forms_valid:
-            for form in forms_to_process:
-                # Salvar apenas se o formulário for válido após todas as validações
-                horario = form.save(commit=False)
-                horario.barbearia = barbearia
-                horario.dia_semana = form.cleaned_data['dia_semana']
-                horario.abertura = form.cleaned_data['abertura']
-                horario.fechamento = form.cleaned_data['fechamento']
-                horario.save()
-            messages.success(request, 'Horários de funcionamento atualizados com sucesso!')
+    dados = request.POST if request.method == 'POST' else request.GET
+    try:
+        semanas = min(max(int(dados.get('semanas', modelo.semanas if modelo else 1)), 1), len(ModeloHorario.SEMANAS_DO_CICLO))
+    except ValueError:
+        semanas = 1
+
+    # Semanas ainda sem horário começam iguais ao horário semanal
+    semanais = HorarioFuncionamento.objects.filter(barbearia=barbearia).values_list('dia_semana', 'abertura', 'fechamento', 'fechado')
+    horarios = {
+        (semana, dia): (abertura, fechamento, fechado)
+        for dia, abertura, fechamento, fechado in semanais
+        for semana in range(semanas)
+    }
+    if modelo:
+        horarios.update({
+            (semana, dia): (abertura, fechamento, fechado)
+            for semana, dia, abertura, fechamento, fechado in modelo.dias.values_list(
+                'semana', 'dia_semana', 'abertura', 'fechamento', 'fechado'
+            )
+        })
+
+    if request.method == 'POST':
+        form = ModeloHorarioForm(request.POST, instance=modelo)
+        grade = GradeHorariosForm(request.POST, semanas=semanas, horarios=horarios)
+        if form.is_valid() and grade.is_valid():
+            with transaction.atomic(using=router.db_for_write(ModeloHorario)):
+                modelo = form.save(commit=False)
+                modelo.barbearia = barbearia
+                modelo.semanas = semanas
+                modelo.save()
+                # Todos os dias do ciclo em um único upsert
+                DiaModeloHorario.objects.bulk_create(
+                    [
+                        DiaModeloHorario(
+                            modelo=modelo, semana=semana, dia_semana=dia,
+                            abertura=abertura, fechamento=fechamento, fechado=fechado,
+                        )
+                        for (semana, dia), (abertura, fechamento, fechado) in grade.horarios().items()
+                    ],
+                    update_conflicts=True,
+                    unique_fields=['modelo', 'semana', 'dia_semana'],
+                    update_fields=['abertura', 'fechamento', 'fechado'],
+                )
+                modelo.dias.filter(semana__gte=semanas).delete()
+            agenda.invalidar_datas(barbearia.id, modelo.data_inicio, modelo.data_fim)
+            if anterior and anterior != (modelo.data_inicio, modelo.data_fim):
+                agenda.invalidar_datas(barbearia.id, *anterior)
+            messages.success(request, 'Modelo de horário salvo com sucesso!')
             return redirect('barbearias:admin_horarios_funcionamento', slug=slug)
-        else:
-            messages.error(request, 'Por favor, corrija os erros nos horários.')
+        messages.error(request, 'Por favor, corrija os erros no formulário.')
+    else:
+        form = ModeloHorarioForm(instance=modelo)
+        grade = GradeHorariosForm(semanas=semanas, horarios=horarios)
 
-        # Re-renderizar formulários com erros
-        forms = []
-        for dia_num, dia_nome in HorarioFuncionamento.DIAS_DA_SEMANA:
-            instance = horarios_existentes.get(dia_num)
-            # Passar post_data para o formulário para que ele mantenha os valores submetidos
-            form = HorarioFuncionamentoForm(post_data, instance=instance, prefix=f'dia_{dia_num}')
-            forms.append({'dia_nome': dia_nome, 'form': form})
+    context = {
+        'barbearia': barbearia,
+        'modelo': modelo,
+        'form': form,
+        'grade': grade,
+        'semanas': semanas,
+        'opcoes_semanas': ModeloHorario.SEMANAS_DO_CICLO,
+    }
+    return render(request, 'barbearias/admin/modelo_horario.html', context)
 
+@barbeiro_required
+def admin_horarios_excecoes(request, slug):
+    """Gerenciar feriados, fechamentos por data, intervalos e folgas dos profissionais"""
+    barbearia = get_object_or_404(Barbearia, slug=slug, usuario=request.user, ativa=True)
+    
+    excecao_form = ExcecaoFuncionamentoForm(barbearia=barbearia, prefix='excecao')
+    intervalo_form = IntervaloProfissionalForm(barbearia=barbearia, prefix='intervalo')
+    bloqueio_form = BloqueioProfissionalForm(barbearia=barbearia, prefix='bloqueio')
+    
+    if request.method == 'POST':
+        acao = request.POST.get('acao')
+        
+        if acao == 'excecao':
+            excecao_form = ExcecaoFuncionamentoForm(request.POST, barbearia=barbearia, prefix='excecao')
+            form = excecao_form
+        elif acao == 'intervalo':
+            intervalo_form = IntervaloProfissionalForm(request.POST, barbearia=barbearia, prefix='intervalo')
+            form = intervalo_form
+        elif acao == 'bloqueio':
+            bloqueio_form = BloqueioProfissionalForm(request.POST, barbearia=barbearia, prefix='bloqueio')
+            form = bloqueio_form
+        else:
+            form = None
+        
+        if form is not None:
+            if form.is_valid():
+                item = form.save(commit=False)
+                if acao == 'excecao':
+                    item.barbearia = barbearia
+                item.save()
+                messages.success(request, 'Cadastro realizado com sucesso!')
+                return redirect('barbearias:admin_horarios_excecoes', slug=slug)
+            messages.error(request, 'Por favor, corrija os erros no formulário.')
+        else:
+            # Remoção de um item existente
+            modelos = {
+                'remover_excecao': (ExcecaoFuncionamento, {'barbearia': barbearia}),
+                'remover_intervalo': (IntervaloProfissional, {'profissional__barbearia': barbearia}),
+                'remover_bloqueio': (BloqueioProfissional, {'profissional__barbearia': barbearia}),
+            }
+            if acao in modelos:
+                modelo, filtro = modelos[acao]
+                item = get_object_or_404(modelo, id=request.POST.get('id'), **filtro)
+                item.delete()
+                messages.success(request, 'Item removido com sucesso!')
+            return redirect('barbearias:admin_horarios_excecoes', slug=slug)
+    
     context = {
         'barbearia': barbearia,
-        'forms': forms,
+        'excecoes': barbearia.excecoes_funcionamento.filter(data__gte=datas.hoje(datas.fuso(barbearia))),
+        'intervalos': IntervaloProfissional.objects.filter(profissional__barbearia=barbearia).select_related('profissional'),
+        'bloqueios': BloqueioProfissional.objects.filter(profissional__barbearia=barbearia, fim__gte=timezone.now()).select_related('profissional'),
+        'excecao_form': excecao_form,
+        'intervalo_form': intervalo_form,
+        'bloqueio_form': bloqueio_form,
     }
-    return render(request, 'barbearias/admin/horarios_funcionamento.html', context)
+    return render(request, 'barbearias/admin/horarios_excecoes.html', context)
 
 @barbeiro_required
 def admin_configuracoes(request, slug):
@@ -835,4 +1409,16 @@ def admin_configuracoes(request, slug):
         'barbearia': barbearia,
         'form': form,
     }
-    return render(request, 'barbearias/admin/configuracoes.html', context)
\ No newline at end of file
+    return render(request, 'barbearias/admin/configuracoes.html', context)
+
+def metricas_prometheus(request):
+    """Métricas no formato de texto do Prometheus (veja METRICAS.md)"""
+    token = getattr(settings, 'METRICAS_TOKEN', None)
+    # REMOTE_ADDR, e não X-Forwarded-For: o cabeçalho pode ser enviado por qualquer cliente
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'METRICAS_IPS_PERMITIDOS', ()):
+        if not token:
+            # Fechado por padrão: sem token nem IP permitido o endpoint não existe
+            raise Http404
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponse('Não autorizado.', status=401, content_type='text/plain; charset=utf-8')
+    return HttpResponse(metricas.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
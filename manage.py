@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'barbearia_system.settings')
+    # Os testes têm bancos extras (shard e réplica) declarados à parte
+    padrao = 'barbearia_system.settings_testes' if sys.argv[1:2] == ['test'] else 'barbearia_system.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', padrao)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -0,0 +1,13 @@
+/** @type {import('tailwindcss').Config} */
+module.exports = {
+  // Apenas as classes usadas nestes arquivos entram no CSS final
+  content: [
+    './templates/**/*.html',
+    './barbearias/**/*.py',
+    './agendamentos/**/*.py',
+  ],
+  theme: {
+    extend: {},
+  },
+  plugins: [],
+}